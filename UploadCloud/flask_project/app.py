@@ -28,7 +28,7 @@ from werkzeug.middleware.proxy_fix import ProxyFix  # 處理反向代理 headers
 load_dotenv()  # 必須在導入自訂模組之前執行！
 
 # ─── 自訂模組 ─────────────────────────────
-from services.socketio_manager import socketio, init_socketio
+from services.socketio_manager import socketio, init_socketio, run_session_reaper
 from services.user import user_bp, load_user as user_load_user, settings_bp
 from services.diary import diary_bp
 from services.admin import admin_bp, admin_chat_bp, admin_announcement_bp
@@ -38,6 +38,11 @@ from services.support import support_bp
 from services.social import social_bp
 from services.announcement import announcement_bp
 from services.coopcard import coopcard_bp
+from utils.points_ledger import run_points_reconciler
+from services.admin.dashboard_metrics import DASHBOARD_METRICS_INTERVAL, run_dashboard_metrics_refresher
+from utils.user_search_index import USER_SEARCH_INDEX, USER_SEARCH_INDEX_REFRESH_INTERVAL, run_user_search_index_refresher
+from services.coopcard.daily_progress import DAILY_PROGRESS_ROLLOVER, run_daily_progress_rollover
+from utils.db import init_app as init_db
 # ─────────────────────────────────────────
 
 # ── 建立 Flask App ────────────────────────
@@ -61,15 +66,13 @@ app.wsgi_app = ProxyFix(
 app.config['JSON_AS_ASCII'] = False
 app.config['JSONIFY_MIMETYPE'] = 'application/json; charset=utf-8'
 
-# Socket 相關資料結構（供事件處理共用）
-# 用於管理 AI 聊天暫停狀態和連線狀態
-app.dify_paused_sessions = set()        # 存放暫停的 AI 對話 session
-app.active_chat_connections = {}        # sid -> session_id 映射
-app.session_id_to_sids   = {}          # session_id -> set(sid) 映射
-
 # 初始化 SocketIO（並把事件綁進 app）
+# AI 聊天暫停狀態與連線狀態存放於 ChatState（CHAT_STATE_URL，預設行程內記憶體）
 init_socketio(app)
 
+# 請求範圍的資料庫連線：同一請求共用連線，請求結束時統一歸還連線池
+init_db(app)
+
 # ── 註冊 Blueprint ────────────────────────
 app.register_blueprint(admin_bp,        url_prefix="/admin")
 app.register_blueprint(admin_chat_bp,   url_prefix="/admin/chat")
@@ -86,6 +89,31 @@ app.register_blueprint(coopcard_bp,     url_prefix="/coopcard")  # 修復：保
 app.register_blueprint(announcement_bp)               # frontend API
 app.register_blueprint(admin_announcement_bp)         # admin CRUD
 
+# ── 聊天會話清理 ──────────────────────────
+# 斷線的會話於寬限期（CHAT_DISCONNECT_GRACE_SECONDS）後由背景 reaper 分批關閉 / 刪除
+socketio.start_background_task(run_session_reaper)
+
+# ── 管理員儀表板統計快照 ──────────────────
+# DASHBOARD_METRICS_INTERVAL（秒）大於 0 時，於背景定期重新計算（DASHBOARD_LIVE_PUSH=1 時一併推送）
+if DASHBOARD_METRICS_INTERVAL > 0:
+    socketio.start_background_task(run_dashboard_metrics_refresher, DASHBOARD_METRICS_INTERVAL)
+
+# ── 用戶搜尋前綴索引 ──────────────────────
+# 啟動時於背景載入，之後每 USER_SEARCH_INDEX_REFRESH_INTERVAL 秒重建（載入完成前搜尋改查資料庫）
+if USER_SEARCH_INDEX:
+    socketio.start_background_task(run_user_search_index_refresher, USER_SEARCH_INDEX_REFRESH_INTERVAL)
+
+# ── 任務卡片每日計數歸零 ──────────────────
+# 每日午夜統一歸零全卡當日總計（讀取 API 不再於跨日時順便重置）
+if DAILY_PROGRESS_ROLLOVER:
+    socketio.start_background_task(run_daily_progress_rollover)
+
+# ── 積分帳本定期對帳 ──────────────────────
+# POINTS_RECONCILE_INTERVAL（秒）大於 0 時，於背景定期以完整重算修正積分漂移
+points_reconcile_interval = int(os.environ.get("POINTS_RECONCILE_INTERVAL", 0))
+if points_reconcile_interval > 0:
+    socketio.start_background_task(run_points_reconciler, points_reconcile_interval)
+
 # ── 登入系統 ──────────────────────────────
 login_manager = LoginManager(app)
 login_manager.login_view = '/user/login/form'
@@ -0,0 +1,19 @@
+/* ============================================================
+   001_posts_feed_keyset_index
+   - 社群動態牆改為 (Created_at, Post_id) 鍵集分頁
+   - 新增複合索引，讓 WHERE Is_public = TRUE ORDER BY Created_at DESC, Post_id DESC
+     LIMIT n 可以直接走索引範圍掃描，不再需要 filesort
+   - MySQL 8.0+
+   ============================================================ */
+
+USE `flaskdb`;
+
+ALTER TABLE `posts`
+  ADD KEY `idx_posts_public_created` (`Is_public`, `Created_at`, `Post_id`);
+
+INSERT INTO `migration_log` (`migration_name`, `rollback_script`, `description`)
+VALUES (
+  '001_posts_feed_keyset_index',
+  'ALTER TABLE `posts` DROP KEY `idx_posts_public_created`;',
+  '社群動態牆鍵集分頁索引'
+);
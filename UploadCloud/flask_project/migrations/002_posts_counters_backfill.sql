@@ -0,0 +1,29 @@
+/* ============================================================
+   002_posts_counters_backfill
+   - posts.likes_count / posts.comments_count 欄位已存在，但過去未被維護
+   - 按讚/評論寫入路徑改為在同一交易內加減計數器，讀取路徑直接讀欄位
+   - 本遷移依 likes / comments 實際資料一次回填計數器
+     （comments_count 只計算公開評論）
+   - 之後若懷疑漂移，可執行 `flask social rebuild-counters` 重算
+   - MySQL 8.0+
+   ============================================================ */
+
+USE `flaskdb`;
+
+UPDATE `posts` p
+LEFT JOIN (
+  SELECT `Post_id`, COUNT(*) AS total FROM `likes` GROUP BY `Post_id`
+) l ON l.`Post_id` = p.`Post_id`
+LEFT JOIN (
+  SELECT `Post_id`, COUNT(*) AS total FROM `comments`
+  WHERE `Is_public` = TRUE GROUP BY `Post_id`
+) c ON c.`Post_id` = p.`Post_id`
+SET p.`likes_count` = COALESCE(l.total, 0),
+    p.`comments_count` = COALESCE(c.total, 0);
+
+INSERT INTO `migration_log` (`migration_name`, `rollback_script`, `description`)
+VALUES (
+  '002_posts_counters_backfill',
+  NULL,
+  '回填貼文按讚/評論計數器'
+);
@@ -0,0 +1,38 @@
+/* ============================================================
+   003_user_timeline
+   - 「追蹤中」分頁改為 fan-out-on-write 時間軸
+   - create_post 發文時寫入所有粉絲的時間軸；追蹤時回填、取消追蹤/移除粉絲時清除
+   - 讀取時以 (owner_email, post_created_at, post_id) 索引做範圍掃描
+   - 刪除貼文或用戶時由外鍵一併清除
+   - 本遷移同時依現有 follows 回填所有時間軸
+     （之後可執行 `flask social rebuild-timeline` 重建）
+   - MySQL 8.0+
+   ============================================================ */
+
+USE `flaskdb`;
+
+CREATE TABLE IF NOT EXISTS `user_timeline` (
+  `owner_email` varchar(255) NOT NULL COMMENT '時間軸擁有者（追蹤者）Email',
+  `post_id` int NOT NULL COMMENT '貼文ID',
+  `author_email` varchar(255) NOT NULL COMMENT '貼文作者Email',
+  `post_created_at` timestamp NOT NULL COMMENT '貼文建立時間（排序用）',
+  PRIMARY KEY (`owner_email`, `post_id`),
+  KEY `idx_timeline_owner_created` (`owner_email`, `post_created_at`, `post_id`),
+  KEY `idx_timeline_owner_author` (`owner_email`, `author_email`),
+  KEY `idx_timeline_post` (`post_id`),
+  CONSTRAINT `user_timeline_ibfk_1` FOREIGN KEY (`owner_email`) REFERENCES `user` (`User_Email`) ON DELETE CASCADE,
+  CONSTRAINT `user_timeline_ibfk_2` FOREIGN KEY (`post_id`) REFERENCES `posts` (`Post_id`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci COMMENT='追蹤動態時間軸';
+
+INSERT IGNORE INTO `user_timeline` (`owner_email`, `post_id`, `author_email`, `post_created_at`)
+SELECT f.`follower_email`, p.`Post_id`, p.`User_Email`, p.`Created_at`
+FROM `follows` f
+INNER JOIN `posts` p ON p.`User_Email` = f.`following_email` AND p.`Is_public` = TRUE
+WHERE p.`Created_at` IS NOT NULL;
+
+INSERT INTO `migration_log` (`migration_name`, `rollback_script`, `description`)
+VALUES (
+  '003_user_timeline',
+  'DROP TABLE IF EXISTS `user_timeline`;',
+  '追蹤動態 fan-out 時間軸'
+);
@@ -0,0 +1,24 @@
+/* ============================================================
+   004_fulltext_search_ngram
+   - 社群搜尋改用 FULLTEXT 索引取代 LIKE '%q%' 全表掃描
+   - 使用 ngram 解析器，中文依二字詞切詞（ngram_token_size 預設 2）
+   - posts(title, Content)：貼文標題與內容
+   - user(User_name)：用戶名稱（搜尋用戶與作者名稱加權）
+   - 長度小於 ngram_token_size 的查詢詞由程式退回 LIKE 比對
+   - MySQL 8.0+
+   ============================================================ */
+
+USE `flaskdb`;
+
+ALTER TABLE `posts`
+  ADD FULLTEXT KEY `ft_posts_title_content` (`title`, `Content`) WITH PARSER ngram;
+
+ALTER TABLE `user`
+  ADD FULLTEXT KEY `ft_user_name` (`User_name`) WITH PARSER ngram;
+
+INSERT INTO `migration_log` (`migration_name`, `rollback_script`, `description`)
+VALUES (
+  '004_fulltext_search_ngram',
+  'ALTER TABLE `posts` DROP KEY `ft_posts_title_content`; ALTER TABLE `user` DROP KEY `ft_user_name`;',
+  '社群搜尋 ngram 全文索引'
+);
@@ -0,0 +1,31 @@
+/* ============================================================
+   005_user_points_ledger
+   - 用戶積分改為事件驅動的增量帳本，不再每次載入頁面重算
+   - 發文 / 獲得讚 / 獲得他人留言 / 每日登入時寫入一筆異動，
+     並以單列 UPDATE 更新 user 上的 user_points 與統計欄位
+   - 'reconcile' 事件為定期對帳修正的差額
+   - 套用後請執行一次 `flask social reconcile-points`，以完整重算初始化所有用戶
+   - MySQL 8.0+
+   ============================================================ */
+
+USE `flaskdb`;
+
+CREATE TABLE IF NOT EXISTS `user_points_ledger` (
+  `id` bigint NOT NULL AUTO_INCREMENT,
+  `user_email` varchar(255) NOT NULL COMMENT '積分異動的用戶Email',
+  `event_type` varchar(32) NOT NULL COMMENT 'post_created / like_received / comment_received / login_day / reconcile',
+  `quantity` int NOT NULL DEFAULT '1' COMMENT '事件數量（負數為撤銷）',
+  `points_delta` int NOT NULL COMMENT '積分異動量',
+  `source_id` int DEFAULT NULL COMMENT '來源貼文ID',
+  `created_at` timestamp NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (`id`),
+  KEY `idx_ledger_user_created` (`user_email`, `created_at`),
+  CONSTRAINT `user_points_ledger_ibfk_1` FOREIGN KEY (`user_email`) REFERENCES `user` (`User_Email`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci COMMENT='用戶積分異動帳本';
+
+INSERT INTO `migration_log` (`migration_name`, `rollback_script`, `description`)
+VALUES (
+  '005_user_points_ledger',
+  'DROP TABLE IF EXISTS `user_points_ledger`;',
+  '用戶積分增量帳本'
+);
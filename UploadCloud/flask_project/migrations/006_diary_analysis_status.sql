@@ -0,0 +1,22 @@
+/* ============================================================
+   006_diary_analysis_status
+   - 日記儲存後立即寫入，Dify 情緒分析改由背景工作完成
+   - Analysis_status: pending（分析中）/ done（完成）/ failed（重試後仍失敗）
+   - Analysis_attempts: 呼叫 Dify 的累計次數
+   - 既有日記皆已含分析結果，預設為 done
+   - MySQL 8.0+
+   ============================================================ */
+
+USE `flaskdb`;
+
+ALTER TABLE `diaryrecords`
+  ADD COLUMN `Analysis_status` varchar(16) NOT NULL DEFAULT 'done' COMMENT 'AI 分析狀態 pending/done/failed' AFTER `AI_suggestions`,
+  ADD COLUMN `Analysis_attempts` int NOT NULL DEFAULT '0' COMMENT 'AI 分析嘗試次數' AFTER `Analysis_status`,
+  ADD KEY `idx_diary_user_status` (`User_Email`, `Analysis_status`);
+
+INSERT INTO `migration_log` (`migration_name`, `rollback_script`, `description`)
+VALUES (
+  '006_diary_analysis_status',
+  'ALTER TABLE `diaryrecords` DROP KEY `idx_diary_user_status`, DROP COLUMN `Analysis_attempts`, DROP COLUMN `Analysis_status`;',
+  '日記 AI 分析背景化狀態欄位'
+);
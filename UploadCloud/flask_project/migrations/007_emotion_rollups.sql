@@ -0,0 +1,53 @@
+/* ============================================================
+   007_emotion_rollups
+   - 情緒洞察統計改讀預先彙總的 rollup，不再逐筆 json.loads emotion_history
+   - emotion_daily_rollups：每用戶每日的互動數、正向/負面/中性百分比總和、信心度總和
+     （摘要、每日趨勢、情緒分布使用；365 天視窗最多 365 列）
+   - emotion_hourly_rollups：每用戶每小時的互動數與正向/負面主導情緒數（今日趨勢使用）
+   - emotion_hourly_emotions：每用戶每小時各主導情緒的出現次數
+   - save_emotion_data() 寫入 emotion_history 時於同一交易內增量更新
+   - 套用後請執行一次 `flask emo_stats rebuild-rollups`，以既有 emotion_history 回填
+   - MySQL 8.0+
+   ============================================================ */
+
+USE `flaskdb`;
+
+CREATE TABLE IF NOT EXISTS `emotion_daily_rollups` (
+  `user_email` varchar(255) NOT NULL,
+  `bucket_date` date NOT NULL,
+  `interaction_count` int NOT NULL DEFAULT '0' COMMENT '情緒紀錄數',
+  `analyzed_count` int NOT NULL DEFAULT '0' COMMENT '含 primary_emotions 的紀錄數',
+  `positive_score` double NOT NULL DEFAULT '0' COMMENT '正向情緒百分比總和',
+  `negative_score` double NOT NULL DEFAULT '0' COMMENT '負面情緒百分比總和',
+  `neutral_score` double NOT NULL DEFAULT '0' COMMENT '中性情緒百分比總和',
+  `confidence_count` int NOT NULL DEFAULT '0',
+  `confidence_sum` int NOT NULL DEFAULT '0',
+  `confidence_sq_sum` int NOT NULL DEFAULT '0' COMMENT '信心度平方和（計算變異數）',
+  PRIMARY KEY (`user_email`, `bucket_date`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci COMMENT='每日情緒統計彙總';
+
+CREATE TABLE IF NOT EXISTS `emotion_hourly_rollups` (
+  `user_email` varchar(255) NOT NULL,
+  `bucket_date` date NOT NULL,
+  `bucket_hour` tinyint NOT NULL,
+  `interaction_count` int NOT NULL DEFAULT '0' COMMENT '含主導情緒的紀錄數',
+  `positive_count` int NOT NULL DEFAULT '0' COMMENT '主導情緒為正向的紀錄數',
+  `negative_count` int NOT NULL DEFAULT '0' COMMENT '主導情緒為負面的紀錄數',
+  PRIMARY KEY (`user_email`, `bucket_date`, `bucket_hour`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci COMMENT='每小時情緒統計彙總';
+
+CREATE TABLE IF NOT EXISTS `emotion_hourly_emotions` (
+  `user_email` varchar(255) NOT NULL,
+  `bucket_date` date NOT NULL,
+  `bucket_hour` tinyint NOT NULL,
+  `emotion` varchar(50) NOT NULL COMMENT '主導情緒名稱',
+  `emotion_count` int NOT NULL DEFAULT '0',
+  PRIMARY KEY (`user_email`, `bucket_date`, `bucket_hour`, `emotion`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci COMMENT='每小時主導情緒次數';
+
+INSERT INTO `migration_log` (`migration_name`, `rollback_script`, `description`)
+VALUES (
+  '007_emotion_rollups',
+  'DROP TABLE IF EXISTS `emotion_hourly_emotions`; DROP TABLE IF EXISTS `emotion_hourly_rollups`; DROP TABLE IF EXISTS `emotion_daily_rollups`;',
+  '情緒洞察每日/每小時彙總表'
+);
@@ -0,0 +1,36 @@
+/* ============================================================
+   008_hot_query_indexes
+   - 依 tools/index_advisor.py 對熱門查詢的 EXPLAIN 結果補上複合索引
+     （等值條件欄位在前、排序欄位在後，避免全表掃描與 filesort）
+   - comments：動態牆/貼文詳情批次載入評論
+       WHERE Post_id IN (...) AND Is_public = TRUE ORDER BY Created_at, Comment_id
+   - diaryrecords：日記列表與匯出
+       WHERE User_Email = ? ORDER BY Created_at
+   - card_participants：卡片參與者列表
+       WHERE card_id = ? AND status = 'active' ORDER BY joined_at
+   - aichatsessions：後台待真人客服列表
+       WHERE need_human = 1 AND is_open = 1 ORDER BY updated_at DESC
+   - friend_requests(receiver_email, status) 已有 idx_receiver_status，不重複建立
+   - MySQL 8.0+
+   ============================================================ */
+
+USE `flaskdb`;
+
+ALTER TABLE `comments`
+  ADD KEY `idx_comments_post_public_created` (`Post_id`, `Is_public`, `Created_at`, `Comment_id`);
+
+ALTER TABLE `diaryrecords`
+  ADD KEY `idx_diaryrecords_user_created` (`User_Email`, `Created_at`);
+
+ALTER TABLE `card_participants`
+  ADD KEY `idx_card_status_joined` (`card_id`, `status`, `joined_at`);
+
+ALTER TABLE `aichatsessions`
+  ADD KEY `idx_sessions_human_open_updated` (`need_human`, `is_open`, `updated_at`);
+
+INSERT INTO `migration_log` (`migration_name`, `rollback_script`, `description`)
+VALUES (
+  '008_hot_query_indexes',
+  'ALTER TABLE `comments` DROP KEY `idx_comments_post_public_created`; ALTER TABLE `diaryrecords` DROP KEY `idx_diaryrecords_user_created`; ALTER TABLE `card_participants` DROP KEY `idx_card_status_joined`; ALTER TABLE `aichatsessions` DROP KEY `idx_sessions_human_open_updated`;',
+  '熱門查詢複合索引'
+);
@@ -0,0 +1,41 @@
+/* ============================================================
+   009_friendships
+   - 好友關係邊表：每段好友關係存兩列（A→B、B→A）
+     原本以 friend_requests 的 (requester_email = ? OR receiver_email = ?)
+     加上 CASE 運算式 JOIN user 查詢好友，無法使用索引
+   - 好友列表：WHERE user_email = ? ORDER BY created_at（idx_friendships_user_created）
+   - 是否為好友：主鍵 (user_email, friend_email) 點查詢
+   - 接受好友請求時寫入、刪除好友時移除（services/coopcard/friendships.py）
+   - friend_requests 仍保留請求的生命週期（pending / accepted / rejected）
+   - 以既有已接受的好友請求回填
+   - MySQL 8.0+
+   ============================================================ */
+
+USE `flaskdb`;
+
+CREATE TABLE IF NOT EXISTS `friendships` (
+  `user_email` varchar(255) NOT NULL,
+  `friend_email` varchar(255) NOT NULL,
+  `created_at` timestamp NULL DEFAULT CURRENT_TIMESTAMP COMMENT '成為好友的時間',
+  PRIMARY KEY (`user_email`, `friend_email`),
+  KEY `idx_friendships_user_created` (`user_email`, `created_at`),
+  KEY `idx_friendships_friend` (`friend_email`),
+  CONSTRAINT `fk_friendships_user` FOREIGN KEY (`user_email`) REFERENCES `user` (`User_Email`) ON DELETE CASCADE,
+  CONSTRAINT `fk_friendships_friend` FOREIGN KEY (`friend_email`) REFERENCES `user` (`User_Email`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci COMMENT='好友關係（雙向各一列）';
+
+INSERT IGNORE INTO `friendships` (`user_email`, `friend_email`, `created_at`)
+SELECT `requester_email`, `receiver_email`, COALESCE(`updated_at`, `created_at`)
+FROM `friend_requests`
+WHERE `status` = 'accepted'
+UNION ALL
+SELECT `receiver_email`, `requester_email`, COALESCE(`updated_at`, `created_at`)
+FROM `friend_requests`
+WHERE `status` = 'accepted';
+
+INSERT INTO `migration_log` (`migration_name`, `rollback_script`, `description`)
+VALUES (
+  '009_friendships',
+  'DROP TABLE IF EXISTS `friendships`;',
+  '好友關係雙向邊表'
+);
@@ -0,0 +1,38 @@
+/* ============================================================
+   010_task_card_completions
+   - 任務卡片每日完成紀錄：每張卡片、每位用戶、每天一列
+     原本只有 task_cards.daily_completed_count 一個共用計數，
+     由讀取 API 在跨日時順便 UPDATE 重置（讀取也要取得寫入鎖），
+     並以「讀出 → 計算 → 寫回」更新，併發時會互相覆蓋
+   - 完成 / 取消完成改為對 (card_id, user_email, completion_date) 列做條件式原子加減
+   - 保留每日歷史，可計算連續達成天數
+   - task_cards.daily_completed_count 保留為當日全卡總計，由每日午夜的排程統一歸零
+   - 以今日既有的共用計數回填給卡片建立者
+   - MySQL 8.0+
+   ============================================================ */
+
+USE `flaskdb`;
+
+CREATE TABLE IF NOT EXISTS `task_card_completions` (
+  `card_id` int NOT NULL,
+  `user_email` varchar(255) NOT NULL,
+  `completion_date` date NOT NULL,
+  `completed_count` int NOT NULL DEFAULT '0' COMMENT '當日完成次數',
+  `updated_at` timestamp NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  PRIMARY KEY (`card_id`, `user_email`, `completion_date`),
+  KEY `idx_completions_user_date` (`user_email`, `completion_date`),
+  CONSTRAINT `fk_completions_card` FOREIGN KEY (`card_id`) REFERENCES `task_cards` (`id`) ON DELETE CASCADE,
+  CONSTRAINT `fk_completions_user` FOREIGN KEY (`user_email`) REFERENCES `user` (`User_Email`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci COMMENT='任務卡片每日完成紀錄';
+
+INSERT IGNORE INTO `task_card_completions` (`card_id`, `user_email`, `completion_date`, `completed_count`)
+SELECT `id`, `user_id`, `last_reset_date`, `daily_completed_count`
+FROM `task_cards`
+WHERE `last_reset_date` = CURDATE() AND `daily_completed_count` > 0;
+
+INSERT INTO `migration_log` (`migration_name`, `rollback_script`, `description`)
+VALUES (
+  '010_task_card_completions',
+  'DROP TABLE IF EXISTS `task_card_completions`;',
+  '任務卡片每日完成紀錄'
+);
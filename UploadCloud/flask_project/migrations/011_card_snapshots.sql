@@ -0,0 +1,55 @@
+/* ============================================================
+   011_card_snapshots
+   - 任務卡片快照表：每張卡片的每個版本（內容雜湊）只存一份 JSON
+     原本 card_invitations 每一列都存一份完整的 card_snapshot，
+     一次邀請 10 位好友就重複存 10 份相同的 JSON
+   - card_invitations.snapshot_id 參照快照；card_snapshot 改為可為 NULL，
+     新邀請不再寫入（讀取時以 COALESCE 相容尚未遷移的舊列）
+   - 快照寫入：INSERT ... ON DUPLICATE KEY UPDATE id = LAST_INSERT_ID(id)，
+     一個語句取得既有或新建的快照 ID（services/coopcard/invitations.py）
+   - 以既有邀請的 card_snapshot 回填，並清空舊欄位以釋放空間
+   - 回填的 snapshot_hash 是 MySQL 正規化後的 JSON 文字（鍵依長度排序），
+     與應用程式的 json.dumps(sort_keys=True) 不同，相同內容的新快照不會與其合併；
+     執行本遷移後請執行一次 `flask coopcard rehash-snapshots` 以相同序列化重算並合併
+   - MySQL 8.0+
+   ============================================================ */
+
+USE `flaskdb`;
+
+CREATE TABLE IF NOT EXISTS `card_snapshots` (
+  `id` int NOT NULL AUTO_INCREMENT,
+  `card_id` int NOT NULL,
+  `snapshot_hash` char(64) NOT NULL COMMENT '快照內容的 SHA-256',
+  `snapshot` json NOT NULL COMMENT '發送邀請時的卡片資訊快照',
+  `created_at` timestamp NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (`id`),
+  UNIQUE KEY `uk_card_snapshots_card_hash` (`card_id`, `snapshot_hash`),
+  CONSTRAINT `fk_card_snapshots_card` FOREIGN KEY (`card_id`) REFERENCES `task_cards` (`id`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci COMMENT='任務卡片快照（每個版本一列）';
+
+ALTER TABLE `card_invitations`
+  ADD COLUMN `snapshot_id` int DEFAULT NULL COMMENT '卡片快照ID，關聯到card_snapshots表' AFTER `invitation_message`,
+  MODIFY COLUMN `card_snapshot` json DEFAULT NULL COMMENT '（舊欄位）發送時的卡片資訊快照，新邀請改用 snapshot_id',
+  ADD KEY `idx_card_invitations_snapshot` (`snapshot_id`),
+  ADD CONSTRAINT `fk_card_invitations_snapshot` FOREIGN KEY (`snapshot_id`) REFERENCES `card_snapshots` (`id`) ON DELETE CASCADE;
+
+INSERT IGNORE INTO `card_snapshots` (`card_id`, `snapshot_hash`, `snapshot`, `created_at`)
+SELECT `card_id`, SHA2(CAST(`card_snapshot` AS CHAR), 256), ANY_VALUE(`card_snapshot`), MIN(`created_at`)
+FROM `card_invitations`
+WHERE `card_snapshot` IS NOT NULL
+GROUP BY `card_id`, SHA2(CAST(`card_snapshot` AS CHAR), 256);
+
+UPDATE `card_invitations` ci
+JOIN `card_snapshots` s
+  ON s.`card_id` = ci.`card_id`
+ AND s.`snapshot_hash` = SHA2(CAST(ci.`card_snapshot` AS CHAR), 256)
+SET ci.`snapshot_id` = s.`id`,
+    ci.`card_snapshot` = NULL
+WHERE ci.`card_snapshot` IS NOT NULL;
+
+INSERT INTO `migration_log` (`migration_name`, `rollback_script`, `description`)
+VALUES (
+  '011_card_snapshots',
+  'UPDATE `card_invitations` ci JOIN `card_snapshots` s ON s.`id` = ci.`snapshot_id` SET ci.`card_snapshot` = s.`snapshot` WHERE ci.`card_snapshot` IS NULL; ALTER TABLE `card_invitations` DROP FOREIGN KEY `fk_card_invitations_snapshot`, DROP KEY `idx_card_invitations_snapshot`, DROP COLUMN `snapshot_id`, MODIFY COLUMN `card_snapshot` json NOT NULL COMMENT ''發送時的卡片資訊快照''; DROP TABLE IF EXISTS `card_snapshots`;',
+  '任務卡片快照表，邀請改為參照快照ID'
+);
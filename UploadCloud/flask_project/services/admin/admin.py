@@ -12,15 +12,21 @@
 - 所有管理功能需要管理員權限
 
 主要路由：
-- /admin/dashboard: 管理員儀表板
+- /admin/dashboard: 管理員儀表板（讀取統計快照）
+- /admin/api/stats: 儀表板統計快照（JSON）
 - /admin/users: 用戶列表管理
 - /admin/diaries: 日記記錄檢視
+- /admin/dify/metrics: Dify 呼叫指標（JSON）
+- /admin/db/pool: 資料庫連線池使用狀況（JSON）
 """
 
 import os, logging, json
 from flask import render_template, jsonify, flash, redirect, url_for
 from flask_login import login_required, current_user
 from utils import db
+from services.ai.dify_client import get_dify_metrics
+from utils.db import get_pool_stats
+from .dashboard_metrics import DASHBOARD_LIVE_PUSH, get_dashboard_metrics, metrics_payload
 from dotenv import load_dotenv
 from . import admin_bp  # 從 __init__.py 導入 Blueprint
 
@@ -101,7 +107,7 @@ def admin_dashboard():
     """
     管理員儀表板頁面
     
-    顯示系統統計資訊，包括用戶數量、日記數量和舉報統計
+    顯示系統統計資訊，包括用戶數量、日記數量和舉報統計（讀取定期計算的快照）
     
     Returns:
         str: 儀表板 HTML 頁面，或 403 錯誤頁面
@@ -111,81 +117,39 @@ def admin_dashboard():
             logging.warning(f"用戶 {current_user.id} 嘗試訪問管理員儀表板但被拒絕")
         return "你沒有權限進入後台", 403
 
-    database_connection = db.get_connection()
-    database_cursor = database_connection.cursor()
-    
-    # 基本統計
-    database_cursor.execute("SELECT COUNT(*) FROM User")
-    user_count = database_cursor.fetchone()[0]
-    
-    database_cursor.execute("SELECT COUNT(*) FROM DiaryRecords")
-    diary_count = database_cursor.fetchone()[0]
-    
-    # 舉報統計
-    database_cursor.execute("SELECT COUNT(*) FROM Reports")
-    total_reports = database_cursor.fetchone()[0]
-    
-    database_cursor.execute("SELECT COUNT(*) FROM Reports WHERE Status = 'pending'")
-    pending_reports = database_cursor.fetchone()[0]
-    
-    # 今日新增統計
-    database_cursor.execute("SELECT COUNT(*) FROM User WHERE DATE(Created_at) = CURDATE()")
-    new_users_today = database_cursor.fetchone()[0]
-    
-    database_cursor.execute("SELECT COUNT(*) FROM DiaryRecords WHERE DATE(Created_at) = CURDATE()")
-    new_diaries_today = database_cursor.fetchone()[0]
-    
-    database_cursor.execute("SELECT COUNT(*) FROM Reports WHERE DATE(Created_at) = CURDATE()")
-    new_reports_today = database_cursor.fetchone()[0]
-    
-    # 最近活動
-    database_cursor.execute("""
-        SELECT r.Report_id, r.Theme, u.User_name, r.Created_at 
-        FROM Reports r
-        LEFT JOIN User u ON r.User_Email = u.User_Email
-        ORDER BY r.Created_at DESC 
-        LIMIT 5
-    """)
-    recent_reports = [
-        {
-            'Report_ID': row[0],
-            'Theme': row[1],
-            'Reporter_Name': row[2] or '匿名用戶',
-            'Created_at': row[3]
-        }
-        for row in database_cursor.fetchall()
-    ]
-    
-    database_cursor.execute("""
-        SELECT User_Email as Username, User_Email as Email, Created_at 
-        FROM User 
-        ORDER BY Created_at DESC 
-        LIMIT 5
-    """)
-    recent_users = [
-        {
-            'Username': row[0].split('@')[0],  # 使用 email 前綴作為顯示名稱
-            'Email': row[1],
-            'Created_at': row[2]
-        }
-        for row in database_cursor.fetchall()
-    ]
-    
-    database_connection.close()
+    # 統計由背景工作定期計算，這裡只讀取快照
+    metrics = get_dashboard_metrics()
 
     return render_template(
         'admin/dashboard.html',
-        user_count=user_count,
-        diary_count=diary_count,
-        total_reports=total_reports,
-        pending_reports=pending_reports,
-        new_users_today=new_users_today,
-        new_diaries_today=new_diaries_today,
-        new_reports_today=new_reports_today,
-        recent_reports=recent_reports,
-        recent_users=recent_users
+        user_count=metrics['user_count'],
+        diary_count=metrics['diary_count'],
+        total_reports=metrics['total_reports'],
+        pending_reports=metrics['pending_reports'],
+        new_users_today=metrics['new_users_today'],
+        new_diaries_today=metrics['new_diaries_today'],
+        new_reports_today=metrics['new_reports_today'],
+        recent_reports=metrics['recent_reports'],
+        recent_users=metrics['recent_users'],
+        metrics_updated_at=metrics['updated_at'],
+        live_push=DASHBOARD_LIVE_PUSH
     )
 
+# 儀表板統計（JSON，供前端定時更新）
+@admin_bp.route('/api/stats')
+@login_required
+def admin_dashboard_stats():
+    """
+    儀表板統計快照
+
+    Returns:
+        JSON: 各計數與最後更新時間，或 403 錯誤
+    """
+    if not is_admin():
+        return jsonify({'success': False, 'message': '你沒有權限進入後台'}), 403
+
+    return jsonify(metrics_payload(get_dashboard_metrics()))
+
 # 使用者列表
 @admin_bp.route('/users')
 @login_required
@@ -209,3 +173,38 @@ def admin_users():
 
     return render_template('admin/users.html', users=users_data)
 
+
+# Dify 呼叫指標
+@admin_bp.route('/dify/metrics')
+@login_required
+def admin_dify_metrics():
+    """
+    Dify 共用用戶端的呼叫指標
+
+    包含各用途的請求數、錯誤數、重試次數、短路/拒絕次數、延遲 P50/P95 與斷路器狀態
+
+    Returns:
+        JSON: 指標資料，或 403 錯誤
+    """
+    if not is_admin():
+        return jsonify({'success': False, 'message': '你沒有權限進入後台'}), 403
+
+    return jsonify({'success': True, 'metrics': get_dify_metrics()})
+
+
+# 資料庫連線池狀態
+@admin_bp.route('/db/pool')
+@login_required
+def admin_db_pool():
+    """
+    本 worker 的資料庫連線池使用狀況
+
+    包含使用中 / 閒置連線數、等待者數、逾時次數與等待時間分布，用來調整每個 worker 的 DB_POOL_MAX_CONNECTIONS
+
+    Returns:
+        JSON: 連線池狀態，或 403 錯誤
+    """
+    if not is_admin():
+        return jsonify({'success': False, 'message': '你沒有權限進入後台'}), 403
+
+    return jsonify({'success': True, 'pools': get_pool_stats()})
@@ -110,7 +110,7 @@ def reply():
     database_connection.close()
 
     # 從暫停列表中移除 session_id，因為管理員已回覆，但 Dify API 仍應對此 session_id 保持暫停
-    # 實際上，Dify API 的暫停是基於 current_app.dify_paused_sessions 集合，
+    # 實際上，Dify API 的暫停是基於 ChatState 的 paused 集合（services/socket_state.py），
     # 並且只在新訊息進來時在 ai_chat.py 中檢查。管理員回覆不直接影響此集合。
     # 如果希望管理員回覆後，使用者可以繼續和 Dify 互動（不建議，因為已轉真人），才需要移除。
     # 目前的邏輯是：一旦轉真人，該 session_id 的 Dify 功能就停用，直到使用者重整得到新 session_id。
@@ -0,0 +1,164 @@
+"""
+管理員儀表板統計快照模組
+
+儀表板原本每次重新整理都執行 7 個 COUNT(*) 與 2 個列表查詢，
+且 DATE(Created_at) = CURDATE() 的寫法無法使用索引。這裡改為：
+- compute_dashboard_metrics()：一次往返取得所有計數（今日條件改為 Created_at 範圍查詢），
+  再加上兩個最近活動列表
+- 快照存放於行程記憶體，由背景工作每 DASHBOARD_METRICS_INTERVAL 秒重新計算；
+  儀表板與 /admin/api/stats 只讀取快照，並顯示最後更新時間
+- DASHBOARD_LIVE_PUSH=1 時，每次重新計算後透過 Socket.IO（/admin 命名空間）
+  推送給開著儀表板的管理員，前端不需輪詢
+
+環境變數：
+- DASHBOARD_METRICS_INTERVAL: 背景重新計算間隔秒數（預設: 60；0 表示不啟動背景工作）
+- DASHBOARD_METRICS_MAX_AGE: 沒有背景工作時快照的最長使用秒數（預設: 60）
+- DASHBOARD_LIVE_PUSH: 是否即時推送（預設: 關閉）
+"""
+
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from utils import db
+
+DASHBOARD_METRICS_INTERVAL = int(os.environ.get("DASHBOARD_METRICS_INTERVAL", 60))
+DASHBOARD_METRICS_MAX_AGE = int(os.environ.get("DASHBOARD_METRICS_MAX_AGE", 60))
+DASHBOARD_LIVE_PUSH = os.environ.get("DASHBOARD_LIVE_PUSH", "").lower() in ("1", "true", "yes")
+
+# 即時推送使用的 Socket.IO 命名空間與房間
+DASHBOARD_NAMESPACE = "/admin"
+DASHBOARD_ROOM = "admin:dashboard"
+
+# 推送給前端的計數欄位
+COUNTER_FIELDS = (
+    'user_count', 'diary_count', 'total_reports', 'pending_reports',
+    'new_users_today', 'new_diaries_today', 'new_reports_today'
+)
+
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+
+def compute_dashboard_metrics():
+    """
+    重新計算儀表板統計
+
+    Returns:
+        dict: 各計數、recent_reports、recent_users 與 updated_at
+    """
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    tomorrow = today + timedelta(days=1)
+
+    database_connection = db.get_connection(readonly=True)
+    try:
+        database_cursor = database_connection.cursor()
+
+        # 基本統計、舉報統計與今日新增：合併為一次查詢
+        database_cursor.execute("""
+            SELECT
+                (SELECT COUNT(*) FROM User),
+                (SELECT COUNT(*) FROM DiaryRecords),
+                (SELECT COUNT(*) FROM Reports),
+                (SELECT COUNT(*) FROM Reports WHERE Status = 'pending'),
+                (SELECT COUNT(*) FROM User WHERE Created_at >= %s AND Created_at < %s),
+                (SELECT COUNT(*) FROM DiaryRecords WHERE Created_at >= %s AND Created_at < %s),
+                (SELECT COUNT(*) FROM Reports WHERE Created_at >= %s AND Created_at < %s)
+        """, (today, tomorrow) * 3)
+        metrics = dict(zip(COUNTER_FIELDS, database_cursor.fetchone()))
+
+        # 最近活動
+        database_cursor.execute("""
+            SELECT r.Report_id, r.Theme, u.User_name, r.Created_at
+            FROM Reports r
+            LEFT JOIN User u ON r.User_Email = u.User_Email
+            ORDER BY r.Created_at DESC
+            LIMIT 5
+        """)
+        metrics['recent_reports'] = [
+            {
+                'Report_ID': row[0],
+                'Theme': row[1],
+                'Reporter_Name': row[2] or '匿名用戶',
+                'Created_at': row[3]
+            }
+            for row in database_cursor.fetchall()
+        ]
+
+        database_cursor.execute("""
+            SELECT User_Email, Created_at
+            FROM User
+            ORDER BY Created_at DESC
+            LIMIT 5
+        """)
+        metrics['recent_users'] = [
+            {
+                'Username': row[0].split('@')[0],  # 使用 email 前綴作為顯示名稱
+                'Email': row[0],
+                'Created_at': row[1]
+            }
+            for row in database_cursor.fetchall()
+        ]
+    finally:
+        database_connection.close()
+
+    metrics['updated_at'] = datetime.now()
+    metrics['_computed_at'] = time.monotonic()
+    return metrics
+
+
+def refresh_dashboard_metrics():
+    """重新計算並替換快照（啟用即時推送時一併推送）"""
+    global _snapshot
+    metrics = compute_dashboard_metrics()
+    with _snapshot_lock:
+        _snapshot = metrics
+    if DASHBOARD_LIVE_PUSH:
+        push_dashboard_metrics(metrics)
+    return metrics
+
+
+def get_dashboard_metrics():
+    """
+    取得儀表板統計快照
+
+    背景工作未啟動（或尚未完成第一次計算）時，快照超過 DASHBOARD_METRICS_MAX_AGE 秒才重新計算
+
+    Returns:
+        dict: 統計快照
+    """
+    snapshot = _snapshot
+    max_age = max(DASHBOARD_METRICS_INTERVAL * 2, DASHBOARD_METRICS_MAX_AGE)
+    if snapshot is None or time.monotonic() - snapshot['_computed_at'] > max_age:
+        snapshot = refresh_dashboard_metrics()
+    return snapshot
+
+
+def metrics_payload(metrics):
+    """計數與最後更新時間（JSON / Socket.IO 推送用）"""
+    payload = {field: metrics[field] for field in COUNTER_FIELDS}
+    payload['updated_at'] = metrics['updated_at'].strftime('%Y-%m-%d %H:%M:%S')
+    return payload
+
+
+def push_dashboard_metrics(metrics):
+    """推送最新計數給開著儀表板的管理員"""
+    from services.socketio_manager import socketio
+
+    try:
+        socketio.emit('dashboard_metrics', metrics_payload(metrics),
+                      to=DASHBOARD_ROOM, namespace=DASHBOARD_NAMESPACE)
+    except Exception as e:
+        logging.warning(f"[Dashboard] 推送統計失敗: {e}")
+
+
+def run_dashboard_metrics_refresher(interval_seconds=DASHBOARD_METRICS_INTERVAL):
+    """背景定期重新計算迴圈（由 app.py 以 socketio.start_background_task 啟動）"""
+    while True:
+        try:
+            refresh_dashboard_metrics()
+        except Exception as e:
+            logging.error(f"[Dashboard] 重新計算統計失敗: {e}")
+        time.sleep(interval_seconds)
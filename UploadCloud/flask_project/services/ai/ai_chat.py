@@ -23,26 +23,28 @@ AI 聊天服務模組
 主要路由：
 - /ai/chat: 聊天頁面
 - /ai/chat/api: 發送訊息 API
+- /ai/chat/api/stream: 發送訊息 API（SSE 串流回覆）
 - /ai/chat/history: 聊天歷史
 - /ai/chat/pause: 暫停 AI 對話
 - /ai/chat/resume: 恢復 AI 對話
 """
 
-import os, requests, logging
+import os, logging, time
 from flask import render_template, request, jsonify, current_app
 from flask_login import login_required, current_user
 from utils import db
 from services.line.line_bot import notify_admins
+from services.ai.dify_client import describe_error, get_dify_client
+from services.ai.streaming import sse_event, sse_response
+from services.socket_state import get_chat_state
 from . import ai_chat_bp  # 從 __init__.py 導入 Blueprint
 from datetime import datetime
 
-# ─── Dify 連線設定 ──────────────────────────────────────────
-DIFY_API_URL = os.getenv("DIFY_API_URL", "https://api.dify.ai/v1/chat-messages")
-DIFY_KEY     = os.getenv("DIFY_API_KEY_For_Chat")
-HEADERS = {
-    "Authorization": f"Bearer {DIFY_KEY}",
-    "Content-Type": "application/json"
-}
+# ─── Dify 連線設定（共用用戶端，見 services/ai/dify_client.py）──
+DIFY_CLIENT_NAME = "chat"
+
+# 帶有回覆片段的 Dify 串流事件（Chatflow / Agent 應用）
+STREAM_ANSWER_EVENTS = ("message", "agent_message")
 
 
 # ─── 公用：取 socketio 實例 ───────────────────────────────
@@ -105,38 +107,14 @@ def chat_page():
     return render_template("ai/ai_chat.html")
 
 
-# ────────────────────────────────────────────────────────────
-#  2. 主要 API：傳送訊息 → Dify → 回傳
-# ────────────────────────────────────────────────────────────
-@ai_chat_bp.route("/chat/api", methods=["POST"])
-@login_required
-def chat_api():
+# ─── 共用：儲存使用者訊息 / AI 回覆並廣播 ─────────────────
+def _save_user_message(session_id, query):
     """
-    處理聊天訊息 API 請求
-    
-    流程：
-    1. 獲取或建立聊天會話
-    2. 將訊息發送至 Dify API
-    3. 儲存對話記錄至資料庫
-    4. 透過 WebSocket 廣播訊息
-    
-    JSON Payload:
-        query (str): 用戶訊息內容
-        
+    儲存使用者訊息並廣播給管理端
+
     Returns:
-        JSON: 包含 AI 回覆和會話資訊
+        bool: 此會話是否在客服暫停模式（暫停時不呼叫 Dify）
     """
-
-    request_data   = request.get_json(silent=True) or {}
-    query = (request_data.get("query") or "").strip()
-    if not query:
-        return jsonify({"reply": "請輸入內容"}), 400
-
-    # 先取得 session 與 conversation_id
-    session_id, conversation_id = _get_or_create_session()
-    logging.info(f"[chat_api] session={session_id}, conversation_id={conversation_id}")
-
-    # ↓↓↓  儲存使用者訊息、廣播給管理端  ↓↓↓
     database_connection = db.get_connection()
     database_cursor  = database_connection.cursor()
     database_cursor.execute("""
@@ -144,6 +122,7 @@ def chat_api():
         VALUES (%s, 'user', %s)
         """, (session_id, query))
     database_connection.commit()
+    database_connection.close()
 
     socketio = get_socketio()
     if socketio:        socketio.emit("msg_added", {
@@ -153,32 +132,13 @@ def chat_api():
             "email"     : current_user.id
         }, namespace="/chat")
 
-    # 若在客服暫停模式 → 不呼叫 Dify
-    is_paused = session_id in current_app.dify_paused_sessions
-    if is_paused:
-        logging.info(f"[chat_api] session {session_id} in paused set, skip Dify")
-        database_connection.close()
-        return jsonify({"reply": "", "session_id": to_str(session_id)})
+    return get_chat_state().is_paused(to_str(session_id))
 
-    # ──  呼叫 Dify，帶入 conversation_id  ───────────────────
-    payload = {
-        "inputs"        : {},
-        "query"         : query,
-        "response_mode" : "blocking",
-        "conversation_id": conversation_id or "",
-        "user"          : current_user.id,
-    }
-    try:
-        dify_api_response      = requests.post(DIFY_API_URL, headers=HEADERS, json=payload, timeout=30)
-        dify_response_data = dify_api_response.json()
-        reply  = dify_response_data.get("answer", "（AI 無回應）")
-        conv_id_from_dify = dify_response_data.get("conversation_id")  # 首次回傳 conversation_id
-    except Exception as e:
-        logging.exception("Dify API error")
-        return jsonify({
-            "reply": f"⚠️ AI 服務異常：{str(e)}",
-            "session_id": to_str(session_id)
-        }), 500
+
+def _save_ai_reply(session_id, conversation_id, conv_id_from_dify, reply):
+    """寫回首次取得的 conversation_id、儲存 AI 回覆並廣播給其他連線"""
+    database_connection = db.get_connection()
+    database_cursor  = database_connection.cursor()
 
     # 第一次取得 conversation_id → 寫回資料庫
     if conv_id_from_dify and not conversation_id:
@@ -188,8 +148,6 @@ def chat_api():
                SET conversation_id = %s
              WHERE session_id = %s
             """, (conv_id_from_dify, session_id))
-        database_connection.commit()
-        conversation_id = conv_id_from_dify
 
     # 儲存 AI 回覆
     database_cursor.execute("""
@@ -200,12 +158,9 @@ def chat_api():
     database_connection.close()
 
     # 廣播 AI 回覆（不要再送給自己）
-    skip_sid = None
-    for s, sess_id in current_app.active_chat_connections.items():
-        if sess_id == to_str(session_id):
-            skip_sid = s
-            break
+    skip_sid = next(iter(get_chat_state().session_sids(to_str(session_id))), None)
 
+    socketio = get_socketio()
     if socketio:        socketio.emit("msg_added", {
             "session_id": to_str(session_id),
             "role"      : "ai",
@@ -213,12 +168,141 @@ def chat_api():
             "email"     : current_user.id
         }, namespace="/chat", skip_sid=skip_sid)
 
+
+# ────────────────────────────────────────────────────────────
+#  2. 主要 API：傳送訊息 → Dify → 回傳
+# ────────────────────────────────────────────────────────────
+@ai_chat_bp.route("/chat/api", methods=["POST"])
+@login_required
+def chat_api():
+    """
+    處理聊天訊息 API 請求
+    
+    流程：
+    1. 獲取或建立聊天會話
+    2. 將訊息發送至 Dify API
+    3. 儲存對話記錄至資料庫
+    4. 透過 WebSocket 廣播訊息
+    
+    JSON Payload:
+        query (str): 用戶訊息內容
+        
+    Returns:
+        JSON: 包含 AI 回覆和會話資訊
+    """
+
+    request_data   = request.get_json(silent=True) or {}
+    query = (request_data.get("query") or "").strip()
+    if not query:
+        return jsonify({"reply": "請輸入內容"}), 400
+
+    # 先取得 session 與 conversation_id
+    session_id, conversation_id = _get_or_create_session()
+    logging.info(f"[chat_api] session={session_id}, conversation_id={conversation_id}")
+
+    # 若在客服暫停模式 → 不呼叫 Dify
+    if _save_user_message(session_id, query):
+        logging.info(f"[chat_api] session {session_id} in paused set, skip Dify")
+        return jsonify({"reply": "", "session_id": to_str(session_id)})
+
+    # ──  呼叫 Dify，帶入 conversation_id  ───────────────────
+    try:
+        dify_response_data = get_dify_client(DIFY_CLIENT_NAME).chat(
+            query, user=current_user.id, conversation_id=conversation_id
+        )
+        reply  = dify_response_data.get("answer", "（AI 無回應）")
+        conv_id_from_dify = dify_response_data.get("conversation_id")  # 首次回傳 conversation_id
+    except Exception as e:
+        logging.exception("Dify API error")
+        return jsonify({
+            "reply": f"⚠️ AI 服務異常：{str(e)}",
+            "session_id": to_str(session_id)
+        }), 500
+
+    _save_ai_reply(session_id, conversation_id, conv_id_from_dify, reply)
+
     return jsonify({
         "reply"      : reply,
         "session_id" : to_str(session_id)
     })
 
 
+@ai_chat_bp.route("/chat/api/stream", methods=["POST"])
+@login_required
+def chat_api_stream():
+    """
+    串流版聊天 API（Server-Sent Events）
+
+    以 Dify streaming 模式取得回覆，逐段以 token 事件轉送給前端，
+    串流結束後才將完整回覆寫入 AIChatLogs 並廣播（與 chat_api 相同）。
+
+    JSON Payload:
+        query (str): 用戶訊息內容
+
+    Returns:
+        text/event-stream: start → token* → done（或 error）
+    """
+
+    request_data   = request.get_json(silent=True) or {}
+    query = (request_data.get("query") or "").strip()
+    if not query:
+        return jsonify({"reply": "請輸入內容"}), 400
+
+    session_id, conversation_id = _get_or_create_session()
+    logging.info(f"[chat_api_stream] session={session_id}, conversation_id={conversation_id}")
+
+    is_paused = _save_user_message(session_id, query)
+
+    def generate():
+        yield sse_event("start", {"session_id": to_str(session_id)})
+
+        # 客服暫停模式 → 不呼叫 Dify，回傳空回覆
+        if is_paused:
+            yield sse_event("done", {"reply": "", "session_id": to_str(session_id)})
+            return
+
+        started = time.monotonic()
+        ttft_ms = None
+        reply_parts = []
+        conv_id_from_dify = None
+        try:
+            for event in get_dify_client(DIFY_CLIENT_NAME).stream_chat(
+                query, user=current_user.id, conversation_id=conversation_id
+            ):
+                conv_id_from_dify = conv_id_from_dify or event.get("conversation_id")
+                delta = event.get("answer") if event.get("event") in STREAM_ANSWER_EVENTS else None
+                if not delta:
+                    continue
+                if ttft_ms is None:
+                    ttft_ms = round((time.monotonic() - started) * 1000)
+                reply_parts.append(delta)
+                yield sse_event("token", {"delta": delta})
+        except Exception as e:
+            logging.exception("Dify streaming error")
+            message, status_code = describe_error(e)
+            # 已收到部分內容時仍保存，避免對話記錄缺漏
+            if reply_parts:
+                _save_ai_reply(session_id, conversation_id, conv_id_from_dify, "".join(reply_parts))
+            yield sse_event("error", {
+                "error": f"⚠️ AI 服務異常：{message}",
+                "status": status_code,
+                "session_id": to_str(session_id)
+            })
+            return
+
+        reply = "".join(reply_parts) or "（AI 無回應）"
+        _save_ai_reply(session_id, conversation_id, conv_id_from_dify, reply)
+        logging.info(f"[chat_api_stream] session={session_id} ttft={ttft_ms}ms")
+
+        yield sse_event("done", {
+            "reply"      : reply,
+            "session_id" : to_str(session_id),
+            "ttft_ms"    : ttft_ms
+        })
+
+    return sse_response(generate())
+
+
 # ────────────────────────────────────────────────────────────
 #  3. 叫真人客服
 # ────────────────────────────────────────────────────────────
@@ -254,7 +338,7 @@ def call_human():
         """, (session_id, help_msg))
     database_connection.commit()
     database_connection.close()    # 暫停 Dify
-    current_app.dify_paused_sessions.add(session_id)
+    get_chat_state().pause_session(to_str(session_id))
 
     socketio = get_socketio()
     if socketio:
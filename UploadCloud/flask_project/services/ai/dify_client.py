@@ -0,0 +1,452 @@
+"""
+共用 Dify API 用戶端
+
+過去 ai_chat、emotion_ai、diary、support_report 各自以一次性 requests.post 呼叫 Dify，
+沒有連線重用，也沒有一致的逾時、重試與退避策略。本模組提供所有呼叫點共用的用戶端：
+- 共用 keep-alive 連線池（requests.Session + HTTPAdapter）
+- 依用途設定的逾時（連線逾時, 讀取逾時）
+- 連線錯誤、逾時、429/5xx 時以 full jitter 指數退避重試
+- 斷路器：連續失敗達門檻即短路，冷卻後以半開狀態試探恢復
+- 併發上限：每個用途以 BoundedSemaphore 限制同時進行的請求數
+- 延遲與錯誤指標（含串流 TTFT）：get_dify_metrics() 供管理後台查詢
+- 本機 stub 模式：DIFY_STUB_MODE=1 時改連 tools/dify_stub_server.py，壓測不必呼叫真實 API
+
+使用方式：
+    from services.ai.dify_client import get_dify_client
+    result = get_dify_client('chat').chat(query, user=current_user.id, conversation_id=conv_id)
+    reply = result.get('answer')
+
+    for event in get_dify_client('chat').stream_chat(query, user=current_user.id):
+        delta = event.get('answer', '')
+
+環境變數：
+- DIFY_API_URL: chat-messages 端點（預設 https://api.dify.ai/v1/chat-messages）
+- DIFY_STUB_MODE / DIFY_STUB_URL: 啟用並指定本機 stub 端點
+- DIFY_API_KEY_For_Chat / _Emobot / _Diary / _Report: 各用途的 API Key
+"""
+
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from utils import db
+
+DIFY_STUB_MODE = os.getenv("DIFY_STUB_MODE", "").lower() in ("1", "true", "yes")
+DIFY_STUB_URL = os.getenv("DIFY_STUB_URL", "http://127.0.0.1:8765/v1/chat-messages")
+DIFY_API_URL = DIFY_STUB_URL if DIFY_STUB_MODE else os.getenv("DIFY_API_URL", "https://api.dify.ai/v1/chat-messages")
+
+# 共用連線池大小（所有用途共用同一個 Session）
+POOL_CONNECTIONS = 4
+POOL_MAXSIZE = 32
+
+# 可重試的 HTTP 狀態碼
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+# 指標保留的最近延遲樣本數
+LATENCY_SAMPLE_SIZE = 500
+
+# 各用途設定：API Key 環境變數、(連線逾時, 讀取逾時)、最多嘗試次數、併發上限
+DIFY_ENDPOINTS = {
+    'chat': {'key_env': 'DIFY_API_KEY_For_Chat', 'timeout': (5, 30), 'max_attempts': 2, 'max_concurrency': 16},
+    'emotion': {'key_env': 'DIFY_API_KEY_For_Emobot', 'timeout': (5, 30), 'max_attempts': 2, 'max_concurrency': 16},
+    'diary': {'key_env': 'DIFY_API_KEY_For_Diary', 'timeout': (5, 60), 'max_attempts': 2, 'max_concurrency': 8},
+    'report': {'key_env': 'DIFY_API_KEY_For_Report', 'timeout': (5, 30), 'max_attempts': 2, 'max_concurrency': 4},
+}
+
+
+class DifyError(requests.RequestException):
+    """Dify 呼叫失敗（沿用 RequestException，既有的例外處理仍可攔截）"""
+
+    def __init__(self, message, status_code=None, **kwargs):
+        super().__init__(message, **kwargs)
+        self.status_code = status_code
+
+
+class DifyCircuitOpenError(DifyError):
+    """斷路器開啟中，請求被短路"""
+
+
+class DifyBusyError(DifyError):
+    """超過併發上限，請求被拒絕"""
+
+
+class CircuitBreaker:
+    """
+    簡易斷路器
+
+    closed：正常放行，連續失敗達 failure_threshold 次後轉為 open
+    open：直接拒絕，經過 reset_timeout 秒後轉為 half_open
+    half_open：只放行一個試探請求，成功則 closed，失敗則重新 open
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = 'half_open'
+                self._probe_in_flight = False
+            if self.state == 'half_open' and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probe_in_flight = False
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+
+    def release_probe(self):
+        """請求未得出結果就結束（例如非連線類的例外）時釋放試探名額，狀態不變"""
+        with self._lock:
+            self._probe_in_flight = False
+
+
+def _latency_summary(samples):
+    """延遲樣本的 P50 / P95 / 最大值（毫秒）"""
+    samples = sorted(samples)
+    if not samples:
+        return {'p50': None, 'p95': None, 'max': None, 'samples': 0}
+
+    def percentile(ratio):
+        return round(samples[min(int(len(samples) * ratio), len(samples) - 1)], 1)
+
+    return {
+        'p50': percentile(0.5),
+        'p95': percentile(0.95),
+        'max': round(samples[-1], 1),
+        'samples': len(samples)
+    }
+
+
+class DifyMetrics:
+    """單一用途的呼叫指標"""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.short_circuited = 0
+        self.rejected = 0
+        self.in_flight = 0
+        self.last_error = None
+        self.latencies_ms = deque(maxlen=LATENCY_SAMPLE_SIZE)
+        # 串流模式：送出請求到收到第一個 answer 片段的時間
+        self.ttft_ms = deque(maxlen=LATENCY_SAMPLE_SIZE)
+        self._lock = threading.Lock()
+
+    def record(self, field, amount=1):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + amount)
+
+    def record_latency(self, started):
+        with self._lock:
+            self.latencies_ms.append((time.monotonic() - started) * 1000)
+
+    def record_ttft(self, started):
+        with self._lock:
+            self.ttft_ms.append((time.monotonic() - started) * 1000)
+
+    def snapshot(self):
+        with self._lock:
+            latencies = list(self.latencies_ms)
+            ttfts = list(self.ttft_ms)
+
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'retries': self.retries,
+            'short_circuited': self.short_circuited,
+            'rejected': self.rejected,
+            'in_flight': self.in_flight,
+            'last_error': self.last_error,
+            'latency_ms': _latency_summary(latencies),
+            'ttft_ms': _latency_summary(ttfts)
+        }
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def _get_session():
+    """取得共用的 keep-alive Session（重試由用戶端自行處理，adapter 不重試）"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE, max_retries=0)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _session = session
+    return _session
+
+
+class DifyClient:
+    """單一用途（API Key）的 Dify 用戶端"""
+
+    def __init__(self, name, api_key, timeout=(5, 30), max_attempts=2, max_concurrency=16,
+                 api_url=None, backoff_base=0.5, backoff_max=8.0, acquire_timeout=10):
+        self.name = name
+        self.api_key = api_key
+        self.api_url = api_url or DIFY_API_URL
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.acquire_timeout = acquire_timeout
+        self.breaker = CircuitBreaker()
+        self.metrics = DifyMetrics()
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+
+    @property
+    def configured(self):
+        """是否可呼叫（stub 模式不需要 API Key）"""
+        return bool(self.api_url) and (bool(self.api_key) or DIFY_STUB_MODE)
+
+    def _backoff(self, attempt):
+        """full jitter 指數退避秒數"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _headers(self):
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+
+    def post(self, payload, stream=False):
+        """
+        送出 chat-messages 請求（含併發限制、斷路器與重試）
+
+        Args:
+            payload (dict): 請求內容
+            stream (bool): 是否以串流方式讀取回應
+
+        Returns:
+            requests.Response: 2xx 回應（stream=True 時併發名額由回應持有，
+                               呼叫端讀完或中止串流後需關閉回應並呼叫 _release_slot()）
+
+        Raises:
+            DifyCircuitOpenError / DifyBusyError / DifyError / requests.RequestException
+        """
+        # 等待 Dify 回應可能長達數十秒，先歸還請求中閒置的資料庫連線
+        db.release_request_connections()
+
+        if not self._semaphore.acquire(timeout=self.acquire_timeout):
+            self.metrics.record('rejected')
+            raise DifyBusyError(f'Dify {self.name} 請求過多，請稍後再試', status_code=503)
+
+        # 取得併發名額後才詢問斷路器：half_open 的試探名額不會因排隊逾時而被佔住
+        if not self.breaker.allow():
+            self._semaphore.release()
+            self.metrics.record('short_circuited')
+            raise DifyCircuitOpenError(f'Dify {self.name} 服務暫時無法使用（斷路器開啟）', status_code=503)
+
+        self.metrics.record('in_flight')
+        started = time.monotonic()
+        outcome_recorded = False
+        slot_transferred = False
+        try:
+            for attempt in range(self.max_attempts):
+                if attempt:
+                    self.metrics.record('retries')
+                    time.sleep(self._backoff(attempt))
+
+                self.metrics.record('requests')
+                try:
+                    response = _get_session().post(
+                        self.api_url, headers=self._headers(), json=payload,
+                        timeout=self.timeout, stream=stream
+                    )
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    error = e
+                    retryable = True
+                else:
+                    if response.status_code < 400:
+                        self.breaker.record_success()
+                        outcome_recorded = True
+                        # 串流回應的內容可能持續數十秒，名額保留到串流結束才釋放
+                        slot_transferred = stream
+                        return response
+
+                    error = DifyError(
+                        f'HTTP {response.status_code}: {response.text[:500]}',
+                        status_code=response.status_code, response=response
+                    )
+                    retryable = response.status_code in RETRYABLE_STATUS
+                    response.close()
+
+                self.metrics.record('errors')
+                self.metrics.last_error = str(error)[:200]
+                if not retryable:
+                    # 4xx 為請求本身的問題：服務有回應，視為斷路器的成功
+                    self.breaker.record_success()
+                    outcome_recorded = True
+                    raise error
+
+            self.breaker.record_failure()
+            outcome_recorded = True
+            raise error
+
+        finally:
+            if not outcome_recorded:
+                self.breaker.release_probe()
+            self.metrics.record_latency(started)
+            if not slot_transferred:
+                self._release_slot()
+
+    def _release_slot(self):
+        """釋放併發名額"""
+        self.metrics.record('in_flight', -1)
+        self._semaphore.release()
+
+    def chat(self, query, user, inputs=None, conversation_id=None):
+        """
+        以 blocking 模式呼叫 chat-messages
+
+        Returns:
+            dict: Dify 回應 JSON（answer、conversation_id 等）
+        """
+        response = self.post({
+            "inputs": inputs or {},
+            "query": query,
+            "response_mode": "blocking",
+            "conversation_id": conversation_id or "",
+            "user": user,
+        })
+        try:
+            return response.json()
+        except ValueError as e:
+            raise DifyError(f'Dify 回應不是有效的 JSON: {str(e)}', status_code=502)
+
+    def stream_chat(self, query, user, inputs=None, conversation_id=None):
+        """
+        以 streaming 模式呼叫 chat-messages，逐一產生 Dify 的 SSE 事件
+
+        重試只發生在收到回應標頭之前；串流開始後中斷會直接拋出例外。
+        併發名額持有到串流讀完或產生器被關閉為止。
+        第一個 answer 片段的到達時間記錄為 TTFT（time to first token）指標。
+
+        Yields:
+            dict: Dify 事件（event 為 message / agent_message / message_end 等）
+
+        Raises:
+            DifyError: 串流中收到 error 事件
+        """
+        started = time.monotonic()
+        response = self.post({
+            "inputs": inputs or {},
+            "query": query,
+            "response_mode": "streaming",
+            "conversation_id": conversation_id or "",
+            "user": user,
+        }, stream=True)
+
+        first_token = True
+        try:
+            response.encoding = 'utf-8'
+            for line in response.iter_lines(decode_unicode=True):
+                # 忽略空行與 event: ping 等非資料行
+                if not line or not line.startswith('data:'):
+                    continue
+                try:
+                    event = json.loads(line[5:].strip())
+                except ValueError:
+                    continue
+
+                if event.get('event') == 'error':
+                    self.metrics.record('errors')
+                    self.metrics.last_error = str(event.get('message'))[:200]
+                    raise DifyError(event.get('message') or 'Dify 串流錯誤', status_code=event.get('status') or 502)
+
+                if first_token and event.get('answer'):
+                    self.metrics.record_ttft(started)
+                    first_token = False
+
+                yield event
+        finally:
+            response.close()
+            self._release_slot()
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_dify_client(name):
+    """
+    取得指定用途的共用用戶端
+
+    Args:
+        name (str): DIFY_ENDPOINTS 中的用途名稱（chat / emotion / diary / report）
+
+    Returns:
+        DifyClient: 共用用戶端
+    """
+    client = _clients.get(name)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(name)
+            if client is None:
+                endpoint = DIFY_ENDPOINTS[name]
+                api_key = (os.getenv(endpoint['key_env']) or '').strip() or None
+                client = DifyClient(
+                    name, api_key,
+                    timeout=endpoint['timeout'],
+                    max_attempts=endpoint['max_attempts'],
+                    max_concurrency=endpoint['max_concurrency']
+                )
+                _clients[name] = client
+                if DIFY_STUB_MODE:
+                    logging.info(f"[Dify] {name} 用戶端使用 stub 端點 {client.api_url}")
+    return client
+
+
+def get_dify_metrics():
+    """所有用途的呼叫指標與斷路器狀態"""
+    return {
+        name: dict(client.metrics.snapshot(), circuit=client.breaker.state, stub_mode=DIFY_STUB_MODE)
+        for name, client in list(_clients.items())
+    }
+
+
+def describe_error(error):
+    """將 Dify 例外轉成 (使用者訊息, HTTP 狀態碼)"""
+    if isinstance(error, DifyCircuitOpenError):
+        return 'AI 服務暫時無法使用，請稍後再試', 503
+    if isinstance(error, DifyBusyError):
+        return 'AI 服務忙碌中，請稍後再試', 503
+    if isinstance(error, requests.Timeout):
+        return 'API請求超時，請稍後重試', 504
+    if isinstance(error, requests.ConnectionError):
+        return '無法連接到AI服務，請檢查網路連線', 503
+    if isinstance(error, DifyError) and error.status_code:
+        return str(error), error.status_code
+    return f'網路請求錯誤: {str(error)}', 500
+
@@ -9,31 +9,22 @@
 - 統計摘要計算
 - 數據匯出功能
 
+統計摘要、趨勢與分布改讀預先彙總的 emotion_daily_rollups / emotion_hourly_rollups
+（見 emotion_rollups.py），歷史記錄 API 仍直接讀取 emotion_history。
+
 主要路由：
-- /ai/emo_stats        # 計算主導情緒傾向
-        total_score = positive_score + negative_score + neutral_score
-        if total_score > 0:
-            positive_ratio = positive_score / total_score
-            negative_ratio = negative_score / total_score
-            
-            if positive_ratio > negative_ratio + 0.1:  # 10% 的緩衝區間
-                emotion_direction = '正向心態'
-            elif negative_ratio > positive_ratio + 0.1:
-                emotion_direction = '較為負面'
-            else:
-                emotion_direction = '情緒平衡'
-        else:
-            emotion_direction = '無明確傾向'- /ai/emo_stats/api/*: 各種統計API端點
+- /ai/emo_stats: 情緒洞察頁面
+- /ai/emo_stats/api/*: 各種統計API端點
 """
 
 import os, json, logging
 from datetime import datetime, timedelta, date
 from flask import render_template, request, jsonify, make_response
 from flask_login import login_required, current_user
-from collections import defaultdict, Counter
 
 # 從 __init__.py 導入 Blueprint
 from . import emo_stats_bp
+from .emotion_rollups import fetch_daily_rollups, fetch_hourly_rollups
 
 def safe_log(message):
     """安全的日誌記錄函數"""
@@ -42,29 +33,6 @@ def safe_log(message):
     except:
         pass
 
-# ==================== 智能情緒分類函數 ====================
-
-def extract_emotion_type_and_percentage(emotion_data):
-    """
-    從情緒數據中提取類型和百分比
-    優先使用 Dify 提供的 type 標籤和 percentage
-    """
-    emotion_type = emotion_data.get('type', '').lower()
-    if emotion_type not in ['positive', 'negative', 'neutral']:
-        emotion_type = 'neutral'
-    
-    # 提取百分比數值
-    percentage_str = emotion_data.get('percentage', '0')
-    try:
-        if isinstance(percentage_str, str):
-            percentage = float(percentage_str.replace('%', ''))
-        else:
-            percentage = float(percentage_str)
-    except (ValueError, TypeError):
-        percentage = 0.0
-    
-    return emotion_type, percentage
-
 # ==================== 輔助函數 ====================
 
 def get_user_emotion_history(user_email, start_date=None, end_date=None, limit=None):
@@ -125,22 +93,34 @@ def get_user_emotion_history(user_email, start_date=None, end_date=None, limit=N
 
 # ==================== 統計計算函數 ====================
 
+def _window_dates(days, today_only):
+    """依天數或今日參數計算統計視窗（start_date, end_date 皆為 datetime）"""
+    if today_only:
+        today = datetime.now().date()
+        return datetime.combine(today, datetime.min.time()), datetime.combine(today, datetime.max.time())
+    end_date = datetime.now()
+    return end_date - timedelta(days=days), end_date
+
+
+def _load_daily_rollups(user_email, start_date, end_date):
+    """讀取視窗內的每日彙總"""
+    from utils.db import get_connection
+    conn = get_connection(readonly=True)
+    try:
+        cursor = conn.cursor()
+        return fetch_daily_rollups(cursor, user_email, start_date.date(), end_date.date())
+    finally:
+        conn.close()
+
+
 def calculate_emotion_summary(user_email, days=7, today_only=False):
-    """計算情緒統計摘要"""
+    """計算情緒統計摘要（讀取每日彙總）"""
     try:
-        if today_only:
-            # 只統計今天的數據
-            today = datetime.now().date()
-            start_date = datetime.combine(today, datetime.min.time())
-            end_date = datetime.combine(today, datetime.max.time())
-        else:
-            # 獲取指定天數的數據
-            end_date = datetime.now()
-            start_date = end_date - timedelta(days=days)
-        
-        records = get_user_emotion_history(user_email, start_date, end_date)
-        
-        if not records:
+        start_date, end_date = _window_dates(days, today_only)
+        rollups = _load_daily_rollups(user_email, start_date, end_date)
+
+        total_interactions = sum(row[1] for row in rollups)
+        if not total_interactions:
             return {
                 'total_interactions': 0,
                 'emotion_direction': '無數據',
@@ -149,32 +129,13 @@ def calculate_emotion_summary(user_email, days=7, today_only=False):
                 'date_range': f'{start_date.strftime("%Y-%m-%d")} 至 {end_date.strftime("%Y-%m-%d")}'
             }
         
-        # 統計計算
-        total_interactions = len(records)
-        
         # 使用百分比進行精確統計
-        positive_score = 0.0
-        negative_score = 0.0
-        neutral_score = 0.0
-        confidence_scores = []
-        
-        for record in records:
-            if record['user_emotions'] and 'primary_emotions' in record['user_emotions']:
-                emotions = record['user_emotions']['primary_emotions']
-                
-                # 統計所有情緒的百分比
-                for emotion_data in emotions:
-                    emotion_type, percentage = extract_emotion_type_and_percentage(emotion_data)
-                    
-                    if emotion_type == 'positive':
-                        positive_score += percentage
-                    elif emotion_type == 'negative':
-                        negative_score += percentage
-                    else:
-                        neutral_score += percentage
-            
-            if record['confidence_score']:
-                confidence_scores.append(record['confidence_score'])
+        positive_score = sum(row[3] for row in rollups)
+        negative_score = sum(row[4] for row in rollups)
+        neutral_score = sum(row[5] for row in rollups)
+        confidence_count = sum(row[6] for row in rollups)
+        confidence_sum = sum(row[7] for row in rollups)
+        confidence_sq_sum = sum(row[8] for row in rollups)
         
         # 計算主導情緒傾向
         total_score = positive_score + negative_score + neutral_score
@@ -192,11 +153,11 @@ def calculate_emotion_summary(user_email, days=7, today_only=False):
             emotion_direction = '無明確傾向'
         
         # 平均信心度
-        avg_confidence = sum(confidence_scores) / len(confidence_scores) if confidence_scores else 0
+        avg_confidence = confidence_sum / confidence_count if confidence_count else 0
         
-        # 情緒穩定度（基於信心度變異）
-        if len(confidence_scores) > 1:
-            variance = sum((x - avg_confidence) ** 2 for x in confidence_scores) / len(confidence_scores)
+        # 情緒穩定度（基於信心度變異，變異數 = 平方和平均 - 平均平方）
+        if confidence_count > 1:
+            variance = max(confidence_sq_sum / confidence_count - avg_confidence ** 2, 0)
             emotion_stability = max(0, 100 - (variance * 10))
         else:
             emotion_stability = avg_confidence * 10
@@ -225,35 +186,10 @@ def calculate_emotion_summary(user_email, days=7, today_only=False):
         }
 
 def get_emotion_trends(user_email, days=7):
-    """獲取情緒趨勢數據 - 基於百分比統計"""
+    """獲取情緒趨勢數據 - 基於每日彙總的百分比統計"""
     try:
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=days)
-        
-        records = get_user_emotion_history(user_email, start_date, end_date)
-        
-        # 按日期分組統計
-        daily_data = defaultdict(lambda: {'positive_score': 0.0, 'negative_score': 0.0, 'neutral_score': 0.0, 'interaction_count': 0})
-        
-        for record in records:
-            record_date = record['created_at'].date()
-            date_str = record_date.strftime('%Y-%m-%d')
-            
-            # 統計該記錄的情緒
-            if record['user_emotions'] and 'primary_emotions' in record['user_emotions']:
-                emotions = record['user_emotions']['primary_emotions']
-                daily_data[date_str]['interaction_count'] += 1
-                
-                # 統計所有情緒的百分比
-                for emotion_data in emotions:
-                    emotion_type, percentage = extract_emotion_type_and_percentage(emotion_data)
-                    
-                    if emotion_type == 'positive':
-                        daily_data[date_str]['positive_score'] += percentage
-                    elif emotion_type == 'negative':
-                        daily_data[date_str]['negative_score'] += percentage
-                    else:
-                        daily_data[date_str]['neutral_score'] += percentage
+        start_date, end_date = _window_dates(days, False)
+        daily_data = {row[0]: row for row in _load_daily_rollups(user_email, start_date, end_date)}
         
         # 生成趨勢數據
         trend_data = {
@@ -267,17 +203,14 @@ def get_emotion_trends(user_email, days=7):
         # 填充每一天的數據
         current_date = start_date.date()
         while current_date <= end_date.date():
-            date_str = current_date.strftime('%Y-%m-%d')
-            date_display = current_date.strftime('%m/%d')
+            trend_data['dates'].append(current_date.strftime('%m/%d'))
             
-            trend_data['dates'].append(date_display)
-            
-            if date_str in daily_data:
-                day_data = daily_data[date_str]
-                trend_data['positive_scores'].append(round(day_data['positive_score'], 1))
-                trend_data['negative_scores'].append(round(day_data['negative_score'], 1))
-                trend_data['neutral_scores'].append(round(day_data['neutral_score'], 1))
-                trend_data['interaction_counts'].append(day_data['interaction_count'])
+            day_data = daily_data.get(current_date)
+            if day_data:
+                trend_data['positive_scores'].append(round(day_data[3], 1))
+                trend_data['negative_scores'].append(round(day_data[4], 1))
+                trend_data['neutral_scores'].append(round(day_data[5], 1))
+                trend_data['interaction_counts'].append(day_data[2])
             else:
                 trend_data['positive_scores'].append(0.0)
                 trend_data['negative_scores'].append(0.0)
@@ -299,41 +232,21 @@ def get_emotion_trends(user_email, days=7):
         }
 
 def get_today_emotion_trends(user_email):
-    """獲取今日按小時的情緒趨勢數據"""
+    """獲取今日按小時的情緒趨勢數據（讀取每小時彙總）"""
     try:
-        # 獲取今日數據
-        today = datetime.now().date()
-        start_date = datetime.combine(today, datetime.min.time())
-        end_date = datetime.combine(today, datetime.max.time())
-        
-        records = get_user_emotion_history(user_email, start_date, end_date)
-        
-        # 按小時分組統計
-        hourly_data = defaultdict(lambda: {'emotions': Counter(), 'positive': 0, 'negative': 0})
-        
-        # 定義正向和負面情緒
-        positive_emotions = ['開心', '快樂', '喜悅', '平靜', '放鬆', '友善', '理解', '自在', '滿足', '愉快', '輕鬆', '舒適', '安心', '希望', '感激', '興奮', '滿意', '溫暖']
-        negative_emotions = ['悲傷', '難過', '憂鬱', '焦慮', '緊張', '擔心', '憤怒', '生氣', '壓力', '煩躁', '不安', '沮喪', '失望', '恐懼', '害怕', '痛苦', '疲憊', '厭煩', '孤單', '無助', '煩惱', '挫折']
-        
-        for record in records:
-            record_hour = record['created_at'].hour
-            hour_key = f"{record_hour:02d}:00"
-            
-            # 統計情緒
-            if record['user_emotions'] and 'primary_emotions' in record['user_emotions']:
-                emotions = record['user_emotions']['primary_emotions']
-                if emotions:
-                    dominant = emotions[0]['emotion']
-                    hourly_data[hour_key]['emotions'][dominant] += 1
-                    
-                    # 分類正向/負面情緒 - 更新分類列表
-                    positive_emotions = ['開心', '快樂', '喜悅', '平靜', '放鬆', '友善', '理解', '自在', '滿足', '愉快', '輕鬆', '舒適', '安心', '希望', '感激', '興奮', '滿意', '溫暖']
-                    negative_emotions = ['悲傷', '難過', '憂鬱', '焦慮', '緊張', '擔心', '憤怒', '生氣', '壓力', '煩躁', '不安', '沮喪', '失望', '恐懼', '害怕', '痛苦', '疲憊', '厭煩', '孤單', '無助', '煩惱', '挫折']
-                    
-                    if dominant in positive_emotions:
-                        hourly_data[hour_key]['positive'] += 1
-                    elif dominant in negative_emotions:
-                        hourly_data[hour_key]['negative'] += 1
+        from utils.db import get_connection
+        conn = get_connection(readonly=True)
+        try:
+            cursor = conn.cursor()
+            hourly_rows, emotion_rows = fetch_hourly_rollups(cursor, user_email, datetime.now().date())
+        finally:
+            conn.close()
+        
+        hourly_data = {row[0]: row for row in hourly_rows}
+        # 每小時次數最多的主導情緒（查詢已依次數遞減排序）
+        dominant_by_hour = {}
+        for hour, emotion, _ in emotion_rows:
+            dominant_by_hour.setdefault(hour, emotion)
         
         # 生成24小時的完整趨勢數據
         trend_data = {
@@ -346,25 +259,14 @@ def get_today_emotion_trends(user_email):
         
         # 填充24小時的數據
         for hour in range(24):
-            hour_key = f"{hour:02d}:00"
-            trend_data['dates'].append(hour_key)
+            trend_data['dates'].append(f"{hour:02d}:00")
             
-            if hour_key in hourly_data:
-                hour_data = hourly_data[hour_key]
-                
-                # 主導情緒
-                if hour_data['emotions']:
-                    dominant = hour_data['emotions'].most_common(1)[0][0]
-                    trend_data['dominant_emotions'].append(dominant)
-                else:
-                    trend_data['dominant_emotions'].append('無數據')
-                
-                # 正向和負面情緒數量
-                trend_data['positive_counts'].append(hour_data['positive'])
-                trend_data['negative_counts'].append(hour_data['negative'])
-                
-                # 互動次數
-                trend_data['interaction_counts'].append(sum(hour_data['emotions'].values()))
+            hour_data = hourly_data.get(hour)
+            if hour_data:
+                trend_data['dominant_emotions'].append(dominant_by_hour.get(hour, '無數據'))
+                trend_data['positive_counts'].append(hour_data[2])
+                trend_data['negative_counts'].append(hour_data[3])
+                trend_data['interaction_counts'].append(hour_data[1])
             else:
                 trend_data['dominant_emotions'].append('無數據')
                 trend_data['positive_counts'].append(0)
@@ -384,41 +286,12 @@ def get_today_emotion_trends(user_email):
         }
 
 def get_emotion_distribution(user_email, days=7, today_only=False):
-    """獲取情緒分布數據 - 基於百分比統計"""
+    """獲取情緒分布數據 - 基於每日彙總的百分比統計"""
     try:
-        if today_only:
-            # 只統計今天的數據
-            today = datetime.now().date()
-            start_date = datetime.combine(today, datetime.min.time())
-            end_date = datetime.combine(today, datetime.max.time())
-        else:
-            end_date = datetime.now()
-            start_date = end_date - timedelta(days=days)
-        
-        records = get_user_emotion_history(user_email, start_date, end_date)
+        start_date, end_date = _window_dates(days, today_only)
+        rollups = _load_daily_rollups(user_email, start_date, end_date)
         
-        total_positive_percentage = 0
-        total_negative_percentage = 0
-        total_neutral_percentage = 0
-        total_records = 0
-        
-        for record in records:
-            if record['user_emotions'] and 'primary_emotions' in record['user_emotions']:
-                emotions_list = record['user_emotions']['primary_emotions']
-                if emotions_list:
-                    # 處理emotions_list中的每個情緒
-                    for emotion_data in emotions_list:
-                        emotion_type, percentage = extract_emotion_type_and_percentage(emotion_data)
-                        
-                        if emotion_type and percentage > 0:
-                            if emotion_type == 'positive':
-                                total_positive_percentage += percentage
-                            elif emotion_type == 'negative':
-                                total_negative_percentage += percentage
-                            else:  # neutral or unknown
-                                total_neutral_percentage += percentage
-                    
-                    total_records += 1
+        total_records = sum(row[2] for row in rollups)
         
         # 準備分布數據
         distribution_data = {
@@ -429,9 +302,9 @@ def get_emotion_distribution(user_email, days=7, today_only=False):
         
         if total_records > 0:
             # 計算平均百分比
-            avg_positive = round(total_positive_percentage / total_records, 1)
-            avg_negative = round(total_negative_percentage / total_records, 1)
-            avg_neutral = round(total_neutral_percentage / total_records, 1)
+            avg_positive = round(sum(row[3] for row in rollups) / total_records, 1)
+            avg_negative = round(sum(row[4] for row in rollups) / total_records, 1)
+            avg_neutral = round(sum(row[5] for row in rollups) / total_records, 1)
             
             if avg_positive > 0:
                 distribution_data['labels'].append('正向情緒')
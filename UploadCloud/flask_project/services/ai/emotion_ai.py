@@ -11,6 +11,7 @@
 主要路由：
 - /ai/emotion: 情緒AI聊天頁面
 - /ai/emotion/api: 情緒分析API（簡化版本）
+- /ai/emotion/api/stream: 情緒分析API（SSE 串流回覆）
 """
 
 import os, requests, logging, json, re, time, uuid
@@ -18,16 +19,15 @@ from datetime import datetime
 from flask import render_template, request, jsonify
 from flask_login import login_required, current_user
 
+from services.ai.dify_client import DifyError, describe_error, get_dify_client
+from services.ai.streaming import JsonStringFieldStream, sse_event, sse_response
+from services.ai.emotion_rollups import apply_emotion_rollup, lock_user_rollups
+
 # 從 __init__.py 導入 Blueprint
 from . import emotion_ai_bp
 
-# ─── Dify 連線設定 ──────────────────────────────────────────
-DIFY_API_URL = os.getenv("DIFY_API_URL", "https://api.dify.ai/v1/chat-messages")
-DIFY_KEY = os.getenv("DIFY_API_KEY_For_Emobot")
-HEADERS = {
-    "Authorization": f"Bearer {DIFY_KEY}",
-    "Content-Type": "application/json"
-}
+# ─── Dify 連線設定（共用用戶端，見 services/ai/dify_client.py）──
+DIFY_CLIENT_NAME = "emotion"
 
 # ==================== 工具函數 ====================
 
@@ -43,7 +43,7 @@ def to_str(v):
     return str(v) if v is not None else None
 
 def save_emotion_data(user_email, user_emotions, ai_emotions, confidence, session_id, message_content=None):
-    """儲存情緒分析數據到資料庫"""
+    """儲存情緒分析數據到資料庫，並在同一交易內更新情緒統計彙總"""
     try:
         from utils.db import get_connection
         conn = get_connection()
@@ -61,25 +61,39 @@ def save_emotion_data(user_email, user_emotions, ai_emotions, confidence, sessio
         if user_emotions and 'overall_tone' in user_emotions:
             overall_tone = user_emotions['overall_tone']
         
+        # 紀錄時間同時用於 emotion_history 與彙總分桶
+        created_at = datetime.now().replace(microsecond=0)
+        
         sql = """INSERT INTO emotion_history 
                 (user_email, message_id, user_emotions, ai_emotions, confidence_score, 
                  overall_tone, session_id, interaction_type, message_content, created_at) 
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, NOW())"""
-        
-        cursor.execute(sql, (
-            user_email,
-            message_id,
-            user_emotions_json,
-            ai_emotions_json,
-            confidence if confidence else 5,
-            overall_tone,
-            session_id,
-            'emotion_chat',
-            message_content[:500] if message_content else None  # 限制長度
-        ))
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"""
+        
+        conn.begin()
+        try:
+            # 與 rebuild_emotion_rollups() 互斥：重算進行中時等待其提交後才寫入
+            lock_user_rollups(cursor, user_email)
+            cursor.execute(sql, (
+                user_email,
+                message_id,
+                user_emotions_json,
+                ai_emotions_json,
+                confidence if confidence else 5,
+                overall_tone,
+                session_id,
+                'emotion_chat',
+                message_content[:500] if message_content else None,  # 限制長度
+                created_at
+            ))
+            apply_emotion_rollup(cursor, user_email, created_at, user_emotions, confidence if confidence else 5)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+            conn.close()
         
-        cursor.close()
-        conn.close()
         safe_log(f"[資料儲存] 成功儲存情緒數據: {user_email}, session: {session_id}")
         return True
         
@@ -180,37 +194,29 @@ def is_default_analysis(analysis):
 
 def call_dify_api(user_message):
     """統一的Dify API調用服務"""
-    if not DIFY_API_URL or not DIFY_KEY:
+    dify_client = get_dify_client(DIFY_CLIENT_NAME)
+    if not dify_client.configured:
         return False, 'API配置錯誤，請檢查環境變數', 500
     
-    payload = {
-        'inputs': {},
-        'query': user_message,
-        'response_mode': 'blocking',
-        'conversation_id': '',
-        'user': current_user.id if current_user.is_authenticated else 'anonymous'
-    }
-    
     try:
-        response = requests.post(DIFY_API_URL, headers=HEADERS, json=payload, timeout=30)
+        result = dify_client.chat(
+            user_message,
+            user=current_user.id if current_user.is_authenticated else 'anonymous'
+        )
+        return True, result, 200
         
-        if response.status_code != 200:
-            error_detail = f'HTTP {response.status_code}'
+    except DifyError as e:
+        if e.response is not None:
+            error_detail = f'HTTP {e.status_code}'
             try:
-                error_json = response.json()
-                error_detail += f': {error_json.get("message", response.text)}'
+                error_json = e.response.json()
+                error_detail += f': {error_json.get("message", e.response.text)}'
             except:
-                error_detail += f': {response.text}'
-            return False, error_detail, response.status_code
-        
-        return True, response.json(), 200
-        
-    except requests.exceptions.Timeout:
-        return False, 'API請求超時，請稍後重試', 504
-    except requests.exceptions.ConnectionError:
-        return False, '無法連接到AI服務，請檢查網路連線', 503
+                error_detail += f': {e.response.text}'
+            return False, error_detail, e.status_code
+        return (False, *describe_error(e))
     except requests.exceptions.RequestException as e:
-        return False, f'網路請求錯誤: {str(e)}', 500
+        return (False, *describe_error(e))
 
 # ==================== JSON處理層 ====================
 
@@ -429,6 +435,86 @@ def emotion_chat_page():
                          js_user_avatar=js_user_avatar,
                          js_username=js_username)
 
+def build_emotion_result(user_message, raw_answer):
+    """
+    解析 Dify 回答、補上預設內容並儲存情緒數據
+
+    Args:
+        user_message (str): 用戶訊息
+        raw_answer (str): Dify 回傳的 answer 原文
+
+    Returns:
+        dict: 前端所需的回應內容（success、user_message、main_payload、sidebar_reco）
+    """
+    if raw_answer:
+        parsed_data = parse_dify_response(raw_answer)
+        main_payload = parsed_data.get('main_payload', {})
+        sidebar_reco = parsed_data.get('sidebar_reco')
+    else:
+        main_payload = {
+            "response_from_ai": '抱歉，我無法處理您的請求。',
+            "analysis_for_user": generate_default_analysis(),
+            "analysis_for_ai": generate_default_analysis()
+        }
+        sidebar_reco = None
+
+    # 確保有AI回應
+    if not main_payload.get('response_from_ai'):
+        main_payload['response_from_ai'] = '我理解您的感受，讓我們繼續對話。'
+
+    # 如果沒有sidebar_reco，提供回滾推薦（與前端一致）
+    if not sidebar_reco:
+        sidebar_reco = {
+            'summary': '根據您的情緒狀態，為您推薦以下內容',
+            'items': [
+                {
+                    'id': 'fallback_emotion_mgmt',
+                    'type': 'psychology',
+                    'title': '情緒管理技巧',
+                    'desc': '學習基本的情緒調節方法',
+                    'addable': True
+                },
+                {
+                    'id': 'fallback_mindfulness',
+                    'type': 'meditation',
+                    'title': '正念練習',
+                    'desc': '培養當下意識，提升情緒穩定性',
+                    'addable': True
+                }
+            ]
+        }
+        safe_log("[API回應] 使用回滾sidebar_reco")
+
+    # 儲存情緒分析數據到資料庫
+    session_id = str(uuid.uuid4())[:12]  # 生成會話ID
+    user_analysis = main_payload.get('analysis_for_user')
+    ai_analysis = main_payload.get('analysis_for_ai')
+    
+    # 提取信心度
+    confidence = None
+    if user_analysis and 'confidence' in user_analysis:
+        try:
+            confidence = int(user_analysis['confidence'])
+        except (ValueError, TypeError):
+            confidence = 5
+    
+    # 儲存數據
+    save_emotion_data(
+        user_email=current_user.id,
+        user_emotions=user_analysis,
+        ai_emotions=ai_analysis,
+        confidence=confidence,
+        session_id=session_id,
+        message_content=user_message
+    )
+
+    return {
+        'success': True,
+        'user_message': user_message,
+        'main_payload': main_payload,
+        'sidebar_reco': sidebar_reco
+    }
+
 @emotion_ai_bp.route('/emotion/api', methods=['POST'])
 @login_required
 def emotion_chat_api():
@@ -448,84 +534,69 @@ def emotion_chat_api():
         if not success:
             return jsonify({'error': f'Dify API 錯誤: {api_result}'}), status_code
         
-        # 處理API回應
-        raw_answer = api_result.get('answer', '')
-        if raw_answer:
-            parsed_data = parse_dify_response(raw_answer)
-            main_payload = parsed_data.get('main_payload', {})
-            sidebar_reco = parsed_data.get('sidebar_reco')
-        else:
-            main_payload = {
-                "response_from_ai": '抱歉，我無法處理您的請求。',
-                "analysis_for_user": generate_default_analysis(),
-                "analysis_for_ai": generate_default_analysis()
-            }
-            sidebar_reco = None
-
-        # 確保有AI回應
-        if not main_payload.get('response_from_ai'):
-            main_payload['response_from_ai'] = '我理解您的感受，讓我們繼續對話。'
-
-        # 如果沒有sidebar_reco，提供回滾推薦（與前端一致）
-        if not sidebar_reco:
-            sidebar_reco = {
-                'summary': '根據您的情緒狀態，為您推薦以下內容',
-                'items': [
-                    {
-                        'id': 'fallback_emotion_mgmt',
-                        'type': 'psychology',
-                        'title': '情緒管理技巧',
-                        'desc': '學習基本的情緒調節方法',
-                        'addable': True
-                    },
-                    {
-                        'id': 'fallback_mindfulness',
-                        'type': 'meditation',
-                        'title': '正念練習',
-                        'desc': '培養當下意識，提升情緒穩定性',
-                        'addable': True
-                    }
-                ]
-            }
-            safe_log("[API回應] 使用回滾sidebar_reco")
+        # 處理API回應並儲存數據
+        result = build_emotion_result(user_message, api_result.get('answer', ''))
 
         safe_log(f"[情緒AI API] 處理成功，直接返回HTTP響應")
         
-        # 儲存情緒分析數據到資料庫
-        session_id = str(uuid.uuid4())[:12]  # 生成會話ID
-        user_analysis = main_payload.get('analysis_for_user')
-        ai_analysis = main_payload.get('analysis_for_ai')
-        
-        # 提取信心度
-        confidence = None
-        if user_analysis and 'confidence' in user_analysis:
-            try:
-                confidence = int(user_analysis['confidence'])
-            except (ValueError, TypeError):
-                confidence = 5
-        
-        # 儲存數據
-        save_emotion_data(
-            user_email=current_user.id,
-            user_emotions=user_analysis,
-            ai_emotions=ai_analysis,
-            confidence=confidence,
-            session_id=session_id,
-            message_content=user_message
-        )
-        
         # 直接返回HTTP響應，不使用WebSocket
-        return jsonify({
-            'success': True,
-            'user_message': user_message,
-            'main_payload': main_payload,
-            'sidebar_reco': sidebar_reco
-        })
+        return jsonify(result)
         
     except Exception as e:
         safe_log(f"[情緒AI API] 系統錯誤: {str(e)}")
         return jsonify({'error': f'伺服器內部錯誤: {str(e)}'}), 500
 
+@emotion_ai_bp.route('/emotion/api/stream', methods=['POST'])
+@login_required
+def emotion_chat_api_stream():
+    """
+    串流版情緒AI API（Server-Sent Events）
+
+    Dify 的回答是一段 JSON，串流時只轉送 response_from_ai 欄位已到達的文字（token 事件），
+    串流結束後再解析情緒分析、儲存 emotion_history，並以 done 事件送出與 /emotion/api 相同的結果。
+    """
+    request_data = request.get_json(silent=True) or {}
+    user_message = (request_data.get("message") or "").strip()
+
+    if not user_message:
+        return jsonify({"error": "請輸入內容"}), 400
+
+    dify_client = get_dify_client(DIFY_CLIENT_NAME)
+    if not dify_client.configured:
+        return jsonify({'error': 'Dify API 錯誤: API配置錯誤，請檢查環境變數'}), 500
+
+    safe_log(f"[情緒AI串流] 用戶 {current_user.id} 發送訊息: {user_message[:50]}...")
+
+    def generate():
+        started = time.monotonic()
+        ttft_ms = None
+        answer_parts = []
+        reply_stream = JsonStringFieldStream('response_from_ai')
+        try:
+            for event in dify_client.stream_chat(user_message, user=current_user.id):
+                chunk = event.get('answer') if event.get('event') in ('message', 'agent_message') else None
+                if not chunk:
+                    continue
+                answer_parts.append(chunk)
+                delta = reply_stream.feed(chunk)
+                if delta:
+                    if ttft_ms is None:
+                        ttft_ms = round((time.monotonic() - started) * 1000)
+                    yield sse_event('token', {'delta': delta})
+
+            result = build_emotion_result(user_message, ''.join(answer_parts))
+        except Exception as e:
+            message, status_code = describe_error(e)
+            safe_log(f"[情緒AI串流] 錯誤: {str(e)}")
+            yield sse_event('error', {'error': f'Dify API 錯誤: {message}', 'status': status_code})
+            return
+
+        safe_log(f"[情緒AI串流] 處理成功，TTFT={ttft_ms}ms")
+        result['ttft_ms'] = ttft_ms
+        yield sse_event('done', result)
+
+    return sse_response(generate())
+
 @emotion_ai_bp.route('/emotion_debug')
 @login_required
 def emotion_debug_page():
@@ -554,9 +625,9 @@ def emotion_debug_api():
             "debug_mode": debug_mode,
             "timestamp": json.dumps(str(datetime.now()), ensure_ascii=False),
             "request_config": {
-                "dify_api_url": DIFY_API_URL,
-                "has_api_key": bool(DIFY_KEY),
-                "headers": {k: v for k, v in HEADERS.items() if k != "Authorization"}
+                "dify_api_url": get_dify_client(DIFY_CLIENT_NAME).api_url,
+                "has_api_key": bool(get_dify_client(DIFY_CLIENT_NAME).api_key),
+                "headers": {"Content-Type": "application/json"}
             }
         }
 
@@ -0,0 +1,347 @@
+# -*- coding: utf-8 -*-
+"""
+情緒統計彙總（rollup）模組
+
+emo_stats 的摘要、趨勢、分布 API 過去每次都以 get_user_emotion_history() 取回視窗內
+所有 emotion_history 原始紀錄，並在 Python 中 json.loads 後逐筆累加，
+視窗越長（30/90/365 天）成本越高。改為預先彙總（見 migrations/007_emotion_rollups.sql）：
+- emotion_daily_rollups：每用戶每日的互動數、正向/負面/中性百分比總和與信心度統計
+- emotion_hourly_rollups / emotion_hourly_emotions：每小時的主導情緒統計（今日趨勢）
+- save_emotion_data() 寫入 emotion_history 時以 apply_emotion_rollup() 在同一交易內增量更新
+- 統計 API 只讀彙總表，365 天視窗最多讀 365 列
+- rebuild_emotion_rollups() 以 emotion_history 完整重算，供回填與修復使用；
+  每位用戶一個交易，以 lock_user_rollups() 與寫入端互斥，重算期間的新紀錄不會遺失
+
+彙總以整日為單位：N 天視窗涵蓋起始日整天，而非精確到起始時刻。
+
+命令列：
+    flask emo_stats rebuild-rollups                      # 重算所有用戶
+    flask emo_stats rebuild-rollups --user a@example.com  # 只重算指定用戶
+"""
+
+import json
+from collections import defaultdict
+
+import click
+
+from utils import db
+from . import emo_stats_bp
+
+# 今日趨勢用的正向 / 負面主導情緒分類
+POSITIVE_EMOTIONS = ('開心', '快樂', '喜悅', '平靜', '放鬆', '友善', '理解', '自在', '滿足', '愉快', '輕鬆', '舒適', '安心', '希望', '感激', '興奮', '滿意', '溫暖')
+NEGATIVE_EMOTIONS = ('悲傷', '難過', '憂鬱', '焦慮', '緊張', '擔心', '憤怒', '生氣', '壓力', '煩躁', '不安', '沮喪', '失望', '恐懼', '害怕', '痛苦', '疲憊', '厭煩', '孤單', '無助', '煩惱', '挫折')
+
+# emotion_hourly_emotions.emotion 欄位長度
+MAX_EMOTION_NAME_LENGTH = 50
+
+# 重算時每批讀取的 emotion_history 筆數
+REBUILD_BATCH_SIZE = 1000
+
+
+def extract_emotion_type_and_percentage(emotion_data):
+    """
+    從情緒數據中提取類型和百分比
+    優先使用 Dify 提供的 type 標籤和 percentage
+    """
+    emotion_type = emotion_data.get('type', '').lower()
+    if emotion_type not in ['positive', 'negative', 'neutral']:
+        emotion_type = 'neutral'
+
+    # 提取百分比數值
+    percentage_str = emotion_data.get('percentage', '0')
+    try:
+        if isinstance(percentage_str, str):
+            percentage = float(percentage_str.replace('%', ''))
+        else:
+            percentage = float(percentage_str)
+    except (ValueError, TypeError):
+        percentage = 0.0
+
+    return emotion_type, percentage
+
+
+def summarize_emotions(user_emotions, confidence):
+    """
+    將一筆情緒分析結果轉成彙總用的增量
+
+    Args:
+        user_emotions (dict): 用戶情緒分析（含 primary_emotions）
+        confidence (int): 信心度
+
+    Returns:
+        dict: analyzed、positive/negative/neutral_score、confidence、dominant、dominant_type
+    """
+    summary = {
+        'analyzed': 0,
+        'positive_score': 0.0,
+        'negative_score': 0.0,
+        'neutral_score': 0.0,
+        'confidence': confidence or None,
+        'dominant': None,
+        'dominant_type': None
+    }
+
+    emotions = (user_emotions or {}).get('primary_emotions') or []
+    if not isinstance(emotions, list) or not emotions:
+        return summary
+
+    summary['analyzed'] = 1
+    for emotion_data in emotions:
+        if not isinstance(emotion_data, dict):
+            continue
+        emotion_type, percentage = extract_emotion_type_and_percentage(emotion_data)
+        summary[f'{emotion_type}_score'] += percentage
+
+    dominant = emotions[0].get('emotion') if isinstance(emotions[0], dict) else None
+    if dominant:
+        dominant = str(dominant)[:MAX_EMOTION_NAME_LENGTH]
+        summary['dominant'] = dominant
+        if dominant in POSITIVE_EMOTIONS:
+            summary['dominant_type'] = 'positive'
+        elif dominant in NEGATIVE_EMOTIONS:
+            summary['dominant_type'] = 'negative'
+
+    return summary
+
+
+def lock_user_rollups(database_cursor, user_email, exclusive=False):
+    """
+    取得用戶彙總的交易鎖（鎖定 User 資料列，需在交易內呼叫）
+
+    save_emotion_data() 以共享鎖寫入（彼此不互斥），rebuild_emotion_rollups() 以排他鎖重算，
+    重算期間的新紀錄會等重算提交後才寫入，不會因重算的刪除 / 重新寫入而遺失。
+    """
+    database_cursor.execute(f"""
+        SELECT User_Email FROM User WHERE User_Email = %s {'FOR UPDATE' if exclusive else 'FOR SHARE'}
+    """, (user_email,))
+    database_cursor.fetchall()
+
+
+def apply_emotion_rollup(database_cursor, user_email, created_at, user_emotions, confidence):
+    """
+    將一筆新的情緒紀錄累加到彙總表（需與 INSERT emotion_history 在同一交易內呼叫）
+
+    Args:
+        database_cursor: 資料庫游標
+        user_email (str): 用戶Email
+        created_at (datetime): 紀錄時間（與 emotion_history.created_at 相同）
+        user_emotions (dict): 用戶情緒分析
+        confidence (int): 信心度
+    """
+    summary = summarize_emotions(user_emotions, confidence)
+    bucket_date = created_at.date()
+    confidence = summary['confidence']
+
+    database_cursor.execute("""
+        INSERT INTO emotion_daily_rollups
+            (user_email, bucket_date, interaction_count, analyzed_count,
+             positive_score, negative_score, neutral_score,
+             confidence_count, confidence_sum, confidence_sq_sum)
+        VALUES (%s, %s, 1, %s, %s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            interaction_count = interaction_count + 1,
+            analyzed_count = analyzed_count + VALUES(analyzed_count),
+            positive_score = positive_score + VALUES(positive_score),
+            negative_score = negative_score + VALUES(negative_score),
+            neutral_score = neutral_score + VALUES(neutral_score),
+            confidence_count = confidence_count + VALUES(confidence_count),
+            confidence_sum = confidence_sum + VALUES(confidence_sum),
+            confidence_sq_sum = confidence_sq_sum + VALUES(confidence_sq_sum)
+    """, (user_email, bucket_date, summary['analyzed'],
+          summary['positive_score'], summary['negative_score'], summary['neutral_score'],
+          1 if confidence else 0, confidence or 0, (confidence or 0) ** 2))
+
+    if not summary['dominant']:
+        return
+
+    database_cursor.execute("""
+        INSERT INTO emotion_hourly_rollups
+            (user_email, bucket_date, bucket_hour, interaction_count, positive_count, negative_count)
+        VALUES (%s, %s, %s, 1, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            interaction_count = interaction_count + 1,
+            positive_count = positive_count + VALUES(positive_count),
+            negative_count = negative_count + VALUES(negative_count)
+    """, (user_email, bucket_date, created_at.hour,
+          1 if summary['dominant_type'] == 'positive' else 0,
+          1 if summary['dominant_type'] == 'negative' else 0))
+
+    database_cursor.execute("""
+        INSERT INTO emotion_hourly_emotions (user_email, bucket_date, bucket_hour, emotion, emotion_count)
+        VALUES (%s, %s, %s, %s, 1)
+        ON DUPLICATE KEY UPDATE emotion_count = emotion_count + 1
+    """, (user_email, bucket_date, created_at.hour, summary['dominant']))
+
+
+def fetch_daily_rollups(database_cursor, user_email, start_date, end_date):
+    """
+    取得日期區間內的每日彙總
+
+    Returns:
+        list: (bucket_date, interaction_count, analyzed_count, positive_score, negative_score,
+               neutral_score, confidence_count, confidence_sum, confidence_sq_sum)
+    """
+    database_cursor.execute("""
+        SELECT bucket_date, interaction_count, analyzed_count,
+               positive_score, negative_score, neutral_score,
+               confidence_count, confidence_sum, confidence_sq_sum
+        FROM emotion_daily_rollups
+        WHERE user_email = %s AND bucket_date BETWEEN %s AND %s
+        ORDER BY bucket_date
+    """, (user_email, start_date, end_date))
+    return database_cursor.fetchall()
+
+
+def fetch_hourly_rollups(database_cursor, user_email, bucket_date):
+    """
+    取得某日每小時的彙總與主導情緒次數
+
+    Returns:
+        tuple: (hourly_rows, emotion_rows)
+               hourly_rows: (bucket_hour, interaction_count, positive_count, negative_count)
+               emotion_rows: (bucket_hour, emotion, emotion_count)，依次數由多到少排序
+    """
+    database_cursor.execute("""
+        SELECT bucket_hour, interaction_count, positive_count, negative_count
+        FROM emotion_hourly_rollups
+        WHERE user_email = %s AND bucket_date = %s
+    """, (user_email, bucket_date))
+    hourly_rows = database_cursor.fetchall()
+
+    database_cursor.execute("""
+        SELECT bucket_hour, emotion, emotion_count
+        FROM emotion_hourly_emotions
+        WHERE user_email = %s AND bucket_date = %s
+        ORDER BY bucket_hour, emotion_count DESC
+    """, (user_email, bucket_date))
+    return hourly_rows, database_cursor.fetchall()
+
+
+def _rebuild_user_rollups(connection, cursor, user_email):
+    """
+    重算單一用戶的彙總（單一交易）
+
+    先以排他鎖鎖定用戶，等進行中的 save_emotion_data() 提交後才讀取 emotion_history，
+    之後的寫入則等重算提交後才進行。
+
+    Returns:
+        int: 重算的 emotion_history 紀錄數
+    """
+    daily = defaultdict(lambda: [0, 0, 0.0, 0.0, 0.0, 0, 0, 0])
+    hourly = defaultdict(lambda: [0, 0, 0])
+    emotions = defaultdict(int)
+    processed = 0
+
+    connection.begin()
+    try:
+        lock_user_rollups(cursor, user_email, exclusive=True)
+
+        last_id = 0
+        while True:
+            cursor.execute("""
+                SELECT id, user_emotions, confidence_score, created_at
+                FROM emotion_history
+                WHERE user_email = %s AND id > %s
+                ORDER BY id
+                LIMIT %s
+            """, (user_email, last_id, REBUILD_BATCH_SIZE))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+
+            for record_id, user_emotions_json, confidence, created_at in rows:
+                last_id = record_id
+                processed += 1
+                try:
+                    user_emotions = json.loads(user_emotions_json) if user_emotions_json else None
+                except (TypeError, ValueError):
+                    user_emotions = None
+
+                summary = summarize_emotions(user_emotions, confidence)
+                day_key = (user_email, created_at.date())
+                day = daily[day_key]
+                day[0] += 1
+                day[1] += summary['analyzed']
+                day[2] += summary['positive_score']
+                day[3] += summary['negative_score']
+                day[4] += summary['neutral_score']
+                if summary['confidence']:
+                    day[5] += 1
+                    day[6] += summary['confidence']
+                    day[7] += summary['confidence'] ** 2
+
+                if summary['dominant']:
+                    hour_key = (user_email, created_at.date(), created_at.hour)
+                    hour = hourly[hour_key]
+                    hour[0] += 1
+                    hour[1] += 1 if summary['dominant_type'] == 'positive' else 0
+                    hour[2] += 1 if summary['dominant_type'] == 'negative' else 0
+                    emotions[hour_key + (summary['dominant'],)] += 1
+
+        for table in ('emotion_daily_rollups', 'emotion_hourly_rollups', 'emotion_hourly_emotions'):
+            cursor.execute(f"DELETE FROM {table} WHERE user_email = %s", (user_email,))
+
+        if daily:
+            cursor.executemany("""
+                INSERT INTO emotion_daily_rollups
+                    (user_email, bucket_date, interaction_count, analyzed_count,
+                     positive_score, negative_score, neutral_score,
+                     confidence_count, confidence_sum, confidence_sq_sum)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """, [key + tuple(values) for key, values in daily.items()])
+        if hourly:
+            cursor.executemany("""
+                INSERT INTO emotion_hourly_rollups
+                    (user_email, bucket_date, bucket_hour, interaction_count, positive_count, negative_count)
+                VALUES (%s, %s, %s, %s, %s, %s)
+            """, [key + tuple(values) for key, values in hourly.items()])
+        if emotions:
+            cursor.executemany("""
+                INSERT INTO emotion_hourly_emotions (user_email, bucket_date, bucket_hour, emotion, emotion_count)
+                VALUES (%s, %s, %s, %s, %s)
+            """, [key + (count,) for key, count in emotions.items()])
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+
+    return processed
+
+
+def rebuild_emotion_rollups(user_email=None):
+    """
+    依 emotion_history 完整重算彙總表（每位用戶一個交易，與 save_emotion_data() 以用戶鎖互斥）
+
+    Args:
+        user_email (str): 只重算指定用戶；None 表示所有用戶
+
+    Returns:
+        int: 重算的 emotion_history 紀錄數
+    """
+    connection = db.get_connection()
+    cursor = connection.cursor()
+
+    try:
+        if user_email:
+            user_emails = [user_email]
+        else:
+            # 也包含已無紀錄、只剩彙總列的用戶，讓其彙總被清空
+            cursor.execute("""
+                SELECT user_email FROM emotion_history
+                UNION SELECT user_email FROM emotion_daily_rollups
+                UNION SELECT user_email FROM emotion_hourly_rollups
+            """)
+            user_emails = [row[0] for row in cursor.fetchall()]
+
+        return sum(_rebuild_user_rollups(connection, cursor, email) for email in user_emails)
+
+    finally:
+        connection.close()
+
+
+@emo_stats_bp.cli.command('rebuild-rollups')
+@click.option('--user', 'user_email', default=None, help='只重算指定用戶的彙總')
+def rebuild_rollups_command(user_email):
+    """以 emotion_history 重算情緒統計彙總表"""
+    processed = rebuild_emotion_rollups(user_email)
+    click.echo(f'情緒統計彙總重算完成，共處理 {processed} 筆紀錄')
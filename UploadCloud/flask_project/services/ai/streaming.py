@@ -0,0 +1,112 @@
+"""
+AI 回覆串流工具
+
+chat_api 與 emotion_chat_api 以 blocking 模式呼叫 Dify，使用者必須等整段回答生成
+（常見 5~20 秒）才看得到內容。串流端點改以 Dify streaming 模式取得片段，
+再以 Server-Sent Events 逐段轉送給瀏覽器（前端以 fetch + ReadableStream 讀取）。
+
+SSE 事件格式：
+- start: 串流開始（附帶 session_id 等資訊）
+- token: 一段新增的回覆文字 {"delta": "..."}
+- done:  串流結束，附帶與 blocking API 相同格式的完整結果與 ttft_ms
+- error: 發生錯誤 {"error": "...", "status": 503}
+"""
+
+import json
+
+from flask import Response, stream_with_context
+
+from utils import db
+
+
+def sse_event(event, data):
+    """組出一筆 SSE 事件字串"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _release_connections_first(generator):
+    """串流開始前先歸還請求中閒置的資料庫連線（teardown 要等整段串流結束才執行）"""
+    db.release_request_connections()
+    yield from generator
+
+
+def sse_response(generator):
+    """以 SSE 回應包裝產生器（保留請求上下文，並關閉代理緩衝）"""
+    return Response(
+        stream_with_context(_release_connections_first(generator)),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+
+class JsonStringFieldStream:
+    """
+    從逐段到達的 JSON 文字中，增量取出指定字串欄位的內容
+
+    情緒AI的回答是一段 JSON（回覆文字位於 response_from_ai），
+    串流時只把該欄位已完整到達的字元轉送給前端，其他分析欄位等串流結束後一併解析。
+    """
+
+    def __init__(self, field):
+        self._key = f'"{field}"'
+        self._buffer = ''
+        self._start = None
+        self._pos = None
+        self.done = False
+
+    def feed(self, chunk):
+        """
+        加入一段原始文字
+
+        Args:
+            chunk (str): Dify 的 answer 片段
+
+        Returns:
+            str: 此次新解出的欄位文字（可能為空字串）
+        """
+        self._buffer += chunk or ''
+        if self.done:
+            return ''
+
+        if self._start is None:
+            key_index = self._buffer.find(self._key)
+            if key_index < 0:
+                return ''
+            cursor = key_index + len(self._key)
+            # 跳過冒號與空白，找到字串起始的引號
+            while cursor < len(self._buffer) and self._buffer[cursor] in ' \t\r\n:':
+                cursor += 1
+            if cursor >= len(self._buffer):
+                return ''
+            if self._buffer[cursor] != '"':
+                self.done = True
+                return ''
+            self._start = self._pos = cursor + 1
+
+        cursor = self._pos
+        while cursor < len(self._buffer):
+            char = self._buffer[cursor]
+            if char == '\\':
+                # 跳脫序列尚未完整到達時等待下一段
+                escape_length = 6 if self._buffer[cursor + 1:cursor + 2] == 'u' else 2
+                if cursor + escape_length > len(self._buffer):
+                    break
+                cursor += escape_length
+                continue
+            if char == '"':
+                self.done = True
+                break
+            cursor += 1
+
+        raw = self._buffer[self._pos:cursor]
+        self._pos = cursor
+        if not raw:
+            return ''
+        try:
+            return json.loads(f'"{raw}"')
+        except ValueError:
+            # 不合法的跳脫（例如 LLM 直接輸出換行），原樣轉送
+            return raw
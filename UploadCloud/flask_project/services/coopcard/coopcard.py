@@ -33,6 +33,12 @@ logger = logging.getLogger(__name__)
 
 # 導入 User ID 管理 API
 from . import user_id_api
+from .hydration import fetch_card_participants
+from .daily_progress import change_completion, completion_streak
+from .invitations import build_card_snapshot, get_or_create_snapshot, insert_invitations, load_snapshot
+from .friendships import (add_friendship, remove_friendship, get_friend_emails, are_friends, friends_among,
+                          invalidate_relationship, resolve_relationships, relationship_fields)
+from utils.user_search_index import get_user_search_index, load_users
 
 # ===== 工具函數 =====
 
@@ -71,6 +77,25 @@ def get_avatar_url(user_avatar):
     # 如果只是檔名，加上完整路徑
     return f'/static/icons/avatars/{user_avatar}'
 
+def build_avatar_list(participants):
+    """
+    將參與者資料列轉換為前端使用的頭像列表
+
+    Args:
+        participants: fetch_card_participants 返回的 (User_Avatar, User_name, User_Email) 列表
+
+    Returns:
+        list: [{'avatar', 'name', 'email'}, ...]
+    """
+    return [
+        {
+            'avatar': get_avatar_url(p[0]),
+            'name': p[1] or '未命名用戶',
+            'email': p[2]
+        }
+        for p in participants
+    ]
+
 # ===== 路由定義 =====
 
 @coopcard_bp.route('/', strict_slashes=False)
@@ -88,16 +113,12 @@ def coopcard_main():
         """, (current_user.id,))
         pending_requests_count = cursor.fetchone()[0]
         
-        # 獲取好友總數
-        cursor.execute("""
-            SELECT COUNT(*) FROM friend_requests 
-            WHERE (requester_email = %s OR receiver_email = %s) AND status = 'accepted'
-        """, (current_user.id, current_user.id))
-        friends_count = cursor.fetchone()[0]
-        
         cursor.close()
         conn.close()
         
+        # 好友總數（好友集合快取）
+        friends_count = len(get_friend_emails(current_user.id))
+        
         return render_template('coopcard/coopcard_main.html',
                              pending_requests_count=pending_requests_count,
                              friends_count=friends_count)
@@ -190,6 +211,11 @@ def respond_request():
             WHERE id = %s
         """, (new_status, request_id))
         
+        if action == 'accept':
+            add_friendship(cursor, request_info[0], current_user.id)
+        else:
+            invalidate_relationship(request_info[0], current_user.id)
+        
         conn.commit()
         cursor.close()
         conn.close()
@@ -209,26 +235,15 @@ def friends_list():
         conn = db.get_connection()
         cursor = conn.cursor()
         
-        # 獲取所有已接受的好友關係
+        # 獲取所有好友（friendships 邊表，依成為好友時間排序）
         cursor.execute("""
-            SELECT DISTINCT
-                CASE 
-                    WHEN fr.requester_email = %s THEN fr.receiver_email
-                    ELSE fr.requester_email
-                END as friend_email,
-                u.User_name, u.User_Avatar, u.bio, u.user_level,
-                fr.updated_at as friend_since
-            FROM friend_requests fr
-            JOIN user u ON (
-                CASE 
-                    WHEN fr.requester_email = %s THEN fr.receiver_email = u.User_Email
-                    ELSE fr.requester_email = u.User_Email
-                END
-            )
-            WHERE (fr.requester_email = %s OR fr.receiver_email = %s)
-            AND fr.status = 'accepted'
-            ORDER BY fr.updated_at DESC
-        """, (current_user.id, current_user.id, current_user.id, current_user.id))
+            SELECT f.friend_email, u.User_name, u.User_Avatar, u.bio, u.user_level,
+                   f.created_at as friend_since
+            FROM friendships f
+            JOIN user u ON f.friend_email = u.User_Email
+            WHERE f.user_email = %s
+            ORDER BY f.created_at DESC
+        """, (current_user.id,))
         
         friends = cursor.fetchall()
         
@@ -343,6 +358,11 @@ def respond_friend_request_simple():
             WHERE id = %s
         """, (new_status, request_id))
         
+        if action == 'accept':
+            add_friendship(cursor, result[0], current_user.id)
+        else:
+            invalidate_relationship(result[0], current_user.id)
+        
         conn.commit()
         cursor.close()
         conn.close()
@@ -430,6 +450,7 @@ def send_friend_request_simple():
         """, (current_user.id, target_email))
         
         conn.commit()
+        invalidate_relationship(current_user.id, target_email)
         cursor.close()
         conn.close()
         
@@ -462,87 +483,51 @@ def api_search_users():
         conn = db.get_connection()
         cursor = conn.cursor()
         
-        # 模糊搜尋用戶（排除自己）
-        search_pattern = f'%{search_query}%'
-        cursor.execute("""
-            SELECT User_Email, User_name, User_Avatar, bio, user_level
-            FROM user 
-            WHERE (User_Email LIKE %s OR User_name LIKE %s) 
-            AND User_Email != %s
-            ORDER BY 
-                CASE 
-                    WHEN User_name LIKE %s THEN 1
-                    WHEN User_Email LIKE %s THEN 2
-                    ELSE 3
-                END,
-                User_name ASC
-            LIMIT 20
-        """, (search_pattern, search_pattern, current_user.id, 
-              f'{search_query}%', f'{search_query}%'))
-        
-        users_data = cursor.fetchall()
-        users_list = []
+        # 優先以前綴索引搜尋（email / 名稱），再以主鍵載入資料列；索引尚未載入時改用 LIKE 查詢
+        index = get_user_search_index()
+        matched_emails = (index.search(search_query, exclude_email=current_user.id, limit=20, include_user_id=False)
+                          if index else None)
+        
+        if matched_emails is not None:
+            users_data = load_users(cursor, matched_emails, 'User_Email, User_name, User_Avatar, bio, user_level')
+        else:
+            # 模糊搜尋用戶（排除自己）
+            search_pattern = f'%{search_query}%'
+            cursor.execute("""
+                SELECT User_Email, User_name, User_Avatar, bio, user_level
+                FROM user 
+                WHERE (User_Email LIKE %s OR User_name LIKE %s) 
+                AND User_Email != %s
+                ORDER BY 
+                    CASE 
+                        WHEN User_name LIKE %s THEN 1
+                        WHEN User_Email LIKE %s THEN 2
+                        ELSE 3
+                    END,
+                    User_name ASC
+                LIMIT 20
+            """, (search_pattern, search_pattern, current_user.id, 
+                  f'{search_query}%', f'{search_query}%'))
+        
+            users_data = cursor.fetchall()
+        cursor.close()
+        conn.close()
         
+        # 一次判斷所有搜尋結果與當前用戶的好友狀態（短期快取，連續輸入時重複使用）
+        relationships = resolve_relationships(current_user.id, [user[0] for user in users_data])
+        
+        users_list = []
         for user in users_data:
             user_email = user[0]
-            
-            # 檢查與當前用戶的好友關係狀態
-            cursor.execute("""
-                SELECT status, requester_email, receiver_email 
-                FROM friend_requests 
-                WHERE (requester_email = %s AND receiver_email = %s) 
-                   OR (requester_email = %s AND receiver_email = %s)
-            """, (current_user.id, user_email, user_email, current_user.id))
-            
-            friend_relationship = cursor.fetchone()
-            
-            # 判斷好友狀態
-            if friend_relationship:
-                status = friend_relationship[0]
-                requester = friend_relationship[1]
-                
-                if status == 'accepted':
-                    friend_status = 'friends'
-                    status_text = '已成為好友!'
-                    button_class = 'status-friends'
-                    button_disabled = True
-                elif status == 'pending':
-                    if requester == current_user.id:
-                        friend_status = 'request_sent' 
-                        status_text = '請求已發送'
-                        button_class = 'status-pending'
-                        button_disabled = True
-                    else:
-                        friend_status = 'request_received'
-                        status_text = '已收到請求'
-                        button_class = 'status-received'
-                        button_disabled = True
-                else:  # rejected
-                    friend_status = 'can_send'
-                    status_text = '發送好友請求'
-                    button_class = 'status-can-send'
-                    button_disabled = False
-            else:
-                friend_status = 'can_send'
-                status_text = '發送好友請求'
-                button_class = 'status-can-send'
-                button_disabled = False
-            
             users_list.append({
                 'email': user_email,
                 'name': user[1] or '未設置姓名',
                 'avatar': get_avatar_url(user[2]),
                 'bio': user[3] or '',
                 'user_level': user[4] or 1,
-                'friend_status': friend_status,
-                'status_text': status_text,
-                'button_class': button_class,
-                'button_disabled': button_disabled
+                **relationship_fields(relationships[user_email])
             })
         
-        cursor.close()
-        conn.close()
-        
         return jsonify({
             'success': True, 
             'users': users_list,
@@ -571,73 +556,43 @@ def api_search_users_extended():
         conn = db.get_connection()
         cursor = conn.cursor()
         
-        # 擴展搜尋：支援user_id、email和name的模糊匹配
-        search_pattern = f'%{search_query}%'
-        cursor.execute("""
-            SELECT User_Email, User_name, User_Avatar, bio, user_level, user_id
-            FROM user 
-            WHERE (User_Email LIKE %s OR User_name LIKE %s OR user_id LIKE %s) 
-            AND User_Email != %s
-            ORDER BY 
-                CASE 
-                    WHEN user_id LIKE %s THEN 1
-                    WHEN User_name LIKE %s THEN 2
-                    WHEN User_Email LIKE %s THEN 3
-                    ELSE 4
-                END,
-                User_name ASC
-            LIMIT 20
-        """, (search_pattern, search_pattern, search_pattern, current_user.id, 
-              f'{search_query}%', f'{search_query}%', f'{search_query}%'))
-        
-        users_data = cursor.fetchall()
-        users_list = []
+        # 優先以前綴索引搜尋（user_id / email / 名稱），再以主鍵載入資料列；索引尚未載入時改用 LIKE 查詢
+        index = get_user_search_index()
+        matched_emails = (index.search(search_query, exclude_email=current_user.id, limit=20)
+                          if index else None)
         
+        if matched_emails is not None:
+            users_data = load_users(cursor, matched_emails, 'User_Email, User_name, User_Avatar, bio, user_level, user_id')
+        else:
+            # 擴展搜尋：支援user_id、email和name的模糊匹配
+            search_pattern = f'%{search_query}%'
+            cursor.execute("""
+                SELECT User_Email, User_name, User_Avatar, bio, user_level, user_id
+                FROM user 
+                WHERE (User_Email LIKE %s OR User_name LIKE %s OR user_id LIKE %s) 
+                AND User_Email != %s
+                ORDER BY 
+                    CASE 
+                        WHEN user_id LIKE %s THEN 1
+                        WHEN User_name LIKE %s THEN 2
+                        WHEN User_Email LIKE %s THEN 3
+                        ELSE 4
+                    END,
+                    User_name ASC
+                LIMIT 20
+            """, (search_pattern, search_pattern, search_pattern, current_user.id, 
+                  f'{search_query}%', f'{search_query}%', f'{search_query}%'))
+        
+            users_data = cursor.fetchall()
+        cursor.close()
+        conn.close()
+        
+        # 一次判斷所有搜尋結果與當前用戶的好友狀態（短期快取，連續輸入時重複使用）
+        relationships = resolve_relationships(current_user.id, [user[0] for user in users_data])
+        
+        users_list = []
         for user in users_data:
             user_email = user[0]
-            
-            # 檢查與當前用戶的好友關係狀態
-            cursor.execute("""
-                SELECT status, requester_email, receiver_email 
-                FROM friend_requests 
-                WHERE (requester_email = %s AND receiver_email = %s) 
-                   OR (requester_email = %s AND receiver_email = %s)
-            """, (current_user.id, user_email, user_email, current_user.id))
-            
-            friend_relationship = cursor.fetchone()
-            
-            # 判斷好友狀態
-            if friend_relationship:
-                status = friend_relationship[0]
-                requester = friend_relationship[1]
-                
-                if status == 'accepted':
-                    friend_status = 'friends'
-                    status_text = '已成為好友!'
-                    button_class = 'status-friends'
-                    button_disabled = True
-                elif status == 'pending':
-                    if requester == current_user.id:
-                        friend_status = 'request_sent' 
-                        status_text = '請求已發送'
-                        button_class = 'status-pending'
-                        button_disabled = True
-                    else:
-                        friend_status = 'request_received'
-                        status_text = '已收到請求'
-                        button_class = 'status-received'
-                        button_disabled = True
-                else:  # rejected
-                    friend_status = 'can_send'
-                    status_text = '發送好友請求'
-                    button_class = 'status-can-send'
-                    button_disabled = False
-            else:
-                friend_status = 'can_send'
-                status_text = '發送好友請求'
-                button_class = 'status-can-send'
-                button_disabled = False
-            
             users_list.append({
                 'email': user_email,
                 'name': user[1] or '未設置姓名',
@@ -645,15 +600,9 @@ def api_search_users_extended():
                 'bio': user[3] or '',
                 'user_level': user[4] or 1,
                 'user_id': user[5],  # 添加user_id字段
-                'friend_status': friend_status,
-                'status_text': status_text,
-                'button_class': button_class,
-                'button_disabled': button_disabled
+                **relationship_fields(relationships[user_email])
             })
         
-        cursor.close()
-        conn.close()
-        
         return jsonify({
             'success': True, 
             'users': users_list,
@@ -759,49 +708,37 @@ def get_task_cards():
         conn = db.get_connection()
         cursor = conn.cursor()
         
+        from datetime import date, datetime
+        today = date.today()
+        
         # 修改SQL查詢以包含用戶參與的所有卡片（自己創建的 + 參與的）
-        # 排除已歸檔和已結算的卡片
+        # 排除已歸檔和已結算的卡片；今日完成次數讀取當前用戶的每日完成紀錄
         cursor.execute("""
             SELECT DISTINCT tc.id, tc.title, tc.content, tc.stamp_icon, tc.daily_executions, 
                    tc.max_participants, tc.status, tc.created_at, tc.updated_at,
-                   tc.daily_completed_count, tc.last_reset_date, tc.end_date, tc.participants_count,
+                   COALESCE(tcc.completed_count, 0) as daily_completed, tc.last_reset_date, tc.end_date, tc.participants_count,
                    tc.user_id,
                    CASE WHEN tc.user_id = %s THEN 'owner' ELSE 'participant' END as user_role
             FROM task_cards tc
             LEFT JOIN card_participants cp ON tc.id = cp.card_id
+            LEFT JOIN task_card_completions tcc
+                   ON tcc.card_id = tc.id AND tcc.user_email = %s AND tcc.completion_date = %s
             WHERE (tc.user_id = %s OR (cp.user_id = %s AND cp.status = 'active'))
               AND tc.status = 'published'
             ORDER BY tc.created_at DESC
-        """, (current_user.id, current_user.id, current_user.id))
+        """, (current_user.id, current_user.id, today, current_user.id, current_user.id))
         
         cards_data = cursor.fetchall()
         
-        # 檢查並重置需要重置的卡片
-        from datetime import date, datetime
-        today = date.today()
-        cards_to_reset = []
-        
-        for card in cards_data:
-            if card[10] and card[10] != today:  # last_reset_date != today
-                cards_to_reset.append(card[0])  # card_id
-        
-        # 批量重置過期的每日計數
-        if cards_to_reset:
-            cursor.execute("""
-                UPDATE task_cards 
-                SET daily_completed_count = 0, last_reset_date = %s
-                WHERE id IN ({})
-            """.format(','.join(['%s'] * len(cards_to_reset))), 
-            [today] + cards_to_reset)
-            conn.commit()
+        # 一次取回所有卡片的參與者總數與頭像（避免逐張卡片查詢）
+        participants_by_card = fetch_card_participants(cursor, [card[0] for card in cards_data])
         
-        # 保留連線用於查詢參與者頭像
-        # cursor 和 conn 將在處理完所有卡片後關閉
+        cursor.close()
+        conn.close()
         
         cards_list = []
         for card in cards_data:
-            # 重置後的計數（如果卡片被重置的話）
-            daily_completed = 0 if card[0] in cards_to_reset else card[9]
+            daily_completed = card[9]
             
             # 計算天數進度
             created_date = card[7].date() if isinstance(card[7], datetime) else card[7]
@@ -816,34 +753,10 @@ def get_task_cards():
             
             logger.debug(f"[獲取卡片] 卡片 {card[0]}: 創建者={card[13]}, 當前用戶={current_user.id}, is_owner={is_owner}")
             
-            # 查詢該卡片的實際參與者總數（修復：不使用 participants_count 欄位）
-            cursor.execute("""
-                SELECT COUNT(*) 
-                FROM card_participants 
-                WHERE card_id = %s AND status = 'active'
-            """, (card[0],))
-            actual_participants_count = cursor.fetchone()[0]
-            
-            # 查詢該卡片的參與者頭像資訊（最多10位）
-            cursor.execute("""
-                SELECT u.User_Avatar, u.User_name, u.User_Email
-                FROM card_participants cp
-                JOIN user u ON cp.user_id = u.User_Email
-                WHERE cp.card_id = %s AND cp.status = 'active'
-                ORDER BY cp.joined_at ASC
-                LIMIT 10
-            """, (card[0],))
-            participants_avatars = cursor.fetchall()
-            
-            # 處理參與者頭像資料，使用 get_avatar_url 統一處理路徑
-            avatars_list = [
-                {
-                    'avatar': get_avatar_url(p[0]),
-                    'name': p[1] or '未命名用戶',
-                    'email': p[2]
-                }
-                for p in participants_avatars
-            ]
+            # 實際參與者總數（不使用 participants_count 欄位）與頭像（最多10位）
+            participants = participants_by_card[card[0]]
+            actual_participants_count = participants['count']
+            avatars_list = build_avatar_list(participants['participants'])
             
             cards_list.append({
                 'id': card[0],
@@ -883,10 +796,6 @@ def get_task_cards():
                 }
             })
         
-        # 關閉資料庫連線
-        cursor.close()
-        conn.close()
-        
         return jsonify({
             'success': True,
             'cards': cards_list
@@ -1002,17 +911,20 @@ def update_daily_progress(card_id):
     """更新每日完成進度API"""
     try:
         action = request.json.get('action', 'increment')  # increment 或 decrement
+        if action not in ('increment', 'decrement'):
+            return jsonify({'success': False, 'message': '無效的操作類型'})
         
         conn = db.get_connection()
         cursor = conn.cursor()
         
         # 檢查用戶是否有權限操作此卡片（創建者或參與者）
         cursor.execute("""
-            SELECT tc.daily_completed_count, tc.daily_executions, tc.last_reset_date
+            SELECT tc.daily_executions
             FROM task_cards tc
             LEFT JOIN card_participants cp ON tc.id = cp.card_id
             WHERE tc.id = %s AND (tc.user_id = %s OR cp.user_id = %s)
             AND tc.status = 'published'
+            LIMIT 1
         """, (card_id, current_user.id, current_user.id))
         
         result = cursor.fetchone()
@@ -1021,48 +933,24 @@ def update_daily_progress(card_id):
             conn.close()
             return jsonify({'success': False, 'message': '找不到該卡片或無權限操作'})
         
-        current_count, daily_limit, last_reset = result
+        daily_limit = result[0]
         
-        # 檢查是否需要重置計數（跨日檢查）
-        from datetime import date
-        today = date.today()
-        if last_reset != today:
-            # 需要重置
-            current_count = 0
-            cursor.execute("""
-                UPDATE task_cards 
-                SET daily_completed_count = 0, last_reset_date = %s
-                WHERE id = %s
-            """, (today, card_id))
-        
-        # 根據動作更新計數
-        if action == 'increment':
-            if current_count >= daily_limit:
-                cursor.close()
-                conn.close()
-                return jsonify({'success': False, 'message': '今日完成次數已達上限'})
-            new_count = current_count + 1
-        elif action == 'decrement':
-            if current_count <= 0:
-                cursor.close()
-                conn.close()
-                return jsonify({'success': False, 'message': '今日完成次數不能小於0'})
-            new_count = current_count - 1
-        else:
+        # 以條件式 UPDATE 原子加減當日完成次數（未達上限才 +1、大於 0 才 -1）
+        conn.begin()
+        try:
+            changed, new_count = change_completion(cursor, card_id, current_user.id, daily_limit,
+                                                   1 if action == 'increment' else -1)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
             cursor.close()
             conn.close()
-            return jsonify({'success': False, 'message': '無效的操作類型'})
         
-        # 更新計數
-        cursor.execute("""
-            UPDATE task_cards 
-            SET daily_completed_count = %s, last_reset_date = %s
-            WHERE id = %s
-        """, (new_count, today, card_id))
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
+        if not changed:
+            message = '今日完成次數已達上限' if action == 'increment' else '今日完成次數不能小於0'
+            return jsonify({'success': False, 'message': message})
         
         return jsonify({
             'success': True, 
@@ -1084,15 +972,20 @@ def get_task_card_progress(card_id):
         conn = db.get_connection()
         cursor = conn.cursor()
         
-        # 獲取卡片進度信息
+        from datetime import date, datetime
+        today = date.today()
+        
+        # 獲取卡片進度信息（今日完成次數讀取當前用戶的每日完成紀錄）
         cursor.execute("""
-            SELECT tc.daily_completed_count, tc.daily_executions, tc.last_reset_date,
+            SELECT COALESCE(tcc.completed_count, 0), tc.daily_executions,
                    tc.end_date, tc.participants_count, tc.max_participants, tc.created_at
             FROM task_cards tc
             LEFT JOIN card_participants cp ON tc.id = cp.card_id
+            LEFT JOIN task_card_completions tcc
+                   ON tcc.card_id = tc.id AND tcc.user_email = %s AND tcc.completion_date = %s
             WHERE tc.id = %s AND (tc.user_id = %s OR cp.user_id = %s)
             AND tc.status = 'published'
-        """, (card_id, current_user.id, current_user.id))
+        """, (current_user.id, today, card_id, current_user.id, current_user.id))
         
         result = cursor.fetchone()
         if not result:
@@ -1100,20 +993,17 @@ def get_task_card_progress(card_id):
             conn.close()
             return jsonify({'success': False, 'message': '找不到該卡片'})
         
-        daily_completed, daily_total, last_reset, end_date, participants_count, max_participants, created_at = result
+        daily_completed, daily_total, end_date, participants_count, max_participants, created_at = result
         
-        # 檢查是否需要重置每日計數
-        from datetime import date, datetime
-        today = date.today()
-        if last_reset != today:
-            daily_completed = 0
-            # 同時更新資料庫
-            cursor.execute("""
-                UPDATE task_cards 
-                SET daily_completed_count = 0, last_reset_date = %s
-                WHERE id = %s
-            """, (today, card_id))
-            conn.commit()
+        # 參與者總數與頭像（與卡片列表共用同一批次查詢）
+        participants = fetch_card_participants(cursor, [card_id])[card_id]
+        participants_count = participants['count']
+        
+        # 連續達成天數
+        streak_days = completion_streak(cursor, card_id, current_user.id, daily_total, today)
+        
+        cursor.close()
+        conn.close()
         
         # 計算天數進度
         created_date = created_at.date() if isinstance(created_at, datetime) else created_at
@@ -1121,19 +1011,6 @@ def get_task_card_progress(card_id):
         elapsed_days = (today - created_date).days + 1
         remaining_days = max(0, (end_date - today).days)
         
-        # 獲取參與者頭像信息
-        cursor.execute("""
-            SELECT u.User_Avatar, u.User_name, u.User_Email
-            FROM card_participants cp
-            JOIN user u ON cp.user_id = u.User_Email
-            WHERE cp.card_id = %s AND cp.status = 'active'
-            LIMIT 10
-        """, (card_id,))
-        participants_avatars = cursor.fetchall()
-        
-        cursor.close()
-        conn.close()
-        
         return jsonify({
             'success': True,
             'progress': {
@@ -1141,7 +1018,8 @@ def get_task_card_progress(card_id):
                     'completed': daily_completed,
                     'total': daily_total,
                     'percentage': round((daily_completed / daily_total) * 100, 1) if daily_total > 0 else 0,
-                    'can_increment': daily_completed < daily_total
+                    'can_increment': daily_completed < daily_total,
+                    'streak_days': streak_days
                 },
                 'timeline': {
                     'total_days': total_days,
@@ -1154,14 +1032,7 @@ def get_task_card_progress(card_id):
                     'current': participants_count,
                     'max': max_participants,
                     'percentage': round((participants_count / max_participants) * 100, 1) if max_participants > 0 else 0,
-                    'avatars': [
-                        {
-                            'avatar': get_avatar_url(p[0]),
-                            'name': p[1] or '未命名用戶',
-                            'email': p[2]
-                        }
-                        for p in participants_avatars
-                    ]
+                    'avatars': build_avatar_list(participants['participants'])
                 }
             }
         })
@@ -1180,39 +1051,15 @@ def api_friends_widget():
         conn = db.get_connection()
         cursor = conn.cursor()
         
-        # 獲取好友列表（簡化版，只包含必要信息）
-        # 修復字符集不匹配問題：使用 COLLATE 統一字符集比較
+        # 獲取好友列表（簡化版，只包含必要信息；friendships 邊表索引查詢）
         cursor.execute("""
-            SELECT 
-                CASE 
-                    WHEN fr.requester_email = %s THEN fr.receiver_email
-                    ELSE fr.requester_email
-                END as friend_email,
-                CASE 
-                    WHEN fr.requester_email = %s THEN receiver.User_name
-                    ELSE requester.User_name
-                END as friend_name,
-                CASE 
-                    WHEN fr.requester_email = %s THEN receiver.User_Avatar
-                    ELSE requester.User_Avatar
-                END as friend_avatar,
-                CASE 
-                    WHEN fr.requester_email = %s THEN receiver.user_level
-                    ELSE requester.user_level
-                END as friend_level
-                    ,
-                    CASE 
-                        WHEN fr.requester_email = %s THEN receiver.user_id
-                        ELSE requester.user_id
-                    END as friend_user_id
-            FROM friend_requests fr
-            LEFT JOIN user requester ON fr.requester_email COLLATE utf8mb4_unicode_ci = requester.User_Email COLLATE utf8mb4_unicode_ci
-            LEFT JOIN user receiver ON fr.receiver_email COLLATE utf8mb4_unicode_ci = receiver.User_Email COLLATE utf8mb4_unicode_ci
-            WHERE (fr.requester_email = %s OR fr.receiver_email = %s) 
-            AND fr.status = 'accepted'
-            ORDER BY fr.created_at DESC
+            SELECT f.friend_email, u.User_name, u.User_Avatar, u.user_level, u.user_id
+            FROM friendships f
+            LEFT JOIN user u ON f.friend_email = u.User_Email
+            WHERE f.user_email = %s
+            ORDER BY f.created_at DESC
             LIMIT 10
-    """, (current_user.id, current_user.id, current_user.id, current_user.id, current_user.id, current_user.id, current_user.id))
+        """, (current_user.id,))
         
         friends = cursor.fetchall()
         cursor.close()
@@ -1246,14 +1093,8 @@ def api_friends_stats():
         conn = db.get_connection()
         cursor = conn.cursor()
         
-        # 獲取好友總數 - 添加 COLLATE 修復字符集問題
-        cursor.execute("""
-            SELECT COUNT(*) FROM friend_requests 
-            WHERE (requester_email COLLATE utf8mb4_unicode_ci = %s 
-                   OR receiver_email COLLATE utf8mb4_unicode_ci = %s) 
-            AND status = 'accepted'
-        """, (current_user.id, current_user.id))
-        friends_count = cursor.fetchone()[0]
+        # 好友總數（好友集合快取）
+        friends_count = len(get_friend_emails(current_user.id))
         
         # 獲取待處理請求數 - 添加 COLLATE
         cursor.execute("""
@@ -1286,25 +1127,13 @@ def remove_friend():
         if not friend_email:
             return jsonify({'success': False, 'message': '缺少好友郵箱參數'})
         
+        # 檢查好友關係是否存在（好友集合快取）
+        if not are_friends(current_user.id, friend_email):
+            return jsonify({'success': False, 'message': '好友關係不存在'})
+        
         conn = db.get_connection()
         cursor = conn.cursor()
         
-        # 檢查好友關係是否存在 - 添加 COLLATE 修復字符集問題
-        cursor.execute("""
-            SELECT id FROM friend_requests 
-            WHERE ((requester_email COLLATE utf8mb4_unicode_ci = %s 
-                    AND receiver_email COLLATE utf8mb4_unicode_ci = %s) 
-                   OR (requester_email COLLATE utf8mb4_unicode_ci = %s 
-                       AND receiver_email COLLATE utf8mb4_unicode_ci = %s))
-            AND status = 'accepted'
-        """, (current_user.id, friend_email, friend_email, current_user.id))
-        
-        friendship = cursor.fetchone()
-        if not friendship:
-            cursor.close()
-            conn.close()
-            return jsonify({'success': False, 'message': '好友關係不存在'})
-        
         # 刪除好友關係 - 添加 COLLATE
         cursor.execute("""
             DELETE FROM friend_requests 
@@ -1314,6 +1143,7 @@ def remove_friend():
                        AND receiver_email COLLATE utf8mb4_unicode_ci = %s))
             AND status = 'accepted'
         """, (current_user.id, friend_email, friend_email, current_user.id))
+        remove_friendship(cursor, current_user.id, friend_email)
         
         conn.commit()
         cursor.close()
@@ -1408,6 +1238,7 @@ def accept_friend_request():
             SET status = 'accepted', updated_at = %s 
             WHERE id = %s
         """, (datetime.now(), request_id))
+        add_friendship(cursor, requester_email, current_user.id)
         
         conn.commit()
         cursor.close()
@@ -1460,6 +1291,7 @@ def reject_friend_request():
         """, (datetime.now(), request_id))
         
         conn.commit()
+        invalidate_relationship(requester_email, current_user.id)
         cursor.close()
         conn.close()
         
@@ -1514,17 +1346,7 @@ def send_card_invitation():
             return jsonify({'success': False, 'message': '任務卡片不存在或無權限邀請'})
         
         # 創建卡片快照
-        card_snapshot = {
-            'id': card_data[0],
-            'user_id': card_data[1],
-            'title': card_data[2],
-            'content': card_data[3],
-            'stamp_icon': card_data[4],
-            'daily_executions': card_data[5],
-            'duration_days': card_data[6],
-            'max_participants': card_data[7],
-            'created_at': card_data[8].isoformat() if card_data[8] else None
-        }
+        card_snapshot = build_card_snapshot(card_data)
         
         # 第一層去重：檢查現有待處理邀請
         format_strings = ','.join(['%s'] * len(receiver_emails))
@@ -1545,20 +1367,8 @@ def send_card_invitation():
                 'existing_invitations': existing_invitations
             })
         
-        # 驗證接收者都是好友
-        cursor.execute(f"""
-            SELECT DISTINCT 
-                CASE 
-                    WHEN fr.requester_email = %s THEN fr.receiver_email 
-                    ELSE fr.requester_email 
-                END as friend_email
-            FROM friend_requests fr
-            WHERE ((fr.requester_email = %s AND fr.receiver_email IN ({format_strings}))
-                   OR (fr.receiver_email = %s AND fr.requester_email IN ({format_strings})))
-            AND fr.status = 'accepted'
-        """, [current_user.id, current_user.id] + new_receiver_emails + [current_user.id] + new_receiver_emails)
-        
-        friends = [row[0] for row in cursor.fetchall()]
+        # 驗證接收者都是好友（好友集合快取）
+        friends = friends_among(current_user.id, new_receiver_emails)
         non_friends = [email for email in new_receiver_emails if email not in friends]
         
         if non_friends:
@@ -1569,43 +1379,26 @@ def send_card_invitation():
                 'message': f'部分用戶不是您的好友：{", ".join(non_friends)}'
             })
         
-        # 批量插入邀請記錄
-        invitation_records = []
-        import json
-        for receiver_email in new_receiver_emails:
-            invitation_records.append((
-                card_id,
-                current_user.id,
-                receiver_email,
-                'pending',
-                invitation_message,
-                json.dumps(card_snapshot, ensure_ascii=False)
-            ))
-        
-        cursor.executemany("""
-            INSERT INTO card_invitations 
-            (card_id, sender_email, receiver_email, status, invitation_message, card_snapshot)
-            VALUES (%s, %s, %s, %s, %s, %s)
-        """, invitation_records)
-        
+        # 快照每個卡片版本只存一份，整批邀請以一次多列 INSERT 寫入並取回邀請ID
+        conn.begin()
+        snapshot_id = get_or_create_snapshot(cursor, card_id, card_snapshot)
+        invitation_ids = insert_invitations(cursor, card_id, current_user.id, new_receiver_emails,
+                                            invitation_message, snapshot_id)
         conn.commit()
         cursor.close()
         conn.close()
         
         # 發送WebSocket通知給收到邀請的好友們
         try:
-            from services.socketio_manager import send_invitation_notification
-            for receiver_email in new_receiver_emails:
-                invitation_data = {
-                    'id': None,  # 由於是批量插入，暫不獲取具體ID
-                    'card_id': card_id,
-                    'sender_email': current_user.id,
-                    'sender_name': getattr(current_user, 'username', current_user.id),
-                    'card_title': card_snapshot.get('title', ''),
-                    'invitation_message': invitation_message,
-                    'card_snapshot': card_snapshot
-                }
-                send_invitation_notification(receiver_email, invitation_data)
+            from services.socketio_manager import send_invitation_notifications
+            send_invitation_notifications(invitation_ids, {
+                'card_id': card_id,
+                'sender_email': current_user.id,
+                'sender_name': getattr(current_user, 'username', current_user.id),
+                'card_title': card_snapshot.get('title', ''),
+                'invitation_message': invitation_message,
+                'card_snapshot': card_snapshot
+            })
         except Exception as ws_error:
             logger.warning(f"WebSocket通知發送失敗: {ws_error}")
         
@@ -1615,7 +1408,8 @@ def send_card_invitation():
             'success': True,
             'message': f'已成功發送 {len(new_receiver_emails)} 份邀請',
             'sent_count': len(new_receiver_emails),
-            'skipped_count': len(existing_invitations)
+            'skipped_count': len(existing_invitations),
+            'invitation_ids': invitation_ids
         })
         
     except Exception as e:
@@ -1637,21 +1431,18 @@ def get_card_invitations():
         # 獲取收到的待處理邀請
         cursor.execute("""
             SELECT ci.id, ci.card_id, ci.sender_email, ci.invitation_message, 
-                   ci.card_snapshot, ci.created_at,
+                   COALESCE(cs.snapshot, ci.card_snapshot), ci.created_at,
                    u.User_name, u.User_Avatar, u.user_id
             FROM card_invitations ci
             JOIN user u ON ci.sender_email = u.User_Email
+            LEFT JOIN card_snapshots cs ON cs.id = ci.snapshot_id
             WHERE ci.receiver_email = %s AND ci.status = 'pending'
             ORDER BY ci.created_at DESC
         """, (current_user.id,))
         
         invitations = []
-        import json
         for row in cursor.fetchall():
-            try:
-                card_snapshot = json.loads(row[4]) if row[4] else {}
-            except:
-                card_snapshot = {}
+            card_snapshot = load_snapshot(row[4])
                 
             invitations.append({
                 'id': row[0],
@@ -1700,7 +1491,7 @@ def respond_card_invitation():
         
         # 驗證邀請存在且屬於當前用戶
         cursor.execute("""
-            SELECT ci.card_id, ci.sender_email, ci.card_snapshot, ci.status
+            SELECT ci.card_id, ci.sender_email, ci.snapshot_id, ci.status
             FROM card_invitations ci
             WHERE ci.id = %s AND ci.receiver_email = %s
         """, (invitation_id, current_user.id))
@@ -1748,7 +1539,7 @@ def respond_card_invitation():
         
         # 發送WebSocket回應通知給邀請者
         try:
-            from services.socketio_manager import send_invitation_response_notification
+            from services.socketio_manager import broadcast_invitation_update, send_invitation_response_notification
             response_data = {
                 'invitation_id': invitation_id,
                 'card_id': card_id,
@@ -1758,6 +1549,9 @@ def respond_card_invitation():
                 'status': new_status
             }
             send_invitation_response_notification(sender_email, response_data)
+            if action == 'accept':
+                # 參與者名單有變動，通知卡片的其他參與者
+                broadcast_invitation_update(invitation_id, new_status, card_id)
         except Exception as ws_error:
             logger.warning(f"WebSocket回應通知發送失敗: {ws_error}")
         
@@ -1914,11 +1708,13 @@ def get_stored_cards():
         """, (current_user.id, current_user.id))
         
         cards_data = cursor.fetchall()
+        participants_by_card = fetch_card_participants(cursor, [card[0] for card in cards_data])
         cursor.close()
         conn.close()
         
         cards_list = []
         for card in cards_data:
+            participants = participants_by_card[card[0]]
             cards_list.append({
                 'id': card[0],
                 'title': card[1],
@@ -1929,7 +1725,12 @@ def get_stored_cards():
                 'status': card[6],
                 'created_at': card[7].strftime('%Y-%m-%d %H:%M:%S') if card[7] else '',
                 'updated_at': card[8].strftime('%Y-%m-%d %H:%M:%S') if card[8] else '',
-                'user_id': card[9]
+                'user_id': card[9],
+                'participants': {
+                    'current': participants['count'],
+                    'max': card[5],
+                    'avatars': build_avatar_list(participants['participants'])
+                }
             })
         
         logger.info(f"[獲取結算卡片API] 返回 {len(cards_list)} 個已結算卡片")
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+任務卡片每日完成進度模組
+
+每日完成次數改記錄於 task_card_completions（migrations/010_task_card_completions.sql），
+每張卡片、每位用戶、每天一列：
+- change_completion()：以條件式 UPDATE 原子加減（未達上限才 +1、大於 0 才 -1），
+  不再「讀出 → 計算 → 寫回」，併發點擊不會互相覆蓋
+- 讀取 API 只讀取當日列，不再於跨日時順便重置（讀取不取得寫入鎖）
+- completion_streak()：依每日歷史計算連續達成天數
+- task_cards.daily_completed_count 保留為當日全卡總計，
+  由 run_daily_progress_rollover() 於每日午夜統一歸零
+
+環境變數：
+- DAILY_PROGRESS_ROLLOVER: 是否啟動午夜歸零排程（預設: 啟用；0 表示停用）
+"""
+
+import logging
+import os
+import time
+from datetime import date, datetime, timedelta
+
+from utils import db
+
+DAILY_PROGRESS_ROLLOVER = os.environ.get("DAILY_PROGRESS_ROLLOVER", "1").lower() not in ("0", "false", "no")
+
+# 計算連續天數時最多回溯的天數
+STREAK_LOOKBACK_DAYS = 366
+
+
+def change_completion(database_cursor, card_id, user_email, daily_limit, delta, today=None):
+    """
+    原子性地加減用戶當日的完成次數（呼叫端負責交易）
+
+    Args:
+        database_cursor: 資料庫游標
+        card_id (int): 卡片ID
+        user_email (str): 用戶 email
+        daily_limit (int): 每日完成次數上限
+        delta (int): 1（完成）或 -1（取消完成）
+        today (date): 計數日期（預設: 今天）
+
+    Returns:
+        tuple: (是否有變動, 變動後的當日完成次數)；已達上限或已為 0 時不變動
+    """
+    today = today or date.today()
+    database_cursor.execute("""
+        INSERT IGNORE INTO task_card_completions (card_id, user_email, completion_date, completed_count)
+        VALUES (%s, %s, %s, 0)
+    """, (card_id, user_email, today))
+
+    if delta > 0:
+        database_cursor.execute("""
+            UPDATE task_card_completions
+            SET completed_count = completed_count + 1
+            WHERE card_id = %s AND user_email = %s AND completion_date = %s AND completed_count < %s
+        """, (card_id, user_email, today, daily_limit))
+    else:
+        database_cursor.execute("""
+            UPDATE task_card_completions
+            SET completed_count = completed_count - 1
+            WHERE card_id = %s AND user_email = %s AND completion_date = %s AND completed_count > 0
+        """, (card_id, user_email, today))
+    changed = database_cursor.rowcount > 0
+
+    if changed:
+        # 當日全卡總計：午夜排程尚未執行時（例如跨日時服務未啟動）先視為 0
+        database_cursor.execute("""
+            UPDATE task_cards
+            SET daily_completed_count = GREATEST(IF(last_reset_date = %s, daily_completed_count, 0) + %s, 0),
+                last_reset_date = %s
+            WHERE id = %s
+        """, (today, 1 if delta > 0 else -1, today, card_id))
+
+    database_cursor.execute("""
+        SELECT completed_count FROM task_card_completions
+        WHERE card_id = %s AND user_email = %s AND completion_date = %s
+    """, (card_id, user_email, today))
+    return changed, database_cursor.fetchone()[0]
+
+
+def completion_streak(database_cursor, card_id, user_email, daily_limit, today=None):
+    """
+    連續達成天數（今天尚未達成時從昨天起算）
+
+    Returns:
+        int: 連續完成次數達到每日上限的天數
+    """
+    today = today or date.today()
+    database_cursor.execute("""
+        SELECT completion_date FROM task_card_completions
+        WHERE card_id = %s AND user_email = %s AND completion_date BETWEEN %s AND %s
+          AND completed_count >= %s
+        ORDER BY completion_date DESC
+    """, (card_id, user_email, today - timedelta(days=STREAK_LOOKBACK_DAYS), today, daily_limit))
+    completed_days = [row[0] for row in database_cursor.fetchall()]
+
+    expected = today if completed_days and completed_days[0] == today else today - timedelta(days=1)
+    streak = 0
+    for completed_day in completed_days:
+        if completed_day != expected:
+            break
+        streak += 1
+        expected -= timedelta(days=1)
+    return streak
+
+
+def rollover_daily_counters(today=None):
+    """
+    將前一天以前的全卡當日總計歸零（一次批次 UPDATE）
+
+    Returns:
+        int: 歸零的卡片數
+    """
+    today = today or date.today()
+    with db.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            UPDATE task_cards
+            SET daily_completed_count = 0, last_reset_date = %s
+            WHERE last_reset_date < %s OR last_reset_date IS NULL
+        """, (today, today))
+        reset_count = cursor.rowcount
+        conn.commit()
+        cursor.close()
+    return reset_count
+
+
+def _seconds_until_midnight():
+    now = datetime.now()
+    next_midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+    # 多等一秒，確保 date.today() 已是新的一天
+    return (next_midnight - now).total_seconds() + 1
+
+
+def run_daily_progress_rollover():
+    """啟動時先補做一次歸零，之後每日午夜執行（由 app.py 以 socketio.start_background_task 啟動）"""
+    while True:
+        try:
+            reset_count = rollover_daily_counters()
+            logging.info(f"[DailyProgress] 每日計數歸零 {reset_count} 張卡片")
+        except Exception as e:
+            logging.error(f"[DailyProgress] 每日計數歸零失敗: {e}")
+        time.sleep(_seconds_until_midnight())
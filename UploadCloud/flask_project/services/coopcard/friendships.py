@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+"""
+好友關係存取與快取模組
+
+好友關係存放於 friendships 邊表（migrations/009_friendships.sql），每段關係存兩列，
+好友列表與「是否為好友」都是以 user_email 開頭的索引查詢。
+
+- add_friendship() / remove_friendship()：接受好友請求、刪除好友時維護邊表，並清除雙方快取
+- get_friend_emails()：用戶的好友 email 集合，行程內快取
+- are_friends() / friends_among()：好友檢查直接查快取
+- resolve_relationships()：搜尋結果的好友狀態，一次查詢判斷整批用戶，結果短期快取
+
+快取為行程內 LRU，寫入時清除雙方項目；多個 worker 行程時，
+其他行程的快取最多保留 FRIEND_CACHE_TTL / RELATIONSHIP_CACHE_TTL 秒。
+
+環境變數：
+- FRIEND_CACHE_TTL: 好友集合快取秒數（預設: 300；0 表示不快取）
+- FRIEND_CACHE_MAX_USERS: 快取的用戶數上限（預設: 10000）
+- RELATIONSHIP_CACHE_TTL: 搜尋結果好友狀態快取秒數（預設: 10；0 表示不快取）
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from utils import db
+
+FRIEND_CACHE_TTL = int(os.environ.get("FRIEND_CACHE_TTL", 300))
+FRIEND_CACHE_MAX_USERS = int(os.environ.get("FRIEND_CACHE_MAX_USERS", 10000))
+RELATIONSHIP_CACHE_TTL = int(os.environ.get("RELATIONSHIP_CACHE_TTL", 10))
+
+
+class FriendSetCache:
+    """用戶 email → 好友 email 集合的 LRU 快取（含過期時間）"""
+
+    def __init__(self, ttl=FRIEND_CACHE_TTL, max_users=FRIEND_CACHE_MAX_USERS):
+        self.ttl = ttl
+        self.max_users = max_users
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_email):
+        with self._lock:
+            entry = self._entries.get(user_email)
+            if entry is None:
+                return None
+            friends, expires_at = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[user_email]
+                return None
+            self._entries.move_to_end(user_email)
+            return friends
+
+    def set(self, user_email, friends):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[user_email] = (friends, time.monotonic() + self.ttl)
+            self._entries.move_to_end(user_email)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *user_emails):
+        with self._lock:
+            for user_email in user_emails:
+                self._entries.pop(user_email, None)
+
+
+_friend_cache = FriendSetCache()
+
+
+def add_friendship(database_cursor, user_email, friend_email):
+    """
+    寫入雙向好友關係（已存在時忽略）並清除雙方快取
+
+    Args:
+        database_cursor: 資料庫游標（與更新 friend_requests 的語句共用連線）
+        user_email (str): 用戶 email
+        friend_email (str): 好友 email
+    """
+    database_cursor.execute("""
+        INSERT IGNORE INTO friendships (user_email, friend_email, created_at)
+        VALUES (%s, %s, NOW()), (%s, %s, NOW())
+    """, (user_email, friend_email, friend_email, user_email))
+    _friend_cache.invalidate(user_email, friend_email)
+    invalidate_relationship(user_email, friend_email)
+
+
+def remove_friendship(database_cursor, user_email, friend_email):
+    """
+    移除雙向好友關係並清除雙方快取
+
+    Returns:
+        int: 刪除的列數（0 表示原本就不是好友）
+    """
+    database_cursor.execute("""
+        DELETE FROM friendships
+        WHERE (user_email = %s AND friend_email = %s)
+           OR (user_email = %s AND friend_email = %s)
+    """, (user_email, friend_email, friend_email, user_email))
+    _friend_cache.invalidate(user_email, friend_email)
+    invalidate_relationship(user_email, friend_email)
+    return database_cursor.rowcount
+
+
+def get_friend_emails(user_email):
+    """
+    取得用戶的所有好友 email
+
+    Returns:
+        frozenset: 好友 email 集合
+    """
+    friends = _friend_cache.get(user_email)
+    if friends is not None:
+        return friends
+
+    # 讀主庫：剛接受請求的另一方也要立即看到新好友，避免把副本延遲的結果寫進快取
+    with db.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT friend_email FROM friendships WHERE user_email = %s", (user_email,))
+        friends = frozenset(row[0] for row in cursor.fetchall())
+        cursor.close()
+
+    _friend_cache.set(user_email, friends)
+    return friends
+
+
+def are_friends(user_email, other_email):
+    """兩位用戶是否為好友"""
+    return other_email in get_friend_emails(user_email)
+
+
+def friends_among(user_email, emails):
+    """
+    篩選出清單中屬於用戶好友的 email（保留原順序）
+
+    Returns:
+        list: 是好友的 email
+    """
+    friends = get_friend_emails(user_email)
+    return [email for email in emails if email in friends]
+
+
+# ─────────────────────── 搜尋結果的好友狀態（批次查詢 + 短期快取）
+
+# 好友狀態 → 搜尋結果按鈕顯示
+RELATIONSHIP_BUTTONS = {
+    'friends': {'status_text': '已成為好友!', 'button_class': 'status-friends', 'button_disabled': True},
+    'request_sent': {'status_text': '請求已發送', 'button_class': 'status-pending', 'button_disabled': True},
+    'request_received': {'status_text': '已收到請求', 'button_class': 'status-received', 'button_disabled': True},
+    'can_send': {'status_text': '發送好友請求', 'button_class': 'status-can-send', 'button_disabled': False},
+}
+
+
+class RelationshipCache:
+    """
+    查詢者 email → {對象 email: (好友狀態, 過期時間)} 的 LRU 快取
+
+    邊打字邊搜尋時，連續的關鍵字多半命中相同用戶，短期快取即可省下重複查詢。
+    """
+
+    def __init__(self, ttl=RELATIONSHIP_CACHE_TTL, max_users=FRIEND_CACHE_MAX_USERS):
+        self.ttl = ttl
+        self.max_users = max_users
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, user_email, emails):
+        """返回 (命中的 {email: 狀態}, 未命中的 email 列表)"""
+        now = time.monotonic()
+        hits = {}
+        with self._lock:
+            states = self._entries.get(user_email)
+            if states is not None:
+                self._entries.move_to_end(user_email)
+                for email in emails:
+                    cached = states.get(email)
+                    if cached and cached[1] > now:
+                        hits[email] = cached[0]
+        return hits, [email for email in emails if email not in hits]
+
+    def set_many(self, user_email, states):
+        if self.ttl <= 0 or not states:
+            return
+        now = time.monotonic()
+        expires_at = now + self.ttl
+        with self._lock:
+            entry = self._entries.setdefault(user_email, {})
+            # 移除已過期的項目，避免長時間搜尋的用戶項目持續變大
+            for email in [email for email, cached in entry.items() if cached[1] <= now]:
+                del entry[email]
+            entry.update((email, (state, expires_at)) for email, state in states.items())
+            self._entries.move_to_end(user_email)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+
+    def invalidate_pair(self, user_email, other_email):
+        with self._lock:
+            for viewer, target in ((user_email, other_email), (other_email, user_email)):
+                states = self._entries.get(viewer)
+                if states:
+                    states.pop(target, None)
+
+
+_relationship_cache = RelationshipCache()
+
+
+def invalidate_relationship(user_email, other_email):
+    """兩位用戶間的好友請求變動後（發送、拒絕、接受、刪除），清除雙方的狀態快取"""
+    _relationship_cache.invalidate_pair(user_email, other_email)
+
+
+def resolve_relationships(user_email, candidate_emails):
+    """
+    批次判斷用戶與多位對象的好友狀態
+
+    已是好友的對象直接由好友集合快取判斷；其餘對象的待處理請求以一次查詢取得。
+
+    Args:
+        user_email (str): 查詢者 email
+        candidate_emails (list): 對象 email 列表（例如搜尋結果）
+
+    Returns:
+        dict: email -> 'friends' / 'request_sent' / 'request_received' / 'can_send'
+    """
+    states, missing = _relationship_cache.get_many(user_email, candidate_emails)
+    if not missing:
+        return states
+
+    friends = get_friend_emails(user_email)
+    resolved = {email: 'friends' for email in missing if email in friends}
+    pending_candidates = [email for email in missing if email not in friends]
+
+    if pending_candidates:
+        placeholders = ', '.join(['%s'] * len(pending_candidates))
+        with db.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT requester_email, receiver_email
+                FROM friend_requests
+                WHERE status = 'pending'
+                  AND ((requester_email = %s AND receiver_email IN ({placeholders}))
+                       OR (receiver_email = %s AND requester_email IN ({placeholders})))
+            """, (user_email, *pending_candidates, user_email, *pending_candidates))
+            for requester_email, receiver_email in cursor.fetchall():
+                if requester_email == user_email:
+                    resolved[receiver_email] = 'request_sent'
+                else:
+                    resolved.setdefault(requester_email, 'request_received')
+            cursor.close()
+
+    for email in pending_candidates:
+        resolved.setdefault(email, 'can_send')
+
+    _relationship_cache.set_many(user_email, resolved)
+    states.update(resolved)
+    return states
+
+
+def relationship_fields(state):
+    """好友狀態轉換為搜尋結果的按鈕欄位（friend_status、status_text、button_class、button_disabled）"""
+    return {'friend_status': state, **RELATIONSHIP_BUTTONS[state]}
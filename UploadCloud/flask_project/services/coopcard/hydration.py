@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+任務卡片參與者資料補齊（hydration）模組
+
+卡片列表、已結算卡片與單張卡片進度都需要替卡片補上：
+- 有效參與者總數
+- 最早加入的前 N 位參與者頭像
+
+過去是逐張卡片執行 COUNT 與頭像查詢（每張卡片兩次查詢）。
+本模組改為以整批卡片為單位，一次查詢取回：
+- ROW_NUMBER() OVER (PARTITION BY card_id ORDER BY joined_at) 取每張卡片前 N 位
+- COUNT(*) OVER (PARTITION BY card_id) 同時取得總數
+（需要 MySQL 8.0+；card_participants 的 idx_card_status_joined 索引可直接使用）
+"""
+
+# 每張卡片顯示的參與者頭像數
+CARD_AVATAR_LIMIT = 10
+
+
+def _placeholders(values):
+    """產生 IN (...) 查詢用的 %s 佔位符字串"""
+    return ', '.join(['%s'] * len(values))
+
+
+def fetch_card_participants(database_cursor, card_ids, limit=CARD_AVATAR_LIMIT):
+    """
+    批次取得多張卡片的有效參與者總數與前 N 位參與者
+
+    Args:
+        database_cursor: 資料庫游標
+        card_ids (list): 卡片ID列表
+        limit (int): 每張卡片取回的參與者數
+
+    Returns:
+        dict: card_id -> {'count': 有效參與者總數,
+                          'participants': [(User_Avatar, User_name, User_Email), ...]（依加入時間正序）}
+              沒有參與者的卡片 count 為 0、participants 為空列表
+    """
+    participants_by_card = {card_id: {'count': 0, 'participants': []} for card_id in card_ids}
+    if not card_ids:
+        return participants_by_card
+
+    database_cursor.execute(f"""
+        SELECT card_id, User_Avatar, User_name, User_Email, participant_count
+        FROM (
+            SELECT cp.card_id, u.User_Avatar, u.User_name, u.User_Email,
+                   ROW_NUMBER() OVER (PARTITION BY cp.card_id ORDER BY cp.joined_at ASC, cp.id ASC) AS row_num,
+                   COUNT(*) OVER (PARTITION BY cp.card_id) AS participant_count
+            FROM card_participants cp
+            JOIN user u ON cp.user_id = u.User_Email
+            WHERE cp.card_id IN ({_placeholders(card_ids)}) AND cp.status = 'active'
+        ) ranked
+        WHERE row_num <= %s
+        ORDER BY card_id, row_num
+    """, tuple(card_ids) + (limit,))
+
+    for card_id, user_avatar, user_name, user_email, participant_count in database_cursor.fetchall():
+        entry = participants_by_card.setdefault(card_id, {'count': 0, 'participants': []})
+        entry['count'] = participant_count
+        entry['participants'].append((user_avatar, user_name, user_email))
+
+    return participants_by_card
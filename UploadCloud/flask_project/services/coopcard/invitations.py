@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+任務卡片邀請寫入模組
+
+卡片快照改存於 card_snapshots（migrations/011_card_snapshots.sql），每張卡片的
+每個版本（快照內容雜湊）只存一份，邀請列只記錄 snapshot_id：
+- get_or_create_snapshot()：以 (card_id, snapshot_hash) 唯一鍵寫入或取得既有快照，一個語句取得 ID
+- insert_invitations()：一次多列 INSERT 寫入整批邀請，並返回每位接收者的邀請 ID
+- load_snapshot()：讀取時相容尚未遷移、仍存於 card_invitations.card_snapshot 的舊列
+- rehash_card_snapshots()：遷移回填的快照雜湊是 MySQL 正規化後的 JSON 文字，
+  改以與 get_or_create_snapshot() 相同的序列化重算，讓既有快照與相同內容的新快照合併
+
+命令列（執行 011_card_snapshots.sql 之後）：
+    flask coopcard rehash-snapshots
+"""
+
+import hashlib
+import json
+
+import click
+
+from utils import db
+from . import coopcard_bp
+
+
+def build_card_snapshot(card_row):
+    """
+    task_cards 資料列轉換為快照 dict
+
+    Args:
+        card_row (tuple): (id, user_id, title, content, stamp_icon, daily_executions,
+                           duration_days, max_participants, created_at)
+    """
+    return {
+        'id': card_row[0],
+        'user_id': card_row[1],
+        'title': card_row[2],
+        'content': card_row[3],
+        'stamp_icon': card_row[4],
+        'daily_executions': card_row[5],
+        'duration_days': card_row[6],
+        'max_participants': card_row[7],
+        'created_at': card_row[8].isoformat() if card_row[8] else None
+    }
+
+
+def _serialize_snapshot(snapshot):
+    """快照的 JSON 文字與內容雜湊（鍵值排序，相同內容必得相同雜湊）"""
+    snapshot_json = json.dumps(snapshot, ensure_ascii=False, sort_keys=True)
+    return snapshot_json, hashlib.sha256(snapshot_json.encode('utf-8')).hexdigest()
+
+
+def get_or_create_snapshot(database_cursor, card_id, snapshot):
+    """
+    取得卡片目前版本的快照ID（內容相同的快照只存一份）
+
+    Args:
+        database_cursor: 資料庫游標
+        card_id (int): 卡片ID
+        snapshot (dict): 卡片快照
+
+    Returns:
+        int: card_snapshots.id
+    """
+    snapshot_json, snapshot_hash = _serialize_snapshot(snapshot)
+    # 已存在時 LAST_INSERT_ID(id) 讓 lastrowid 返回既有列的 ID，不需再查詢一次
+    database_cursor.execute("""
+        INSERT INTO card_snapshots (card_id, snapshot_hash, snapshot)
+        VALUES (%s, %s, %s)
+        ON DUPLICATE KEY UPDATE id = LAST_INSERT_ID(id)
+    """, (card_id, snapshot_hash, snapshot_json))
+    return database_cursor.lastrowid
+
+
+def insert_invitations(database_cursor, card_id, sender_email, receiver_emails, invitation_message, snapshot_id):
+    """
+    以一次多列 INSERT 寫入整批待處理邀請（呼叫端負責交易）
+
+    Returns:
+        dict: 接收者 email -> 新邀請ID（與 receiver_emails 同順序）
+    """
+    if not receiver_emails:
+        return {}
+    values = ', '.join(["(%s, %s, %s, 'pending', %s, %s)"] * len(receiver_emails))
+    params = []
+    for receiver_email in receiver_emails:
+        params.extend((card_id, sender_email, receiver_email, invitation_message, snapshot_id))
+    database_cursor.execute(f"""
+        INSERT INTO card_invitations
+        (card_id, sender_email, receiver_email, status, invitation_message, snapshot_id)
+        VALUES {values}
+    """, params)
+
+    # 列數已知的多列 INSERT（simple insert）在任何 innodb_autoinc_lock_mode 下都會一次配給連續的 ID
+    # （auto_increment_increment 為預設的 1），lastrowid 為第一列的 ID
+    first_id = database_cursor.lastrowid
+    return {receiver_email: first_id + offset for offset, receiver_email in enumerate(receiver_emails)}
+
+
+def load_snapshot(snapshot_json):
+    """解析快照 JSON（COALESCE(card_snapshots.snapshot, card_invitations.card_snapshot)）；無法解析時返回空 dict"""
+    if not snapshot_json:
+        return {}
+    try:
+        return json.loads(snapshot_json)
+    except (TypeError, ValueError):
+        return {}
+
+
+def rehash_card_snapshots():
+    """
+    以 _serialize_snapshot() 重算既有快照的雜湊；同一卡片已有相同雜湊的快照時，
+    將邀請改指向該快照並刪除重複列
+
+    Returns:
+        tuple: (重算雜湊的快照數, 合併刪除的快照數)
+    """
+    rehashed = merged = 0
+    with db.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT id, card_id, snapshot_hash, snapshot FROM card_snapshots ORDER BY id")
+        for snapshot_id, card_id, stored_hash, snapshot_json in cursor.fetchall():
+            snapshot_hash = _serialize_snapshot(load_snapshot(snapshot_json))[1]
+            if snapshot_hash == stored_hash:
+                continue
+
+            conn.begin()
+            try:
+                # 鎖定唯一鍵，避免同時寫入的新快照搶先使用相同雜湊
+                cursor.execute("""
+                    SELECT id FROM card_snapshots
+                    WHERE card_id = %s AND snapshot_hash = %s
+                    FOR UPDATE
+                """, (card_id, snapshot_hash))
+                existing = cursor.fetchone()
+                if existing:
+                    cursor.execute("UPDATE card_invitations SET snapshot_id = %s WHERE snapshot_id = %s",
+                                   (existing[0], snapshot_id))
+                    cursor.execute("DELETE FROM card_snapshots WHERE id = %s", (snapshot_id,))
+                    merged += 1
+                else:
+                    cursor.execute("UPDATE card_snapshots SET snapshot_hash = %s WHERE id = %s",
+                                   (snapshot_hash, snapshot_id))
+                    rehashed += 1
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        cursor.close()
+    return rehashed, merged
+
+
+@coopcard_bp.cli.command('rehash-snapshots')
+def rehash_snapshots_command():
+    """以應用程式的序列化方式重算卡片快照雜湊（011_card_snapshots.sql 之後執行一次）"""
+    rehashed, merged = rehash_card_snapshots()
+    click.echo(f'卡片快照雜湊重算完成：更新 {rehashed} 筆，合併 {merged} 筆')
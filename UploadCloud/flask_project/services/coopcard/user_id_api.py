@@ -20,6 +20,8 @@ from utils import db
 import logging
 import re
 from . import coopcard_bp
+from .friendships import resolve_relationships, relationship_fields
+from utils.user_search_index import get_user_search_index, index_user, load_users
 
 # 設置日誌
 logger = logging.getLogger(__name__)
@@ -83,25 +85,31 @@ def check_user_id():
         }
     """
     try:
-        conn = db.get_connection()
-        cursor = conn.cursor()
-        
-        # 查詢當前用戶的 user_id
-        cursor.execute("""
-            SELECT user_id FROM user 
-            WHERE User_Email = %s
-        """, (current_user.id,))
-        
-        result = cursor.fetchone()
+        # 優先查前綴索引，索引尚未載入或不認得該用戶時查資料庫
+        index = get_user_search_index()
+        user_id_value = index.user_id_of(current_user.id) if index else None
         
-        if not result:
-            logger.error(f"用戶 {current_user.id} 在資料庫中不存在")
-            return jsonify({
-                'success': False,
-                'message': '用戶資料不存在，請重新登入'
-            }), 404
+        if user_id_value is None:
+            conn = db.get_connection()
+            cursor = conn.cursor()
+            
+            # 查詢當前用戶的 user_id
+            cursor.execute("""
+                SELECT user_id FROM user 
+                WHERE User_Email = %s
+            """, (current_user.id,))
+            
+            result = cursor.fetchone()
+            
+            if not result:
+                logger.error(f"用戶 {current_user.id} 在資料庫中不存在")
+                return jsonify({
+                    'success': False,
+                    'message': '用戶資料不存在，請重新登入'
+                }), 404
+            
+            user_id_value = result[0]
         
-        user_id_value = result[0]
         has_user_id = user_id_value is not None and user_id_value.strip() != ''
         
         logger.info(f"用戶 {current_user.id} user_id 檢查結果: {has_user_id}")
@@ -158,16 +166,23 @@ def validate_user_id():
                 'message': format_result['message']
             })
         
-        # 唯一性檢查
-        conn = db.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT User_Email FROM user 
-            WHERE user_id = %s
-        """, (user_id,))
+        # 唯一性檢查：優先查前綴索引（每次按鍵都會呼叫），索引尚未載入時查資料庫
+        # 建立時 create_user_id 仍會在交易內以資料庫再次確認
+        index = get_user_search_index()
+        owner_email = index.user_id_owner(user_id) if index else None
         
-        existing_user = cursor.fetchone()
+        if owner_email is not None:
+            existing_user = (owner_email,) if owner_email else None
+        else:
+            conn = db.get_connection()
+            cursor = conn.cursor()
+            
+            cursor.execute("""
+                SELECT User_Email FROM user 
+                WHERE user_id = %s
+            """, (user_id,))
+            
+            existing_user = cursor.fetchone()
         
         if existing_user:
             # 檢查是否是當前用戶自己的 user_id
@@ -307,6 +322,7 @@ def create_user_id():
             
             # 提交事務
             conn.commit()
+            index_user(current_user.id, user_id=user_id)
             
             logger.info(f"用戶 {current_user.id} 成功創建 user_id: {user_id}")
             
@@ -330,6 +346,38 @@ def create_user_id():
         if 'conn' in locals():
             conn.close()
 
+def _search_users_by_like(cursor, search_query, exclude_email):
+    """前綴索引尚未載入時的資料庫搜尋（LIKE 模糊比對 user_id、User_Email 和 User_name）"""
+    search_pattern = f'%{search_query}%'
+    
+    # 擴展搜尋以支援 user_id - 添加 COLLATE 修復字符集問題
+    cursor.execute("""
+        SELECT User_Email, User_name, User_Avatar, bio, user_level, user_id
+        FROM user 
+        WHERE (
+            User_Email COLLATE utf8mb4_unicode_ci LIKE %s 
+            OR User_name COLLATE utf8mb4_unicode_ci LIKE %s 
+            OR (user_id IS NOT NULL AND user_id COLLATE utf8mb4_unicode_ci LIKE %s)
+        )
+        AND User_Email COLLATE utf8mb4_unicode_ci != %s
+        ORDER BY 
+            CASE 
+                WHEN user_id COLLATE utf8mb4_unicode_ci = %s THEN 0
+                WHEN user_id COLLATE utf8mb4_unicode_ci LIKE %s THEN 1
+                WHEN User_name COLLATE utf8mb4_unicode_ci LIKE %s THEN 2
+                WHEN User_Email COLLATE utf8mb4_unicode_ci LIKE %s THEN 3
+                ELSE 4
+            END,
+            User_name
+        LIMIT 10
+    """, (
+        search_pattern, search_pattern, search_pattern,  # WHERE 條件
+        exclude_email,  # 排除自己
+        search_query,  # 精確匹配 user_id
+        search_pattern, search_pattern, search_pattern  # ORDER BY 條件
+    ))
+    return cursor.fetchall()
+
 # 擴展好友搜尋功能，支援 user_id 搜尋
 @coopcard_bp.route('/api/search_users_extended', methods=['GET'])
 @login_required  
@@ -365,37 +413,21 @@ def search_users_extended():
         conn = db.get_connection()
         cursor = conn.cursor()
         
-        search_pattern = f'%{search_query}%'
-        
-        # 擴展搜尋以支援 user_id - 添加 COLLATE 修復字符集問題
-        cursor.execute("""
-            SELECT User_Email, User_name, User_Avatar, bio, user_level, user_id
-            FROM user 
-            WHERE (
-                User_Email COLLATE utf8mb4_unicode_ci LIKE %s 
-                OR User_name COLLATE utf8mb4_unicode_ci LIKE %s 
-                OR (user_id IS NOT NULL AND user_id COLLATE utf8mb4_unicode_ci LIKE %s)
-            )
-            AND User_Email COLLATE utf8mb4_unicode_ci != %s
-            ORDER BY 
-                CASE 
-                    WHEN user_id COLLATE utf8mb4_unicode_ci = %s THEN 0
-                    WHEN user_id COLLATE utf8mb4_unicode_ci LIKE %s THEN 1
-                    WHEN User_name COLLATE utf8mb4_unicode_ci LIKE %s THEN 2
-                    WHEN User_Email COLLATE utf8mb4_unicode_ci LIKE %s THEN 3
-                    ELSE 4
-                END,
-                User_name
-            LIMIT 10
-        """, (
-            search_pattern, search_pattern, search_pattern,  # WHERE 條件
-            current_user.id,  # 排除自己
-            search_query,  # 精確匹配 user_id
-            search_pattern, search_pattern, search_pattern  # ORDER BY 條件
-        ))
+        # 優先以前綴索引搜尋，再以主鍵載入資料列；索引尚未載入時改用 LIKE 查詢
+        index = get_user_search_index()
+        matched_emails = index.search(search_query, exclude_email=current_user.id, limit=10) if index else None
+        
+        if matched_emails is not None:
+            rows = load_users(cursor, matched_emails,
+                              'User_Email, User_name, User_Avatar, bio, user_level, user_id')
+        else:
+            rows = _search_users_by_like(cursor, search_query, current_user.id)
+        
+        # 一次判斷所有搜尋結果與當前用戶的好友狀態（短期快取，連續輸入時重複使用）
+        relationships = resolve_relationships(current_user.id, [row[0] for row in rows])
         
         users = []
-        for row in cursor.fetchall():
+        for row in rows:
             user_email, user_name, user_avatar, bio, user_level, user_id = row
             
             # 判斷匹配類型以提供更好的搜尋體驗
@@ -412,7 +444,8 @@ def search_users_extended():
                 'bio': bio,
                 'user_level': user_level,
                 'user_id': user_id,
-                'match_type': match_type
+                'match_type': match_type,
+                **relationship_fields(relationships[user_email])
             })
         
         logger.info(f"用戶 {current_user.id} 搜尋 '{search_query}' 找到 {len(users)} 個結果")
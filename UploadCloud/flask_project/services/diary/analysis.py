@@ -0,0 +1,228 @@
+"""
+日記 AI 分析背景管線
+
+save_diary() 過去在請求內同步呼叫 Dify（無逾時），使用者必須等待整個 LLM 回應，
+Dify 故障時整篇日記也無法儲存。改為：
+1. 日記內容立即加密寫入，Analysis_status = 'pending'
+2. 分析工作放入佇列，由背景 worker（eventlet green thread）透過共用 Dify 用戶端呼叫，
+   用戶端重試仍失敗時，工作層再以較長的指數退避重試
+3. 分析完成後加密寫回 AI_analysis_content，並透過 Socket.IO /diary 命名空間推送給該用戶
+
+加密金鑰只存在於使用者 session，工作僅在記憶體中持有金鑰與明文，不寫入資料庫；
+行程重啟造成遺失的工作，會在使用者下次開啟日記列表時由 requeue_stale_analyses() 補送。
+
+環境變數：
+- DIARY_ANALYSIS_WORKERS: 背景 worker 數量（預設 4）
+"""
+
+import logging
+import os
+import queue
+import random
+import threading
+import time
+
+import requests
+
+from services.ai.dify_client import get_dify_client
+from utils import db
+from utils.encryption import encrypt
+
+# 共用用戶端用途名稱（逾時與重試設定見 services/ai/dify_client.py）
+DIFY_CLIENT_NAME = 'diary'
+
+ANALYSIS_WORKERS = int(os.getenv("DIARY_ANALYSIS_WORKERS", 4))
+ANALYSIS_QUEUE_SIZE = 1000
+ANALYSIS_MAX_ATTEMPTS = 3
+RETRY_BASE_DELAY = 2
+
+# 超過此秒數仍為 pending 的日記視為工作遺失，可重新排入佇列
+ANALYSIS_STALE_SECONDS = 120
+# failed 的日記距上次失敗超過此秒數才重新排入，且累計嘗試次數未達上限
+# （Dify 故障期間，每次開啟日記列表都重送會放大故障）
+ANALYSIS_RETRY_SECONDS = 600
+ANALYSIS_MAX_TOTAL_ATTEMPTS = ANALYSIS_MAX_ATTEMPTS * 3
+
+STATUS_PENDING = 'pending'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+
+ANALYSIS_NAMESPACE = '/diary'
+ANALYSIS_EVENT = 'diary_analysis'
+
+_job_queue = queue.Queue(maxsize=ANALYSIS_QUEUE_SIZE)
+_inflight_diary_ids = set()
+_workers_lock = threading.Lock()
+_workers_started = False
+
+
+def _ensure_workers():
+    """第一次排入工作時啟動背景 worker"""
+    global _workers_started
+    if _workers_started:
+        return
+
+    from services.socketio_manager import socketio
+
+    with _workers_lock:
+        if _workers_started:
+            return
+        for _ in range(ANALYSIS_WORKERS):
+            socketio.start_background_task(_worker_loop)
+        _workers_started = True
+
+
+def enqueue_analysis(diary_id, user_email, query, aes_key):
+    """
+    將日記分析工作排入背景佇列
+
+    Args:
+        diary_id (int): 日記ID
+        user_email (str): 用戶Email（推送對象）
+        query (str): 送往 Dify 的明文內容
+        aes_key (bytes): 加密分析結果用的金鑰
+
+    Returns:
+        bool: 是否成功排入（佇列已滿或已在處理中時返回 False，日記維持 pending 稍後補送）
+    """
+    if diary_id in _inflight_diary_ids:
+        return False
+
+    _ensure_workers()
+
+    try:
+        _job_queue.put_nowait({
+            'diary_id': diary_id,
+            'user_email': user_email,
+            'query': query,
+            'aes_key': aes_key
+        })
+    except queue.Full:
+        logging.warning(f"日記分析佇列已滿，diary_id={diary_id} 稍後補送")
+        return False
+
+    _inflight_diary_ids.add(diary_id)
+    return True
+
+
+def request_dify_analysis(query):
+    """
+    呼叫 Dify 取得情緒分析
+
+    Args:
+        query (str): 日記內容
+
+    Returns:
+        str: 分析結果
+
+    Raises:
+        requests.RequestException: 連線失敗、逾時、斷路器開啟或非 2xx 回應
+    """
+    result = get_dify_client(DIFY_CLIENT_NAME).chat(
+        query, user="normaluser", inputs={"question": query}
+    )
+    return result.get('answer', '無法取得分析結果')
+
+
+def _worker_loop():
+    """背景 worker：持續從佇列取出工作處理"""
+    while True:
+        job = _job_queue.get()
+        try:
+            _process_job(job)
+        except Exception as e:
+            logging.error(f"日記分析工作失敗 diary_id={job['diary_id']}: {str(e)}")
+        finally:
+            _inflight_diary_ids.discard(job['diary_id'])
+            _job_queue.task_done()
+
+
+def _process_job(job):
+    """執行一筆分析工作（含重試），完成後寫回資料庫並推送結果"""
+    diary_id = job['diary_id']
+    last_error = None
+
+    for attempt in range(1, ANALYSIS_MAX_ATTEMPTS + 1):
+        try:
+            ai_result = request_dify_analysis(job['query'])
+            break
+        except (requests.RequestException, ValueError) as e:
+            last_error = e
+            logging.warning(f"Dify 日記分析失敗 diary_id={diary_id} 第 {attempt} 次: {str(e)}")
+            if attempt < ANALYSIS_MAX_ATTEMPTS:
+                # 指數退避加上隨機抖動，避免 Dify 恢復時同時湧入
+                time.sleep(RETRY_BASE_DELAY * (2 ** (attempt - 1)) + random.uniform(0, 1))
+    else:
+        _save_result(diary_id, job['user_email'], None, STATUS_FAILED, ANALYSIS_MAX_ATTEMPTS)
+        _push_result(job['user_email'], diary_id, STATUS_FAILED, None, str(last_error))
+        return
+
+    ai_result = str(ai_result) if ai_result else "（無AI分析）"
+    _save_result(diary_id, job['user_email'], encrypt(ai_result, job['aes_key']), STATUS_DONE, attempt)
+    _push_result(job['user_email'], diary_id, STATUS_DONE, ai_result)
+
+
+def _save_result(diary_id, user_email, enc_analysis, status, attempts):
+    """寫回分析結果與狀態"""
+    database_connection = db.get_connection()
+    try:
+        database_cursor = database_connection.cursor()
+        database_cursor.execute("""
+            UPDATE DiaryRecords
+            SET AI_analysis_content = COALESCE(%s, AI_analysis_content),
+                Analysis_status = %s,
+                Analysis_attempts = Analysis_attempts + %s
+            WHERE Diary_id = %s AND User_Email = %s
+        """, (enc_analysis, status, attempts, diary_id, user_email))
+        database_connection.commit()
+    finally:
+        database_connection.close()
+
+
+def _push_result(user_email, diary_id, status, analysis, error=None):
+    """透過 Socket.IO 推送分析結果給該用戶的所有連線"""
+    from services.socketio_manager import socketio, user_room
+
+    payload = {'diary_id': diary_id, 'status': status, 'analysis': analysis}
+    if error:
+        payload['message'] = 'AI 分析暫時無法完成，稍後將自動重試'
+
+    socketio.emit(ANALYSIS_EVENT, payload, room=user_room(user_email), namespace=ANALYSIS_NAMESPACE)
+
+
+def requeue_stale_analyses(database_cursor, user_email, diaries, aes_key):
+    """
+    將遺失或失敗的分析工作重新排入佇列（於使用者持有金鑰時呼叫）
+
+    failed 的日記需距上次失敗 ANALYSIS_RETRY_SECONDS 秒以上，
+    且累計嘗試次數未達 ANALYSIS_MAX_TOTAL_ATTEMPTS 才會重送
+
+    Args:
+        database_cursor: 資料庫游標
+        user_email (str): 用戶Email
+        diaries (dict): diary_id -> 已解密的日記內容
+        aes_key (bytes): 加密金鑰
+
+    Returns:
+        int: 重新排入的工作數
+    """
+    if not diaries:
+        return 0
+
+    placeholders = ', '.join(['%s'] * len(diaries))
+    database_cursor.execute(f"""
+        SELECT Diary_id FROM DiaryRecords
+        WHERE User_Email = %s AND Diary_id IN ({placeholders})
+        AND (
+            (Analysis_status = %s AND Analysis_attempts < %s AND Updated_at < NOW() - INTERVAL %s SECOND)
+            OR (Analysis_status = %s AND Updated_at < NOW() - INTERVAL %s SECOND)
+        )
+    """, (user_email, *diaries.keys(),
+          STATUS_FAILED, ANALYSIS_MAX_TOTAL_ATTEMPTS, ANALYSIS_RETRY_SECONDS,
+          STATUS_PENDING, ANALYSIS_STALE_SECONDS))
+
+    requeued = 0
+    for (diary_id,) in database_cursor.fetchall():
+        if enqueue_analysis(diary_id, user_email, diaries[diary_id], aes_key):
+            requeued += 1
+    return requeued
@@ -29,6 +29,7 @@ from datetime import datetime
 import os, base64, logging, io, urllib.parse
 from dotenv import load_dotenv
 from . import diary_bp  # 從 __init__.py 導入 Blueprint
+from .analysis import enqueue_analysis, requeue_stale_analyses, STATUS_PENDING, STATUS_DONE
 
 # PDF生成相關套件
 from reportlab.lib.pagesizes import A4
@@ -39,9 +40,7 @@ from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.lib.units import inch
 from reportlab.lib.colors import black, darkblue, darkred
 
-# DIFY_API_KEY_For_Diary
 load_dotenv()  # 載入環境變數
-DIFY_API_KEY_For_Diary = os.getenv("DIFY_API_KEY_For_Diary")
 
 # 顯示日記頁面
 @diary_bp.route('/form')
@@ -64,18 +63,17 @@ def save_diary():
     
     流程：
     1. 接收日記內容和情緒狀態
-    2. 呼叫 Dify API 進行情緒分析
-    3. 將日記內容和分析結果儲存至資料庫
+    2. 立即加密並儲存日記（分析狀態為 pending）
+    3. 將 Dify 情緒分析排入背景佇列，完成後經 Socket.IO 推送結果
     
     JSON Payload:
         content (str): 日記內容
         state (str): 用戶自填情緒狀態
         
     Returns:
-        JSON: 包含成功狀態、訊息和情緒分析結果
+        JSON: 包含成功狀態、訊息、日記ID與分析狀態
     """
     try:
-        import requests  # 確保你有在上面匯入
         request_data = request.get_json()
         content = request_data.get('content', '').strip()
         user_emotion = request_data.get('state', '').strip()
@@ -91,33 +89,6 @@ def save_diary():
             content = f"今天的心情是：{user_emotion}"
             logging.info(f"Auto-generated diary content: {content}")
 
-        # 呼叫 Dify 取得情緒分析
-        dify_query = content if content else f"用戶情緒狀態：{user_emotion}"
-        dify_payload = {
-            "inputs": {
-                "question": dify_query
-            },
-            "query": dify_query,
-            "conversation_id": None,
-            "response_mode": "blocking",
-            "user": "normaluser",
-        }
-
-        dify_headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {DIFY_API_KEY_For_Diary}"
-        }
-
-        dify_response = requests.post("https://api.dify.ai/v1/chat-messages", json=dify_payload, headers=dify_headers)
-
-        if dify_response.status_code != 200:
-            print("Dify 錯誤狀態碼:", dify_response.status_code)
-            print("Dify 回傳內容:", dify_response.text)
-            return jsonify({'success': False, 'message': 'DIFY API 回傳錯誤', 'error': dify_response.text})
-
-        ai_analysis_response = dify_response.json()
-        ai_result = ai_analysis_response.get('answer', '無法取得分析結果')
-
         current_time = datetime.now()
 
         # 1. 取得 session 中金鑰（Base64 解碼）
@@ -132,39 +103,86 @@ def save_diary():
             logging.error(f"金鑰解碼失敗 - 用戶: {current_user.id}, 錯誤: {str(e)}")
             return jsonify({'success': False, 'message': '金鑰格式異常，請重新登入後再試'})
 
-        # 2. 加密內容與分析結果
+        # 2. 加密日記內容（AI 分析結果稍後由背景工作寫入）
         try:
             # 確保內容不為空
             content_to_encrypt = str(content) if content else "（空白日記）"
-            ai_result_to_encrypt = str(ai_result) if ai_result else "（無AI分析）"
             
-            logging.info(f"Preparing encryption - Content length: {len(content_to_encrypt)}, AI analysis length: {len(ai_result_to_encrypt)}")
+            logging.info(f"Preparing encryption - Content length: {len(content_to_encrypt)}")
             
             enc_content = encrypt(content_to_encrypt, aes_key)
-            enc_analysis = encrypt(ai_result_to_encrypt, aes_key)
             
-            logging.info(f"Encryption completed - Encrypted content length: {len(enc_content)}, Encrypted analysis length: {len(enc_analysis)}")
+            logging.info(f"Encryption completed - Encrypted content length: {len(enc_content)}")
             
         except Exception as e:
             logging.error(f"加密失敗 - 用戶: {current_user.id}, 錯誤: {str(e)}")
             return jsonify({'success': False, 'message': '數據加密失敗，請稍後再試'})
 
-        # 3. 儲存到資料庫（加密後內容）
+        # 3. 儲存到資料庫（加密後內容，分析狀態 pending）
         database_connection = db.get_connection()
         database_cursor = database_connection.cursor()
         database_cursor.execute("""
-            INSERT INTO DiaryRecords (User_Email, Diary_Content, AI_analysis_content, Created_at, Updated_at)
-            VALUES (%s, %s, %s, %s, %s)
-        """, (current_user.id, enc_content, enc_analysis, current_time, current_time))
+            INSERT INTO DiaryRecords (User_Email, Diary_Content, AI_analysis_content, Analysis_status, Created_at, Updated_at)
+            VALUES (%s, %s, NULL, %s, %s, %s)
+        """, (current_user.id, enc_content, STATUS_PENDING, current_time, current_time))
+        diary_id = database_cursor.lastrowid
         database_connection.commit()
         database_connection.close()
 
-        return jsonify({'success': True, 'message': '日記與情緒分析已儲存成功', 'emotion_detail': ai_result})
+        # 4. 排入背景分析（Dify 故障時日記仍已保存，稍後自動補送）
+        dify_query = content if content else f"用戶情緒狀態：{user_emotion}"
+        enqueue_analysis(diary_id, current_user.id, dify_query, aes_key)
+
+        return jsonify({
+            'success': True,
+            'message': '日記已儲存，AI 情緒分析進行中',
+            'diary_id': diary_id,
+            'analysis_status': STATUS_PENDING
+        })
     
     except Exception as e:
         return jsonify({'success': False, 'message': f'發生錯誤: {str(e)}'})
 
 
+@diary_bp.route('/analysis/<int:diary_id>')
+@login_required
+def diary_analysis_status(diary_id):
+    """
+    查詢日記 AI 分析狀態（Socket.IO 無法連線時的輪詢備援）
+    
+    Args:
+        diary_id (int): 日記ID
+        
+    Returns:
+        JSON: status 為 pending / done / failed，done 時附上解密後的分析結果
+    """
+    try:
+        database_connection = db.get_connection()
+        database_cursor = database_connection.cursor()
+        database_cursor.execute("""
+            SELECT AI_analysis_content, Analysis_status FROM DiaryRecords
+            WHERE Diary_id = %s AND User_Email = %s
+        """, (diary_id, current_user.id))
+        row = database_cursor.fetchone()
+        database_connection.close()
+
+        if not row:
+            return jsonify({'success': False, 'message': '日記不存在'}), 404
+
+        enc_analysis, status = row
+        analysis = None
+        if status == STATUS_DONE:
+            encoded_key = session.get('encryption_key')
+            if not encoded_key:
+                return jsonify({'success': False, 'message': '金鑰不存在，請重新登入後再試'})
+            analysis = safe_decrypt(enc_analysis, base64.b64decode(encoded_key), "AI分析")
+
+        return jsonify({'success': True, 'diary_id': diary_id, 'status': status, 'analysis': analysis})
+
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'發生錯誤: {str(e)}'})
+
+
 @diary_bp.route('/list')
 @login_required
 def diary_list():
@@ -180,18 +198,18 @@ def diary_list():
         database_connection = db.get_connection()
         database_cursor = database_connection.cursor()
         database_cursor.execute("""
-            SELECT Diary_id, Diary_Content, AI_analysis_content, Created_at 
+            SELECT Diary_id, Diary_Content, AI_analysis_content, Created_at, Analysis_status 
             FROM DiaryRecords 
             WHERE User_Email = %s 
             ORDER BY Created_at DESC
         """, (current_user.id,))
         rows = database_cursor.fetchall()
-        database_connection.close()
 
         # 2. 解碼 session 金鑰
         encoded_key = session.get('encryption_key')
         if not encoded_key:
             # 如果沒有金鑰，可能是 session 過期或使用者未正確登入
+            database_connection.close()
             return render_template('diary/diary_list.html',
                                    error_message="解密金鑰不存在，請重新登入後再試")
 
@@ -199,27 +217,40 @@ def diary_list():
             aes_key = base64.b64decode(encoded_key)
         except Exception as e:
             logging.error(f"金鑰解碼失敗 - 用戶: {current_user.id}, 錯誤: {str(e)}")
+            database_connection.close()
             return render_template('diary/diary_list.html',
                                    error_message="金鑰格式異常，請重新登入後再試")
 
         # 3. 解密每一筆日記
         decrypted_diaries = []
+        unanalyzed_diaries = {}
         logging.info(f"User {current_user.id} started decrypting {len(rows)} diaries")
         
-        for diary_id, enc_content, enc_analysis, created_at in rows:
+        for diary_id, enc_content, enc_analysis, created_at, analysis_status in rows:
             logging.info(f"Processing diary ID: {diary_id}, Content length: {len(enc_content) if enc_content else 0}, Analysis length: {len(enc_analysis) if enc_analysis else 0}")
             
             # 使用安全解密函數
             content = safe_decrypt(enc_content, aes_key, "日記內容")
-            analysis = safe_decrypt(enc_analysis, aes_key, "AI分析")
+            
+            if analysis_status == STATUS_DONE:
+                analysis = safe_decrypt(enc_analysis, aes_key, "AI分析")
+            else:
+                # 分析尚未完成：記錄明文以便補送遺失的背景工作
+                unanalyzed_diaries[diary_id] = content
+                analysis = 'AI 情緒分析進行中…' if analysis_status == STATUS_PENDING else 'AI 分析暫時無法完成，稍後將自動重試'
 
             decrypted_diaries.append({
                 'id': diary_id,
                 'content': content,
                 'analysis': analysis,
+                'analysis_status': analysis_status,
                 'created_at': created_at
             })
 
+        # 補送遺失或失敗的分析工作
+        requeue_stale_analyses(database_cursor, current_user.id, unanalyzed_diaries, aes_key)
+        database_connection.close()
+
         # 4. 傳給模板
         return render_template('diary/diary_list.html', diaries=decrypted_diaries)
 
@@ -14,6 +14,9 @@ social_bp = Blueprint(
 
 # 導入功能模組
 from . import social_main
+from . import counters
+from . import timeline
+from . import points
 
 # 導出藍圖供app.py使用
 __all__ = ('social_bp',)
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+貼文計數器模組
+
+Posts.likes_count / Posts.comments_count 為反正規化的計數欄位：
+- toggle_like / add_comment / delete_comment 在同一個交易內以
+  adjust_post_counter() 原子性地加減
+- 所有讀取路徑直接讀欄位，不再 LEFT JOIN Likes ... GROUP BY 重算
+- rebuild_post_counters() 依 Likes / Comments 實際資料重算，供修復與回填使用
+
+comments_count 只計算公開評論（Is_public = TRUE），與貼文卡片上顯示的數量一致。
+
+命令列：
+    flask social rebuild-counters            # 重算全部貼文
+    flask social rebuild-counters 12 34      # 只重算指定貼文
+"""
+
+import click
+
+from utils import db
+from . import social_bp
+
+# 允許調整的計數欄位（避免欄位名稱被外部輸入注入）
+POST_COUNTER_COLUMNS = ('likes_count', 'comments_count')
+
+# 全表重算時每批處理的 Post_id 範圍
+REBUILD_BATCH_SIZE = 1000
+
+
+def adjust_post_counter(database_cursor, post_id, column, delta):
+    """
+    原子性地調整貼文計數器（需與寫入 Likes/Comments 在同一交易內呼叫）
+
+    Args:
+        database_cursor: 資料庫游標
+        post_id (int): 貼文ID
+        column (str): 'likes_count' 或 'comments_count'
+        delta (int): 增減量
+
+    Returns:
+        int: 調整後的計數值
+    """
+    if column not in POST_COUNTER_COLUMNS:
+        raise ValueError(f'不支援的計數欄位: {column}')
+
+    database_cursor.execute(f"""
+        UPDATE Posts SET {column} = GREATEST(COALESCE({column}, 0) + %s, 0)
+        WHERE Post_id = %s
+    """, (delta, post_id))
+
+    database_cursor.execute(f"SELECT {column} FROM Posts WHERE Post_id = %s", (post_id,))
+    row = database_cursor.fetchone()
+    return row[0] if row else 0
+
+
+def _rebuild_range(database_cursor, where_clause, params):
+    """依 Likes / Comments 實際資料重算一批貼文的計數器，返回被修正的貼文數"""
+    database_cursor.execute(f"""
+        UPDATE Posts p
+        LEFT JOIN (
+            SELECT Post_id, COUNT(*) AS total FROM Likes GROUP BY Post_id
+        ) l ON l.Post_id = p.Post_id
+        LEFT JOIN (
+            SELECT Post_id, COUNT(*) AS total FROM Comments
+            WHERE Is_public = TRUE GROUP BY Post_id
+        ) c ON c.Post_id = p.Post_id
+        SET p.likes_count = COALESCE(l.total, 0),
+            p.comments_count = COALESCE(c.total, 0)
+        WHERE {where_clause}
+    """, params)
+    return database_cursor.rowcount
+
+
+def rebuild_post_counters(post_ids=None, batch_size=REBUILD_BATCH_SIZE):
+    """
+    重算貼文計數器（修復/回填）
+
+    Args:
+        post_ids (list): 只重算指定貼文；None 表示依 Post_id 範圍分批重算全部
+        batch_size (int): 全表重算時每批的 Post_id 範圍大小
+
+    Returns:
+        int: 計數值有變動（漂移被修正）的貼文數
+    """
+    database_connection = db.get_connection()
+    database_cursor = database_connection.cursor()
+    repaired = 0
+
+    try:
+        if post_ids:
+            placeholders = ', '.join(['%s'] * len(post_ids))
+            repaired = _rebuild_range(database_cursor, f"p.Post_id IN ({placeholders})", tuple(post_ids))
+            database_connection.commit()
+            return repaired
+
+        database_cursor.execute("SELECT MIN(Post_id), MAX(Post_id) FROM Posts")
+        min_id, max_id = database_cursor.fetchone()
+        if min_id is None:
+            return 0
+
+        # 分批處理，避免單一 UPDATE 長時間鎖住整張 Posts
+        for range_start in range(min_id, max_id + 1, batch_size):
+            repaired += _rebuild_range(
+                database_cursor,
+                "p.Post_id BETWEEN %s AND %s",
+                (range_start, range_start + batch_size - 1)
+            )
+            database_connection.commit()
+
+        return repaired
+
+    finally:
+        database_connection.close()
+
+
+@social_bp.cli.command('rebuild-counters')
+@click.argument('post_ids', nargs=-1, type=int)
+def rebuild_counters_command(post_ids):
+    """重算 Posts.likes_count / comments_count（不帶參數則重算全部）"""
+    repaired = rebuild_post_counters(list(post_ids) or None)
+    click.echo(f'貼文計數器重算完成，共修正 {repaired} 篇貼文')
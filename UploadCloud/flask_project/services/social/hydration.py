@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+社交貼文資料補齊（hydration）模組
+
+動態牆、搜尋、喜歡的貼文與追蹤貼文等頁面都需要替一整頁貼文補上：
+- 每則貼文的公開評論列表
+- 當前用戶對貼文作者/評論者的追蹤狀態
+
+過去這些資料是逐篇貼文、逐則評論查詢（N+1），一頁 50 篇會產生上百次查詢。
+本模組改為以整頁貼文為單位批次查詢：
+- 所有評論以一次 Post_id IN (...) 查詢取回
+- 所有作者/評論者的追蹤關係以一次 following_email IN (...) 查詢取回
+再組裝成與原本模板相同結構的字典。
+"""
+
+
+def _placeholders(values):
+    """產生 IN (...) 查詢用的 %s 佔位符字串"""
+    return ', '.join(['%s'] * len(values))
+
+
+def fetch_comments_by_post(database_cursor, post_ids):
+    """
+    批次取得多篇貼文的公開評論
+
+    Args:
+        database_cursor: 資料庫游標
+        post_ids (list): 貼文ID列表
+
+    Returns:
+        dict: post_id -> 評論資料列列表（依建立時間正序），欄位順序為
+              (Comment_id, User_Email, User_name, Content, Reply_to_id,
+               Reply_to_username, Is_public, Created_at, Post_id)
+    """
+    comments_by_post = {post_id: [] for post_id in post_ids}
+    if not post_ids:
+        return comments_by_post
+
+    database_cursor.execute(f"""
+        SELECT
+            c.Comment_id,
+            c.User_Email,
+            u.User_name,
+            c.Content,
+            c.Reply_to_id,
+            c.Reply_to_username,
+            c.Is_public,
+            c.Created_at,
+            c.Post_id
+        FROM Comments c
+        LEFT JOIN User u ON c.User_Email = u.User_Email
+        WHERE c.Post_id IN ({_placeholders(post_ids)}) AND c.Is_public = TRUE
+        ORDER BY c.Created_at ASC, c.Comment_id ASC
+    """, tuple(post_ids))
+
+    for comment_item in database_cursor.fetchall():
+        comments_by_post.setdefault(comment_item[8], []).append(comment_item)
+
+    return comments_by_post
+
+
+def fetch_followed_emails(database_cursor, follower_email, candidate_emails):
+    """
+    批次檢查當前用戶追蹤了哪些用戶
+
+    Args:
+        database_cursor: 資料庫游標
+        follower_email (str): 當前用戶Email
+        candidate_emails (iterable): 要檢查的用戶Email
+
+    Returns:
+        set: 當前用戶有追蹤的Email集合
+    """
+    candidate_emails = [email for email in set(candidate_emails) if email and email != follower_email]
+    if not candidate_emails:
+        return set()
+
+    database_cursor.execute(f"""
+        SELECT following_email FROM follows
+        WHERE follower_email = %s AND following_email IN ({_placeholders(candidate_emails)})
+    """, (follower_email, *candidate_emails))
+
+    return {row[0] for row in database_cursor.fetchall()}
+
+
+def hydrate_posts(database_cursor, posts, user_email, include_follow_status=True, time_formatter=None):
+    """
+    替一整頁貼文字典補上評論列表與追蹤狀態（就地修改並返回）
+
+    Args:
+        database_cursor: 資料庫游標
+        posts (list): 貼文字典列表，至少需包含 post_id、user_email、is_anonymous
+        user_email (str): 當前用戶Email
+        include_follow_status (bool): 是否補上 is_following（貼文與評論）
+        time_formatter (callable): 評論時間格式化函式，None 表示保留原始值
+
+    Returns:
+        list: 補齊後的貼文字典列表
+    """
+    if not posts:
+        return posts
+
+    comments_by_post = fetch_comments_by_post(
+        database_cursor, [post['post_id'] for post in posts]
+    )
+
+    followed_emails = set()
+    if include_follow_status:
+        candidate_emails = {post['user_email'] for post in posts if not post['is_anonymous']}
+        for comments_data in comments_by_post.values():
+            candidate_emails.update(comment_item[1] for comment_item in comments_data)
+        followed_emails = fetch_followed_emails(database_cursor, user_email, candidate_emails)
+
+    for post in posts:
+        post_author = post['user_email']
+
+        comments = []
+        for comment_item in comments_by_post.get(post['post_id'], []):
+            comment = {
+                'comment_id': comment_item[0],
+                'user_email': comment_item[1],
+                'username': comment_item[2],
+                'content': comment_item[3],
+                'reply_to_id': comment_item[4],
+                'reply_to_username': comment_item[5],
+                'is_public': comment_item[6],
+                'created_at': time_formatter(comment_item[7]) if time_formatter else comment_item[7]
+            }
+            if include_follow_status:
+                # 非自己且非貼文作者才顯示追蹤狀態
+                comment['is_following'] = (
+                    comment_item[1] != user_email
+                    and comment_item[1] != post_author
+                    and comment_item[1] in followed_emails
+                )
+            comments.append(comment)
+
+        if include_follow_status:
+            # 僅非匿名且非自己的貼文才有追蹤狀態
+            post['is_following'] = (
+                not post['is_anonymous']
+                and post_author != user_email
+                and post_author in followed_emails
+            )
+        post['comments'] = comments
+
+    return posts
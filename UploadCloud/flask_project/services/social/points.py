@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+"""
+積分帳本對帳命令
+
+積分由 utils.points_ledger 以事件增量維護，本命令以完整重算對帳並修正漂移：
+    flask social reconcile-points                    # 對帳並修正所有用戶
+    flask social reconcile-points a@example.com      # 只對帳指定用戶
+    flask social reconcile-points --dry-run          # 只回報差異，不修正
+"""
+
+import click
+
+from utils.points_ledger import reconcile_user_points
+from . import social_bp
+
+
+@social_bp.cli.command('reconcile-points')
+@click.argument('user_emails', nargs=-1)
+@click.option('--dry-run', is_flag=True, help='只回報差異，不修正')
+def reconcile_points_command(user_emails, dry_run):
+    """以完整重算對帳 user_points 與統計欄位"""
+    drifts = reconcile_user_points(list(user_emails) or None, fix=not dry_run)
+
+    for drift in drifts:
+        changed = {
+            column: f"{drift['stored'][column]} -> {value}"
+            for column, value in drift['expected'].items()
+            if drift['stored'][column] != value
+        }
+        click.echo(f"{drift['user_email']}: {changed}")
+
+    action = '發現' if dry_run else '修正'
+    click.echo(f'積分對帳完成，{action} {len(drifts)} 位用戶的差異')
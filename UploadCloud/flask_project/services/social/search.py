@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+"""
+社群全文搜尋模組
+
+/social/search 與 /social/search_api 過去以 LIKE '%q%' 搜尋標題、內容與用戶名稱，
+每次都必須全表掃描 Posts 與 User。改為使用 MySQL FULLTEXT 索引搭配 ngram 解析器
+（見 migrations/004_fulltext_search_ngram.sql），中文可依二字詞 (bigram) 切詞：
+- 關鍵字以空白分隔，每個關鍵字以片語 (+"詞") 方式比對，多個關鍵字須同時符合
+- 依 MATCH ... AGAINST 相關度排序，作者名稱符合時額外加權
+- 以 page / per_page 分頁，多取一筆判斷是否還有下一頁
+- highlight() 產生以 <mark> 標示關鍵字的安全 HTML
+
+ngram 索引無法查詢長度小於 ngram_token_size（預設 2）的詞，
+這類查詢（例如單一中文字）退回原本的 LIKE 比對。
+"""
+
+import html
+import re
+
+from markupsafe import Markup
+
+# 每頁筆數
+SEARCH_PAGE_SIZE = 20
+MAX_SEARCH_PAGE_SIZE = 50
+USER_SEARCH_LIMIT = 20
+
+# MySQL ngram_token_size 預設值，短於此長度的詞無法使用全文索引
+NGRAM_TOKEN_SIZE = 2
+
+# 單次查詢最多採用的關鍵字數
+MAX_SEARCH_TERMS = 8
+
+# 作者名稱符合時額外加上的相關度
+USERNAME_MATCH_BOOST = 1.0
+
+# BOOLEAN MODE 的運算子字元，關鍵字中一律移除
+_BOOLEAN_OPERATORS = re.compile(r'[+\-<>()~*"@]')
+
+
+def tokenize_query(query):
+    """
+    將搜尋字串切成關鍵字列表（去除 BOOLEAN MODE 運算子與重複詞）
+
+    Args:
+        query (str): 使用者輸入的搜尋字串
+
+    Returns:
+        list: 關鍵字列表
+    """
+    terms = []
+    for raw_term in _BOOLEAN_OPERATORS.sub(' ', query or '').split():
+        term = raw_term.strip()
+        if term and term.lower() not in (existing.lower() for existing in terms):
+            terms.append(term)
+    return terms[:MAX_SEARCH_TERMS]
+
+
+def build_boolean_query(terms):
+    """將關鍵字組成 BOOLEAN MODE 查詢字串，每個關鍵字都必須以片語形式出現"""
+    return ' '.join(f'+"{term}"' for term in terms)
+
+
+def can_use_fulltext(terms):
+    """所有關鍵字長度都不小於 ngram_token_size 時才能使用全文索引"""
+    return bool(terms) and all(len(term) >= NGRAM_TOKEN_SIZE for term in terms)
+
+
+def normalize_page(page, per_page):
+    """將分頁參數限制在合法範圍，返回 (page, per_page, offset)"""
+    page = max(page or 1, 1)
+    per_page = min(max(per_page or SEARCH_PAGE_SIZE, 1), MAX_SEARCH_PAGE_SIZE)
+    return page, per_page, (page - 1) * per_page
+
+
+_POST_COLUMNS = """
+    p.Post_id,
+    p.User_Email,
+    u.User_name,
+    p.title,
+    p.Content,
+    p.Mood,
+    p.Is_Anonymous,
+    p.Image_URL,
+    p.Is_public,
+    p.Created_at,
+    p.likes_count,
+    EXISTS (
+        SELECT 1 FROM Likes l WHERE l.Post_id = p.Post_id AND l.User_Email = %s
+    ) AS user_liked,
+    p.comments_count
+"""
+
+
+def search_posts(database_cursor, user_email, query, page=1, per_page=SEARCH_PAGE_SIZE):
+    """
+    依相關度搜尋公開貼文（標題、內容與非匿名作者名稱）
+
+    Args:
+        database_cursor: 資料庫游標
+        user_email (str): 當前用戶Email（用於按讚狀態）
+        query (str): 搜尋字串
+        page (int): 頁碼（從 1 開始）
+        per_page (int): 每頁筆數
+
+    Returns:
+        tuple: (posts_data, has_more)，posts_data 欄位順序為
+               (Post_id, User_Email, User_name, title, Content, Mood, Is_Anonymous,
+                Image_URL, Is_public, Created_at, likes_count, user_liked, comments_count)
+    """
+    terms = tokenize_query(query)
+    if not terms:
+        return [], False
+
+    page, per_page, offset = normalize_page(page, per_page)
+
+    if can_use_fulltext(terms):
+        boolean_query = build_boolean_query(terms)
+        # 先以全文索引找出符合的貼文與相關度，再回表取完整欄位
+        database_cursor.execute(f"""
+            SELECT {_POST_COLUMNS}
+            FROM (
+                SELECT hits.Post_id, SUM(hits.relevance) AS relevance
+                FROM (
+                    SELECT Post_id, MATCH(title, Content) AGAINST (%s IN BOOLEAN MODE) AS relevance
+                    FROM Posts
+                    WHERE Is_public = TRUE AND MATCH(title, Content) AGAINST (%s IN BOOLEAN MODE)
+                    UNION ALL
+                    SELECT author_posts.Post_id, %s AS relevance
+                    FROM User author
+                    INNER JOIN Posts author_posts ON author_posts.User_Email = author.User_Email
+                    WHERE MATCH(author.User_name) AGAINST (%s IN BOOLEAN MODE)
+                    AND author_posts.Is_public = TRUE AND author_posts.Is_Anonymous = FALSE
+                ) hits
+                GROUP BY hits.Post_id
+            ) matched
+            INNER JOIN Posts p ON p.Post_id = matched.Post_id
+            LEFT JOIN User u ON p.User_Email = u.User_Email
+            ORDER BY matched.relevance DESC, p.Created_at DESC, p.Post_id DESC
+            LIMIT %s OFFSET %s
+        """, (user_email, boolean_query, boolean_query, USERNAME_MATCH_BOOST, boolean_query,
+              per_page + 1, offset))
+    else:
+        like_conditions = []
+        params = [user_email]
+        for term in terms:
+            like_conditions.append(
+                "(p.title LIKE %s OR p.Content LIKE %s OR (p.Is_Anonymous = FALSE AND u.User_name LIKE %s))"
+            )
+            params.extend([f'%{term}%'] * 3)
+        params.extend([per_page + 1, offset])
+
+        database_cursor.execute(f"""
+            SELECT {_POST_COLUMNS}
+            FROM Posts p
+            LEFT JOIN User u ON p.User_Email = u.User_Email
+            WHERE p.Is_public = TRUE AND {' AND '.join(like_conditions)}
+            ORDER BY p.Created_at DESC, p.Post_id DESC
+            LIMIT %s OFFSET %s
+        """, tuple(params))
+
+    posts_data = list(database_cursor.fetchall())
+    has_more = len(posts_data) > per_page
+    return posts_data[:per_page], has_more
+
+
+def search_users(database_cursor, query, page=1, per_page=USER_SEARCH_LIMIT):
+    """
+    依相關度搜尋用戶名稱
+
+    Args:
+        database_cursor: 資料庫游標
+        query (str): 搜尋字串
+        page (int): 頁碼（從 1 開始）
+        per_page (int): 每頁筆數
+
+    Returns:
+        tuple: (users_data, has_more)，users_data 欄位順序為
+               (User_Email, User_name, Created_At, post_count, likes_received)
+    """
+    terms = tokenize_query(query)
+    if not terms:
+        return [], False
+
+    page, per_page, offset = normalize_page(page, per_page)
+
+    if can_use_fulltext(terms):
+        boolean_query = build_boolean_query(terms)
+        match_condition = "MATCH(u.User_name) AGAINST (%s IN BOOLEAN MODE)"
+        order_clause = f"{match_condition} DESC, post_count DESC, u.User_name ASC"
+        params = [boolean_query, boolean_query]
+    else:
+        match_condition = ' AND '.join(["u.User_name LIKE %s"] * len(terms))
+        order_clause = "post_count DESC, u.User_name ASC"
+        params = [f'%{term}%' for term in terms]
+
+    params.extend([per_page + 1, offset])
+
+    database_cursor.execute(f"""
+        SELECT
+            u.User_Email,
+            u.User_name,
+            u.Created_At,
+            COUNT(p.Post_id) as post_count,
+            COALESCE(SUM(p.likes_count), 0) as likes_received
+        FROM User u
+        LEFT JOIN Posts p ON u.User_Email = p.User_Email AND p.Is_public = TRUE
+        WHERE {match_condition}
+        GROUP BY u.User_Email, u.User_name, u.Created_At
+        ORDER BY {order_clause}
+        LIMIT %s OFFSET %s
+    """, tuple(params))
+
+    users_data = list(database_cursor.fetchall())
+    has_more = len(users_data) > per_page
+    return users_data[:per_page], has_more
+
+
+def highlight(text, query, max_length=None):
+    """
+    以 <mark> 標示關鍵字，返回已跳脫的安全 HTML
+
+    Args:
+        text (str): 原始文字
+        query (str): 搜尋字串
+        max_length (int): 截取長度，None 表示不截取；截取時以第一個符合處為中心
+
+    Returns:
+        Markup: 可直接輸出於模板的 HTML
+    """
+    text = text or ''
+    terms = tokenize_query(query)
+    pattern = None
+    if terms:
+        pattern = re.compile(
+            '|'.join(re.escape(term) for term in sorted(terms, key=len, reverse=True)),
+            re.IGNORECASE
+        )
+
+    if max_length and len(text) > max_length:
+        first_hit = pattern.search(text) if pattern else None
+        start = 0
+        if first_hit:
+            start = max(min(first_hit.start() - max_length // 4, len(text) - max_length), 0)
+        snippet = text[start:start + max_length]
+        text = ('...' if start > 0 else '') + snippet + ('...' if start + max_length < len(text) else '')
+
+    if not pattern:
+        return Markup(html.escape(text))
+
+    pieces = []
+    last_end = 0
+    for hit in pattern.finditer(text):
+        pieces.append(html.escape(text[last_end:hit.start()]))
+        pieces.append(f'<mark>{html.escape(hit.group(0))}</mark>')
+        last_end = hit.end()
+    pieces.append(html.escape(text[last_end:]))
+    return Markup(''.join(pieces))
@@ -22,18 +22,29 @@
 from flask import render_template, request, jsonify, redirect, url_for
 from flask_login import login_required, current_user
 from utils import db
-from utils.level_system import UserLevelSystem, update_user_level_and_stats, get_user_level_info
+from utils.level_system import UserLevelSystem, get_user_level_info
+from utils.points_ledger import record_points_event
 from datetime import datetime
 from werkzeug.utils import secure_filename
+import base64
+import binascii
 import os
 import uuid
 from . import social_bp  # 從 __init__.py 導入 Blueprint
+from .hydration import hydrate_posts
+from .counters import adjust_post_counter
+from .timeline import fan_out_post, backfill_timeline, prune_timeline
+from .search import search_posts, search_users, highlight
 
 # 圖片上傳設定
 UPLOAD_FOLDER = 'static/uploads'
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
 MAX_FILE_SIZE = 5 * 1024 * 1024  # 5MB
 
+# 動態牆分頁設定（以 (Created_at, Post_id) 作為游標）
+FEED_PAGE_SIZE = 20
+MAX_FEED_PAGE_SIZE = 50
+
 
 def format_datetime(val, fmt='%Y-%m-%d %H:%M:%S'):
     """Safely format a datetime-like value.
@@ -64,6 +75,117 @@ def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+
+def encode_feed_cursor(created_at, post_id):
+    """
+    將最後一則貼文的 (Created_at, Post_id) 編碼為 URL 安全的游標字串
+    
+    Args:
+        created_at (datetime): 貼文建立時間
+        post_id (int): 貼文ID
+        
+    Returns:
+        str: 游標字串
+    """
+    raw_cursor = f"{format_datetime(created_at)}|{post_id}"
+    return base64.urlsafe_b64encode(raw_cursor.encode('utf-8')).decode('ascii')
+
+
+def decode_feed_cursor(cursor):
+    """
+    解析動態牆游標
+    
+    Args:
+        cursor (str): encode_feed_cursor() 產生的游標
+        
+    Returns:
+        tuple or None: (created_at, post_id)；游標為空或格式錯誤時返回 None（視為第一頁）
+    """
+    if not cursor:
+        return None
+    try:
+        raw_cursor = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        created_at_text, post_id_text = raw_cursor.rsplit('|', 1)
+        return datetime.strptime(created_at_text, '%Y-%m-%d %H:%M:%S'), int(post_id_text)
+    except (ValueError, UnicodeError, binascii.Error):
+        return None
+
+
+def fetch_feed_page(database_cursor, user_email, tab='all-posts', cursor=None, limit=FEED_PAGE_SIZE):
+    """
+    以鍵集分頁 (keyset pagination) 取得一頁動態牆貼文
+    
+    依 (Created_at, Post_id) 倒序排列，從游標位置之後取 limit 筆，
+    按讚數直接讀取 Posts.likes_count 計數器，按讚狀態只針對該頁貼文做子查詢，
+    查詢成本只與頁面大小有關。追蹤中分頁改讀 user_timeline 預先寫入的時間軸，
+    不再即時 JOIN follows。
+    
+    Args:
+        database_cursor: 資料庫游標
+        user_email (str): 當前用戶Email
+        tab (str): 'all-posts' 或 'following'
+        cursor (str): 上一頁返回的游標，None 表示第一頁
+        limit (int): 每頁筆數
+        
+    Returns:
+        tuple: (raw_posts_data, next_cursor)，沒有下一頁時 next_cursor 為 None
+    """
+    from_clause = "FROM Posts p"
+    created_column, id_column = "p.Created_at", "p.Post_id"
+    conditions = ["p.Is_public = TRUE"]
+    params = [user_email]
+
+    if tab == 'following':
+        # 以時間軸索引 (owner_email, post_created_at, post_id) 做範圍掃描
+        from_clause = "FROM user_timeline t INNER JOIN Posts p ON p.Post_id = t.post_id"
+        created_column, id_column = "t.post_created_at", "t.post_id"
+        conditions.append("t.owner_email = %s")
+        params.append(user_email)
+
+    position = decode_feed_cursor(cursor)
+    if position:
+        last_created_at, last_post_id = position
+        conditions.append(
+            f"({created_column} < %s OR ({created_column} = %s AND {id_column} < %s))"
+        )
+        params.extend([last_created_at, last_created_at, last_post_id])
+
+    # 多取一筆用來判斷是否還有下一頁
+    params.append(limit + 1)
+
+    database_cursor.execute(f"""
+        SELECT 
+            p.Post_id,
+            p.User_Email,
+            u.User_name,
+            p.title,
+            p.Content,
+            p.Mood,
+            p.Is_Anonymous,
+            p.Image_URL,
+            p.Is_public,
+            p.Created_at,
+            p.likes_count,
+            EXISTS (
+                SELECT 1 FROM Likes l WHERE l.Post_id = p.Post_id AND l.User_Email = %s
+            ) AS user_liked
+        {from_clause}
+        LEFT JOIN User u ON p.User_Email = u.User_Email
+        WHERE {' AND '.join(conditions)}
+        ORDER BY {created_column} DESC, {id_column} DESC
+        LIMIT %s
+    """, tuple(params))
+
+    raw_posts_data = list(database_cursor.fetchall())
+
+    next_cursor = None
+    if len(raw_posts_data) > limit:
+        raw_posts_data = raw_posts_data[:limit]
+        last_post = raw_posts_data[-1]
+        next_cursor = encode_feed_cursor(last_post[9], last_post[0])
+
+    return raw_posts_data, next_cursor
+
 @social_bp.route('/create_post', methods=['GET', 'POST'])
 @login_required
 def create_post():
@@ -159,7 +281,9 @@ def create_post():
             database_connection = db.get_connection()
             database_cursor = database_connection.cursor()
             
-            current_time = datetime.now()
+            # 貼文與粉絲時間軸在同一交易內寫入
+            current_time = datetime.now().replace(microsecond=0)
+            database_connection.begin()
             
             database_cursor.execute("""
                 INSERT INTO Posts (
@@ -178,12 +302,17 @@ def create_post():
                 current_time     # Updated_at
             ))
             
+            post_id = database_cursor.lastrowid
+            
+            # 寫入所有粉絲的追蹤時間軸
+            fan_out_post(database_cursor, post_id, current_user.id, current_time)
+            
+            # 發文積分（同一交易內增量更新等級）
+            level_update = record_points_event(database_cursor, current_user.id, 'post_created', source_id=post_id)
+            
             database_connection.commit()
             database_connection.close()
             
-            # 發文成功後更新用戶等級
-            level_update = update_user_level_and_stats(current_user.id)
-            
             # 回傳成功訊息
             response_data = {
                 'success': True,
@@ -208,6 +337,43 @@ def create_post():
                 'message': f'發布失敗：{str(e)}'
             }), 500
 
+def format_feed_posts(database_cursor, raw_posts_data, user_email):
+    """
+    將動態牆貼文查詢結果組裝成模板使用的字典（含評論與追蹤狀態）
+    
+    評論與追蹤狀態由 hydrate_posts() 以整頁為單位批次查詢。
+    
+    Args:
+        database_cursor: 資料庫游標
+        raw_posts_data (list): fetch_feed_page() 返回的貼文資料列
+        user_email (str): 當前用戶Email
+        
+    Returns:
+        list: 貼文字典列表
+    """
+    formatted_post_data = [
+        {
+            'post_id': post_item[0],
+            'user_email': post_item[1],
+            'username': post_item[2] if not post_item[6] else '匿名用戶',  # 如果匿名則顯示匿名用戶
+            'title': post_item[3],
+            'content': post_item[4],
+            'mood': post_item[5],
+            'is_anonymous': post_item[6],
+            'image_url': post_item[7],
+            'is_public': post_item[8],
+            'created_at': format_datetime(post_item[9]),
+            'likes_count': post_item[10],
+            'user_liked': bool(post_item[11])  # 當前用戶是否已按讚
+        }
+        for post_item in raw_posts_data
+    ]
+    
+    # 批次補上評論與追蹤狀態
+    hydrate_posts(database_cursor, formatted_post_data, user_email, time_formatter=format_datetime)
+    
+    return formatted_post_data
+
 @social_bp.route('/main')
 @login_required
 def main():
@@ -223,141 +389,19 @@ def main():
     - 點讚數和評論列表
     - 當前用戶的按讚狀態
     - 按時間倒序排列
+    - 只渲染第一頁（FEED_PAGE_SIZE 筆），其餘由無限捲動呼叫 /social/api/feed
     
     Returns:
         str: 渲染後的社交主頁 HTML 頁面
     """
     tab = request.args.get('tab', 'all-posts')
     
-    database_connection = db.get_connection()
+    database_connection = db.get_connection(readonly=True)
     database_cursor = database_connection.cursor()
 
-    formatted_post_data = []
-    
-    if tab == 'following':
-        # 顯示追蹤用戶的貼文
-        database_cursor.execute("""
-            SELECT 
-                p.Post_id,
-                p.User_Email,
-                u.User_name,
-                p.title,
-                p.Content,
-                p.Mood,
-                p.Is_Anonymous,
-                p.Image_URL,
-                p.Is_public,
-                p.Created_at,
-                COUNT(l.Like_id) AS likes_count,
-                MAX(CASE WHEN l.User_Email = %s THEN 1 ELSE 0 END) AS user_liked
-            FROM Posts p
-            INNER JOIN follows f ON p.User_Email = f.following_email
-            LEFT JOIN User u ON p.User_Email = u.User_Email
-            LEFT JOIN Likes l ON p.Post_id = l.Post_id
-            WHERE f.follower_email = %s AND p.Is_public = TRUE
-            GROUP BY p.Post_id, p.User_Email, u.User_name, p.title, p.Content, p.Mood, p.Is_Anonymous, p.Image_URL, p.Is_public, p.Created_at
-            ORDER BY p.Created_at DESC
-            """, (current_user.id, current_user.id))
-    else:
-        # 顯示所有貼文（預設）
-        database_cursor.execute("""
-            SELECT 
-                p.Post_id,
-                p.User_Email,
-                u.User_name,
-                p.title,
-                p.Content,
-                p.Mood,
-                p.Is_Anonymous,
-                p.Image_URL,
-                p.Is_public,
-                p.Created_at,
-                COUNT(l.Like_id) AS likes_count,
-                MAX(CASE WHEN l.User_Email = %s THEN 1 ELSE 0 END) AS user_liked
-            FROM Posts p
-            LEFT JOIN User u ON p.User_Email = u.User_Email
-            LEFT JOIN Likes l ON p.Post_id = l.Post_id
-            WHERE p.Is_public = TRUE
-            GROUP BY p.Post_id, p.User_Email, u.User_name, p.title, p.Content, p.Mood, p.Is_Anonymous, p.Image_URL, p.Is_public, p.Created_at
-            ORDER BY p.Created_at DESC
-            """, (current_user.id,))
-    
-    raw_posts_data = database_cursor.fetchall()
-
-    # 為每個貼文處理評論資料
-    for post_item in raw_posts_data:
-        post_id = post_item[0]
-        
-        # 獲取該貼文的評論
-        database_cursor.execute("""
-            SELECT 
-                c.Comment_id,
-                c.User_Email,
-                u.User_name,
-                c.Content,
-                c.Reply_to_id,
-                c.Reply_to_username,
-                c.Is_public,
-                c.Created_at
-            FROM Comments c
-            LEFT JOIN User u ON c.User_Email = u.User_Email
-            WHERE c.Post_id = %s AND c.Is_public = TRUE
-            ORDER BY c.Created_at ASC
-        """, (post_id,))
-        
-        comments_data = database_cursor.fetchall()
-        
-        # 檢查當前用戶是否已追蹤該貼文作者（僅非匿名貼文）
-        is_following = False
-        if not post_item[6] and post_item[1] != current_user.id:  # 非匿名且非自己的貼文
-            database_cursor.execute("""
-                SELECT id FROM follows 
-                WHERE follower_email = %s AND following_email = %s
-            """, (current_user.id, post_item[1]))
-            is_following = database_cursor.fetchone() is not None
-
-        # 為評論添加追蹤狀態
-        comments_with_follow_status = []
-        for comment_item in comments_data:
-            comment_following = False
-            if comment_item[1] != current_user.id and comment_item[1] != post_item[1]:  # 非自己且非貼文作者
-                database_cursor.execute("""
-                    SELECT id FROM follows 
-                    WHERE follower_email = %s AND following_email = %s
-                """, (current_user.id, comment_item[1]))
-                comment_following = database_cursor.fetchone() is not None
-            
-            comments_with_follow_status.append({
-                'comment_id': comment_item[0],
-                'user_email': comment_item[1],
-                'username': comment_item[2],
-                'content': comment_item[3],
-                'reply_to_id': comment_item[4],
-                'reply_to_username': comment_item[5],
-                'is_public': comment_item[6],
-                'created_at': format_datetime(comment_item[7]),
-                'is_following': comment_following
-            })
-        
-        # 組裝完整的貼文資料
-        complete_post_data = {
-            'post_id': post_item[0],
-            'user_email': post_item[1],
-            'username': post_item[2] if not post_item[6] else '匿名用戶',  # 如果匿名則顯示匿名用戶
-            'title': post_item[3],
-            'content': post_item[4],
-            'mood': post_item[5],
-            'is_anonymous': post_item[6],
-            'image_url': post_item[7],
-            'is_public': post_item[8],
-            'created_at': format_datetime(post_item[9]),
-            'likes_count': post_item[10],
-            'user_liked': bool(post_item[11]),  # 當前用戶是否已按讚
-            'is_following': is_following,  # 當前用戶是否已追蹤該作者
-            'comments': comments_with_follow_status
-        }
-        
-        formatted_post_data.append(complete_post_data)
+    # 只取第一頁，後續頁面由 /social/api/feed 依游標載入
+    raw_posts_data, next_cursor = fetch_feed_page(database_cursor, current_user.id, tab)
+    formatted_post_data = format_feed_posts(database_cursor, raw_posts_data, current_user.id)
     
     # 獲取社交統計數據
     try:
@@ -441,9 +485,63 @@ def main():
     return render_template('social/social_main.html', 
                          posts=formatted_post_data, 
                          current_tab=tab,
+                         next_cursor=next_cursor,
                          social_stats=social_stats,
                          user_level_info=user_level_info)
 
+@social_bp.route('/api/feed')
+@login_required
+def feed_api():
+    """
+    動態牆載入更多 (API 端點)
+    
+    Query Parameters:
+        tab (str): 'all-posts' 或 'following'
+        cursor (str): 上一頁返回的 next_cursor
+        limit (int): 每頁筆數，預設 FEED_PAGE_SIZE，最大 MAX_FEED_PAGE_SIZE
+    
+    Returns:
+        JSON: 該頁貼文資料、渲染好的貼文卡片 HTML 與下一頁游標
+    """
+    tab = request.args.get('tab', 'all-posts')
+    cursor = request.args.get('cursor')
+    limit = request.args.get('limit', FEED_PAGE_SIZE, type=int)
+    limit = max(1, min(limit, MAX_FEED_PAGE_SIZE))
+    
+    try:
+        database_connection = db.get_connection(readonly=True)
+        database_cursor = database_connection.cursor()
+        
+        raw_posts_data, next_cursor = fetch_feed_page(database_cursor, current_user.id, tab, cursor, limit)
+        posts = format_feed_posts(database_cursor, raw_posts_data, current_user.id)
+        
+        database_connection.close()
+        
+        # 與首頁共用同一份貼文卡片模板，前端直接插入即可
+        posts_html = ''.join(
+            render_template('social/post_card.html', post=post)
+            for post in posts
+        )
+        
+        return jsonify({
+            'success': True,
+            'posts': posts,
+            'html': posts_html,
+            'next_cursor': next_cursor,
+            'has_more': next_cursor is not None
+        })
+        
+    except Exception as e:
+        print(f"[ERROR] 載入更多貼文失敗: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': f'載入失敗：{str(e)}',
+            'posts': [],
+            'html': '',
+            'next_cursor': None,
+            'has_more': False
+        }), 500
+
 @social_bp.route('/delete_post/<int:post_id>', methods=['POST'])
 @login_required
 def delete_post(post_id):
@@ -464,7 +562,7 @@ def delete_post(post_id):
         
         # 先檢查貼文是否存在且屬於當前用戶
         database_cursor.execute("""
-            SELECT User_Email FROM Posts 
+            SELECT User_Email, Is_public, likes_count, comments_count FROM Posts 
             WHERE Post_id = %s AND User_Email = %s
         """, (post_id, current_user.id))
         
@@ -478,6 +576,22 @@ def delete_post(post_id):
                 'message': '貼文不存在或您沒有權限刪除此貼文'
             }), 403
         
+        # 刪除貼文與扣回積分在同一個交易內完成
+        database_connection.begin()
+        
+        # 公開貼文刪除後，扣回發文、獲讚與他人留言的積分
+        if post_owner[1]:
+            database_cursor.execute("""
+                SELECT COUNT(*) FROM Comments 
+                WHERE Post_id = %s AND User_Email = %s AND Is_public = TRUE
+            """, (post_id, current_user.id))
+            own_comments = database_cursor.fetchone()[0]
+            
+            record_points_event(database_cursor, current_user.id, 'post_created', -1, post_id)
+            record_points_event(database_cursor, current_user.id, 'like_received', -(post_owner[2] or 0), post_id)
+            record_points_event(database_cursor, current_user.id, 'comment_received',
+                                -max((post_owner[3] or 0) - own_comments, 0), post_id)
+        
         # 刪除相關的評論和按讚記錄（由於外鍵約束會自動刪除）
         # 刪除貼文
         database_cursor.execute("DELETE FROM Posts WHERE Post_id = %s", (post_id,))
@@ -632,25 +746,26 @@ def my_contributions():
         for mood, count in database_cursor.fetchall():
             mood_stats[mood or 'neutral'] = count
         
-        # 獲取用戶的獲讚總數
+        # 獲取用戶的獲讚總數與貼文評論總數（讀取貼文計數器）
         database_cursor.execute("""
-            SELECT COUNT(*) as total_likes
-            FROM Likes l
-            JOIN Posts p ON l.Post_id = p.Post_id
-            WHERE p.User_Email = %s AND p.Is_public = TRUE
+            SELECT COALESCE(SUM(likes_count), 0), COALESCE(SUM(comments_count), 0)
+            FROM Posts
+            WHERE User_Email = %s AND Is_public = TRUE
         """, (current_user.id,))
         
-        total_likes = database_cursor.fetchone()[0]
+        total_likes, total_comments = database_cursor.fetchone()
         
-        # 獲取用戶貼文被其他人評論的總數（不包括自己的評論）
+        # 扣除自己在自己貼文下的留言（只掃描自己的留言）
         database_cursor.execute("""
-            SELECT COUNT(*) as total_comments
+            SELECT COUNT(*)
             FROM Comments c
             JOIN Posts p ON c.Post_id = p.Post_id
-            WHERE p.User_Email = %s AND p.Is_public = TRUE AND c.User_Email != %s
+            WHERE c.User_Email = %s AND c.Is_public = TRUE
+            AND p.User_Email = %s AND p.Is_public = TRUE
         """, (current_user.id, current_user.id))
         
-        total_comments = database_cursor.fetchone()[0]
+        total_comments = max(int(total_comments) - database_cursor.fetchone()[0], 0)
+        total_likes = int(total_likes)
         
         database_connection.close()
         
@@ -696,22 +811,32 @@ def toggle_like(post_id):
     Returns:
         JSON: 按讚狀態和更新後的數量
     """
+    database_connection = None
     try:
         database_connection = db.get_connection()
         database_cursor = database_connection.cursor()
         
-        # 檢查貼文是否存在
-        database_cursor.execute("SELECT Post_id FROM Posts WHERE Post_id = %s", (post_id,))
-        if not database_cursor.fetchone():
+        # 檢查貼文是否存在，同時取得作者（獲得按讚積分的用戶）
+        database_cursor.execute("SELECT User_Email, Is_public FROM Posts WHERE Post_id = %s", (post_id,))
+        post_data = database_cursor.fetchone()
+        if not post_data:
+            database_connection.close()
             return jsonify({
                 'success': False,
                 'message': '貼文不存在'
             }), 404
         
-        # 檢查用戶是否已經按過讚
+        # 只有公開貼文的按讚會計入作者積分
+        post_author = post_data[0] if post_data[1] else None
+        
+        # 按讚紀錄、計數器與作者積分在同一個交易內更新
+        database_connection.begin()
+        
+        # 檢查用戶是否已經按過讚（鎖定該筆紀錄避免重複點擊競爭）
         database_cursor.execute("""
             SELECT Like_id FROM Likes 
             WHERE Post_id = %s AND User_Email = %s
+            FOR UPDATE
         """, (post_id, current_user.id))
         
         existing_like = database_cursor.fetchone()
@@ -722,6 +847,9 @@ def toggle_like(post_id):
                 DELETE FROM Likes 
                 WHERE Post_id = %s AND User_Email = %s
             """, (post_id, current_user.id))
+            removed_likes = database_cursor.rowcount
+            likes_count = adjust_post_counter(database_cursor, post_id, 'likes_count', -removed_likes)
+            level_update = record_points_event(database_cursor, post_author, 'like_received', -removed_likes, post_id)
             is_liked = False
             action = 'unliked'
         else:
@@ -731,22 +859,17 @@ def toggle_like(post_id):
                 INSERT INTO Likes (Post_id, User_Email, Created_at) 
                 VALUES (%s, %s, %s)
             """, (post_id, current_user.id, current_time))
+            likes_count = adjust_post_counter(database_cursor, post_id, 'likes_count', 1)
+            level_update = record_points_event(database_cursor, post_author, 'like_received', 1, post_id)
             is_liked = True
             action = 'liked'
         
-        # 獲取更新後的按讚數量
-        database_cursor.execute("""
-            SELECT COUNT(*) FROM Likes WHERE Post_id = %s
-        """, (post_id,))
-        likes_count = database_cursor.fetchone()[0]
-        
         database_connection.commit()
         database_connection.close()
+        database_connection = None
         
-        # 如果是按讚（不是取消），更新用戶等級
-        if is_liked:
-            level_update = update_user_level_and_stats(current_user.id)
-        else:
+        # 升級提示只在積分屬於當前用戶時顯示（例如按讚自己的貼文）
+        if not level_update or level_update.get('user_email') != current_user.id:
             level_update = None
         
         response_data = {
@@ -770,6 +893,9 @@ def toggle_like(post_id):
         
     except Exception as e:
         print(f"[ERROR] 按讚操作失敗: {str(e)}")
+        if database_connection:
+            database_connection.rollback()
+            database_connection.close()
         return jsonify({
             'success': False,
             'message': f'操作失敗：{str(e)}'
@@ -802,78 +928,19 @@ def liked_posts():
                 p.Is_public,
                 p.Created_at,
                 l.Created_at as liked_at,
-                COUNT(all_likes.Like_id) AS likes_count,
+                p.likes_count,
                 1 AS user_liked
             FROM Likes l
             INNER JOIN Posts p ON l.Post_id = p.Post_id
             LEFT JOIN User u ON p.User_Email = u.User_Email
-            LEFT JOIN Likes all_likes ON p.Post_id = all_likes.Post_id
             WHERE l.User_Email = %s AND p.Is_public = TRUE
-            GROUP BY p.Post_id, p.User_Email, u.User_name, p.title, p.Content, p.Mood, p.Is_Anonymous, p.Image_URL, p.Is_public, p.Created_at, l.Created_at
             ORDER BY l.Created_at DESC
         """, (current_user.id,))
         
         raw_posts_data = database_cursor.fetchall()
         
-        formatted_post_data = []
-        
-        # 為每個貼文處理評論資料
-        for post_item in raw_posts_data:
-            post_id = post_item[0]
-            
-            # 獲取該貼文的評論
-            database_cursor.execute("""
-                SELECT 
-                    c.Comment_id,
-                    c.User_Email,
-                    u.User_name,
-                    c.Content,
-                    c.Reply_to_id,
-                    c.Reply_to_username,
-                    c.Is_public,
-                    c.Created_at
-                FROM Comments c
-                LEFT JOIN User u ON c.User_Email = u.User_Email
-                WHERE c.Post_id = %s AND c.Is_public = TRUE
-                ORDER BY c.Created_at ASC
-            """, (post_id,))
-            
-            comments_data = database_cursor.fetchall()
-            
-            # 檢查當前用戶是否已追蹤該貼文作者（僅非匿名貼文）
-            is_following = False
-            if not post_item[6] and post_item[1] != current_user.id:  # 非匿名且非自己的貼文
-                database_cursor.execute("""
-                    SELECT id FROM follows 
-                    WHERE follower_email = %s AND following_email = %s
-                """, (current_user.id, post_item[1]))
-                is_following = database_cursor.fetchone() is not None
-
-            # 為評論添加追蹤狀態
-            comments_with_follow_status = []
-            for comment_item in comments_data:
-                comment_following = False
-                if comment_item[1] != current_user.id and comment_item[1] != post_item[1]:  # 非自己且非貼文作者
-                    database_cursor.execute("""
-                        SELECT id FROM follows 
-                        WHERE follower_email = %s AND following_email = %s
-                    """, (current_user.id, comment_item[1]))
-                    comment_following = database_cursor.fetchone() is not None
-                
-                comments_with_follow_status.append({
-                    'comment_id': comment_item[0],
-                    'user_email': comment_item[1],
-                    'username': comment_item[2],
-                    'content': comment_item[3],
-                    'reply_to_id': comment_item[4],
-                    'reply_to_username': comment_item[5],
-                    'is_public': comment_item[6],
-                    'created_at': format_datetime(comment_item[7]),
-                    'is_following': comment_following
-                })
-            
-            # 組裝完整的貼文資料
-            complete_post_data = {
+        formatted_post_data = [
+            {
                 'post_id': post_item[0],
                 'user_email': post_item[1],
                 'username': post_item[2] if not post_item[6] else '匿名用戶',  # 如果匿名則顯示匿名用戶
@@ -886,12 +953,13 @@ def liked_posts():
                 'created_at': format_datetime(post_item[9]),
                 'liked_at': format_datetime(post_item[10]),  # 新增按讚時間
                 'likes_count': post_item[11],
-                'user_liked': bool(post_item[12]),  # 當前用戶已按讚
-                'is_following': is_following,  # 當前用戶是否已追蹤該作者
-                'comments': comments_with_follow_status
+                'user_liked': bool(post_item[12])  # 當前用戶已按讚
             }
-            
-            formatted_post_data.append(complete_post_data)
+            for post_item in raw_posts_data
+        ]
+        
+        # 批次補上評論與追蹤狀態
+        hydrate_posts(database_cursor, formatted_post_data, current_user.id, time_formatter=format_datetime)
         
         database_connection.close()
         
@@ -997,15 +1065,12 @@ def get_liked_posts_api():
                 p.Image_URL,
                 p.Created_at,
                 l.Created_at as liked_at,
-                COUNT(all_likes.Like_id) AS likes_count,
-                COUNT(c.Comment_id) AS comments_count
+                p.likes_count,
+                p.comments_count
             FROM Likes l
             INNER JOIN Posts p ON l.Post_id = p.Post_id
             LEFT JOIN User u ON p.User_Email = u.User_Email
-            LEFT JOIN Likes all_likes ON p.Post_id = all_likes.Post_id
-            LEFT JOIN Comments c ON p.Post_id = c.Post_id AND c.Is_public = TRUE
             WHERE l.User_Email = %s AND p.Is_public = TRUE
-            GROUP BY p.Post_id, p.User_Email, u.User_name, p.title, p.Content, p.Mood, p.Is_Anonymous, p.Image_URL, p.Created_at, l.Created_at
             ORDER BY l.Created_at DESC
             LIMIT %s OFFSET %s
         """, (current_user.id, limit, offset))
@@ -1084,14 +1149,18 @@ def add_comment(post_id):
         database_connection = db.get_connection()
         database_cursor = database_connection.cursor()
         
-        # 檢查貼文是否存在
-        database_cursor.execute("SELECT Post_id FROM Posts WHERE Post_id = %s", (post_id,))
-        if not database_cursor.fetchone():
+        # 檢查貼文是否存在，同時取得作者（獲得留言積分的用戶）
+        database_cursor.execute("SELECT User_Email, Is_public FROM Posts WHERE Post_id = %s", (post_id,))
+        post_data = database_cursor.fetchone()
+        if not post_data:
             return jsonify({
                 'success': False,
                 'message': '貼文不存在'
             }), 404
         
+        # 他人在公開貼文下的留言才計入作者積分
+        post_author = post_data[0] if post_data[1] and post_data[0] != current_user.id else None
+        
         # 如果是回覆，檢查被回覆的評論是否存在
         if reply_to_id:
             database_cursor.execute("SELECT Comment_id FROM Comments WHERE Comment_id = %s AND Post_id = %s", (reply_to_id, post_id))
@@ -1101,31 +1170,30 @@ def add_comment(post_id):
                     'message': '被回覆的評論不存在'
                 }), 404
         
-        # 新增評論
-        current_time = datetime.now()
-        database_cursor.execute("""
-            INSERT INTO Comments (Post_id, User_Email, Content, Reply_to_id, Reply_to_username, Is_public, Created_at, Updated_at) 
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-        """, (post_id, current_user.id, content, reply_to_id or None, reply_to_username or None, True, current_time, current_time))
-        
-        comment_id = database_cursor.lastrowid
-        
         # 獲取用戶名稱
         database_cursor.execute("SELECT User_name FROM User WHERE User_Email = %s", (current_user.id,))
         user_data = database_cursor.fetchone()
         username = user_data[0] if user_data else '未知用戶'
         
-        # 獲取更新後的評論數量
-        database_cursor.execute("""
-            SELECT COUNT(*) FROM Comments WHERE Post_id = %s
-        """, (post_id,))
-        comments_count = database_cursor.fetchone()[0]
-        
-        database_connection.commit()
-        database_connection.close()
-        
-        # 更新用戶等級
-        level_update = update_user_level_and_stats(current_user.id)
+        # 新增評論與更新評論計數器在同一個交易內完成
+        current_time = datetime.now()
+        database_connection.begin()
+        try:
+            database_cursor.execute("""
+                INSERT INTO Comments (Post_id, User_Email, Content, Reply_to_id, Reply_to_username, Is_public, Created_at, Updated_at) 
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            """, (post_id, current_user.id, content, reply_to_id or None, reply_to_username or None, True, current_time, current_time))
+            
+            comment_id = database_cursor.lastrowid
+            comments_count = adjust_post_counter(database_cursor, post_id, 'comments_count', 1)
+            record_points_event(database_cursor, post_author, 'comment_received', 1, post_id)
+            
+            database_connection.commit()
+        except Exception:
+            database_connection.rollback()
+            raise
+        finally:
+            database_connection.close()
         
         response_data = {
             'success': True,
@@ -1140,16 +1208,6 @@ def add_comment(post_id):
             'comments_count': comments_count
         }
         
-        # 如果等級提升，添加升級信息
-        if level_update and level_update.get('level_changed'):
-            new_level_info = UserLevelSystem.get_level_info(level_update['new_level'])
-            response_data['level_up'] = {
-                'new_level': level_update['new_level'],
-                'new_title': new_level_info['title'],
-                'new_emoji': new_level_info['emoji'],
-                'message': f'🎉 恭喜！您已升級為 {new_level_info["emoji"]} {new_level_info["title"]}！'
-            }
-        
         return jsonify(response_data)
         
     except Exception as e:
@@ -1326,8 +1384,10 @@ def delete_comment(comment_id):
         
         # 先檢查留言是否存在且屬於當前用戶，同時獲取貼文ID用於更新留言數
         database_cursor.execute("""
-            SELECT User_Email, Post_id FROM Comments 
-            WHERE Comment_id = %s AND User_Email = %s
+            SELECT c.User_Email, c.Post_id, p.User_Email, p.Is_public, c.Is_public
+            FROM Comments c
+            JOIN Posts p ON c.Post_id = p.Post_id
+            WHERE c.Comment_id = %s AND c.User_Email = %s
         """, (comment_id, current_user.id))
         
         comment_data = database_cursor.fetchone()
@@ -1342,19 +1402,27 @@ def delete_comment(comment_id):
         
         post_id = comment_data[1]
         
-        # 刪除留言
-        database_cursor.execute("DELETE FROM Comments WHERE Comment_id = %s", (comment_id,))
-        affected_rows = database_cursor.rowcount
-        print(f"[DEBUG] 刪除影響的行數: {affected_rows}")
-        
-        # 獲取更新後的留言數量
-        database_cursor.execute("""
-            SELECT COUNT(*) FROM Comments WHERE Post_id = %s
-        """, (post_id,))
-        comments_count = database_cursor.fetchone()[0]
+        # 他人在公開貼文下的公開留言才需要扣回作者積分
+        post_author = comment_data[2] if comment_data[3] and comment_data[4] and comment_data[2] != current_user.id else None
         
-        database_connection.commit()
-        database_connection.close()
+        # 刪除留言、更新留言計數器與扣回作者積分在同一個交易內完成
+        database_connection.begin()
+        try:
+            database_cursor.execute("DELETE FROM Comments WHERE Comment_id = %s", (comment_id,))
+            affected_rows = database_cursor.rowcount
+            print(f"[DEBUG] 刪除影響的行數: {affected_rows}")
+            
+            # comments_count 只計公開留言；非公開留言（例如舊資料）刪除時不扣，只讀回目前計數
+            counter_delta = -affected_rows if comment_data[4] else 0
+            comments_count = adjust_post_counter(database_cursor, post_id, 'comments_count', counter_delta)
+            record_points_event(database_cursor, post_author, 'comment_received', -affected_rows, post_id)
+            
+            database_connection.commit()
+        except Exception:
+            database_connection.rollback()
+            raise
+        finally:
+            database_connection.close()
         
         print(f"[DEBUG] 留言 {comment_id} 刪除成功")
         return jsonify({
@@ -1395,11 +1463,12 @@ def check_like_status(post_id):
         
         is_liked = database_cursor.fetchone() is not None
         
-        # 獲取總按讚數
+        # 獲取總按讚數（讀取貼文計數器）
         database_cursor.execute("""
-            SELECT COUNT(*) FROM Likes WHERE Post_id = %s
+            SELECT likes_count FROM Posts WHERE Post_id = %s
         """, (post_id,))
-        likes_count = database_cursor.fetchone()[0]
+        likes_row = database_cursor.fetchone()
+        likes_count = likes_row[0] if likes_row else 0
         
         database_connection.close()
         
@@ -1425,12 +1494,14 @@ def search():
     Query Parameters:
         q (str): 搜尋關鍵字
         type (str): 搜尋類型 (all, posts, users)
+        page (int): 頁碼（從 1 開始）
         
     Returns:
         str: 渲染後的搜尋結果 HTML 頁面
     """
     query = request.args.get('q', '').strip()
     search_type = request.args.get('type', 'all')
+    page = request.args.get('page', 1, type=int)
     
     if not query:
         # 如果沒有搜尋關鍵字，返回空結果
@@ -1439,126 +1510,55 @@ def search():
                              search_type=search_type,
                              posts=[], 
                              users=[],
-                             total_results=0)
+                             total_results=0,
+                             page=1,
+                             has_more=False)
     
-    database_connection = db.get_connection()
+    database_connection = db.get_connection(readonly=True)
     database_cursor = database_connection.cursor()
     
     posts = []
     users = []
+    posts_has_more = False
+    users_has_more = False
     
     try:
         # 搜尋貼文 (如果搜尋類型是 all 或 posts)
         if search_type in ['all', 'posts']:
-            # 搜尋貼文標題和內容
-            database_cursor.execute("""
-                SELECT 
-                    p.Post_id,
-                    p.User_Email,
-                    u.User_name,
-                    p.title,
-                    p.Content,
-                    p.Mood,
-                    p.Is_Anonymous,
-                    p.Image_URL,
-                    p.Is_public,
-                    p.Created_at,
-                    COUNT(l.Like_id) AS likes_count,
-                    MAX(CASE WHEN l.User_Email = %s THEN 1 ELSE 0 END) AS user_liked
-                FROM Posts p
-                LEFT JOIN User u ON p.User_Email = u.User_Email
-                LEFT JOIN Likes l ON p.Post_id = l.Post_id
-                WHERE p.Is_public = TRUE 
-                AND (
-                    p.title LIKE %s 
-                    OR p.Content LIKE %s 
-                    OR (p.Is_Anonymous = FALSE AND u.User_name LIKE %s)
-                )
-                GROUP BY p.Post_id, p.User_Email, u.User_name, p.title, p.Content, p.Mood, p.Is_Anonymous, p.Image_URL, p.Is_public, p.Created_at
-                ORDER BY p.Created_at DESC
-                LIMIT 50
-            """, (current_user.id, f'%{query}%', f'%{query}%', f'%{query}%'))
+            # 以全文索引依相關度搜尋貼文標題、內容與作者名稱
+            posts_data, posts_has_more = search_posts(database_cursor, current_user.id, query, page)
             
-            posts_data = database_cursor.fetchall()
-            
-            # 為每個貼文獲取評論
-            for post_item in posts_data:
-                post_id = post_item[0]
-                
-                # 獲取該貼文的評論
-                database_cursor.execute("""
-                    SELECT 
-                        c.Comment_id,
-                        c.User_Email,
-                        u.User_name,
-                        c.Content,
-                        c.Reply_to_id,
-                        c.Reply_to_username,
-                        c.Is_public,
-                        c.Created_at
-                    FROM Comments c
-                    LEFT JOIN User u ON c.User_Email = u.User_Email
-                    WHERE c.Post_id = %s AND c.Is_public = TRUE
-                    ORDER BY c.Created_at ASC
-                """, (post_id,))
-                
-                comments_data = database_cursor.fetchall()
-                
-                # 組裝完整的貼文資料
-                complete_post_data = {
+            posts = [
+                {
                     'post_id': post_item[0],
                     'user_email': post_item[1],
                     'username': post_item[2] if not post_item[6] else '匿名用戶',
                     'title': post_item[3],
                     'content': post_item[4],
+                    'highlighted_title': highlight(post_item[3], query),
+                    'highlighted_content': highlight(post_item[4], query, max_length=150),
                     'mood': post_item[5],
                     'is_anonymous': post_item[6],
                     'image_url': post_item[7],
                     'is_public': post_item[8],
                     'created_at': post_item[9],
                     'likes_count': post_item[10],
-                    'user_liked': bool(post_item[11]),
-                    'comments': [
-                        {
-                            'comment_id': comment_item[0],
-                            'user_email': comment_item[1],
-                            'username': comment_item[2],
-                            'content': comment_item[3],
-                            'reply_to_id': comment_item[4],
-                            'reply_to_username': comment_item[5],
-                            'is_public': comment_item[6],
-                            'created_at': comment_item[7]
-                        }
-                        for comment_item in comments_data
-                    ]
+                    'user_liked': bool(post_item[11])
                 }
-                
-                posts.append(complete_post_data)
+                for post_item in posts_data
+            ]
+            
+            # 批次補上評論
+            hydrate_posts(database_cursor, posts, current_user.id, include_follow_status=False)
         
         # 搜尋用戶 (如果搜尋類型是 all 或 users)
         if search_type in ['all', 'users']:
-            # 搜尋用戶名稱
-            database_cursor.execute("""
-                SELECT 
-                    u.User_Email,
-                    u.User_name,
-                    u.Created_At,
-                    COUNT(DISTINCT p.Post_id) as post_count,
-                    COUNT(DISTINCT l.Like_id) as likes_received
-                FROM User u
-                LEFT JOIN Posts p ON u.User_Email = p.User_Email AND p.Is_public = TRUE
-                LEFT JOIN Likes l ON p.Post_id = l.Post_id
-                WHERE u.User_name LIKE %s
-                GROUP BY u.User_Email, u.User_name, u.Created_At
-                ORDER BY post_count DESC, u.User_name ASC
-                LIMIT 20
-            """, (f'%{query}%',))
-            
-            users_data = database_cursor.fetchall()
+            users_data, users_has_more = search_users(database_cursor, query, page)
             users = [
                 {
                     'user_email': user_item[0],
                     'username': user_item[1],
+                    'highlighted_username': highlight(user_item[1], query),
                     'created_at': user_item[2],
                     'post_count': user_item[3],
                     'likes_received': user_item[4]
@@ -1576,7 +1576,9 @@ def search():
                              search_type=search_type,
                              posts=posts, 
                              users=users,
-                             total_results=total_results)
+                             total_results=total_results,
+                             page=page,
+                             has_more=posts_has_more or users_has_more)
         
     except Exception as e:
         print(f"[ERROR] 搜尋時發生錯誤: {str(e)}")
@@ -1587,6 +1589,8 @@ def search():
                              posts=[], 
                              users=[],
                              total_results=0,
+                             page=page,
+                             has_more=False,
                              error_message=f'搜尋失敗：{str(e)}')
 
 @social_bp.route('/search_api')
@@ -1598,12 +1602,14 @@ def search_api():
     Query Parameters:
         q (str): 搜尋關鍵字
         type (str): 搜尋類型 (all, posts, users)
+        page (int): 頁碼（從 1 開始）
         
     Returns:
-        JSON: 搜尋結果
+        JSON: 搜尋結果（highlighted_* 欄位為已跳脫並以 <mark> 標示關鍵字的 HTML）
     """
     query = request.args.get('q', '').strip()
     search_type = request.args.get('type', 'all')
+    page = request.args.get('page', 1, type=int)
     
     if not query:
         return jsonify({
@@ -1612,90 +1618,52 @@ def search_api():
             'search_type': search_type,
             'posts': [],
             'users': [],
-            'total_results': 0
+            'total_results': 0,
+            'page': 1,
+            'has_more': False
         })
     
-    database_connection = db.get_connection()
+    database_connection = db.get_connection(readonly=True)
     database_cursor = database_connection.cursor()
     
     posts = []
     users = []
+    posts_has_more = False
+    users_has_more = False
     
     try:
         # 搜尋貼文
         if search_type in ['all', 'posts']:
-            database_cursor.execute("""
-                SELECT 
-                    p.Post_id,
-                    p.User_Email,
-                    u.User_name,
-                    p.title,
-                    p.Content,
-                    p.Mood,
-                    p.Is_Anonymous,
-                    p.Image_URL,
-                    p.Created_at,
-                    COUNT(l.Like_id) AS likes_count,
-                    MAX(CASE WHEN l.User_Email = %s THEN 1 ELSE 0 END) AS user_liked,
-                    COUNT(c.Comment_id) AS comments_count
-                FROM Posts p
-                LEFT JOIN User u ON p.User_Email = u.User_Email
-                LEFT JOIN Likes l ON p.Post_id = l.Post_id
-                LEFT JOIN Comments c ON p.Post_id = c.Post_id AND c.Is_public = TRUE
-                WHERE p.Is_public = TRUE 
-                AND (
-                    p.title LIKE %s 
-                    OR p.Content LIKE %s 
-                    OR (p.Is_Anonymous = FALSE AND u.User_name LIKE %s)
-                )
-                GROUP BY p.Post_id, p.User_Email, u.User_name, p.title, p.Content, p.Mood, p.Is_Anonymous, p.Image_URL, p.Created_at
-                ORDER BY p.Created_at DESC
-                LIMIT 50
-            """, (current_user.id, f'%{query}%', f'%{query}%', f'%{query}%'))
-            
-            posts_data = database_cursor.fetchall()
-        posts = [
+            posts_data, posts_has_more = search_posts(database_cursor, current_user.id, query, page)
+            posts = [
                 {
                     'post_id': post_item[0],
                     'user_email': post_item[1],
                     'username': post_item[2] if not post_item[6] else '匿名用戶',
                     'title': post_item[3],
                     'content': post_item[4][:200] + '...' if len(post_item[4]) > 200 else post_item[4],  # 截取內容
+                    'highlighted_title': str(highlight(post_item[3], query)),
+                    'highlighted_content': str(highlight(post_item[4], query, max_length=200)),
                     'mood': post_item[5],
                     'is_anonymous': post_item[6],
                     'image_url': post_item[7],
-            'created_at': format_datetime(post_item[8]),
-                    'likes_count': post_item[9],
-                    'user_liked': bool(post_item[10]),
-                    'comments_count': post_item[11]
+                    'created_at': format_datetime(post_item[9]),
+                    'likes_count': post_item[10],
+                    'user_liked': bool(post_item[11]),
+                    'comments_count': post_item[12]
                 }
                 for post_item in posts_data
             ]
         
         # 搜尋用戶
         if search_type in ['all', 'users']:
-            database_cursor.execute("""
-                SELECT 
-                    u.User_Email,
-                    u.User_name,
-                    u.Created_At,
-                    COUNT(DISTINCT p.Post_id) as post_count,
-                    COUNT(DISTINCT l.Like_id) as likes_received
-                FROM User u
-                LEFT JOIN Posts p ON u.User_Email = p.User_Email AND p.Is_public = TRUE
-                LEFT JOIN Likes l ON p.Post_id = l.Post_id
-                WHERE u.User_name LIKE %s
-                GROUP BY u.User_Email, u.User_name, u.Created_At
-                ORDER BY post_count DESC, u.User_name ASC
-                LIMIT 20
-            """, (f'%{query}%',))
-            
-            users_data = database_cursor.fetchall()
-        users = [
+            users_data, users_has_more = search_users(database_cursor, query, page)
+            users = [
                 {
                     'user_email': user_item[0],
                     'username': user_item[1],
-            'created_at': format_datetime(user_item[2], '%Y-%m-%d'),
+                    'highlighted_username': str(highlight(user_item[1], query)),
+                    'created_at': format_datetime(user_item[2], '%Y-%m-%d'),
                     'post_count': user_item[3],
                     'likes_received': user_item[4]
                 }
@@ -1710,7 +1678,9 @@ def search_api():
             'search_type': search_type,
             'posts': posts,
             'users': users,
-            'total_results': len(posts) + len(users)
+            'total_results': len(posts) + len(users),
+            'page': page,
+            'has_more': posts_has_more or users_has_more
         })
         
     except Exception as e:
@@ -1781,12 +1751,14 @@ def follow():
                 'message': '您已經追蹤了這個用戶'
             }), 400
         
-        # 創建追蹤關係
+        # 創建追蹤關係，並在同一交易內回填追蹤時間軸
         current_time = datetime.now()
+        database_connection.begin()
         database_cursor.execute("""
             INSERT INTO follows (follower_email, following_email, created_at) 
             VALUES (%s, %s, %s)
         """, (current_user.id, user_email, current_time))
+        backfill_timeline(database_cursor, current_user.id, user_email)
         
         # 獲取更新後的當前用戶統計數據（只返回當前用戶的數據）
         database_cursor.execute("""
@@ -1854,11 +1826,13 @@ def unfollow():
                 'message': '您尚未追蹤這個用戶'
             }), 400
         
-        # 刪除追蹤關係
+        # 刪除追蹤關係，並在同一交易內清除追蹤時間軸
+        database_connection.begin()
         database_cursor.execute("""
             DELETE FROM follows 
             WHERE follower_email = %s AND following_email = %s
         """, (current_user.id, user_email))
+        prune_timeline(database_cursor, current_user.id, user_email)
         
         # 獲取更新後的當前用戶統計數據（只返回當前用戶的數據）
         database_cursor.execute("""
@@ -1939,12 +1913,14 @@ def follow_user(user_email):
                 'message': '您已經追蹤了這個用戶'
             }), 400
         
-        # 創建追蹤關係
+        # 創建追蹤關係，並在同一交易內回填追蹤時間軸
         current_time = datetime.now()
+        database_connection.begin()
         database_cursor.execute("""
             INSERT INTO follows (follower_email, following_email, created_at) 
             VALUES (%s, %s, %s)
         """, (current_user.id, user_email, current_time))
+        backfill_timeline(database_cursor, current_user.id, user_email)
         
         # 獲取更新後的追蹤數據
         database_cursor.execute("""
@@ -2010,11 +1986,13 @@ def unfollow_user(user_email):
                 'message': '您尚未追蹤這個用戶'
             }), 400
         
-        # 刪除追蹤關係
+        # 刪除追蹤關係，並在同一交易內清除追蹤時間軸
+        database_connection.begin()
         database_cursor.execute("""
             DELETE FROM follows 
             WHERE follower_email = %s AND following_email = %s
         """, (current_user.id, user_email))
+        prune_timeline(database_cursor, current_user.id, user_email)
         
         # 獲取更新後的追蹤數據
         database_cursor.execute("""
@@ -2272,7 +2250,7 @@ def get_following_posts():
         database_connection = db.get_connection()
         database_cursor = database_connection.cursor()
         
-        # 獲取我追蹤的用戶的貼文
+        # 獲取我追蹤的用戶的貼文（讀取追蹤時間軸）
         database_cursor.execute("""
             SELECT 
                 p.Post_id,
@@ -2285,46 +2263,22 @@ def get_following_posts():
                 p.Image_URL,
                 p.Is_public,
                 p.Created_at,
-                COUNT(l.Like_id) AS likes_count,
-                MAX(CASE WHEN l.User_Email = %s THEN 1 ELSE 0 END) AS user_liked
-            FROM Posts p
-            INNER JOIN follows f ON p.User_Email = f.following_email
+                p.likes_count,
+                EXISTS (
+                    SELECT 1 FROM Likes l WHERE l.Post_id = p.Post_id AND l.User_Email = %s
+                ) AS user_liked
+            FROM user_timeline t
+            INNER JOIN Posts p ON p.Post_id = t.post_id
             LEFT JOIN User u ON p.User_Email = u.User_Email
-            LEFT JOIN Likes l ON p.Post_id = l.Post_id
-            WHERE f.follower_email = %s AND p.Is_public = TRUE
-            GROUP BY p.Post_id, p.User_Email, u.User_name, p.title, p.Content, p.Mood, p.Is_Anonymous, p.Image_URL, p.Is_public, p.Created_at
-            ORDER BY p.Created_at DESC
+            WHERE t.owner_email = %s AND p.Is_public = TRUE
+            ORDER BY t.post_created_at DESC, t.post_id DESC
             LIMIT 100
         """, (current_user.id, current_user.id))
         
         posts_data = database_cursor.fetchall()
         
-        # 為每個貼文獲取評論
-        formatted_posts = []
-        for post_item in posts_data:
-            post_id = post_item[0]
-            
-            # 獲取該貼文的評論
-            database_cursor.execute("""
-                SELECT 
-                    c.Comment_id,
-                    c.User_Email,
-                    u.User_name,
-                    c.Content,
-                    c.Reply_to_id,
-                    c.Reply_to_username,
-                    c.Is_public,
-                    c.Created_at
-                FROM Comments c
-                LEFT JOIN User u ON c.User_Email = u.User_Email
-                WHERE c.Post_id = %s AND c.Is_public = TRUE
-                ORDER BY c.Created_at ASC
-            """, (post_id,))
-            
-            comments_data = database_cursor.fetchall()
-            
-            # 組裝完整的貼文資料
-            complete_post_data = {
+        formatted_posts = [
+            {
                 'post_id': post_item[0],
                 'user_email': post_item[1],
                 'username': post_item[2] if not post_item[6] else '匿名用戶',
@@ -2336,23 +2290,14 @@ def get_following_posts():
                 'is_public': post_item[8],
                 'created_at': format_datetime(post_item[9]),
                 'likes_count': post_item[10],
-                'user_liked': bool(post_item[11]),
-                'comments': [
-                    {
-                        'comment_id': comment_item[0],
-                        'user_email': comment_item[1],
-                        'username': comment_item[2],
-                        'content': comment_item[3],
-                        'reply_to_id': comment_item[4],
-                        'reply_to_username': comment_item[5],
-                        'is_public': comment_item[6],
-                        'created_at': format_datetime(comment_item[7])
-                    }
-                    for comment_item in comments_data
-                ]
+                'user_liked': bool(post_item[11])
             }
-            
-            formatted_posts.append(complete_post_data)
+            for post_item in posts_data
+        ]
+        
+        # 批次補上評論
+        hydrate_posts(database_cursor, formatted_posts, current_user.id,
+                      include_follow_status=False, time_formatter=format_datetime)
         
         database_connection.close()
         
@@ -2404,9 +2349,8 @@ def user_posts(user_email):
 
         database_cursor.execute(
             """
-            SELECT COUNT(l.Like_id) FROM Likes l
-            JOIN Posts p ON l.Post_id = p.Post_id
-            WHERE p.User_Email = %s
+            SELECT COALESCE(SUM(likes_count), 0) FROM Posts
+            WHERE User_Email = %s
             """,
             (user_email,)
         )
@@ -2425,43 +2369,22 @@ def user_posts(user_email):
                 p.Image_URL,
                 p.Is_public,
                 p.Created_at,
-                COUNT(l.Like_id) AS likes_count,
-                MAX(CASE WHEN l.User_Email = %s THEN 1 ELSE 0 END) AS user_liked
+                p.likes_count,
+                EXISTS (
+                    SELECT 1 FROM Likes l WHERE l.Post_id = p.Post_id AND l.User_Email = %s
+                ) AS user_liked
             FROM Posts p
             LEFT JOIN User u ON p.User_Email = u.User_Email
-            LEFT JOIN Likes l ON p.Post_id = l.Post_id
             WHERE p.Is_public = TRUE AND p.User_Email = %s
-            GROUP BY p.Post_id, p.User_Email, u.User_name, p.title, p.Content, p.Mood, p.Is_Anonymous, p.Image_URL, p.Is_public, p.Created_at
             ORDER BY p.Created_at DESC
             LIMIT 100
         """, (current_user.id, user_email))
 
         posts_data = database_cursor.fetchall()
 
-        # 處理每篇貼文與其評論
-        formatted_posts = []
-        for post_item in posts_data:
-            post_id = post_item[0]
-
-            database_cursor.execute("""
-                SELECT 
-                    c.Comment_id,
-                    c.User_Email,
-                    u.User_name,
-                    c.Content,
-                    c.Reply_to_id,
-                    c.Reply_to_username,
-                    c.Is_public,
-                    c.Created_at
-                FROM Comments c
-                LEFT JOIN User u ON c.User_Email = u.User_Email
-                WHERE c.Post_id = %s AND c.Is_public = TRUE
-                ORDER BY c.Created_at ASC
-            """, (post_id,))
-
-            comments_data = database_cursor.fetchall()
-
-            complete_post_data = {
+        # 處理每篇貼文，評論以整頁批次查詢
+        formatted_posts = [
+            {
                 'post_id': post_item[0],
                 'user_email': post_item[1],
                 'username': post_item[2] if not post_item[6] else '匿名用戶',
@@ -2473,23 +2396,12 @@ def user_posts(user_email):
                 'is_public': post_item[8],
                 'created_at': format_datetime(post_item[9]),
                 'likes_count': post_item[10],
-                'user_liked': bool(post_item[11]),
-                'comments': [
-                    {
-                        'comment_id': c_item[0],
-                        'user_email': c_item[1],
-                        'username': c_item[2],
-                        'content': c_item[3],
-                        'reply_to_id': c_item[4],
-                        'reply_to_username': c_item[5],
-                        'is_public': c_item[6],
-                        'created_at': format_datetime(c_item[7])
-                    }
-                    for c_item in comments_data
-                ]
+                'user_liked': bool(post_item[11])
             }
-
-            formatted_posts.append(complete_post_data)
+            for post_item in posts_data
+        ]
+        hydrate_posts(database_cursor, formatted_posts, current_user.id,
+                      include_follow_status=False, time_formatter=format_datetime)
 
         database_connection.close()
         return render_template('social/social_main.html', posts=formatted_posts, user=user_obj)
@@ -2533,11 +2445,13 @@ def remove_follower():
                 'message': '該用戶並未追蹤您'
             }), 400
         
-        # 刪除追蹤關係
+        # 刪除追蹤關係，並在同一交易內清除對方的追蹤時間軸
+        database_connection.begin()
         database_cursor.execute("""
             DELETE FROM follows 
             WHERE follower_email = %s AND following_email = %s
         """, (follower_email, current_user.id))
+        prune_timeline(database_cursor, follower_email, current_user.id)
         
         # 獲取更新後的粉絲數
         database_cursor.execute("""
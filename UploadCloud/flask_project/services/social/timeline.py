@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+追蹤動態時間軸（fan-out-on-write）模組
+
+「追蹤中」分頁過去每次都以 Posts × follows 即時 JOIN，成本隨追蹤人數成長。
+改為每位用戶一份時間軸資料表 user_timeline：
+- create_post 發文時，將貼文寫入所有粉絲的時間軸（fan_out_post）
+- 追蹤時回填被追蹤者的既有公開貼文（backfill_timeline）
+- 取消追蹤 / 移除粉絲時刪除該作者在時間軸上的貼文（prune_timeline）
+- 刪除貼文時由外鍵 ON DELETE CASCADE 一併移除
+
+讀取時只需對 (owner_email, post_created_at, post_id) 索引做一次範圍掃描。
+
+命令列：
+    flask social rebuild-timeline              # 依 follows 重建全部時間軸
+    flask social rebuild-timeline a@example.com
+"""
+
+import click
+
+from utils import db
+from . import social_bp
+
+
+def fan_out_post(database_cursor, post_id, author_email, created_at):
+    """
+    將新貼文寫入作者所有粉絲的時間軸（需與 INSERT Posts 在同一交易內呼叫）
+
+    Args:
+        database_cursor: 資料庫游標
+        post_id (int): 貼文ID
+        author_email (str): 作者Email
+        created_at (datetime): 貼文建立時間
+
+    Returns:
+        int: 寫入的時間軸筆數
+    """
+    database_cursor.execute("""
+        INSERT IGNORE INTO user_timeline (owner_email, post_id, author_email, post_created_at)
+        SELECT f.follower_email, %s, %s, %s
+        FROM follows f
+        WHERE f.following_email = %s
+    """, (post_id, author_email, created_at, author_email))
+    return database_cursor.rowcount
+
+
+def backfill_timeline(database_cursor, owner_email, author_email):
+    """
+    追蹤後將被追蹤者的既有公開貼文回填到追蹤者的時間軸
+
+    Args:
+        database_cursor: 資料庫游標
+        owner_email (str): 追蹤者Email（時間軸擁有者）
+        author_email (str): 被追蹤者Email
+
+    Returns:
+        int: 回填的時間軸筆數
+    """
+    database_cursor.execute("""
+        INSERT IGNORE INTO user_timeline (owner_email, post_id, author_email, post_created_at)
+        SELECT %s, p.Post_id, p.User_Email, p.Created_at
+        FROM Posts p
+        WHERE p.User_Email = %s AND p.Is_public = TRUE
+    """, (owner_email, author_email))
+    return database_cursor.rowcount
+
+
+def prune_timeline(database_cursor, owner_email, author_email):
+    """
+    取消追蹤後從追蹤者的時間軸移除該作者的貼文
+
+    Args:
+        database_cursor: 資料庫游標
+        owner_email (str): 追蹤者Email（時間軸擁有者）
+        author_email (str): 被取消追蹤者Email
+
+    Returns:
+        int: 移除的時間軸筆數
+    """
+    database_cursor.execute("""
+        DELETE FROM user_timeline
+        WHERE owner_email = %s AND author_email = %s
+    """, (owner_email, author_email))
+    return database_cursor.rowcount
+
+
+def rebuild_timelines(owner_emails=None):
+    """
+    依 follows 與 Posts 重建時間軸（修復/回填）
+
+    Args:
+        owner_emails (list): 只重建指定用戶；None 表示重建所有有追蹤對象的用戶
+
+    Returns:
+        int: 重建的用戶數
+    """
+    database_connection = db.get_connection()
+    database_cursor = database_connection.cursor()
+
+    try:
+        if not owner_emails:
+            database_cursor.execute("SELECT DISTINCT follower_email FROM follows")
+            owner_emails = [row[0] for row in database_cursor.fetchall()]
+
+        # 逐位用戶重建，每位用戶一個交易，避免長時間鎖表
+        for owner_email in owner_emails:
+            database_connection.begin()
+            database_cursor.execute("DELETE FROM user_timeline WHERE owner_email = %s", (owner_email,))
+            database_cursor.execute("""
+                INSERT INTO user_timeline (owner_email, post_id, author_email, post_created_at)
+                SELECT f.follower_email, p.Post_id, p.User_Email, p.Created_at
+                FROM follows f
+                INNER JOIN Posts p ON p.User_Email = f.following_email AND p.Is_public = TRUE
+                WHERE f.follower_email = %s
+            """, (owner_email,))
+            database_connection.commit()
+
+        return len(owner_emails)
+
+    except Exception:
+        database_connection.rollback()
+        raise
+
+    finally:
+        database_connection.close()
+
+
+@social_bp.cli.command('rebuild-timeline')
+@click.argument('owner_emails', nargs=-1)
+def rebuild_timeline_command(owner_emails):
+    """依追蹤關係重建 user_timeline（不帶參數則重建全部）"""
+    rebuilt = rebuild_timelines(list(owner_emails) or None)
+    click.echo(f'追蹤時間軸重建完成，共 {rebuilt} 位用戶')
@@ -0,0 +1,247 @@
+"""
+Socket.IO 連線狀態共享儲存模組
+路徑：services/socket_state.py
+
+聊天的連線狀態原本存放在行程記憶體（SID_ROLES、app.active_chat_connections、
+app.session_id_to_sids、app.dify_paused_sessions），
+只能執行單一 eventlet 行程。這裡將狀態集中到 ChatState，後端可選擇：
+
+- memory://（預設）：LocalStore，行程內字典，單一行程部署與測試使用
+- redis://host:port/db：Redis，多個 worker 行程共用同一份狀態
+
+多 worker 部署：
+    SOCKETIO_MESSAGE_QUEUE=redis://localhost:6379/0   # 跨行程轉送 emit
+    CHAT_STATE_URL=redis://localhost:6379/1           # 共享連線狀態
+    負載平衡器需開啟 sticky session（Engine.IO polling 需回到同一個 worker）
+
+環境變數：
+- CHAT_STATE_URL: 狀態儲存位置（預設: memory://）
+- CHAT_STATE_PREFIX: Redis 鍵值前綴（預設: chat_state:）
+- CHAT_STATE_TTL: 會話相關鍵值的存活秒數，避免 worker 異常終止後殘留（預設: 86400）
+- CHAT_DISCONNECT_GRACE_SECONDS: 斷線後保留會話的秒數，期間重新訂閱即取消清理（預設: 30）
+
+Redis 為選用套件，只有設定 redis:// 時才需要安裝（pip install redis）。
+"""
+
+import os
+import threading
+import time
+
+CHAT_STATE_URL = os.environ.get("CHAT_STATE_URL", "memory://")
+CHAT_STATE_PREFIX = os.environ.get("CHAT_STATE_PREFIX", "chat_state:")
+CHAT_STATE_TTL = int(os.environ.get("CHAT_STATE_TTL", 86400))
+CHAT_DISCONNECT_GRACE_SECONDS = int(os.environ.get("CHAT_DISCONNECT_GRACE_SECONDS", 30))
+
+
+class LocalStore:
+    """
+    行程內的替代儲存，實作 ChatState 使用到的 Redis 指令子集
+
+    與 Redis 後端走相同的 ChatState 程式路徑，供單一行程部署與測試使用。
+    """
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def hget(self, key, field):
+        with self._lock:
+            return self._data.get(key, {}).get(field)
+
+    def hset(self, key, field, value):
+        with self._lock:
+            self._data.setdefault(key, {})[field] = value
+
+    def hdel(self, key, field):
+        with self._lock:
+            values = self._data.get(key, {})
+            removed = values.pop(field, None) is not None
+            if not values:
+                self._data.pop(key, None)
+            return int(removed)
+
+    def sadd(self, key, member):
+        with self._lock:
+            self._data.setdefault(key, set()).add(member)
+
+    def srem(self, key, member):
+        with self._lock:
+            members = self._data.get(key, set())
+            members.discard(member)
+            if not members:
+                self._data.pop(key, None)
+
+    def smembers(self, key):
+        with self._lock:
+            return set(self._data.get(key, set()))
+
+    def scard(self, key):
+        with self._lock:
+            return len(self._data.get(key, set()))
+
+    def sismember(self, key, member):
+        with self._lock:
+            return member in self._data.get(key, set())
+
+    def zadd(self, key, mapping):
+        with self._lock:
+            self._data.setdefault(key, {}).update(mapping)
+
+    def zrem(self, key, *members):
+        with self._lock:
+            scores = self._data.get(key, {})
+            removed = sum(1 for member in members if scores.pop(member, None) is not None)
+            if not scores:
+                self._data.pop(key, None)
+            return removed
+
+    def zrangebyscore(self, key, min_score, max_score, start=None, num=None):
+        with self._lock:
+            scores = self._data.get(key, {})
+            members = sorted(
+                (score, member) for member, score in scores.items()
+                if float(min_score) <= score <= float(max_score)
+            )
+        members = [member for score, member in members]
+        if start is not None and num is not None:
+            members = members[start:start + num]
+        return members
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def expire(self, key, seconds):
+        # 行程內資料隨行程結束消失，不需要過期
+        pass
+
+
+def _create_store(url):
+    """依 URL 建立儲存後端"""
+    if url.startswith("memory://"):
+        return LocalStore()
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("CHAT_STATE_URL 使用 Redis 時需先安裝 redis 套件（pip install redis）") from e
+        return redis.Redis.from_url(url, decode_responses=True)
+    raise ValueError(f"不支援的 CHAT_STATE_URL: {url}")
+
+
+class ChatState:
+    """
+    Socket.IO 連線狀態
+
+    鍵值配置（前綴後）：
+    - roles                 hash  sid → "user" / "admin"
+    - connections           hash  sid → 訂閱中的聊天 session_id
+    - session:<session_id>  set   訂閱該聊天 session 的 sid
+    - paused                set   暫停 Dify 回覆（已轉真人客服）的 session_id
+    - pending:close         zset  用戶端已斷線、待關閉的 session_id（分數為到期時間）
+    - pending:delete        zset  已無任何連線、待刪除的 session_id（分數為到期時間）
+
+    邀請通知不需記錄 sid：訂閱時加入用戶房間（user_room），由 Socket.IO 管理房間成員。
+    """
+
+    def __init__(self, store, prefix=CHAT_STATE_PREFIX, ttl=CHAT_STATE_TTL):
+        self.store = store
+        self.prefix = prefix
+        self.ttl = ttl
+
+    def _key(self, *parts):
+        return self.prefix + ":".join(parts)
+
+    # ─────────────────────── 聊天 session 訂閱
+    def subscribe(self, sid, session_id, role):
+        """
+        sid 訂閱聊天 session（會先取消前一個訂閱）
+
+        Returns:
+            int: 該 session 目前的連線數
+        """
+        previous = self.store.hget(self._key("connections"), sid)
+        if previous and previous != session_id:
+            self.store.srem(self._key("session", previous), sid)
+
+        self.store.hset(self._key("connections"), sid, session_id)
+        self.store.hset(self._key("roles"), sid, role)
+        # 寬限期內重新連線：取消待刪除；用戶端回來時一併取消待關閉
+        self.store.zrem(self._key("pending", "delete"), session_id)
+        if role == "user":
+            self.store.zrem(self._key("pending", "close"), session_id)
+        session_key = self._key("session", session_id)
+        self.store.sadd(session_key, sid)
+        self.store.expire(session_key, self.ttl)
+        return self.store.scard(session_key)
+
+    def unsubscribe(self, sid):
+        """
+        sid 斷線時移除訂閱
+
+        Returns:
+            tuple: (session_id 或 None, role, 該 session 剩餘連線數)
+        """
+        session_id = self.store.hget(self._key("connections"), sid)
+        role = self.store.hget(self._key("roles"), sid) or "unknown"
+        self.store.hdel(self._key("connections"), sid)
+        self.store.hdel(self._key("roles"), sid)
+        if not session_id:
+            return None, role, 0
+
+        session_key = self._key("session", session_id)
+        self.store.srem(session_key, sid)
+        return session_id, role, self.store.scard(session_key)
+
+    def session_sids(self, session_id):
+        """訂閱該聊天 session 的所有 sid"""
+        return self.store.smembers(self._key("session", session_id))
+
+    def forget_session(self, session_id):
+        """會話刪除後清除其訂閱與暫停狀態"""
+        self.store.delete(self._key("session", session_id))
+        self.store.srem(self._key("paused"), session_id)
+        self.store.zrem(self._key("pending", "close"), session_id)
+
+    # ─────────────────────── 斷線寬限期與延後清理
+    def schedule_cleanup(self, session_id, action, grace_seconds=CHAT_DISCONNECT_GRACE_SECONDS):
+        """
+        排定寬限期後的清理
+
+        Args:
+            session_id (str): 聊天 session
+            action (str): "close"（用戶端離開）或 "delete"（已無任何連線）
+        """
+        self.store.zadd(self._key("pending", action), {session_id: time.time() + grace_seconds})
+
+    def claim_due(self, action, limit):
+        """
+        取出已到期的待清理 session（zrem 成功才算取得，多個 worker 同時執行時不會重複處理）
+
+        Returns:
+            list: 由本行程負責清理的 session_id
+        """
+        key = self._key("pending", action)
+        due = self.store.zrangebyscore(key, 0, time.time(), start=0, num=limit)
+        return [session_id for session_id in due if self.store.zrem(key, session_id)]
+
+    def has_subscribers(self, session_id):
+        return self.store.scard(self._key("session", session_id)) > 0
+
+    # ─────────────────────── Dify 暫停（轉真人客服）
+    def pause_session(self, session_id):
+        self.store.sadd(self._key("paused"), session_id)
+
+    def is_paused(self, session_id):
+        return bool(self.store.sismember(self._key("paused"), session_id))
+
+
+_chat_state = None
+
+
+def get_chat_state():
+    """取得（必要時依 CHAT_STATE_URL 建立）共用的 ChatState"""
+    global _chat_state
+    if _chat_state is None:
+        _chat_state = ChatState(_create_store(CHAT_STATE_URL))
+    return _chat_state
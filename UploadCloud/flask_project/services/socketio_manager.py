@@ -6,12 +6,29 @@ Socket.IO 初始化與事件處理模組
 2025-05-17  fix   :  _delete_chat_session() 以 int 查 DB
 2025-05-18  feat  :  區分 user / admin 連線；user 斷線即廣播離開
 2025-01-15  feat  :  新增卡片邀請WebSocket支援
+            feat  :  新增 /diary 命名空間，推送背景日記分析結果
+            feat  :  連線狀態改存 ChatState（可用 Redis 共享），
+                     SOCKETIO_MESSAGE_QUEUE 設定後可執行多個 worker 行程
+            perf  :  邀請通知改用每位用戶的房間推送，邀請狀態更新只推送給卡片參與者
+            perf  :  斷線後保留寬限期，由背景 reaper 分批關閉 / 刪除閒置會話
+            feat  :  新增 /admin 命名空間，推送儀表板統計快照
+            perf  :  批次邀請改由 send_invitation_notifications() 一次推送，通知帶入邀請ID
 """
 
+import logging
+import os
 import time
-from flask_socketio import SocketIO
+from flask_socketio import SocketIO, join_room
 from flask import request, current_app
+from flask_login import current_user
 from utils import db
+from services.socket_state import get_chat_state
+
+# 多 worker 部署時的訊息佇列（例如 redis://localhost:6379/0），未設定則只在本行程內 emit
+SOCKETIO_MESSAGE_QUEUE = os.environ.get("SOCKETIO_MESSAGE_QUEUE")
+# 會話清理 reaper 的執行間隔（秒）與每批處理的會話數
+CHAT_REAPER_INTERVAL = int(os.environ.get("CHAT_REAPER_INTERVAL", 10))
+CHAT_REAPER_BATCH_SIZE = int(os.environ.get("CHAT_REAPER_BATCH_SIZE", 100))
 
 socketio = SocketIO(
     async_mode="eventlet",
@@ -25,14 +42,19 @@ def to_str(v):
     """將任何值轉成字串（None → None）"""
     return str(v) if v is not None else None
 
-# sid → "user" / "admin"
-SID_ROLES = {}
+def user_room(user_email):
+    """每位登入用戶專屬的房間名稱（用於推送個人通知）"""
+    return f"user:{user_email}"
 
 # ───────────────────────── init
 def init_socketio(app):
     """綁定 SocketIO 到 Flask app，並註冊所有事件"""
-    socketio.init_app(app)
+    if SOCKETIO_MESSAGE_QUEUE:
+        socketio.init_app(app, message_queue=SOCKETIO_MESSAGE_QUEUE)
+    else:
+        socketio.init_app(app)
     app.extensions["socketio"] = socketio   # 供其他模組使用
+    app.extensions["chat_state"] = chat_state = get_chat_state()
 
     # ─────────────────────── connect
     @socketio.on("connect", namespace="/chat")
@@ -52,44 +74,31 @@ def init_socketio(app):
             current_app.logger.error("[WS] subscribe 無 session_id")
             return
 
-        # 清前一個訂閱
-        prev = current_app.active_chat_connections.get(sid)
-        if prev and prev != session_id:
-            current_app.session_id_to_sids.get(prev, set()).discard(sid)
-            if not current_app.session_id_to_sids.get(prev):
-                current_app.session_id_to_sids.pop(prev, None)
-
-        # 建立新記錄
-        current_app.active_chat_connections[sid] = session_id
-        current_app.session_id_to_sids.setdefault(session_id, set()).add(sid)
-        SID_ROLES[sid] = role
+        # 清前一個訂閱並建立新記錄
+        online_count = chat_state.subscribe(sid, session_id, role)
 
         current_app.logger.info(
             f"[WS] sid={sid} ({role}) 訂閱 session={session_id} "
-            f"在線人數={len(current_app.session_id_to_sids[session_id])}"
+            f"在線人數={online_count}"
         )
 
     # ─────────────────────── disconnect
     @socketio.on("disconnect", namespace="/chat")
     def handle_chat_disconnect():
         sid        = request.sid
-        session_id = current_app.active_chat_connections.pop(sid, None)
-        role       = SID_ROLES.pop(sid, "unknown")
+        session_id, role, remaining = chat_state.unsubscribe(sid)
         current_app.logger.info(f"[WS] disconnect sid={sid} role={role} session={session_id}")
 
+        # 不在事件處理中直接寫資料庫：排入寬限期，重新整理 / 網路短暫中斷後
+        # 重新訂閱同一 session 即取消；到期後由 run_session_reaper 分批處理
         if session_id:
-            sids = current_app.session_id_to_sids.get(session_id, set())
-            sids.discard(sid)
-
-            # 若 user 端斷線且還有 admin 在線 → 廣播離開 & 關閉會話
+            # 若 user 端斷線 → 寬限期後廣播離開 & 關閉會話
             if role == "user":
-                _broadcast_user_left(session_id)
-                _close_session(session_id)
+                chat_state.schedule_cleanup(session_id, "close")
 
-            # 房間已空 → 刪除整個會話
-            if not sids:
-                current_app.session_id_to_sids.pop(session_id, None)
-                _delete_chat_session(session_id)
+            # 房間已空（所有 worker 上都沒有連線）→ 寬限期後刪除整個會話
+            if not remaining:
+                chat_state.schedule_cleanup(session_id, "delete")
 
     # ─────────────────────── send_message (default namespace)
     @socketio.on("send_message")
@@ -102,47 +111,64 @@ def init_socketio(app):
     def handle_invitation_subscribe(socket_data):
         """用戶訂閱邀請通知"""
         sid = request.sid
-        user_email = socket_data.get("user_email")
-        
-        if not user_email:
-            current_app.logger.error("[WS] invitation subscribe 無 user_email")
+        # 只以登入身分訂閱，不接受前端帶入的 user_email，避免訂閱他人的邀請通知
+        if not current_user.is_authenticated:
+            current_app.logger.error("[WS] invitation subscribe 未登入")
             return
+        user_email = current_user.id
         
-        # 記錄用戶的邀請訂閱
-        current_app.invitation_connections = getattr(current_app, 'invitation_connections', {})
-        current_app.invitation_connections[sid] = user_email
+        # 加入用戶專屬房間：推送時直接 emit 到房間，不必查找 sid
+        join_room(user_room(user_email), namespace="/invitations")
         
         current_app.logger.info(f"[WS] sid={sid} 訂閱邀請通知 email={user_email}")
 
     @socketio.on("disconnect", namespace="/invitations")
     def handle_invitation_disconnect():
-        """邀請通知斷線處理"""
-        sid = request.sid
-        user_email = getattr(current_app, 'invitation_connections', {}).pop(sid, None)
-        current_app.logger.info(f"[WS] invitation disconnect sid={sid} email={user_email}")
+        """邀請通知斷線處理（離開房間由 Socket.IO 自動處理）"""
+        current_app.logger.info(f"[WS] invitation disconnect sid={request.sid}")
 
     @socketio.on("connect", namespace="/invitations")
-    def handle_invitation_connect():
-        """邀請通知連線處理"""
-        current_app.logger.info(f"[WS] invitation connect sid={request.sid}")
+    def handle_invitation_connect(auth=None):
+        """邀請通知連線處理：只允許登入用戶連線"""
+        if not current_user.is_authenticated:
+            return False
+        current_app.logger.info(f"[WS] invitation connect sid={request.sid} email={current_user.id}")
+        return True
+
+    # ─────────────────────── admin dashboard events
+    @socketio.on("connect", namespace="/admin")
+    def handle_admin_connect(auth=None):
+        """儀表板即時統計：只允許管理員加入推送房間"""
+        from services.admin.admin import is_admin
+        from services.admin.dashboard_metrics import DASHBOARD_ROOM
+
+        if not current_user.is_authenticated or not is_admin():
+            return False
+        join_room(DASHBOARD_ROOM, namespace="/admin")
+        current_app.logger.info(f"[WS] admin dashboard connect sid={request.sid} email={current_user.id}")
+        return True
+
+    # ─────────────────────── diary analysis events
+    @socketio.on("connect", namespace="/diary")
+    def handle_diary_connect(auth=None):
+        """日記分析推送連線：登入用戶加入個人房間"""
+        if not current_user.is_authenticated:
+            return False
+        join_room(user_room(current_user.id), namespace="/diary")
+        current_app.logger.info(f"[WS] diary connect sid={request.sid} email={current_user.id}")
         return True
 
 
 # ──────────────────────────────────────────────────────────────
 #                      Helper  Function
 # ──────────────────────────────────────────────────────────────
-def _broadcast_user_left(session_id: str):
-    """向所有管理端廣播使用者已離開"""
-    database_connection = db.get_connection()
-    database_cursor  = database_connection.cursor()
-    database_cursor.execute(
-        "SELECT user_email FROM AIChatSessions WHERE session_id=%s",
-        (int(session_id),)
-    )
-    row   = database_cursor.fetchone()
-    email = row[0] if row else "未知使用者"
-    database_connection.close()
+def _placeholders(values):
+    return ", ".join(["%s"] * len(values))
+
 
+def _emit_user_left(session_id, email):
+    """向所有管理端廣播使用者已離開"""
+    email = email or "未知使用者"
     socketio.emit(
         "user_left",
         {
@@ -153,64 +179,103 @@ def _broadcast_user_left(session_id: str):
         namespace="/chat",
     )
 
-def _close_session(session_id: str):
-    """標記該 session 已關閉 (is_open = 0)"""
+
+def _close_sessions(session_ids):
+    """批次標記會話已關閉 (is_open = 0)，並逐一廣播使用者離開"""
+    sid_ints = [int(session_id) for session_id in session_ids]
     database_connection = db.get_connection()
-    database_cursor  = database_connection.cursor()
-    database_cursor.execute("UPDATE AIChatSessions SET is_open = 0 WHERE session_id=%s",
-                (int(session_id),))
-    database_connection.commit()
-    database_connection.close()
+    try:
+        database_cursor = database_connection.cursor()
+        database_cursor.execute(
+            f"SELECT session_id, user_email FROM AIChatSessions WHERE session_id IN ({_placeholders(sid_ints)})",
+            sid_ints,
+        )
+        emails = dict(database_cursor.fetchall())
+        database_cursor.execute(
+            f"UPDATE AIChatSessions SET is_open = 0 WHERE session_id IN ({_placeholders(sid_ints)})",
+            sid_ints,
+        )
+        database_connection.commit()
+    finally:
+        database_connection.close()
+
+    for sid_int in sid_ints:
+        _emit_user_left(sid_int, emails.get(sid_int))
+
 
-def _delete_chat_session(session_id: str):
+def _delete_chat_sessions(session_ids):
     """
-    移除過期會話：
-    1. 刪 DB
-    2. 清緩存
+    批次移除過期會話：
+    1. 需要真人客服的會話通知管理端
+    2. 同一交易內刪除聊天紀錄與會話
+    3. 清除共享狀態
     """
-    room    = to_str(session_id)
-    sid_int = int(session_id)
-
-    database_connection = None
+    sid_ints = [int(session_id) for session_id in session_ids]
+    database_connection = db.get_connection()
     try:
-        database_connection = db.get_connection()
-        database_cursor  = database_connection.cursor()
-
+        database_cursor = database_connection.cursor()
         database_cursor.execute(
-            "SELECT need_human, user_email "
-            "FROM AIChatSessions WHERE session_id=%s",
-            (sid_int,),
+            f"SELECT session_id, user_email FROM AIChatSessions "
+            f"WHERE session_id IN ({_placeholders(sid_ints)}) AND need_human = 1",
+            sid_ints,
         )
-        session_query_result = database_cursor.fetchone()
-
-        if session_query_result and session_query_result[0] == 1:
-            email = session_query_result[1] or "未知使用者"
-            socketio.emit(
-                "user_left",
-                {
-                    "session_id": room,
-                    "email": email,
-                    "message": f"使用者 {email} 已離開聊天",
-                },
-                namespace="/chat",
-            )
+        need_human_sessions = database_cursor.fetchall()
 
-        # 刪除 DB 紀錄
-        database_cursor.execute("DELETE FROM AIChatLogs WHERE session_id=%s", (sid_int,))
-        database_cursor.execute("DELETE FROM AIChatSessions WHERE session_id=%s", (sid_int,))
+        database_connection.begin()
+        database_cursor.execute(f"DELETE FROM AIChatLogs WHERE session_id IN ({_placeholders(sid_ints)})", sid_ints)
+        database_cursor.execute(f"DELETE FROM AIChatSessions WHERE session_id IN ({_placeholders(sid_ints)})", sid_ints)
         database_connection.commit()
-        current_app.logger.info(f"[WS] 已刪除 session {session_id} 的聊天紀錄")
+    except Exception:
+        database_connection.rollback()
+        raise
+    finally:
+        database_connection.close()
 
-    except Exception as e:
-        if database_connection:
-            database_connection.rollback()
-        current_app.logger.error(f"[WS] 刪除 session {session_id} 時出錯: {e}")
+    for session_id, email in need_human_sessions:
+        _emit_user_left(session_id, email)
 
-    finally:
-        if database_connection:
-            database_connection.close()
+    chat_state = get_chat_state()
+    for session_id in session_ids:
+        chat_state.forget_session(session_id)
+    logging.info(f"[WS] 已刪除 {len(sid_ints)} 個閒置 session 的聊天紀錄")
+
+
+def reap_chat_sessions(batch_size=CHAT_REAPER_BATCH_SIZE):
+    """
+    處理寬限期已到期的會話（先刪除、再關閉；已刪除的會話不再關閉）
+
+    Returns:
+        tuple: (刪除數, 關閉數)
+    """
+    chat_state = get_chat_state()
+
+    # 寬限期內有人重新訂閱的會話會被 subscribe() 取消；取得後再確認一次避免競態
+    to_delete = [session_id for session_id in chat_state.claim_due("delete", batch_size)
+                 if not chat_state.has_subscribers(session_id)]
+    if to_delete:
+        _delete_chat_sessions(to_delete)
+
+    deleted = set(to_delete)
+    to_close = [session_id for session_id in chat_state.claim_due("close", batch_size)
+                if session_id not in deleted]
+    if to_close:
+        _close_sessions(to_close)
+
+    return len(to_delete), len(to_close)
 
-    current_app.dify_paused_sessions.discard(session_id)
+
+def run_session_reaper(interval_seconds=CHAT_REAPER_INTERVAL):
+    """背景會話清理迴圈（由 app.py 以 socketio.start_background_task 啟動；多個 worker 可同時執行）"""
+    while True:
+        socketio.sleep(interval_seconds)
+        try:
+            # 一次最多處理一批；積壓時持續處理直到清空
+            while True:
+                deleted, closed = reap_chat_sessions()
+                if deleted < CHAT_REAPER_BATCH_SIZE and closed < CHAT_REAPER_BATCH_SIZE:
+                    break
+        except Exception as e:
+            logging.error(f"[WS] 清理閒置 session 失敗: {e}")
 
 
 # ──────────────────────────────────────────────────────────────
@@ -218,83 +283,99 @@ def _delete_chat_session(session_id: str):
 # ──────────────────────────────────────────────────────────────
 
 def send_invitation_notification(receiver_email, invitation_data):
-    """發送邀請通知到特定用戶"""
+    """發送邀請通知到特定用戶（該用戶所有分頁 / worker 上的連線）"""
     try:
-        invitation_connections = getattr(current_app, 'invitation_connections', {})
+        notification = {
+            'type': 'new_invitation',
+            'data': invitation_data,
+            'timestamp': str(int(time.time() * 1000))
+        }
         
-        # 找到該用戶的所有連線
-        target_sids = [sid for sid, email in invitation_connections.items() 
-                      if email == receiver_email]
+        socketio.emit(
+            'invitation_received', 
+            notification, 
+            to=user_room(receiver_email),
+            namespace='/invitations'
+        )
         
-        if target_sids:
-            notification = {
-                'type': 'new_invitation',
-                'data': invitation_data,
-                'timestamp': str(int(time.time() * 1000))
-            }
-            
-            for sid in target_sids:
-                socketio.emit(
-                    'invitation_received', 
-                    notification, 
-                    room=sid,
-                    namespace='/invitations'
-                )
-            
-            current_app.logger.info(
-                f"[WS] 發送邀請通知到 {receiver_email}, sids={target_sids}"
-            )
-        else:
-            current_app.logger.info(
-                f"[WS] 用戶 {receiver_email} 未在線，暫不發送通知"
-            )
+        current_app.logger.info(f"[WS] 發送邀請通知到 {receiver_email}")
             
     except Exception as e:
         current_app.logger.error(f"[WS] 發送邀請通知失敗: {e}")
 
 
+def send_invitation_notifications(invitation_ids, invitation_data):
+    """
+    一次發送整批邀請通知（每位接收者的房間各一則，內容只差邀請ID）
+
+    Args:
+        invitation_ids (dict): 接收者 email -> 邀請ID（insert_invitations() 的返回值）
+        invitation_data (dict): 共用的邀請內容（卡片、發送者、訊息）
+    """
+    timestamp = str(int(time.time() * 1000))
+    sent_count = 0
+    for receiver_email, invitation_id in invitation_ids.items():
+        try:
+            socketio.emit(
+                'invitation_received',
+                {
+                    'type': 'new_invitation',
+                    'data': {**invitation_data, 'id': invitation_id},
+                    'timestamp': timestamp
+                },
+                to=user_room(receiver_email),
+                namespace='/invitations'
+            )
+            sent_count += 1
+        except Exception as e:
+            current_app.logger.error(f"[WS] 發送邀請通知到 {receiver_email} 失敗: {e}")
+
+    current_app.logger.info(f"[WS] 發送邀請通知到 {sent_count} 位用戶")
+
+
 def send_invitation_response_notification(sender_email, response_data):
     """發送邀請回應通知到邀請者"""
     try:
-        invitation_connections = getattr(current_app, 'invitation_connections', {})
+        notification = {
+            'type': 'invitation_response',
+            'data': response_data,
+            'timestamp': str(int(time.time() * 1000))
+        }
         
-        # 找到邀請者的所有連線
-        target_sids = [sid for sid, email in invitation_connections.items() 
-                      if email == sender_email]
+        socketio.emit(
+            'invitation_response', 
+            notification, 
+            to=user_room(sender_email),
+            namespace='/invitations'
+        )
         
-        if target_sids:
-            notification = {
-                'type': 'invitation_response',
-                'data': response_data,
-                'timestamp': str(int(time.time() * 1000))
-            }
-            
-            for sid in target_sids:
-                socketio.emit(
-                    'invitation_response', 
-                    notification, 
-                    room=sid,
-                    namespace='/invitations'
-                )
-            
-            current_app.logger.info(
-                f"[WS] 發送回應通知到 {sender_email}, sids={target_sids}"
-            )
-        else:
-            current_app.logger.info(
-                f"[WS] 邀請者 {sender_email} 未在線，暫不發送通知"
-            )
+        current_app.logger.info(f"[WS] 發送回應通知到 {sender_email}")
             
     except Exception as e:
         current_app.logger.error(f"[WS] 發送回應通知失敗: {e}")
 
 
-def broadcast_invitation_update(invitation_id, status):
-    """廣播邀請狀態更新"""
+def broadcast_invitation_update(invitation_id, status, card_id):
+    """推送邀請狀態更新給該卡片的參與者（不再廣播給所有連線）"""
+    database_connection = None
     try:
+        database_connection = db.get_connection(readonly=True)
+        database_cursor = database_connection.cursor()
+        database_cursor.execute("""
+            SELECT user_id FROM card_participants
+            WHERE card_id = %s AND status = 'active'
+        """, (card_id,))
+        participant_emails = [row[0] for row in database_cursor.fetchall()]
+        database_connection.close()
+        database_connection = None
+
+        if not participant_emails:
+            return
+
         update_data = {
             'type': 'invitation_update',
             'invitation_id': invitation_id,
+            'card_id': card_id,
             'status': status,
             'timestamp': str(int(time.time() * 1000))
         }
@@ -302,12 +383,16 @@ def broadcast_invitation_update(invitation_id, status):
         socketio.emit(
             'invitation_updated',
             update_data,
+            to=[user_room(email) for email in participant_emails],
             namespace='/invitations'
         )
         
         current_app.logger.info(
-            f"[WS] 廣播邀請更新 id={invitation_id}, status={status}"
+            f"[WS] 推送邀請更新 id={invitation_id}, status={status}, 參與者={len(participant_emails)}"
         )
         
     except Exception as e:
-        current_app.logger.error(f"[WS] 廣播邀請更新失敗: {e}")
+        current_app.logger.error(f"[WS] 推送邀請更新失敗: {e}")
+    finally:
+        if database_connection:
+            database_connection.close()
@@ -31,26 +31,14 @@ from flask_login import login_required, current_user
 from dotenv import load_dotenv
 from utils import db
 from services.line.line_bot import notify_admins
+from services.ai.dify_client import get_dify_client
 from . import support_bp  # 從 __init__.py 導入 Blueprint
 
 # 確保載入環境變數
 load_dotenv()
 
-# ─── Dify 連線設定 ──────────────────────────────────────────
-DIFY_API_URL = os.getenv("DIFY_API_URL", "https://api.dify.ai/v1/chat-messages") 
-DIFY_KEY = os.getenv("DIFY_API_KEY_For_Report")  # 專門用於舉報分析的 API Key
-
-# 清理 DIFY_KEY（移除可能的空白字元）
-if DIFY_KEY:
-    DIFY_KEY = DIFY_KEY.strip()
-    if not DIFY_KEY:  # 如果清理後變成空字串
-        logging.warning("DIFY_API_KEY_For_Report 環境變數為空字串")
-        DIFY_KEY = None
-
-HEADERS = {
-    "Authorization": f"Bearer {DIFY_KEY}",
-    "Content-Type": "application/json"
-}
+# ─── Dify 連線設定（共用用戶端，見 services/ai/dify_client.py）──
+DIFY_CLIENT_NAME = "report"  # 使用專門用於舉報分析的 DIFY_API_KEY_For_Report
 
 def send_to_dify_for_analysis(theme, options, context):
     """
@@ -69,11 +57,13 @@ def send_to_dify_for_analysis(theme, options, context):
             - confidence: 判斷可信度
             - suggest_action: 建議行動
     """
-    # 除錯：記錄 DIFY_KEY 的狀態
-    logging.info(f"開始 Dify 分析 - API Key 已載入：{bool(DIFY_KEY)}")
+    dify_client = get_dify_client(DIFY_CLIENT_NAME)
+
+    # 除錯：記錄 API Key 的狀態
+    logging.info(f"開始 Dify 分析 - API Key 已載入：{bool(dify_client.api_key)}")
     
-    # 如果 DIFY_KEY 未設定，返回預設分析結果
-    if not DIFY_KEY:
+    # 如果 API Key 未設定，返回預設分析結果
+    if not dify_client.configured:
         logging.warning("DIFY_API_KEY_For_Report 未設定，使用預設分析結果")
         return {
             "is_valid": True,
@@ -84,30 +74,20 @@ def send_to_dify_for_analysis(theme, options, context):
         }
     
     try:
-        dify_payload = {
-            "inputs": {
-                "theme": theme,
-                "options": options,
-                "context": context
-            },
-            "query": f"分析舉報：主題={theme}, 類型={options}, 說明={context}",
-            "conversation_id": None,
-            "response_mode": "blocking", 
-            "user": str(current_user.id)
+        dify_inputs = {
+            "theme": theme,
+            "options": options,
+            "context": context
         }
+        dify_query = f"分析舉報：主題={theme}, 類型={options}, 說明={context}"
         
-        logging.info(f"發送 Dify 請求：{DIFY_API_URL}")
-        logging.debug(f"請求 payload：{json.dumps(dify_payload, ensure_ascii=False, indent=2)}")
-        
-        response = requests.post(DIFY_API_URL, json=dify_payload, headers=HEADERS, timeout=30)
-        
-        # 記錄回應狀態
-        logging.info(f"Dify 回應狀態：{response.status_code}")
-        logging.debug(f"Dify 原始回應：{response.text}")
+        logging.info(f"發送 Dify 請求：{dify_client.api_url}")
+        logging.debug(f"請求 inputs：{json.dumps(dify_inputs, ensure_ascii=False, indent=2)}")
         
-        response.raise_for_status()
+        # 共用用戶端負責逾時、重試與斷路器，非 2xx 回應會拋出 DifyError
+        result = dify_client.chat(dify_query, user=str(current_user.id), inputs=dify_inputs)
+        logging.debug(f"Dify 原始回應：{result}")
         
-        result = response.json()
         answer = result.get('answer', '{}')
         logging.info(f"Dify 回應長度：{len(answer) if answer else 0} 字元")
         
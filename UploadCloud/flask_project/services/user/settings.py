@@ -19,6 +19,7 @@ from flask import (
 )
 from flask_login import login_required, current_user
 from utils import db
+from utils.user_search_index import index_user
 from utils.ip import get_client_ip
 
 # 在 __init__.py 中註冊此藍圖
@@ -100,6 +101,7 @@ def profile():
 
         conn.commit()
         conn.close()
+        index_user(current_user.id, new_name)
         flash("個人資料已更新")
         return redirect(url_for("settings.profile"))
 
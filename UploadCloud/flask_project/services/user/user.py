@@ -16,6 +16,8 @@ from itsdangerous import URLSafeTimedSerializer
 from utils.ip import get_client_ip
 from utils.db import get_connection
 from utils.keygen import derive_key
+from utils.points_ledger import sync_login_days
+from utils.user_search_index import index_user
 from . import user_bp
 
 load_dotenv()
@@ -139,6 +141,7 @@ def signup():
             ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
         """, (email, username, hashed_password, 0, verification_token, expiry_time, 0, current_time, current_time))
         conn.commit()
+        index_user(email, username)
 
         # 發送驗證信件
         try:
@@ -207,6 +210,9 @@ def login():
                     last_login_ip   = %s
                 WHERE User_Email = %s
             """, (datetime.now(), client_ip, email))
+            
+            # 每日登入積分（當天首次登入才會產生帳本異動）
+            sync_login_days(cursor, email)
             conn.commit()
             
             return redirect(url_for('index'))
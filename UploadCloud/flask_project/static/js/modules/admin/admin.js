@@ -1129,8 +1129,14 @@ function initDashboardFeatures() {
 
     document.querySelectorAll('.dashboard-card').forEach(card => observer.observe(card));
 
-    // 定時更新數據（每 5 分鐘自動拉一次）
-    setInterval(fetchDashboardStats, 5 * 60 * 1000);
+    // 即時推送模式：伺服器重新計算快照後經 /admin 命名空間推送；否則每 5 分鐘自動拉一次
+    const grid = document.querySelector('.stats-grid');
+    if (grid?.dataset.livePush && window.io) {
+        const socket = io('/admin');
+        socket.on('dashboard_metrics', updateStats);
+    } else {
+        setInterval(fetchDashboardStats, 5 * 60 * 1000);
+    }
     
     function fetchDashboardStats() {
         fetch('/admin/api/stats')
@@ -1153,6 +1159,23 @@ function initDashboardFeatures() {
                 animateValue(el, value);
             }
         }
+
+        const todayFields = {
+            user_count: 'new_users_today',
+            diary_count: 'new_diaries_today',
+            total_reports: 'new_reports_today'
+        };
+        for (const [key, field] of Object.entries(todayFields)) {
+            const el = document.querySelector(`[data-stat="${key}"] .card-trend`);
+            if (el && data[field] !== undefined) {
+                el.textContent = `+${data[field]} 今日新增`;
+            }
+        }
+
+        const updatedAt = document.getElementById('metrics-updated-at');
+        if (updatedAt && data.updated_at) {
+            updatedAt.textContent = `最後更新：${data.updated_at}`;
+        }
     }
 }
 
@@ -3,6 +3,7 @@
    – 使用者端 AI 聊天前端
    – ✅ 已修正：求助按鈕事件掛載不到的問題
    – ✅ 新增：session_id 一律字串化，避免型別不一致
+   – ✅ 新增：透過 /ai/chat/api/stream（SSE）逐段顯示 AI 回覆
    -------------------------------------------------- */
 
 document.addEventListener("DOMContentLoaded", () => {
@@ -52,6 +53,63 @@ document.addEventListener("DOMContentLoaded", () => {
       
       chatBox.appendChild(div);
       chatBox.scrollTop = chatBox.scrollHeight;
+      return div;
+    };
+
+    /* －－－ 讀取 SSE 串流回覆：token 逐段寫入同一個 AI 訊息框 －－－ */
+    const readReplyStream = async (apiResponse) => {
+      const reader  = apiResponse.body.getReader();
+      const decoder = new TextDecoder("utf-8");
+      let buffer    = "";
+      let replyDiv  = null;
+      let result    = null;
+
+      const handleEvent = (eventName, eventData) => {
+        if (eventName === "start" && eventData.session_id && !currentSessionId) {
+          currentSessionId = toStr(eventData.session_id);
+          localStorage.setItem("userCurrentSessionId", currentSessionId);
+          subscribeToCurrentSession();
+        } else if (eventName === "token") {
+          if (!replyDiv) {
+            replyDiv = appendMsg("", "ai");
+            sendButton.innerText = "回覆中…";
+          }
+          replyDiv.innerText += eventData.delta;
+          chatBox.scrollTop = chatBox.scrollHeight;
+        } else if (eventName === "done") {
+          result = eventData;
+        } else if (eventName === "error") {
+          throw new Error(eventData.error || "AI 服務異常");
+        }
+      };
+
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let boundary;
+        while ((boundary = buffer.indexOf("\n\n")) >= 0) {
+          const rawEvent = buffer.slice(0, boundary);
+          buffer = buffer.slice(boundary + 2);
+
+          let eventName = "message";
+          let dataText  = "";
+          rawEvent.split("\n").forEach(line => {
+            if (line.startsWith("event:")) eventName = line.slice(6).trim();
+            else if (line.startsWith("data:")) dataText += line.slice(5).trim();
+          });
+          if (dataText) handleEvent(eventName, JSON.parse(dataText));
+        }
+      }
+
+      if (!result) throw new Error("串流中斷，請稍後重試");
+      // 以最終完整內容覆蓋，確保與資料庫記錄一致
+      if (replyDiv) {
+        replyDiv.innerText = result.reply || "⚠️ AI 沒有回覆";
+        result.streamed = true;
+      }
+      return result;
     };
 
     /* --- WebSocket 連線和事件處理 --- */
@@ -104,7 +162,8 @@ document.addEventListener("DOMContentLoaded", () => {
       sendButton.innerText = "思考中…";
 
       try {
-      const apiResponse = await fetch("/ai/chat/api", {
+      // 優先使用串流 API，逐段顯示 AI 回覆
+      const apiResponse = await fetch("/ai/chat/api/stream", {
         method: "POST",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify({ query: text })
@@ -115,9 +174,13 @@ document.addEventListener("DOMContentLoaded", () => {
       }
 
       let responseData;
+      const isStream = (apiResponse.headers.get("Content-Type") || "").includes("text/event-stream");
       try {
-        responseData = await apiResponse.json();
+        responseData = (isStream && apiResponse.body)
+          ? await readReplyStream(apiResponse)
+          : await apiResponse.json();
       } catch (e) {
+        if (isStream) throw e;
         throw new Error("伺服器未回傳有效 JSON，可能是內部錯誤");
       }
 
@@ -130,7 +193,7 @@ document.addEventListener("DOMContentLoaded", () => {
 
       if (responseData.reply === "") {
         console.log("真人客服模式下，不顯示AI回覆");
-      } else {
+      } else if (!responseData.streamed) {
         appendMsg(responseData.reply || "⚠️ AI 沒有回覆", "ai");
       }
 
@@ -1,6 +1,7 @@
 /**
  * 情緒AI聊天助手 JavaScript - 簡化版本
  * 移除WebSocket依賴，改用同步HTTP通訊
+ * 回覆改由 /ai/emotion/api/stream（SSE）逐段顯示
  * 基於backup_chatbot的簡潔設計
  */
 function forceSystemDarkMode() {
@@ -195,8 +196,8 @@ async function sendMessage() {
     showLoadingButton();
     
     try {
-        // 發送到後端並等待響應
-        const response = await fetch('/ai/emotion/api', {
+        // 發送到串流API，回覆文字逐段顯示於打字指示器中
+        const response = await fetch('/ai/emotion/api/stream', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
@@ -204,7 +205,10 @@ async function sendMessage() {
             body: JSON.stringify({ message: message })
         });
         
-        const data = await response.json();
+        const isStream = (response.headers.get('Content-Type') || '').includes('text/event-stream');
+        const data = (isStream && response.body)
+            ? await readEmotionStream(response)
+            : await response.json();
         console.log('📥 收到回應:', data);
         
         if (data.success) {
@@ -272,6 +276,51 @@ async function sendMessage() {
     }
 }
 
+// 讀取SSE串流回覆：token 事件即時更新打字指示器，done 事件返回與 /ai/emotion/api 相同格式的結果
+async function readEmotionStream(response) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder('utf-8');
+    let buffer = '';
+    let streamedText = '';
+    let result = null;
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) >= 0) {
+            const rawEvent = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+
+            let eventName = 'message';
+            let dataText = '';
+            rawEvent.split('\n').forEach(line => {
+                if (line.startsWith('event:')) eventName = line.slice(6).trim();
+                else if (line.startsWith('data:')) dataText += line.slice(5).trim();
+            });
+            if (!dataText) continue;
+
+            const eventData = JSON.parse(dataText);
+            if (eventName === 'token') {
+                streamedText += eventData.delta;
+                const typingText = document.querySelector('#dynamic-typing-indicator .typing-text');
+                if (typingText) {
+                    typingText.textContent = streamedText;
+                    scrollToBottom();
+                }
+            } else if (eventName === 'done') {
+                result = eventData;
+            } else if (eventName === 'error') {
+                result = { success: false, error: eventData.error };
+            }
+        }
+    }
+
+    return result || { success: false, error: '串流中斷，請稍後再試' };
+}
+
 // 顯示打字指示器 - 修改為在chat-box內部顯示
 function showTypingIndicator() {
     // 先移除已存在的思考訊息（避免重複）
@@ -42,6 +42,61 @@ document.addEventListener('DOMContentLoaded', () => {
     submitButton.textContent = isLoading ? '小助手正在查看您的訊息…' : '儲存日記';
   };
 
+  /* ---------- AI 分析結果（背景完成後推送） ---------- */
+  const ANALYSIS_POLL_INTERVAL = 3000;
+  const ANALYSIS_POLL_INTERVAL_CONNECTED = 15000;   // Socket 已連線時只作為備援，拉長間隔
+  const ANALYSIS_POLL_LIMIT    = 40;
+  let pendingDiaryId = null;
+  let analysisPollTimer = null;
+
+  const showAnalysis = (text) => {
+    aiContent.textContent = text;
+    aiBox.style.display = 'block';
+  };
+
+  const handleAnalysisResult = (result) => {
+    if (!result || result.diary_id !== pendingDiaryId || result.status === 'pending') return;
+    pendingDiaryId = null;
+    clearTimeout(analysisPollTimer);
+    if (result.status === 'done') {
+      showAnalysis(result.analysis || '無法取得情緒分析');
+    } else {
+      showAnalysis(result.message || 'AI 分析暫時無法完成，稍後將自動重試');
+    }
+  };
+
+  const fetchAnalysis = async (diaryId) => {
+    try {
+      const pollResponse = await fetch(`/diary/analysis/${diaryId}`);
+      const pollData = await pollResponse.json();
+      if (pollData.success) handleAnalysisResult(pollData);
+    } catch (error) {
+      console.error(error);
+    }
+  };
+
+  // 一律輪詢作為備援：推送可能在 Socket 重新連線期間遺失，或早於 pendingDiaryId 設定前送達
+  // （handleAnalysisResult 會忽略重複的結果）；Socket 已連線時拉長輪詢間隔
+  const pollAnalysis = (diaryId, remaining) => {
+    if (diaryId !== pendingDiaryId || remaining <= 0) return;
+    const interval = analysisSocket && analysisSocket.connected
+      ? ANALYSIS_POLL_INTERVAL_CONNECTED
+      : ANALYSIS_POLL_INTERVAL;
+    analysisPollTimer = setTimeout(async () => {
+      await fetchAnalysis(diaryId);
+      pollAnalysis(diaryId, remaining - 1);
+    }, interval);
+  };
+
+  const analysisSocket = window.io ? io('/diary') : null;
+  if (analysisSocket) {
+    analysisSocket.on('diary_analysis', handleAnalysisResult);
+    // 重新連線後補查一次，斷線期間送出的推送不會重送
+    analysisSocket.on('connect', () => {
+      if (pendingDiaryId) fetchAnalysis(pendingDiaryId);
+    });
+  }
+
   /* ---------- Emotion Picker ---------- */
   emotionButtons.forEach(button => {
     button.addEventListener('click', () => {
@@ -92,10 +147,12 @@ document.addEventListener('DOMContentLoaded', () => {
       if (apiResponse.ok && responseData.success) {
         resetForm();
 
-        /* 顯示 AI 回覆 */
-        aiContent.textContent = responseData.emotion_detail || '無法取得情緒分析';
-        aiBox.style.display = 'block';
+        /* 顯示 AI 回覆（分析在背景進行，完成後推送或輪詢取得） */
+        pendingDiaryId = responseData.diary_id;
+        showAnalysis('小助手正在閱讀您的日記，分析完成後會顯示在這裡…');
         aiBox.scrollIntoView({ behavior: 'smooth', block: 'center' });
+        clearTimeout(analysisPollTimer);
+        pollAnalysis(pendingDiaryId, ANALYSIS_POLL_LIMIT);
 
         showAlert(successAlert, responseData.message || '日記已成功儲存！');
         animationSuccess();
@@ -1394,82 +1394,87 @@ document.addEventListener('DOMContentLoaded', () => {
   }
 
   /* --- 按讚與留言功能 --- */
-  document.querySelectorAll('.like-btn').forEach(likeButton => {
-    likeButton.addEventListener('click', function() {
-      const postId = this.getAttribute('data-post-id');
-      const isLiked = this.getAttribute('data-liked') === 'true';
+  // 以函式包裝，讓無限捲動新插入的貼文卡片也能綁定事件
+  function bindPostCardActions(scope) {
+    scope.querySelectorAll('.like-btn').forEach(likeButton => {
+      likeButton.addEventListener('click', function() {
+        const postId = this.getAttribute('data-post-id');
+        const isLiked = this.getAttribute('data-liked') === 'true';
       
-      // 禁用按鈕防止重複點擊
-      this.disabled = true;
+        // 禁用按鈕防止重複點擊
+        this.disabled = true;
       
-      fetch(`/social/toggle_like/${postId}`, {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-        }
-      })
-      .then(response => response.json())
-      .then(data => {
-        if (data.success) {
-          const emoji = this.querySelector('.btn-emoji');
-          // 修復：使用 API 返回的 is_liked 而不是 liked
-          const newIsLiked = data.is_liked;
-          emoji.textContent = newIsLiked ? '👍' : '🤍';
-          this.setAttribute('data-liked', newIsLiked);
-          
-          // 查找並更新數字部分（跳過表情符號）
-          const textNodes = Array.from(this.childNodes).filter(node => 
-            node.nodeType === Node.TEXT_NODE && node.textContent.trim() !== ''
-          );
-          if (textNodes.length > 0) {
-            textNodes[0].textContent = ` ${data.likes_count}`;
-          } else {
-            // 如果沒有文字節點，在表情符號後面添加
-            this.appendChild(document.createTextNode(` ${data.likes_count}`));
+        fetch(`/social/toggle_like/${postId}`, {
+          method: 'POST',
+          headers: {
+            'Content-Type': 'application/json',
           }
+        })
+        .then(response => response.json())
+        .then(data => {
+          if (data.success) {
+            const emoji = this.querySelector('.btn-emoji');
+            // 修復：使用 API 返回的 is_liked 而不是 liked
+            const newIsLiked = data.is_liked;
+            emoji.textContent = newIsLiked ? '👍' : '🤍';
+            this.setAttribute('data-liked', newIsLiked);
           
-          // 如果有等級提升通知
-          if (data.level_up) {
-            showNotification(data.level_up.message, 'success');
+            // 查找並更新數字部分（跳過表情符號）
+            const textNodes = Array.from(this.childNodes).filter(node => 
+              node.nodeType === Node.TEXT_NODE && node.textContent.trim() !== ''
+            );
+            if (textNodes.length > 0) {
+              textNodes[0].textContent = ` ${data.likes_count}`;
+            } else {
+              // 如果沒有文字節點，在表情符號後面添加
+              this.appendChild(document.createTextNode(` ${data.likes_count}`));
+            }
+          
+            // 如果有等級提升通知
+            if (data.level_up) {
+              showNotification(data.level_up.message, 'success');
+            }
+          } else {
+            showNotification(data.message || '按讚操作失敗', 'error');
           }
-        } else {
-          showNotification(data.message || '按讚操作失敗', 'error');
-        }
-      })
-      .catch(error => {
-        console.error('按讚操作失敗:', error);
-        showNotification('網路錯誤，請稍後再試', 'error');
-      })
-      .finally(() => {
-        // 重新啟用按鈕
-        this.disabled = false;
+        })
+        .catch(error => {
+          console.error('按讚操作失敗:', error);
+          showNotification('網路錯誤，請稍後再試', 'error');
+        })
+        .finally(() => {
+          // 重新啟用按鈕
+          this.disabled = false;
+        });
       });
     });
-  });
 
-  // 留言按鈕功能
-  document.querySelectorAll('.comment-btn').forEach(commentButton => {
-    commentButton.addEventListener('click', function() {
-      const postId = this.getAttribute('data-post-id');
-      const commentsSection = document.getElementById(`comments-${postId}`);
+    // 留言按鈕功能
+    scope.querySelectorAll('.comment-btn').forEach(commentButton => {
+      commentButton.addEventListener('click', function() {
+        const postId = this.getAttribute('data-post-id');
+        const commentsSection = document.getElementById(`comments-${postId}`);
       
-      console.log(`[DEBUG] 點擊留言按鈕，PostID: ${postId}`);
-      console.log(`[DEBUG] 留言區元素:`, commentsSection);
+        console.log(`[DEBUG] 點擊留言按鈕，PostID: ${postId}`);
+        console.log(`[DEBUG] 留言區元素:`, commentsSection);
       
-      if (commentsSection) {
-        if (commentsSection.style.display === 'none' || !commentsSection.style.display) {
-          commentsSection.style.display = 'block';
-          loadComments(postId);
-          console.log(`[DEBUG] 顯示留言區並載入留言`);
+        if (commentsSection) {
+          if (commentsSection.style.display === 'none' || !commentsSection.style.display) {
+            commentsSection.style.display = 'block';
+            loadComments(postId);
+            console.log(`[DEBUG] 顯示留言區並載入留言`);
+          } else {
+            commentsSection.style.display = 'none';
+            console.log(`[DEBUG] 隱藏留言區`);
+          }
         } else {
-          commentsSection.style.display = 'none';
-          console.log(`[DEBUG] 隱藏留言區`);
+          console.error(`[ERROR] 找不到留言區元素: comments-${postId}`);
         }
-      } else {
-        console.error(`[ERROR] 找不到留言區元素: comments-${postId}`);
-      }
+      });
     });
-  });
+  }
+
+  bindPostCardActions(document);
 
   // 載入留言
   function loadComments(postId) {
@@ -1709,6 +1714,73 @@ document.addEventListener('DOMContentLoaded', () => {
     }
   }
 
+  /* --- 無限捲動：依游標載入下一頁貼文 --- */
+  function initializeInfiniteScroll() {
+    const loadMore = document.getElementById('feed-load-more');
+    const postList = document.querySelector('.post-list');
+    if (!loadMore || !postList) return;
+
+    let isLoading = false;
+
+    function loadNextPage() {
+      const nextCursor = loadMore.dataset.nextCursor;
+      if (isLoading || !nextCursor) return;
+      isLoading = true;
+      loadMore.classList.add('loading');
+
+      const params = new URLSearchParams({
+        tab: loadMore.dataset.tab || 'all-posts',
+        cursor: nextCursor
+      });
+
+      fetch(`/social/api/feed?${params.toString()}`)
+        .then(response => response.json())
+        .then(data => {
+          if (!data.success) {
+            showNotification(data.message || '載入更多貼文失敗', 'error');
+            return;
+          }
+
+          // 插入新貼文並綁定事件
+          const template = document.createElement('template');
+          template.innerHTML = data.html;
+          const newCards = Array.from(template.content.querySelectorAll('.post-card'));
+          postList.appendChild(template.content);
+          newCards.forEach(card => bindPostCardActions(card));
+
+          // 重新計算篩選數量並套用目前篩選
+          updateAllTimeDisplays();
+          updateFilterCounts();
+          const activeTag = document.querySelector('.sub-tabs .tag.active');
+          if (activeTag) filterPosts(activeTag.dataset.filter);
+
+          if (data.has_more) {
+            loadMore.dataset.nextCursor = data.next_cursor;
+          } else {
+            observer.disconnect();
+            loadMore.remove();
+          }
+        })
+        .catch(error => {
+          console.error('[ERROR] 載入更多貼文失敗:', error);
+          showNotification('網路錯誤，請稍後再試', 'error');
+        })
+        .finally(() => {
+          isLoading = false;
+          loadMore.classList.remove('loading');
+        });
+    }
+
+    const observer = new IntersectionObserver(entries => {
+      if (entries.some(entry => entry.isIntersecting)) {
+        loadNextPage();
+      }
+    }, { rootMargin: '400px 0px' });
+    observer.observe(loadMore);
+  }
+
+  initializeInfiniteScroll();
+
 });
 
 /* --- 追蹤列表和粉絲列表功能 --- */
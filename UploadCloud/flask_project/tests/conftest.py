@@ -0,0 +1,7 @@
+# -*- coding: utf-8 -*-
+"""測試共用設定：以 flask_project 為匯入根目錄（與 tools/ 相同）"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+積分對帳（utils/points_ledger.py）測試
+
+以 SQLite 記憶體資料庫模擬 User / Posts / Likes / Comments，
+補上 MySQL 專用的 NOW() / DATEDIFF() / GREATEST() 與 %s 參數格式。
+"""
+
+import sqlite3
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from utils import points_ledger
+from utils.level_system import UserLevelSystem, recount_user_stats
+
+SCHEMA = """
+    CREATE TABLE User (
+        User_Email TEXT PRIMARY KEY, Created_at TEXT,
+        posts_count INTEGER, likes_received INTEGER, comments_made INTEGER,
+        login_days INTEGER, user_points INTEGER
+    );
+    CREATE TABLE Posts (
+        Post_id INTEGER PRIMARY KEY, User_Email TEXT, Is_public INTEGER,
+        likes_count INTEGER, comments_count INTEGER
+    );
+    CREATE TABLE Likes (Post_id INTEGER, User_Email TEXT);
+    CREATE TABLE Comments (Comment_id INTEGER PRIMARY KEY, Post_id INTEGER, User_Email TEXT, Is_public INTEGER);
+    CREATE TABLE user_points_ledger (
+        user_email TEXT, event_type TEXT, quantity INTEGER, points_delta INTEGER, source_id INTEGER
+    );
+"""
+
+AUTHOR = 'author@example.com'
+
+
+def _datediff(first, second):
+    return (date.fromisoformat(first[:10]) - date.fromisoformat(second[:10])).days
+
+
+class _Cursor:
+    """將 PyMySQL 的 %s 參數格式轉換為 SQLite 的 ?"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, sql, params=()):
+        return self._cursor.execute(sql.replace('%s', '?'), params)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class _Connection:
+    def __init__(self, connection):
+        self._connection = connection
+
+    def cursor(self):
+        return _Cursor(self._connection.cursor())
+
+    def commit(self):
+        self._connection.commit()
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def database(monkeypatch):
+    connection = sqlite3.connect(':memory:')
+    connection.create_function('NOW', 0, lambda: datetime.now().isoformat(' '))
+    connection.create_function('DATEDIFF', 2, _datediff)
+    connection.create_function('GREATEST', 2, max)
+    connection.executescript(SCHEMA)
+
+    created_at = (datetime.now() - timedelta(days=9)).isoformat(' ')
+    connection.execute("INSERT INTO User VALUES (?, ?, 0, 0, 0, 10, 0)", (AUTHOR, created_at))
+    connection.execute("INSERT INTO Posts VALUES (1, ?, 1, 0, 0)", (AUTHOR,))
+    for index in range(3):
+        connection.execute("INSERT INTO Likes VALUES (1, ?)", (f'fan{index}@example.com',))
+    connection.execute("INSERT INTO Comments VALUES (1, 1, 'fan0@example.com', 1)")
+    connection.execute("INSERT INTO Comments VALUES (2, 1, ?, 1)", (AUTHOR,))
+    connection.commit()
+
+    monkeypatch.setattr('utils.db.get_connection', lambda *args, **kwargs: _Connection(connection))
+    yield connection
+    connection.close()
+
+
+def _store_user_stats(connection, posts, likes, comments, login_days=10):
+    points = UserLevelSystem.calculate_points(posts, likes, comments, login_days)
+    connection.execute("""
+        UPDATE User SET posts_count = ?, likes_received = ?, comments_made = ?, login_days = ?, user_points = ?
+        WHERE User_Email = ?
+    """, (posts, likes, comments, login_days, points, AUTHOR))
+    connection.commit()
+
+
+def test_recount_reads_likes_and_comments_rows(database):
+    # Posts 上的計數器已漂移，重算仍以實際資料列為準
+    database.execute("UPDATE Posts SET likes_count = 7, comments_count = 5")
+
+    stats = recount_user_stats(_Cursor(database.cursor()), AUTHOR)
+
+    assert stats['posts_count'] == 1
+    assert stats['likes_received'] == 3
+    assert stats['comments_received'] == 1
+
+
+def test_reconcile_reports_drift_in_denormalized_counters(database):
+    # User 與 Posts 的計數器一起漂移（只比對計數器時不會發現）
+    database.execute("UPDATE Posts SET likes_count = 7")
+    _store_user_stats(database, posts=1, likes=7, comments=1)
+
+    drifts = points_ledger.reconcile_user_points([AUTHOR], fix=False)
+
+    assert len(drifts) == 1
+    assert drifts[0]['stored']['likes_received'] == 7
+    assert drifts[0]['expected']['likes_received'] == 3
+
+
+def test_dry_run_does_not_write(database):
+    # 登入天數落後且統計漂移：dry run 只回報，不補登入天數也不寫帳本
+    _store_user_stats(database, posts=1, likes=7, comments=1, login_days=4)
+
+    drifts = points_ledger.reconcile_user_points([AUTHOR], fix=False)
+
+    assert len(drifts) == 1
+    assert drifts[0]['stored']['login_days'] == drifts[0]['expected']['login_days']
+    assert database.execute("SELECT login_days FROM User").fetchone()[0] == 4
+    assert database.execute("SELECT COUNT(*) FROM user_points_ledger").fetchone()[0] == 0
+
+
+def test_dry_run_ignores_pending_login_days(database):
+    # 只有登入天數尚未補上時不算漂移
+    _store_user_stats(database, posts=1, likes=3, comments=1, login_days=4)
+
+    assert points_ledger.reconcile_user_points([AUTHOR], fix=False) == []
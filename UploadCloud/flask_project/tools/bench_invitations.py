@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""
+任務卡片邀請寫入效能比較：每列一份快照 vs. 快照表 + 多列 INSERT
+
+在資料庫中建立暫存資料表，對 1 / 10 / 100 位接收者分別執行多輪邀請：
+- 舊路徑：executemany 寫入，每列 card_invitations 都存一份完整的 card_snapshot JSON
+- 新路徑：get_or_create_snapshot() 每個卡片版本只存一份快照，
+  insert_invitations() 以一次多列 INSERT 寫入並取回邀請ID
+並輸出每秒寫入的邀請數，以及每份邀請平均佔用的快照位元組數
+（JSON_STORAGE_SIZE；新路徑另計 snapshot_id 欄位的 4 位元組）。結束後刪除暫存資料表。
+
+使用方式（於 flask_project 目錄執行，使用 .env 中的資料庫設定）：
+    python tools/bench_invitations.py
+    python tools/bench_invitations.py --rounds 200 --cards 20 --keep
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import db  # noqa: E402
+from services.coopcard.invitations import build_card_snapshot  # noqa: E402
+
+RECEIVER_COUNTS = (1, 10, 100)
+LEGACY_TABLE = 'bench_card_invitations_legacy'
+INVITATION_TABLE = 'bench_card_invitations'
+SNAPSHOT_TABLE = 'bench_card_snapshots'
+SNAPSHOT_ID_BYTES = 4
+
+# 測試卡片內容用詞庫
+VOCABULARY = ['每天', '喝水', '八杯', '早睡', '早起', '散步', '三十分鐘', '閱讀', '十頁', '冥想',
+              '伸展', '記帳', '寫日記', '感謝', '朋友', '一起', '堅持', '打卡', '運動', '放鬆']
+
+
+def create_tables(cursor):
+    drop_tables(cursor)
+    cursor.execute(f"""
+        CREATE TABLE {LEGACY_TABLE} (
+            id int NOT NULL AUTO_INCREMENT,
+            card_id int NOT NULL,
+            sender_email varchar(255) NOT NULL,
+            receiver_email varchar(255) NOT NULL,
+            status enum('pending','accepted','rejected') DEFAULT 'pending',
+            invitation_message text,
+            card_snapshot json NOT NULL,
+            created_at timestamp NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (id)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """)
+    cursor.execute(f"""
+        CREATE TABLE {SNAPSHOT_TABLE} (
+            id int NOT NULL AUTO_INCREMENT,
+            card_id int NOT NULL,
+            snapshot_hash char(64) NOT NULL,
+            snapshot json NOT NULL,
+            created_at timestamp NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (id),
+            UNIQUE KEY uk_bench_card_hash (card_id, snapshot_hash)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """)
+    cursor.execute(f"""
+        CREATE TABLE {INVITATION_TABLE} (
+            id int NOT NULL AUTO_INCREMENT,
+            card_id int NOT NULL,
+            sender_email varchar(255) NOT NULL,
+            receiver_email varchar(255) NOT NULL,
+            status enum('pending','accepted','rejected') DEFAULT 'pending',
+            invitation_message text,
+            snapshot_id int DEFAULT NULL,
+            created_at timestamp NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (id)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """)
+
+
+def drop_tables(cursor):
+    for table in (LEGACY_TABLE, INVITATION_TABLE, SNAPSHOT_TABLE):
+        cursor.execute(f"DROP TABLE IF EXISTS {table}")
+
+
+def make_cards(rng, count):
+    """產生測試卡片快照（欄位與 task_cards 快照相同）"""
+    cards = []
+    for card_id in range(1, count + 1):
+        cards.append(build_card_snapshot((
+            card_id,
+            f'owner{card_id}@example.com',
+            ''.join(rng.choice(VOCABULARY) for _ in range(3)),
+            '，'.join(rng.choice(VOCABULARY) for _ in range(rng.randint(40, 120))),
+            'star',
+            rng.randint(1, 5),
+            rng.choice((7, 14, 21, 30)),
+            rng.randint(2, 100),
+            datetime.now()
+        )))
+    return cards
+
+
+def legacy_invite(cursor, card, receivers, message):
+    snapshot_json = json.dumps(card, ensure_ascii=False)
+    cursor.executemany(f"""
+        INSERT INTO {LEGACY_TABLE}
+        (card_id, sender_email, receiver_email, status, invitation_message, card_snapshot)
+        VALUES (%s, %s, %s, %s, %s, %s)
+    """, [(card['id'], card['user_id'], receiver, 'pending', message, snapshot_json) for receiver in receivers])
+
+
+def batched_invite(cursor, card, receivers, message):
+    """與 services/coopcard/invitations.py 相同的 SQL，改寫入暫存資料表"""
+    snapshot_json = json.dumps(card, ensure_ascii=False, sort_keys=True)
+    snapshot_hash = hashlib.sha256(snapshot_json.encode('utf-8')).hexdigest()
+    cursor.execute(f"""
+        INSERT INTO {SNAPSHOT_TABLE} (card_id, snapshot_hash, snapshot)
+        VALUES (%s, %s, %s)
+        ON DUPLICATE KEY UPDATE id = LAST_INSERT_ID(id)
+    """, (card['id'], snapshot_hash, snapshot_json))
+    snapshot_id = cursor.lastrowid
+
+    values = ', '.join(["(%s, %s, %s, 'pending', %s, %s)"] * len(receivers))
+    params = []
+    for receiver in receivers:
+        params.extend((card['id'], card['user_id'], receiver, message, snapshot_id))
+    cursor.execute(f"""
+        INSERT INTO {INVITATION_TABLE}
+        (card_id, sender_email, receiver_email, status, invitation_message, snapshot_id)
+        VALUES {values}
+    """, params)
+    first_id = cursor.lastrowid
+    return {receiver: first_id + offset for offset, receiver in enumerate(receivers)}
+
+
+def time_invites(connection, cursor, invite, cards, receiver_count, rounds, rng):
+    """執行多輪邀請（每輪一個交易），返回每秒寫入的邀請數"""
+    started = time.perf_counter()
+    for round_index in range(rounds):
+        card = rng.choice(cards)
+        receivers = [f'friend{round_index}_{offset}@example.com' for offset in range(receiver_count)]
+        connection.begin()
+        invite(cursor, card, receivers, '一起來打卡吧！')
+        connection.commit()
+    elapsed = time.perf_counter() - started
+    return rounds * receiver_count / elapsed if elapsed else float('inf')
+
+
+def bytes_per_invitation(cursor):
+    cursor.execute(f"SELECT COUNT(*), COALESCE(SUM(JSON_STORAGE_SIZE(card_snapshot)), 0) FROM {LEGACY_TABLE}")
+    legacy_rows, legacy_bytes = cursor.fetchone()
+    cursor.execute(f"SELECT COUNT(*) FROM {INVITATION_TABLE}")
+    new_rows = cursor.fetchone()[0]
+    cursor.execute(f"SELECT COALESCE(SUM(JSON_STORAGE_SIZE(snapshot)), 0) FROM {SNAPSHOT_TABLE}")
+    snapshot_bytes = cursor.fetchone()[0]
+    legacy_average = legacy_bytes / legacy_rows if legacy_rows else 0
+    new_average = (snapshot_bytes + SNAPSHOT_ID_BYTES * new_rows) / new_rows if new_rows else 0
+    return legacy_average, new_average
+
+
+def run_benchmark(rounds, card_count, keep):
+    rng = random.Random(42)
+    cards = make_cards(rng, card_count)
+    connection = db.get_connection()
+    cursor = connection.cursor()
+
+    try:
+        print(f'{"接收者數":<8}{"舊路徑 邀請/秒":>16}{"新路徑 邀請/秒":>16}{"加速":>8}'
+              f'{"舊路徑 位元組/邀請":>20}{"新路徑 位元組/邀請":>20}')
+        for receiver_count in RECEIVER_COUNTS:
+            create_tables(cursor)
+            legacy_rate = time_invites(connection, cursor, legacy_invite, cards, receiver_count, rounds, rng)
+            new_rate = time_invites(connection, cursor, batched_invite, cards, receiver_count, rounds, rng)
+            legacy_bytes, new_bytes = bytes_per_invitation(cursor)
+            speedup = new_rate / legacy_rate if legacy_rate else float('inf')
+            print(f'{receiver_count:<8}{legacy_rate:>16.0f}{new_rate:>16.0f}{speedup:>7.1f}x'
+                  f'{legacy_bytes:>20.0f}{new_bytes:>20.1f}')
+        print(f'\n每個接收者數執行 {rounds} 輪，隨機選自 {card_count} 張卡片（每輪一個交易）')
+
+    finally:
+        if not keep:
+            drop_tables(cursor)
+        connection.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='任務卡片邀請寫入效能與快照儲存量比較')
+    parser.add_argument('--rounds', type=int, default=200, help='每個接收者數執行的邀請輪數')
+    parser.add_argument('--cards', type=int, default=20, help='測試卡片數（快照版本數）')
+    parser.add_argument('--keep', action='store_true', help='保留暫存資料表（最後一組接收者數）')
+    args = parser.parse_args()
+    run_benchmark(args.rounds, args.cards, args.keep)
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+社群搜尋效能比較：LIKE '%q%' vs. FULLTEXT ngram
+
+在資料庫中建立暫存資料表 bench_search_posts，灌入指定筆數（預設 100,000）的
+中文測試貼文，建立 ngram 全文索引後，以同一組關鍵字分別執行：
+- 舊路徑：title LIKE '%q%' OR Content LIKE '%q%'
+- 新路徑：MATCH(title, Content) AGAINST ('+"q"' IN BOOLEAN MODE)，依相關度排序
+並輸出各查詢的中位數 / P95 延遲與符合筆數。結束後刪除暫存資料表。
+
+使用方式（於 flask_project 目錄執行，使用 .env 中的資料庫設定）：
+    python tools/bench_search.py
+    python tools/bench_search.py --rows 100000 --repeat 20 --keep
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import db  # noqa: E402
+
+BENCH_TABLE = 'bench_search_posts'
+INSERT_BATCH_SIZE = 1000
+
+# 測試貼文用詞庫
+VOCABULARY = [
+    '今天', '心情', '不好', '開心', '考試', '報告', '朋友', '家人', '工作', '壓力',
+    '睡不著', '運動', '跑步', '咖啡', '下雨', '天氣', '晴天', '散步', '音樂', '電影',
+    '焦慮', '放鬆', '感謝', '努力', '失眠', '旅行', '午餐', '晚餐', '學校', '老師',
+    '同學', '加班', '週末', '生日', '禮物', '貓咪', '狗狗', '聊天', '日記', '早安',
+]
+SEARCH_TERMS = ['心情', '睡不著', '考試 壓力', '貓咪', '旅行', '咖啡']
+
+
+def random_text(rng, words):
+    return '，'.join(rng.choice(VOCABULARY) for _ in range(words))
+
+
+def seed_table(cursor, connection, rows, rng):
+    cursor.execute(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+    cursor.execute(f"""
+        CREATE TABLE {BENCH_TABLE} (
+            Post_id int NOT NULL AUTO_INCREMENT,
+            User_Email varchar(255) DEFAULT NULL,
+            title varchar(255) DEFAULT NULL,
+            Content text,
+            Is_public tinyint(1) DEFAULT '1',
+            Created_at timestamp NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (Post_id)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """)
+
+    base_time = datetime.now() - timedelta(days=365)
+    inserted = 0
+    while inserted < rows:
+        batch = []
+        for offset in range(min(INSERT_BATCH_SIZE, rows - inserted)):
+            batch.append((
+                f'bench{rng.randint(1, 2000)}@example.com',
+                random_text(rng, rng.randint(2, 5)),
+                random_text(rng, rng.randint(20, 80)),
+                base_time + timedelta(seconds=inserted + offset)
+            ))
+        cursor.executemany(f"""
+            INSERT INTO {BENCH_TABLE} (User_Email, title, Content, Created_at)
+            VALUES (%s, %s, %s, %s)
+        """, batch)
+        connection.commit()
+        inserted += len(batch)
+
+    started = time.perf_counter()
+    cursor.execute(f"""
+        ALTER TABLE {BENCH_TABLE}
+        ADD FULLTEXT KEY ft_bench_title_content (title, Content) WITH PARSER ngram
+    """)
+    return time.perf_counter() - started
+
+
+def time_query(cursor, sql, params, repeat):
+    durations = []
+    row_count = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        cursor.execute(sql, params)
+        row_count = len(cursor.fetchall())
+        durations.append((time.perf_counter() - started) * 1000)
+    durations.sort()
+    p95_index = max(int(len(durations) * 0.95) - 1, 0)
+    return statistics.median(durations), durations[p95_index], row_count
+
+
+def run_benchmark(rows, repeat, keep):
+    rng = random.Random(42)
+    connection = db.get_connection()
+    cursor = connection.cursor()
+
+    try:
+        print(f'灌入 {rows} 筆測試貼文至 {BENCH_TABLE} ...')
+        index_seconds = seed_table(cursor, connection, rows, rng)
+        print(f'建立 ngram 全文索引耗時 {index_seconds:.1f} 秒\n')
+
+        print(f'{"關鍵字":<10}{"LIKE 中位數":>14}{"LIKE P95":>12}{"FULLTEXT 中位數":>18}{"FULLTEXT P95":>14}{"加速":>8}')
+        for term_text in SEARCH_TERMS:
+            terms = term_text.split()
+            like_sql = ' AND '.join(['(title LIKE %s OR Content LIKE %s)'] * len(terms))
+            like_params = [value for term in terms for value in (f'%{term}%', f'%{term}%')]
+            like_median, like_p95, like_rows = time_query(cursor, f"""
+                SELECT Post_id FROM {BENCH_TABLE}
+                WHERE Is_public = TRUE AND {like_sql}
+                ORDER BY Created_at DESC LIMIT 21
+            """, tuple(like_params), repeat)
+
+            boolean_query = ' '.join(f'+"{term}"' for term in terms)
+            fulltext_median, fulltext_p95, fulltext_rows = time_query(cursor, f"""
+                SELECT Post_id, MATCH(title, Content) AGAINST (%s IN BOOLEAN MODE) AS relevance
+                FROM {BENCH_TABLE}
+                WHERE Is_public = TRUE AND MATCH(title, Content) AGAINST (%s IN BOOLEAN MODE)
+                ORDER BY relevance DESC, Created_at DESC LIMIT 21
+            """, (boolean_query, boolean_query), repeat)
+
+            speedup = like_median / fulltext_median if fulltext_median else float('inf')
+            print(f'{term_text:<10}{like_median:>11.2f} ms{like_p95:>9.2f} ms'
+                  f'{fulltext_median:>15.2f} ms{fulltext_p95:>11.2f} ms{speedup:>7.1f}x'
+                  f'  ({like_rows}/{fulltext_rows} 筆)')
+
+    finally:
+        if not keep:
+            cursor.execute(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+        connection.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='LIKE vs. FULLTEXT ngram 搜尋效能比較')
+    parser.add_argument('--rows', type=int, default=100000, help='測試貼文筆數')
+    parser.add_argument('--repeat', type=int, default=10, help='每個查詢重複次數')
+    parser.add_argument('--keep', action='store_true', help='保留暫存資料表')
+    args = parser.parse_args()
+    run_benchmark(args.rows, args.repeat, args.keep)
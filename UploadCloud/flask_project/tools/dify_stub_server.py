@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+本機 Dify stub 伺服器（壓測用）
+
+模擬 Dify /v1/chat-messages 端點，讓壓測不必呼叫真實 API：
+- response_mode = blocking：延遲後回傳 JSON（answer、conversation_id、message_id）
+- response_mode = streaming：以 SSE 逐段送出 message 事件，最後送出 message_end
+- 可設定回應延遲、隨機錯誤率（回傳 503），用來觀察重試與斷路器行為
+
+使用方式（於 flask_project 目錄執行）：
+    python tools/dify_stub_server.py --port 8765 --latency 0.8 --error-rate 0.05
+並以 DIFY_STUB_MODE=1（或 DIFY_STUB_URL=http://127.0.0.1:8765/v1/chat-messages）啟動應用程式。
+"""
+
+import argparse
+import json
+import random
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STUB_ANSWER = '這是本機 stub 伺服器的模擬回覆。謝謝你願意分享，我們一起慢慢整理今天的心情。'
+STREAM_CHUNK_SIZE = 4
+
+
+class DifyStubHandler(BaseHTTPRequestHandler):
+    latency = 0.5
+    jitter = 0.2
+    error_rate = 0.0
+    chunk_delay = 0.05
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body):
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        if not self.path.rstrip('/').endswith('/chat-messages'):
+            self._send_json(404, {'code': 'not_found', 'message': 'stub 只支援 /v1/chat-messages'})
+            return
+
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            payload = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            self._send_json(400, {'code': 'invalid_param', 'message': 'JSON 格式錯誤'})
+            return
+
+        time.sleep(max(self.latency + random.uniform(-self.jitter, self.jitter), 0))
+
+        if random.random() < self.error_rate:
+            self._send_json(503, {'code': 'service_unavailable', 'message': 'stub 模擬錯誤'})
+            return
+
+        conversation_id = payload.get('conversation_id') or str(uuid.uuid4())
+        message_id = str(uuid.uuid4())
+
+        if payload.get('response_mode') == 'streaming':
+            self._send_stream(conversation_id, message_id)
+            return
+
+        self._send_json(200, {
+            'event': 'message',
+            'message_id': message_id,
+            'conversation_id': conversation_id,
+            'mode': 'chat',
+            'answer': STUB_ANSWER,
+            'created_at': int(time.time())
+        })
+
+    def _send_stream(self, conversation_id, message_id):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+
+        for start in range(0, len(STUB_ANSWER), STREAM_CHUNK_SIZE):
+            event = {
+                'event': 'message',
+                'message_id': message_id,
+                'conversation_id': conversation_id,
+                'answer': STUB_ANSWER[start:start + STREAM_CHUNK_SIZE],
+                'created_at': int(time.time())
+            }
+            self.wfile.write(f'data: {json.dumps(event, ensure_ascii=False)}\n\n'.encode('utf-8'))
+            self.wfile.flush()
+            time.sleep(self.chunk_delay)
+
+        end_event = {'event': 'message_end', 'message_id': message_id, 'conversation_id': conversation_id}
+        self.wfile.write(f'data: {json.dumps(end_event)}\n\n'.encode('utf-8'))
+        self.wfile.flush()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='本機 Dify stub 伺服器')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.5, help='平均回應延遲（秒）')
+    parser.add_argument('--jitter', type=float, default=0.2, help='延遲隨機浮動範圍（秒）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='回傳 503 的機率（0~1）')
+    parser.add_argument('--chunk-delay', type=float, default=0.05, help='串流模式每段間隔（秒）')
+    args = parser.parse_args()
+
+    DifyStubHandler.latency = args.latency
+    DifyStubHandler.jitter = args.jitter
+    DifyStubHandler.error_rate = args.error_rate
+    DifyStubHandler.chunk_delay = args.chunk_delay
+
+    server = ThreadingHTTPServer((args.host, args.port), DifyStubHandler)
+    print(f'Dify stub 伺服器啟動於 http://{args.host}:{args.port}/v1/chat-messages')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
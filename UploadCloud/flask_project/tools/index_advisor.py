@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""
+查詢索引顧問：對收集到的 SQL 執行 EXPLAIN，列出全表掃描與 filesort
+
+收集語句（於 flask_project 目錄執行）：
+    DB_QUERY_CAPTURE=captured_queries.jsonl python app.py
+    # 操作各頁面或執行壓測腳本，每個語句指紋會以代入參數後的完整語句記錄一次
+
+分析：
+    python tools/index_advisor.py captured_queries.jsonl
+    python tools/index_advisor.py captured_queries.jsonl --min-rows 100 --json
+
+報告內容（依預估掃描列數由多到少）：
+- type = ALL（全表掃描）或 index（全索引掃描）
+- Extra 含 Using filesort / Using temporary
+- 依 WHERE 等值條件與 ORDER BY 欄位推測的複合索引建議（等值欄位在前、排序欄位在後）
+
+只分析 SELECT / UPDATE / DELETE；EXPLAIN 不會實際執行語句。
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import db  # noqa: E402
+
+EXPLAINABLE = re.compile(r"^\s*\(?\s*(SELECT|UPDATE|DELETE)\b", re.IGNORECASE)
+FLAGGED_EXTRA = ('Using filesort', 'Using temporary')
+
+_IDENTIFIER = r"`?(\w+)`?"
+_TABLE_REFERENCE = re.compile(
+    r"\b(?:FROM|JOIN|UPDATE)\s+" + _IDENTIFIER + r"(?:\s+(?:AS\s+)?(?!WHERE|ON|LEFT|RIGHT|INNER|JOIN|SET|ORDER|GROUP|LIMIT)(\w+))?",
+    re.IGNORECASE
+)
+_EQUALITY = re.compile(r"(?:(\w+)\.)?" + _IDENTIFIER + r"\s*(?:=\s*(?:%s|\?|'[^']*'|\d+|TRUE|FALSE)|IN\s*\()", re.IGNORECASE)
+_RANGE = re.compile(r"(?:(\w+)\.)?" + _IDENTIFIER + r"\s*(?:>=|<=|>|<|BETWEEN)\s", re.IGNORECASE)
+_ORDER_BY = re.compile(r"\bORDER\s+BY\s+(.+?)(?:\bLIMIT\b|\bFOR\s+UPDATE\b|$)", re.IGNORECASE | re.DOTALL)
+_WHERE = re.compile(r"\bWHERE\b(.+?)(?:\bGROUP\s+BY\b|\bORDER\s+BY\b|\bLIMIT\b|$)", re.IGNORECASE | re.DOTALL)
+
+
+def load_statements(path):
+    """讀取 DB_QUERY_CAPTURE 收集檔，依指紋去除重複"""
+    statements = {}
+    with open(path, encoding='utf-8') as capture_file:
+        for line in capture_file:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except ValueError:
+                continue
+            if item.get('sql') and EXPLAINABLE.match(item['sql']):
+                statements.setdefault(item['fingerprint'], item)
+    return list(statements.values())
+
+
+def _columns_for(pattern, text, aliases, multi_table):
+    """取出屬於指定資料表（別名或未加前綴）的欄位"""
+    columns = []
+    for qualifier, column in pattern.findall(text):
+        if qualifier and qualifier.lower() not in aliases:
+            continue
+        if not qualifier and multi_table:
+            # 多表查詢中未加前綴的欄位無法判斷歸屬
+            continue
+        if column.upper() in ('AND', 'OR', 'NOT') or column in columns:
+            continue
+        columns.append(column)
+    return columns
+
+
+def resolve_table(sql, name):
+    """EXPLAIN 的 table 欄位為別名時，換回實際資料表名稱"""
+    for table, alias in _TABLE_REFERENCE.findall(sql):
+        if alias and alias.lower() == name.lower():
+            return table
+    return name
+
+
+def suggest_index(sql, table):
+    """
+    依語句推測指定資料表的複合索引欄位
+
+    Returns:
+        list: 欄位順序為 等值條件 → 範圍條件 / 排序欄位；無法推測時返回空列表
+    """
+    references = _TABLE_REFERENCE.findall(sql)
+    multi_table = len(references) > 1
+    aliases = {table.lower()}
+    aliases.update(alias.lower() for name, alias in references if name.lower() == table.lower() and alias)
+
+    where_match = _WHERE.search(sql)
+    where_text = where_match.group(1) if where_match else ''
+    columns = _columns_for(_EQUALITY, where_text, aliases, multi_table)
+
+    order_match = _ORDER_BY.search(sql)
+    if order_match:
+        order_text = re.sub(r"\b(ASC|DESC)\b", '', order_match.group(1), flags=re.IGNORECASE)
+        for item in order_text.split(','):
+            parts = item.strip().strip('`').split('.')
+            qualifier, column = (parts[0], parts[1]) if len(parts) == 2 else ('', parts[0])
+            column = column.strip('` ')
+            if not re.fullmatch(r"\w+", column or ''):
+                continue
+            if (qualifier and qualifier.lower() not in aliases) or (not qualifier and multi_table):
+                continue
+            if column not in columns:
+                columns.append(column)
+    else:
+        for column in _columns_for(_RANGE, where_text, aliases, multi_table):
+            if column not in columns:
+                columns.append(column)
+                break
+
+    return columns
+
+
+def explain(cursor, sql):
+    """執行 EXPLAIN 並返回字典列"""
+    cursor.execute(f"EXPLAIN {sql}")
+    names = [column[0] for column in cursor.description]
+    return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+
+def analyze(statements, min_rows):
+    """
+    對每個語句執行 EXPLAIN，返回有問題的計畫列
+
+    Returns:
+        tuple: (findings, errors)
+    """
+    findings = []
+    errors = []
+    connection = db.get_connection()
+    cursor = connection.cursor()
+    try:
+        for item in statements:
+            try:
+                plan = explain(cursor, item['sql'])
+            except Exception as e:
+                errors.append({'fingerprint': item['fingerprint'], 'error': str(e)})
+                continue
+
+            for row in plan:
+                access_type = row.get('type')
+                extra = row.get('Extra') or ''
+                estimated_rows = int(row.get('rows') or 0)
+                problems = []
+                if access_type == 'ALL':
+                    problems.append('全表掃描')
+                elif access_type == 'index':
+                    problems.append('全索引掃描')
+                problems.extend(flag for flag in FLAGGED_EXTRA if flag in extra)
+                # <derived2> 等暫存結果沒有可加索引的資料表
+                if not problems or estimated_rows < min_rows or not row.get('table') or row['table'].startswith('<'):
+                    continue
+
+                table = resolve_table(item['fingerprint'], row['table'])
+                findings.append({
+                    'path': item.get('path'),
+                    'fingerprint': item['fingerprint'],
+                    'table': table,
+                    'type': access_type,
+                    'key': row.get('key'),
+                    'rows': estimated_rows,
+                    'extra': extra,
+                    'problems': problems,
+                    'suggested_index': suggest_index(item['fingerprint'], table)
+                })
+    finally:
+        connection.close()
+
+    findings.sort(key=lambda finding: finding['rows'], reverse=True)
+    return findings, errors
+
+
+def print_report(findings, errors, total):
+    print(f"分析語句數: {total}，有問題的計畫: {len(findings)}，EXPLAIN 失敗: {len(errors)}")
+    print('-' * 80)
+    for finding in findings:
+        print(f"[{', '.join(finding['problems'])}] {finding['table']} "
+              f"type={finding['type']} key={finding['key']} rows≈{finding['rows']}")
+        print(f"  來源: {finding['path']}")
+        print(f"  語句: {finding['fingerprint'][:200]}")
+        if finding['suggested_index']:
+            columns = ', '.join(f"`{column}`" for column in finding['suggested_index'])
+            print(f"  建議: ALTER TABLE `{finding['table']}` ADD KEY ({columns})")
+        print()
+
+    for error in errors:
+        print(f"[EXPLAIN 失敗] {error['error']}: {error['fingerprint'][:160]}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='對收集到的 SQL 執行 EXPLAIN，找出全表掃描與 filesort')
+    parser.add_argument('capture_file', help='DB_QUERY_CAPTURE 產生的 JSON Lines 檔案')
+    parser.add_argument('--min-rows', type=int, default=0, help='只列出預估掃描列數不少於此值的計畫')
+    parser.add_argument('--json', action='store_true', help='以 JSON 輸出報告')
+    args = parser.parse_args()
+
+    statements = load_statements(args.capture_file)
+    findings, errors = analyze(statements, args.min_rows)
+
+    if args.json:
+        print(json.dumps({'statements': len(statements), 'findings': findings, 'errors': errors},
+                         ensure_ascii=False, indent=2, default=str))
+    else:
+        print_report(findings, errors, len(statements))
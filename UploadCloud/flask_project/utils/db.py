@@ -8,11 +8,19 @@
 - 環境變數配置支援
 
 連線池配置：
-- mincached: 5 個最小空閒連線
+- 延遲建立：第一次取用連線時才建立連線池（import 模組不會連線資料庫，
+  且連線池的鎖在 eventlet.monkey_patch() 之後建立，等待時只讓出 green thread）
+- mincached: 預設 0 個最小空閒連線（依需求建立）
 - maxcached: 10 個最大空閒連線
 - maxconnections: 20 個最大總連線數
-- blocking: 阻塞等待可用連線
+- 有上限的等待：連線用盡時最多等待 DB_POOL_WAIT_TIMEOUT 秒，
+  逾時拋出 PoolTimeoutError，由 init_app 註冊的處理器回應 503
 - autocommit: 自動提交事務
+- 請求範圍重用：同一請求內依序呼叫 get_connection() 共用同一條連線，
+  請求結束時（teardown_appcontext）統一歸還；連線有效性依閒置 / 存活時間檢查，
+  不再每次取出都 ping（請求內重用閒置的連線時也依同樣規則檢查）
+- 長時間的外部 I/O（Dify 呼叫、SSE 串流）之前以 release_request_connections()
+  先歸還請求中閒置的連線，避免連線在等待回應期間被佔住
 
 環境變數：
 - DB_HOST: 資料庫主機（預設: localhost）
@@ -20,6 +28,27 @@
 - DB_NAME: 資料庫名稱（預設: flaskdb）
 - DB_USER: 資料庫用戶（預設: root）
 - DB_PASSWORD: 資料庫密碼（預設: NTUB）
+- DB_PING_IDLE_SECONDS: 閒置超過此秒數才 ping（預設: 60）
+- DB_MAX_CONNECTION_AGE: 實體連線最長存活秒數（預設: 3600）
+- DB_CHECKOUT_WARN_THRESHOLD: 單一請求取出連線數警告門檻（預設: 3）
+- DB_POOL_MINCACHED / DB_POOL_MAXCACHED: 連線池最小 / 最大空閒連線數（預設: 0 / 10）
+- DB_POOL_MAX_CONNECTIONS: 主庫連線池最大連線數（預設: 20，依每個 worker 調整）
+- DB_POOL_WAIT_TIMEOUT: 等待可用連線的最長秒數（預設: 5）
+- DB_DEBUG_HEADERS: 回應附上連線與 SQL 統計標頭（預設: 關閉；debug 模式自動開啟）
+- DB_REPLICA_HOST: 唯讀副本主機（未設定則不啟用讀寫分離）
+- DB_REPLICA_PORT / DB_REPLICA_NAME / DB_REPLICA_USER / DB_REPLICA_PASSWORD:
+  副本連線資訊（預設沿用主庫設定）
+- DB_REPLICA_MAX_CONNECTIONS: 副本連線池最大連線數（預設: 20）
+- DB_READ_YOUR_WRITES_SECONDS: 用戶寫入後唯讀查詢仍走主庫的秒數（預設: 5）
+
+讀寫分離：
+- 只讀的呼叫端以 get_connection(readonly=True) 或 `with connection(readonly=True)` 取用副本
+- 請求內偵測到寫入語句時，本請求與該用戶之後數秒內（session 記錄）的唯讀查詢改走主庫
+- 本機測試可用同一台 MySQL 建立只有 SELECT 權限的帳號當作副本：
+    CREATE USER 'flask_ro'@'localhost' IDENTIFIED BY '...';
+    GRANT SELECT ON flaskdb.* TO 'flask_ro'@'localhost';
+    DB_REPLICA_HOST=localhost DB_REPLICA_USER=flask_ro DB_REPLICA_PASSWORD=...
+  或啟動第二個 MySQL 實例並設定 DB_REPLICA_PORT
 
 使用方式：
     from utils.db import get_connection
@@ -27,13 +56,33 @@
     cursor = conn.cursor()
     # 執行 SQL 操作...
     conn.close()
+
+    # 只讀查詢使用副本
+    with connection(readonly=True) as conn:
+        ...
+
+    # 連線池使用狀況（使用中、閒置、等待者、等待時間分布）
+    from utils.db import get_pool_stats
+    get_pool_stats()
+
+    # app.py
+    from utils.db import init_app as init_db
+    init_db(app)
 """
 
+import bisect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
 import pymysql
 import os
 from dbutils.pooled_db import PooledDB
 from dotenv import load_dotenv
 
+from utils.query_stats import add_query_headers, instrument_cursor, log_query_stats
+
 # 載入環境變數
 load_dotenv()
 
@@ -44,40 +93,488 @@ DB_NAME = os.environ.get("DB_NAME", "flaskdb")
 DB_USER = os.environ.get("DB_USER", "root")
 DB_PASSWORD = os.environ.get("DB_PASSWORD", "NTUB")
 
-# 建立資料庫連線池
-# mincached: 啟動時建立的空閒連接數
-# maxcached: 連線池中最大空閒連接數
-# maxconnections: 連線池允許的最大連接數
-# blocking: 連接池中無可用連接是否阻塞等待 True/False
-pool = PooledDB(
-    creator=pymysql,  # 指定使用的資料庫模組
-    mincached=5,
-    maxcached=10,
-    maxconnections=20,
-    blocking=True,
-    host=DB_HOST,
-    port=DB_PORT,
-    user=DB_USER,
-    password=DB_PASSWORD,
-    database=DB_NAME,
-    charset="utf8mb4",
-    autocommit=True, # 建議在 Web 應用中設定為 True，或者確保手動管理事務
-    reset=True  # 在每次使用後重置連接
-)
+# 連線閒置超過此秒數才在取出時 ping 檢查（需小於 MySQL wait_timeout）
+DB_PING_IDLE_SECONDS = int(os.environ.get("DB_PING_IDLE_SECONDS", 60))
+# 實體連線存活超過此秒數即重新建立，避免長壽連線被中介層切斷
+DB_MAX_CONNECTION_AGE = int(os.environ.get("DB_MAX_CONNECTION_AGE", 3600))
+# 單一請求實際向連線池取出的連線數超過此值時記錄警告
+DB_CHECKOUT_WARN_THRESHOLD = int(os.environ.get("DB_CHECKOUT_WARN_THRESHOLD", 3))
+
+# 連線池大小與等待上限
+DB_POOL_MINCACHED = int(os.environ.get("DB_POOL_MINCACHED", 0))
+DB_POOL_MAXCACHED = int(os.environ.get("DB_POOL_MAXCACHED", 10))
+DB_POOL_MAX_CONNECTIONS = int(os.environ.get("DB_POOL_MAX_CONNECTIONS", 20))
+DB_POOL_WAIT_TIMEOUT = float(os.environ.get("DB_POOL_WAIT_TIMEOUT", 5))
+
+# ── 唯讀副本（replica）連線池 ──────────────────
+# 設定 DB_REPLICA_HOST 才會啟用；其餘連線資訊未設定時沿用主庫設定。
+# 連線建立後設為 READ ONLY 交易模式，誤送寫入語句會直接失敗。
+DB_REPLICA_HOST = os.environ.get("DB_REPLICA_HOST")
+DB_REPLICA_PORT = int(os.environ.get("DB_REPLICA_PORT", DB_PORT))
+DB_REPLICA_NAME = os.environ.get("DB_REPLICA_NAME", DB_NAME)
+DB_REPLICA_USER = os.environ.get("DB_REPLICA_USER", DB_USER)
+DB_REPLICA_PASSWORD = os.environ.get("DB_REPLICA_PASSWORD", DB_PASSWORD)
+DB_REPLICA_MAX_CONNECTIONS = int(os.environ.get("DB_REPLICA_MAX_CONNECTIONS", 20))
+
+# 用戶寫入後此秒數內的唯讀查詢仍走主庫（read-your-writes，需大於副本延遲）
+DB_READ_YOUR_WRITES_SECONDS = int(os.environ.get("DB_READ_YOUR_WRITES_SECONDS", 5))
+
+# 等待時間分布的桶上限（毫秒），最後一桶為超過最大值
+WAIT_BUCKETS_MS = (1, 5, 10, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class PoolTimeoutError(Exception):
+    """等待可用連線逾時（連線池已滿）"""
+
+
+class BoundedPool(PooledDB):
+    """
+    等待有上限並記錄使用狀況的 PooledDB
+
+    DBUtils 的 blocking=True 在連線用盡時會無限期等待；這裡在同一把條件鎖上
+    最多等待 wait_timeout 秒，逾時拋出 PoolTimeoutError。
+    """
+
+    def __init__(self, name, wait_timeout, **kwargs):
+        super().__init__(blocking=True, **kwargs)
+        self.name = name
+        self.wait_timeout = wait_timeout
+        self.waiters = 0
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_ms_total = 0.0
+        self.wait_histogram = [0] * (len(WAIT_BUCKETS_MS) + 1)
+
+    def connection(self, shareable=False):
+        started = time.monotonic()
+        # _lock 為 RLock 條件變數：持鎖等到有空位後，父類別的取出流程不會再等待
+        with self._lock:
+            deadline = started + self.wait_timeout
+            while self._maxconnections and self._connections >= self._maxconnections:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.timeouts += 1
+                    self._record_wait(started)
+                    raise PoolTimeoutError(
+                        f"{self.name} 連線池已滿（{self._maxconnections} 條），等待 {self.wait_timeout:g} 秒逾時"
+                    )
+                self.waiters += 1
+                try:
+                    self._lock.wait(remaining)
+                finally:
+                    self.waiters -= 1
+            con = super().connection(shareable)
+            self.checkouts += 1
+            self._record_wait(started)
+        return con
+
+    def _record_wait(self, started):
+        waited_ms = (time.monotonic() - started) * 1000
+        self.wait_ms_total += waited_ms
+        self.wait_histogram[bisect.bisect_left(WAIT_BUCKETS_MS, waited_ms)] += 1
+
+    def stats(self):
+        """連線池目前狀態與累計等待時間分布"""
+        with self._lock:
+            in_use = self._connections
+            idle = len(self._idle_cache)
+        attempts = self.checkouts + self.timeouts
+        labels = [f'<={bound}ms' for bound in WAIT_BUCKETS_MS] + [f'>{WAIT_BUCKETS_MS[-1]}ms']
+        return {
+            'in_use': in_use,
+            'idle': idle,
+            'waiters': self.waiters,
+            'max_connections': self._maxconnections,
+            'checkouts': self.checkouts,
+            'timeouts': self.timeouts,
+            'avg_wait_ms': round(self.wait_ms_total / attempts, 2) if attempts else 0,
+            'wait_histogram': dict(zip(labels, self.wait_histogram))
+        }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _create_pool(readonly):
+    """
+    建立連線池
+    mincached: 啟動時建立的空閒連接數
+    maxcached: 連線池中最大空閒連接數
+    maxconnections: 連線池允許的最大連接數
+    ping: 0 表示取出時不自動 ping，改由 _verify_connection() 依閒置時間 / 存活時間檢查
+    """
+    if readonly:
+        return BoundedPool(
+            'replica',
+            DB_POOL_WAIT_TIMEOUT,
+            creator=pymysql,
+            mincached=DB_POOL_MINCACHED,
+            maxcached=DB_POOL_MAXCACHED,
+            maxconnections=DB_REPLICA_MAX_CONNECTIONS,
+            ping=0,
+            setsession=["SET SESSION TRANSACTION READ ONLY"],
+            host=DB_REPLICA_HOST,
+            port=DB_REPLICA_PORT,
+            user=DB_REPLICA_USER,
+            password=DB_REPLICA_PASSWORD,
+            database=DB_REPLICA_NAME,
+            charset="utf8mb4",
+            autocommit=True,
+            reset=True
+        )
+    return BoundedPool(
+        'primary',
+        DB_POOL_WAIT_TIMEOUT,
+        creator=pymysql,  # 指定使用的資料庫模組
+        mincached=DB_POOL_MINCACHED,
+        maxcached=DB_POOL_MAXCACHED,
+        maxconnections=DB_POOL_MAX_CONNECTIONS,
+        ping=0,
+        host=DB_HOST,
+        port=DB_PORT,
+        user=DB_USER,
+        password=DB_PASSWORD,
+        database=DB_NAME,
+        charset="utf8mb4",
+        autocommit=True, # 建議在 Web 應用中設定為 True，或者確保手動管理事務
+        reset=True  # 在每次使用後重置連接
+    )
+
+
+def get_pool(readonly=False):
+    """取得（必要時建立）主庫或副本連線池；未設定副本時 readonly 返回 None"""
+    key = 'replica' if readonly else 'primary'
+    if readonly and not DB_REPLICA_HOST:
+        return None
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = _pools[key] = _create_pool(readonly)
+    return pool
+
+
+def get_pool_stats():
+    """
+    已建立連線池的使用狀況
+
+    Returns:
+        dict: {'primary': {...}, 'replica': {...}, 'checkout_stats': {...}}
+              尚未建立的連線池不列出
+    """
+    stats = {name: pool.stats() for name, pool in list(_pools.items())}
+    stats['checkout_stats'] = dict(checkout_stats)
+    return stats
+
+
+# 全域累計：get_connection() 呼叫次數 / 實際自連線池取出次數 / ping 次數 / 重建次數 / 副本取出與退回主庫次數
+checkout_stats = {
+    'requests': 0, 'calls': 0, 'pool_checkouts': 0, 'pings': 0, 'recycles': 0,
+    'replica_checkouts': 0, 'replica_fallbacks': 0
+}
+
+
+def _steady(conn):
+    """DBUtils 在多次取出之間保留的 SteadyDB 連線（用來記錄存活與閒置時間）"""
+    return getattr(conn, '_con', conn)
+
+
+def _verify_connection(conn):
+    """
+    依存活時間與閒置時間檢查連線，取代每次取出都 ping
+
+    - 第一次取出：ping 一次（連線池啟動時預先建立的連線可能已閒置很久）
+    - 存活超過 DB_MAX_CONNECTION_AGE：關閉底層連線並重新連線
+    - 閒置超過 DB_PING_IDLE_SECONDS：ping 一次（失敗時自動重連）
+    - 其餘情況直接使用，不產生額外的網路往返
+    """
+    steady = _steady(conn)
+    now = time.monotonic()
+    opened_at = getattr(steady, '_opened_at', None)
+    last_used = getattr(steady, '_last_used_at', None)
+
+    if opened_at is None:
+        conn.ping(reconnect=True)
+        checkout_stats['pings'] += 1
+        steady._opened_at = now
+    elif now - opened_at > DB_MAX_CONNECTION_AGE:
+        try:
+            steady._con.close()
+        except Exception:
+            pass
+        conn.ping(reconnect=True)
+        checkout_stats['recycles'] += 1
+        steady._opened_at = now
+    elif last_used is None or now - last_used > DB_PING_IDLE_SECONDS:
+        conn.ping(reconnect=True)
+        checkout_stats['pings'] += 1
+
+    steady._last_used_at = now
+
+
+def _return_to_pool(conn):
+    """記錄最後使用時間後歸還連線池"""
+    _steady(conn)._last_used_at = time.monotonic()
+    conn.close()
+
+
+def _checkout(readonly=False):
+    """自連線池取出一條連線並檢查有效性（readonly 時優先使用副本，副本無法連線則退回主庫）"""
+    replica = get_pool(readonly=True) if readonly else None
+    if replica is not None:
+        try:
+            conn = replica.connection()
+            _verify_connection(conn)
+            checkout_stats['replica_checkouts'] += 1
+            return conn
+        except PoolTimeoutError:
+            raise
+        except Exception as e:
+            checkout_stats['replica_fallbacks'] += 1
+            logging.warning(f"[DB] 副本連線失敗，改用主庫: {str(e)}")
+
+    conn = get_pool().connection()
+    _verify_connection(conn)
+    checkout_stats['pool_checkouts'] += 1
+    return conn
+
+
+def _mark_write():
+    """記錄目前用戶剛寫入主庫（本請求與之後 DB_READ_YOUR_WRITES_SECONDS 秒內的唯讀查詢改走主庫）"""
+    from flask import g, has_request_context, session
+
+    g._db_wrote = True
+    # 未設定副本時不需要 read-your-writes，避免每個寫入請求都修改 session 而重發 cookie
+    if DB_REPLICA_HOST and has_request_context():
+        session['_db_last_write'] = time.time()
+
+
+def _read_your_writes():
+    """目前請求是否需要讀到自己剛寫入的資料"""
+    from flask import g, has_request_context, session
+
+    if g.get('_db_wrote'):
+        return True
+    if not has_request_context():
+        return False
+    return time.time() - session.get('_db_last_write', 0) < DB_READ_YOUR_WRITES_SECONDS
+
+
+class _ConnectionSlot:
+    """請求內持有的一條實體連線"""
+
+    def __init__(self, conn, readonly=False):
+        self.conn = conn
+        self.readonly = readonly
+        self.busy = False
+        self.in_transaction = False
+
+    def release(self):
+        """呼叫端 close() 時歸還給請求（未提交的交易一律回滾）"""
+        if self.in_transaction:
+            try:
+                self.conn.rollback()
+            except Exception as e:
+                logging.warning(f"[DB] 回滾未完成的交易失敗: {str(e)}")
+            self.in_transaction = False
+        self.busy = False
+        # 請求內再次取用時由 _verify_connection() 依閒置時間決定是否 ping
+        _steady(self.conn)._last_used_at = time.monotonic()
+
+
+class RequestConnection:
+    """
+    請求範圍連線的代理物件
+
+    介面與 PyMySQL 連線相同；close() 只把連線還給目前的請求，
+    由 teardown_appcontext 在請求結束時統一歸還連線池。
+    cursor() 交出的游標會記錄每請求的 SQL 統計（見 utils/query_stats.py）。
+    """
+
+    def __init__(self, slot):
+        self._slot = slot
+        self._closed = False
+
+    def __getattr__(self, name):
+        return getattr(self._slot.conn, name)
+
+    def cursor(self, *args, **kwargs):
+        on_write = None if self._slot.readonly else _mark_write
+        return instrument_cursor(self._slot.conn.cursor(*args, **kwargs), on_write)
+
+    def begin(self):
+        self._slot.conn.begin()
+        self._slot.in_transaction = True
+
+    def commit(self):
+        self._slot.conn.commit()
+        self._slot.in_transaction = False
+
+    def rollback(self):
+        self._slot.conn.rollback()
+        self._slot.in_transaction = False
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._slot.release()
+
+
+def _request_slots():
+    """目前請求持有的連線列表；不在 app context 中時返回 None"""
+    from flask import g, has_app_context
+
+    if not has_app_context():
+        return None
+    if '_db_slots' not in g:
+        g._db_slots = []
+        g._db_calls = 0
+        checkout_stats['requests'] += 1
+    return g._db_slots
+
 
 # 從連線池取得資料庫連線
-def get_connection():
+def get_connection(readonly=False):
     """
     從連線池獲取資料庫連線
     
-    自動檢查連線有效性，提供可靠的資料庫連線
+    在 Flask 請求（app context）中，同一請求內依序呼叫的 helper 共用同一條連線：
+    若請求已持有閒置中的連線就直接重用，只有在前一個使用者尚未 close() 時才另外取出。
+    不在 app context 中（背景工作、腳本）則直接自連線池取出。
+    
+    Args:
+        readonly (bool): 只執行查詢的呼叫端可設為 True，改用唯讀副本；
+                         未設定副本，或目前用戶在 read-your-writes 視窗內時仍使用主庫
     
     Returns:
-        Connection: PyMySQL 資料庫連線物件
+        Connection: PyMySQL 資料庫連線物件（請求內為 RequestConnection 代理）
         
     Note:
-        使用後請記得呼叫 conn.close() 以歸還連線至連線池
+        使用後請記得呼叫 conn.close() 以歸還連線
+    """
+    checkout_stats['calls'] += 1
+    slots = _request_slots()
+    if slots is None:
+        return _checkout(readonly)
+
+    from flask import g
+    g._db_calls += 1
+
+    readonly = readonly and bool(DB_REPLICA_HOST) and not _read_your_writes()
+    slot = next((slot for slot in slots if not slot.busy and slot.readonly == readonly), None)
+    if slot is None:
+        slot = _ConnectionSlot(_checkout(readonly), readonly)
+        slots.append(slot)
+    else:
+        _verify_connection(slot.conn)
+    slot.busy = True
+    return RequestConnection(slot)
+
+
+@contextmanager
+def connection(readonly=False):
     """
-    conn = pool.connection()
-    conn.ping(reconnect=True)  # 檢查連線是否有效
-    return conn
\ No newline at end of file
+    以 with 語法取得連線，離開區塊時自動 close()
+
+    使用方式：
+        with db.connection(readonly=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT ...")
+    """
+    conn = get_connection(readonly=readonly)
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def get_request_checkouts():
+    """
+    目前請求的連線使用次數
+
+    Returns:
+        tuple: (get_connection 呼叫次數, 實際自連線池取出的連線數)
+    """
+    from flask import g, has_app_context
+
+    if not has_app_context() or '_db_slots' not in g:
+        return 0, 0
+    return g._db_calls, len(g._db_slots)
+
+
+def release_request_connections():
+    """
+    將目前請求中閒置（已 close()）的連線提前歸還連線池
+
+    在長時間的外部 I/O（例如 Dify 呼叫、SSE 串流）之前呼叫，
+    避免請求在等待回應期間佔住連線；仍在使用中的連線不受影響。
+    之後再呼叫 get_connection() 會重新自連線池取出。
+    """
+    from flask import g, has_app_context
+
+    if not has_app_context() or not g.get('_db_slots'):
+        return
+
+    idle_slots = [slot for slot in g._db_slots if not slot.busy]
+    g._db_slots = [slot for slot in g._db_slots if slot.busy]
+    for slot in idle_slots:
+        try:
+            _return_to_pool(slot.conn)
+        except Exception as e:
+            logging.warning(f"[DB] 歸還連線失敗: {str(e)}")
+
+
+def close_request_connections(exception=None):
+    """teardown_appcontext：回滾未完成的交易、將請求持有的連線歸還連線池並記錄 SQL 統計"""
+    from flask import g, request, has_request_context
+
+    path = request.path if has_request_context() else '-'
+    log_query_stats(path)
+
+    slots = g.pop('_db_slots', None)
+    calls = g.pop('_db_calls', 0)
+    if not slots:
+        return
+
+    for slot in slots:
+        if slot.busy or slot.in_transaction:
+            slot.release()
+        try:
+            _return_to_pool(slot.conn)
+        except Exception as e:
+            logging.warning(f"[DB] 歸還連線失敗: {str(e)}")
+
+    if len(slots) > DB_CHECKOUT_WARN_THRESHOLD:
+        logging.warning(f"[DB] {path} 單一請求取出 {len(slots)} 條連線（get_connection 呼叫 {calls} 次）")
+
+
+def add_debug_headers(response):
+    """
+    除錯用回應標頭：
+    - X-DB-Checkouts: 本請求 get_connection 呼叫數/實際取出數
+    - X-DB-Queries / X-DB-Repeated: 查詢次數、總耗時與疑似 N+1 的語句
+    """
+    calls, pool_checkouts = get_request_checkouts()
+    response.headers['X-DB-Checkouts'] = f'{calls}/{pool_checkouts}'
+    return add_query_headers(response)
+
+
+def handle_pool_timeout(error):
+    """連線池等待逾時：回應 503 並請客戶端稍後重試"""
+    from flask import jsonify
+
+    logging.warning(f"[DB] {str(error)}")
+    response = jsonify({'success': False, 'message': '系統忙碌中，請稍後再試'})
+    response.status_code = 503
+    response.headers['Retry-After'] = '1'
+    return response
+
+
+def init_app(app):
+    """註冊請求範圍連線的歸還處理與連線池逾時的 503 回應（DB_DEBUG_HEADERS=1 或 debug 模式時另外附上除錯標頭）"""
+    app.teardown_appcontext(close_request_connections)
+    app.register_error_handler(PoolTimeoutError, handle_pool_timeout)
+    if app.debug or os.environ.get("DB_DEBUG_HEADERS", "").lower() in ("1", "true", "yes"):
+        app.after_request(add_debug_headers)
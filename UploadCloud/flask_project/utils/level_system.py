@@ -28,6 +28,12 @@ import pymysql
 class UserLevelSystem:
     """用戶等級系統"""
     
+    # 各項活動的積分權重
+    POINTS_PER_POST = 10
+    POINTS_PER_LIKE = 3
+    POINTS_PER_COMMENT = 5
+    POINTS_PER_LOGIN_DAY = 2
+    
     # 等級配置
     LEVEL_CONFIG = {
         1: {
@@ -109,7 +115,12 @@ class UserLevelSystem:
         Returns:
             int: 總積分
         """
-        return (posts_count * 10) + (likes_received * 3) + (comments_received * 5) + (login_days * 2)
+        return (
+            posts_count * cls.POINTS_PER_POST
+            + likes_received * cls.POINTS_PER_LIKE
+            + comments_received * cls.POINTS_PER_COMMENT
+            + login_days * cls.POINTS_PER_LOGIN_DAY
+        )
     
     @classmethod
     def get_level_by_points(cls, points):
@@ -209,9 +220,59 @@ class UserLevelSystem:
         return max(0, next_min - current_points)
 
 
+def recount_user_stats(cursor, user_email):
+    """
+    依 Posts / Comments 完整重算用戶統計數據（積分帳本對帳用）
+    
+    Args:
+        cursor: 資料庫游標
+        user_email (str): 用戶郵箱
+        
+    Returns:
+        dict: posts_count、likes_received、comments_received、login_days
+    """
+    # 1. 發文數量
+    cursor.execute("""
+        SELECT COUNT(*) FROM Posts WHERE User_Email = %s AND Is_public = TRUE
+    """, (user_email,))
+    posts_count = cursor.fetchone()[0]
+    
+    # 2. 獲得的讚數：直接計算 Likes（不讀 Posts.likes_count，計數器漂移才能被對帳發現）
+    cursor.execute("""
+        SELECT COUNT(*) FROM Likes l
+        JOIN Posts p ON l.Post_id = p.Post_id
+        WHERE p.User_Email = %s AND p.Is_public = TRUE
+    """, (user_email,))
+    likes_received = cursor.fetchone()[0]
+    
+    # 3. 用戶貼文被其他人評論的數量：直接計算他人在公開貼文下的公開留言
+    cursor.execute("""
+        SELECT COUNT(*) FROM Comments c 
+        JOIN Posts p ON c.Post_id = p.Post_id 
+        WHERE p.User_Email = %s AND p.Is_public = TRUE
+        AND c.Is_public = TRUE AND c.User_Email <> %s
+    """, (user_email, user_email))
+    comments_received = cursor.fetchone()[0]
+    
+    # 4. 登入天數（簡化處理，基於註冊時間計算）
+    cursor.execute("SELECT DATEDIFF(NOW(), Created_at) + 1 FROM User WHERE User_Email = %s", (user_email,))
+    result = cursor.fetchone()
+    login_days = result[0] if result else 1
+    
+    return {
+        'posts_count': int(posts_count),
+        'likes_received': int(likes_received),
+        'comments_received': int(comments_received),
+        'login_days': login_days
+    }
+
+
 def update_user_level_and_stats(user_email, db_connection=None):
     """
-    更新用戶等級和統計數據
+    完整重算並更新用戶等級和統計數據
+    
+    一般請求改由 utils.points_ledger 以增量方式更新積分，
+    此函式僅供對帳修復與初始化使用。
     
     Args:
         user_email (str): 用戶郵箱
@@ -229,30 +290,11 @@ def update_user_level_and_stats(user_email, db_connection=None):
         cursor = connection.cursor()
         
         # 計算用戶統計數據
-        # 1. 發文數量
-        cursor.execute("SELECT COUNT(*) FROM Posts WHERE User_Email = %s AND Is_public = TRUE", (user_email,))
-        posts_count = cursor.fetchone()[0]
-        
-        # 2. 獲得的讚數
-        cursor.execute("""
-            SELECT COUNT(*) FROM Likes l 
-            JOIN Posts p ON l.Post_id = p.Post_id 
-            WHERE p.User_Email = %s AND p.Is_public = TRUE
-        """, (user_email,))
-        likes_received = cursor.fetchone()[0]
-        
-        # 3. 用戶貼文被其他人評論的數量（不包括自己的評論）
-        cursor.execute("""
-            SELECT COUNT(*) FROM Comments c 
-            JOIN Posts p ON c.Post_id = p.Post_id 
-            WHERE p.User_Email = %s AND p.Is_public = TRUE AND c.User_Email != %s
-        """, (user_email, user_email))
-        comments_received = cursor.fetchone()[0]
-        
-        # 4. 登入天數（簡化處理，基於註冊時間計算）
-        cursor.execute("SELECT DATEDIFF(NOW(), Created_at) + 1 FROM User WHERE User_Email = %s", (user_email,))
-        result = cursor.fetchone()
-        login_days = result[0] if result else 1
+        stats = recount_user_stats(cursor, user_email)
+        posts_count = stats['posts_count']
+        likes_received = stats['likes_received']
+        comments_received = stats['comments_received']
+        login_days = stats['login_days']
         
         # 計算總積分
         total_points = UserLevelSystem.calculate_points(posts_count, likes_received, comments_received, login_days)
@@ -325,6 +367,7 @@ def get_user_level_info(user_email, db_connection=None):
         dict: 用戶等級詳細信息
     """
     from utils.db import get_connection
+    from utils.points_ledger import sync_login_days
     
     connection = db_connection or get_connection()
     should_close = db_connection is None
@@ -332,11 +375,8 @@ def get_user_level_info(user_email, db_connection=None):
     try:
         cursor = connection.cursor()
         
-        # 先更新用戶數據確保最新
-        update_result = update_user_level_and_stats(user_email, connection)
-        
-        if not update_result['success']:
-            return {'success': False, 'message': '獲取用戶信息失敗'}
+        # 積分由帳本增量維護，這裡只需補上今天的登入天數（單列更新）
+        sync_login_days(cursor, user_email)
         
         cursor.execute("""
             SELECT user_level, user_points, posts_count, likes_received, 
@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+"""
+用戶積分帳本
+
+過去每次載入社群頁面都會呼叫 update_user_level_and_stats()，
+以多個 COUNT/JOIN 重算 Posts、Likes、Comments 後再 UPDATE User。
+改為事件驅動的增量帳本：
+- 發文、獲得讚、獲得他人留言、每日登入時產生積分異動事件
+- record_points_event() 以單列 UPDATE 原子性地加減 User 上的統計欄位與 user_points，
+  並寫入 user_points_ledger 留下異動紀錄，O(1) 完成
+- 等級依更新後的積分判斷，升級時寫入 UserLevelHistory
+- reconcile_user_points() 定期以完整重算對帳，發現漂移時修正並記錄 'reconcile' 事件
+
+事件須與觸發它的寫入（INSERT Posts / Likes / Comments）在同一交易內呼叫。
+
+命令列：
+    flask social reconcile-points            # 對帳並修正所有用戶
+    flask social reconcile-points --dry-run  # 只回報差異
+
+環境變數：
+- POINTS_RECONCILE_INTERVAL: 背景定期對帳間隔秒數（0 或未設定表示停用）
+"""
+
+import time
+from datetime import datetime
+
+from utils.level_system import UserLevelSystem, recount_user_stats, update_user_level_and_stats
+
+# 事件類型 -> (User 統計欄位, 每單位積分)
+POINT_EVENTS = {
+    'post_created': ('posts_count', UserLevelSystem.POINTS_PER_POST),
+    'like_received': ('likes_received', UserLevelSystem.POINTS_PER_LIKE),
+    'comment_received': ('comments_made', UserLevelSystem.POINTS_PER_COMMENT),
+    'login_day': ('login_days', UserLevelSystem.POINTS_PER_LOGIN_DAY),
+}
+
+# 事件類型的中文說明（寫入等級歷史的升級原因）
+EVENT_REASONS = {
+    'post_created': '發文活動',
+    'like_received': '獲得按讚',
+    'comment_received': '獲得留言',
+    'login_day': '每日登入',
+    'reconcile': '積分對帳',
+}
+
+# 對帳時比對的統計欄位（recount_user_stats 鍵 -> User 欄位）
+RECONCILE_COLUMNS = {
+    'posts_count': 'posts_count',
+    'likes_received': 'likes_received',
+    'comments_received': 'comments_made',
+    'login_days': 'login_days',
+}
+
+
+def _apply_points(cursor, user_email, event_type, quantity, points_delta, source_id=None):
+    """加減 user_points、寫入帳本並檢查等級變化，返回與 update_user_level_and_stats 相同格式的結果"""
+    cursor.execute("""
+        UPDATE User SET user_points = GREATEST(COALESCE(user_points, 0) + %s, 0)
+        WHERE User_Email = %s
+    """, (points_delta, user_email))
+
+    cursor.execute("""
+        INSERT INTO user_points_ledger (user_email, event_type, quantity, points_delta, source_id)
+        VALUES (%s, %s, %s, %s, %s)
+    """, (user_email, event_type, quantity, points_delta, source_id))
+
+    cursor.execute("SELECT user_points, user_level FROM User WHERE User_Email = %s", (user_email,))
+    result = cursor.fetchone()
+    if not result:
+        return {'success': False, 'error': '找不到用戶'}
+
+    total_points, old_level = result
+    old_level = old_level or 1
+    new_level = UserLevelSystem.get_level_by_points(total_points)
+
+    if new_level != old_level:
+        cursor.execute("""
+            UPDATE User SET user_level = %s, last_level_update = %s WHERE User_Email = %s
+        """, (new_level, datetime.now(), user_email))
+
+        if new_level > old_level:
+            old_info = UserLevelSystem.get_level_info(old_level)
+            new_info = UserLevelSystem.get_level_info(new_level)
+            cursor.execute("""
+                INSERT INTO UserLevelHistory
+                (user_email, old_level, new_level, old_title, new_title, points_earned, reason)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+            """, (user_email, old_level, new_level, old_info['title'], new_info['title'],
+                  total_points, EVENT_REASONS.get(event_type, event_type)))
+
+    return {
+        'success': True,
+        'user_email': user_email,
+        'level_changed': new_level > old_level,
+        'old_level': old_level,
+        'new_level': new_level,
+        'total_points': total_points,
+        'points_delta': points_delta
+    }
+
+
+def record_points_event(cursor, user_email, event_type, quantity=1, source_id=None):
+    """
+    記錄一筆積分異動事件（O(1) 增量更新）
+
+    Args:
+        cursor: 資料庫游標（與觸發事件的寫入同一交易）
+        user_email (str): 獲得/扣除積分的用戶
+        event_type (str): POINT_EVENTS 中的事件類型
+        quantity (int): 事件數量，負數表示撤銷（如取消按讚、刪除留言）
+        source_id (int): 來源貼文/評論ID（可選）
+
+    Returns:
+        dict: 更新結果，包含 level_changed / new_level 等等級變化信息；quantity 為 0 時返回 None
+    """
+    if not user_email or not quantity:
+        return None
+
+    column, weight = POINT_EVENTS[event_type]
+    cursor.execute(f"""
+        UPDATE User SET {column} = GREATEST(COALESCE({column}, 0) + %s, 0)
+        WHERE User_Email = %s
+    """, (quantity, user_email))
+
+    return _apply_points(cursor, user_email, event_type, quantity, quantity * weight, source_id)
+
+
+def sync_login_days(cursor, user_email):
+    """
+    補上登入天數積分（依註冊天數計算，每天只會實際產生一次異動）
+
+    Args:
+        cursor: 資料庫游標
+        user_email (str): 用戶郵箱
+
+    Returns:
+        dict: 有新增天數時返回更新結果，否則返回 None
+    """
+    cursor.execute("""
+        SELECT DATEDIFF(NOW(), Created_at) + 1, COALESCE(login_days, 0)
+        FROM User WHERE User_Email = %s
+    """, (user_email,))
+    result = cursor.fetchone()
+    if not result or result[0] is None or result[0] <= result[1]:
+        return None
+
+    target_days, current_days = result
+
+    # 以目前值作為條件搶先寫入，避免同時多個請求重複加分
+    cursor.execute("""
+        UPDATE User SET login_days = %s
+        WHERE User_Email = %s AND COALESCE(login_days, 0) = %s
+    """, (target_days, user_email, current_days))
+    if cursor.rowcount == 0:
+        return None
+
+    quantity = target_days - current_days
+    return _apply_points(cursor, user_email, 'login_day', quantity,
+                         quantity * UserLevelSystem.POINTS_PER_LOGIN_DAY)
+
+
+def reconcile_user_points(user_emails=None, fix=True):
+    """
+    以完整重算對帳積分帳本
+
+    Args:
+        user_emails (list): 只對帳指定用戶；None 表示所有用戶
+        fix (bool): 是否修正漂移（修正時寫入 'reconcile' 帳本事件）
+
+    Returns:
+        list: 有差異的用戶列表，每筆包含 user_email、stored、expected
+    """
+    from utils.db import get_connection
+
+    connection = get_connection()
+    cursor = connection.cursor()
+    drifts = []
+
+    try:
+        if not user_emails:
+            cursor.execute("SELECT User_Email FROM User")
+            user_emails = [row[0] for row in cursor.fetchall()]
+
+        for user_email in user_emails:
+            # 先補上登入天數，避免把尚未登入的天數誤判為漂移（dry run 不寫入，改於下方比對時換算）
+            if fix:
+                sync_login_days(cursor, user_email)
+
+            cursor.execute("""
+                SELECT posts_count, likes_received, comments_made, login_days, user_points
+                FROM User WHERE User_Email = %s
+            """, (user_email,))
+            result = cursor.fetchone()
+            if not result:
+                continue
+
+            stored = dict(zip(list(RECONCILE_COLUMNS.values()) + ['user_points'],
+                              [value or 0 for value in result]))
+            stats = recount_user_stats(cursor, user_email)
+            if not fix and stats['login_days'] > stored['login_days']:
+                # 唯讀換算 sync_login_days() 會補上的天數與積分
+                pending_days = stats['login_days'] - stored['login_days']
+                stored['login_days'] += pending_days
+                stored['user_points'] += pending_days * UserLevelSystem.POINTS_PER_LOGIN_DAY
+            expected = {RECONCILE_COLUMNS[key]: value for key, value in stats.items()}
+            expected['user_points'] = UserLevelSystem.calculate_points(**stats)
+
+            if stored == expected:
+                continue
+
+            drifts.append({'user_email': user_email, 'stored': stored, 'expected': expected})
+
+            if fix:
+                update_user_level_and_stats(user_email, connection)
+                cursor.execute("""
+                    INSERT INTO user_points_ledger (user_email, event_type, quantity, points_delta, source_id)
+                    VALUES (%s, 'reconcile', 0, %s, NULL)
+                """, (user_email, expected['user_points'] - stored['user_points']))
+
+        return drifts
+
+    finally:
+        connection.close()
+
+
+def run_points_reconciler(interval_seconds):
+    """背景定期對帳迴圈（由 app.py 以 socketio.start_background_task 啟動）"""
+    while True:
+        time.sleep(interval_seconds)
+        try:
+            drifts = reconcile_user_points()
+            if drifts:
+                print(f"[INFO] 積分對帳修正 {len(drifts)} 位用戶")
+        except Exception as e:
+            print(f"[ERROR] 積分對帳失敗: {str(e)}")
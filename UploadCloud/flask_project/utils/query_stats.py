@@ -0,0 +1,244 @@
+"""
+每請求 SQL 統計與 N+1 偵測模組
+
+utils.db 在請求內交出的連線，其 cursor() 會以 InstrumentedCursor 包裝，
+記錄本次請求的：
+- 查詢次數與資料庫總耗時
+- 最慢的幾條語句
+- 語句指紋（參數、數字與字串常值、IN 清單長度正規化後的 SQL）出現次數
+
+同一指紋的 SELECT 在單一請求內出現達 N+1 門檻次數時，視為 N+1 查詢模式
+（例如逐篇貼文查詢 Comments、逐張卡片查詢參與者）。
+
+輸出方式：
+- 回應標頭（DB_DEBUG_HEADERS=1 或 debug 模式）：
+    X-DB-Queries: 23 queries; 41.2ms
+    X-DB-Repeated: 18x SELECT ... FROM Comments WHERE Post_id = %s
+- 記錄檔：DB_QUERY_LOG=1 時每個請求記錄一行摘要；偵測到 N+1 時一律記錄警告
+- 查詢收集：設定 DB_QUERY_CAPTURE 時，每個指紋第一次出現的完整語句（已代入參數）
+  以 JSON Lines 附加到該檔案，供 tools/index_advisor.py 執行 EXPLAIN
+
+環境變數：
+- DB_NPLUS1_THRESHOLD: 同一指紋重複幾次視為 N+1（預設: 5）
+- DB_SLOW_QUERY_COUNT: 保留的最慢語句數（預設: 5）
+- DB_QUERY_LOG: 是否每個請求都記錄摘要（預設: 關閉）
+- DB_QUERY_CAPTURE: 收集語句的輸出檔路徑（預設: 不收集）
+"""
+
+import json
+import logging
+import os
+import threading
+import re
+import time
+from collections import Counter
+
+DB_NPLUS1_THRESHOLD = int(os.environ.get("DB_NPLUS1_THRESHOLD", 5))
+DB_SLOW_QUERY_COUNT = int(os.environ.get("DB_SLOW_QUERY_COUNT", 5))
+DB_QUERY_LOG = os.environ.get("DB_QUERY_LOG", "").lower() in ("1", "true", "yes")
+DB_QUERY_CAPTURE = os.environ.get("DB_QUERY_CAPTURE")
+
+# 回應標頭中 SQL 摘要的最大長度
+HEADER_SQL_LENGTH = 160
+
+_STRING_LITERAL = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"(?:(?:%s|\?)\s*,\s*)+(?:%s|\?)")
+_LINE_COMMENT = re.compile(r"--[^\n]*")
+_WHITESPACE = re.compile(r"\s+")
+# 已寫入收集檔的指紋（每個行程只收集一次）
+_captured_fingerprints = set()
+_capture_lock = threading.Lock()
+
+_WRITE_STATEMENT = re.compile(r"^\s*(?:INSERT|UPDATE|DELETE|REPLACE|ALTER|CREATE|DROP|TRUNCATE)\b", re.IGNORECASE)
+
+
+def is_write(sql):
+    """是否為寫入語句（INSERT / UPDATE / DELETE 等）"""
+    text = sql.decode('utf-8', 'replace') if isinstance(sql, bytes) else str(sql)
+    return bool(_WRITE_STATEMENT.match(text))
+
+
+def fingerprint(sql):
+    """
+    將 SQL 正規化為指紋：移除註解、常值換成 ?、IN (%s, %s, ...) 合併、空白壓縮
+
+    Args:
+        sql (str): SQL 語句
+
+    Returns:
+        str: 指紋字串
+    """
+    text = sql.decode('utf-8', 'replace') if isinstance(sql, bytes) else str(sql)
+    text = _LINE_COMMENT.sub(' ', text)
+    text = _STRING_LITERAL.sub('?', text)
+    text = _NUMBER_LITERAL.sub('?', text)
+    text = _PLACEHOLDER_LIST.sub('%s...', text)
+    return _WHITESPACE.sub(' ', text).strip()
+
+
+class QueryStats:
+    """單一請求的 SQL 統計"""
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.slowest = []
+        self.fingerprints = Counter()
+        self.samples = {}
+
+    def record(self, sql, duration_ms, sample=None):
+        self.count += 1
+        self.total_ms += duration_ms
+        key = fingerprint(sql)
+        self.fingerprints[key] += 1
+        if sample is not None and key not in self.samples and key not in _captured_fingerprints:
+            self.samples[key] = sample
+
+        if len(self.slowest) < DB_SLOW_QUERY_COUNT or duration_ms > self.slowest[-1][0]:
+            self.slowest.append((duration_ms, key))
+            self.slowest.sort(key=lambda item: item[0], reverse=True)
+            del self.slowest[DB_SLOW_QUERY_COUNT:]
+
+    def repeated(self, threshold=None):
+        """重複次數達門檻的 SELECT 指紋（疑似 N+1），依次數由多到少排序"""
+        threshold = threshold or DB_NPLUS1_THRESHOLD
+        return [
+            (key, times) for key, times in self.fingerprints.most_common()
+            if times >= threshold and key.lstrip('( ').upper().startswith('SELECT')
+        ]
+
+    def summary(self):
+        return {
+            'queries': self.count,
+            'total_ms': round(self.total_ms, 1),
+            'slowest': [{'ms': round(ms, 1), 'sql': sql} for ms, sql in self.slowest],
+            'repeated': [{'count': times, 'sql': sql} for sql, times in self.repeated()]
+        }
+
+
+class InstrumentedCursor:
+    """包裝 PyMySQL cursor，計時每次 execute / executemany；寫入語句成功後呼叫 on_write"""
+
+    def __init__(self, cursor, stats, on_write=None):
+        self._cursor = cursor
+        self._stats = stats
+        self._on_write = on_write
+
+    def _sample(self, query, args):
+        """DB_QUERY_CAPTURE 啟用時，取得代入參數後的完整語句（executemany 取第一組參數）"""
+        if not DB_QUERY_CAPTURE:
+            return None
+        if isinstance(args, list):
+            args = args[0] if args else None
+        try:
+            return self._cursor.mogrify(query, args)
+        except Exception:
+            return None
+
+    def _run(self, method, query, args):
+        started = time.perf_counter()
+        try:
+            result = method(query, args)
+        finally:
+            self._stats.record(query, (time.perf_counter() - started) * 1000, self._sample(query, args))
+        if self._on_write and is_write(query):
+            self._on_write()
+        return result
+
+    def execute(self, query, args=None):
+        return self._run(self._cursor.execute, query, args)
+
+    def executemany(self, query, args):
+        return self._run(self._cursor.executemany, query, args)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self._cursor.close()
+
+
+def current_stats():
+    """目前請求的 QueryStats；不在 app context 中時返回 None"""
+    from flask import g, has_app_context
+
+    if not has_app_context():
+        return None
+    if '_db_query_stats' not in g:
+        g._db_query_stats = QueryStats()
+    return g._db_query_stats
+
+
+def instrument_cursor(cursor, on_write=None):
+    """在請求內以 InstrumentedCursor 包裝 cursor，其餘情況原樣返回"""
+    stats = current_stats()
+    return InstrumentedCursor(cursor, stats, on_write) if stats is not None else cursor
+
+
+def _header_safe(text):
+    """回應標頭只能使用 latin-1，截斷並替換非 ASCII 字元"""
+    text = text if len(text) <= HEADER_SQL_LENGTH else text[:HEADER_SQL_LENGTH] + '...'
+    return text.encode('ascii', 'replace').decode('ascii')
+
+
+def add_query_headers(response):
+    """於回應標頭附上本請求的查詢次數、總耗時與最常重複的語句"""
+    from flask import g
+
+    stats = g.get('_db_query_stats')
+    if not stats:
+        return response
+
+    response.headers['X-DB-Queries'] = f'{stats.count} queries; {stats.total_ms:.1f}ms'
+    repeated = stats.repeated()
+    if repeated:
+        sql, times = repeated[0]
+        response.headers['X-DB-Repeated'] = _header_safe(f'{times}x {sql}')
+    return response
+
+
+def _write_captured(path, stats):
+    """將本請求新出現的語句指紋與範例語句附加到 DB_QUERY_CAPTURE 檔案"""
+    with _capture_lock:
+        lines = []
+        for key, sample in stats.samples.items():
+            if key in _captured_fingerprints:
+                continue
+            _captured_fingerprints.add(key)
+            lines.append(json.dumps({'path': path, 'fingerprint': key, 'sql': sample}, ensure_ascii=False))
+        if not lines:
+            return
+        try:
+            with open(DB_QUERY_CAPTURE, 'a', encoding='utf-8') as capture_file:
+                capture_file.write('\n'.join(lines) + '\n')
+        except OSError as e:
+            logging.warning(f"[SQL] 寫入查詢收集檔失敗: {str(e)}")
+
+
+def log_query_stats(path):
+    """請求結束時記錄摘要（DB_QUERY_LOG）與 N+1 警告、附加收集的語句，並清除本請求的統計"""
+    from flask import g
+
+    stats = g.pop('_db_query_stats', None)
+    if not stats or not stats.count:
+        return
+
+    if DB_QUERY_CAPTURE and stats.samples:
+        _write_captured(path, stats)
+
+    if DB_QUERY_LOG:
+        slowest = stats.slowest[0] if stats.slowest else (0, '')
+        logging.info(
+            f"[SQL] {path} {stats.count} queries, {stats.total_ms:.1f}ms, "
+            f"slowest {slowest[0]:.1f}ms: {slowest[1][:HEADER_SQL_LENGTH]}"
+        )
+
+    for sql, times in stats.repeated():
+        logging.warning(f"[SQL] {path} 疑似 N+1 查詢：同一語句執行 {times} 次：{sql[:HEADER_SQL_LENGTH]}")
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+"""
+用戶搜尋前綴索引
+
+好友搜尋原本以 User_Email LIKE '%q%' OR User_name LIKE '%q%' 查詢，每次按鍵都全表掃描；
+User ID 可用性檢查也是每次按鍵查一次資料庫。這裡在行程記憶體內維護排序陣列：
+- 鍵值為小寫的 email、用戶名稱（整串與名稱中的每個單字）、user_id
+- 以 bisect 找到前綴起點後往後掃描，搜尋只比對前綴（不再支援字串中段的比對）
+- user_id → email 字典，可用性檢查直接查表
+
+啟動時於背景載入（warm），並每 USER_SEARCH_INDEX_REFRESH_INTERVAL 秒重建一次，
+讓其他 worker 行程的註冊與資料修改最終也會反映；本行程內的註冊、個人資料修改與
+create_user_id 則以 index_user() 立即更新。
+索引尚未載入完成（cold）時 search() / user_id_owner() 返回 None，呼叫端改查資料庫。
+
+環境變數：
+- USER_SEARCH_INDEX: 是否啟用（預設: 啟用；0 表示停用，一律查資料庫）
+- USER_SEARCH_INDEX_REFRESH_INTERVAL: 背景重建間隔秒數（預設: 300；0 表示只在啟動時載入）
+"""
+
+import bisect
+import os
+import threading
+import time
+
+from utils import db
+
+USER_SEARCH_INDEX = os.environ.get("USER_SEARCH_INDEX", "1").lower() not in ("0", "false", "no")
+USER_SEARCH_INDEX_REFRESH_INTERVAL = int(os.environ.get("USER_SEARCH_INDEX_REFRESH_INTERVAL", 300))
+
+# 單次搜尋最多掃描的索引項目數（一兩個字元的前綴可能命中大量用戶）
+SEARCH_SCAN_LIMIT = 200
+
+# 排序優先順序（數字小者在前），與原本 SQL 的 ORDER BY CASE 一致
+RANK_USER_ID_EXACT = 0
+RANK_USER_ID = 1
+RANK_NAME = 2
+RANK_EMAIL = 3
+
+
+def _index_keys(email, name, user_id):
+    """用戶的所有索引鍵：[(小寫鍵值, 排序優先順序, email), ...]"""
+    keys = {(email.lower(), RANK_EMAIL)}
+    name_lower = (name or '').strip().lower()
+    if name_lower:
+        keys.add((name_lower, RANK_NAME))
+        keys.update((word, RANK_NAME) for word in name_lower.split()[1:])
+    if user_id:
+        keys.add((user_id.lower(), RANK_USER_ID))
+    return sorted((key, rank, email) for key, rank in keys)
+
+
+class UserSearchIndex:
+    """email / 用戶名稱 / user_id 的前綴索引（排序陣列 + bisect）"""
+
+    def __init__(self):
+        self._keys = []        # 排序的 (小寫鍵值, 排序優先順序, email)
+        self._users = {}       # email -> (User_name, user_id, 索引鍵列表)
+        self._user_ids = {}    # 小寫 user_id -> email（資料庫定序不分大小寫）
+        self._lock = threading.Lock()
+        self.ready = False
+
+    def rebuild(self, rows):
+        """以 (User_Email, User_name, user_id) 資料列重建整個索引"""
+        keys = []
+        users = {}
+        user_ids = {}
+        for email, name, user_id in rows:
+            entry_keys = _index_keys(email, name, user_id)
+            keys.extend(entry_keys)
+            users[email] = (name, user_id, entry_keys)
+            if user_id:
+                user_ids[user_id.lower()] = email
+        keys.sort()
+
+        with self._lock:
+            self._keys = keys
+            self._users = users
+            self._user_ids = user_ids
+            self.ready = True
+
+    def upsert(self, email, name=None, user_id=None):
+        """新增或更新單一用戶；name / user_id 為 None 時保留原值"""
+        with self._lock:
+            old_name, old_user_id, old_keys = self._users.get(email, (None, None, []))
+            name = old_name if name is None else name
+            user_id = old_user_id if user_id is None else user_id
+
+            for entry in old_keys:
+                position = bisect.bisect_left(self._keys, entry)
+                if position < len(self._keys) and self._keys[position] == entry:
+                    del self._keys[position]
+            if old_user_id and self._user_ids.get(old_user_id.lower()) == email:
+                del self._user_ids[old_user_id.lower()]
+
+            new_keys = _index_keys(email, name, user_id)
+            for entry in new_keys:
+                bisect.insort(self._keys, entry)
+            self._users[email] = (name, user_id, new_keys)
+            if user_id:
+                self._user_ids[user_id.lower()] = email
+
+    def search(self, query, exclude_email=None, limit=20, include_user_id=True):
+        """
+        前綴搜尋
+
+        Returns:
+            list: 依 user_id 完全相符 → user_id / 名稱 / email 前綴 → 名稱 排序的 email；
+                  索引尚未載入時返回 None
+        """
+        if not self.ready:
+            return None
+        prefix = query.strip().lower()
+        if not prefix:
+            return []
+
+        best = {}
+        with self._lock:
+            position = bisect.bisect_left(self._keys, (prefix,))
+            end = min(len(self._keys), position + SEARCH_SCAN_LIMIT)
+            while position < end:
+                key, rank, email = self._keys[position]
+                position += 1
+                if not key.startswith(prefix):
+                    break
+                if email == exclude_email or (rank == RANK_USER_ID and not include_user_id):
+                    continue
+                if rank == RANK_USER_ID and key == prefix:
+                    rank = RANK_USER_ID_EXACT
+                best[email] = min(best.get(email, rank), rank)
+            names = {email: (self._users[email][0] or '').lower() for email in best}
+
+        return sorted(best, key=lambda email: (best[email], names[email]))[:limit]
+
+    def user_id_owner(self, user_id):
+        """
+        user_id 的擁有者
+
+        Returns:
+            str: 擁有者 email；沒有人使用時返回空字串；索引尚未載入時返回 None
+        """
+        if not self.ready:
+            return None
+        with self._lock:
+            return self._user_ids.get(user_id.lower(), '')
+
+    def user_id_of(self, email):
+        """用戶的 user_id（未設定時返回空字串）；索引尚未載入或不認得該用戶時返回 None"""
+        if not self.ready:
+            return None
+        with self._lock:
+            entry = self._users.get(email)
+        return None if entry is None else (entry[1] or '')
+
+
+_index = UserSearchIndex()
+
+
+def get_user_search_index():
+    """取得共用的索引；USER_SEARCH_INDEX 停用時返回 None"""
+    return _index if USER_SEARCH_INDEX else None
+
+
+def warm_user_search_index():
+    """自資料庫載入所有用戶並重建索引"""
+    with db.connection(readonly=True) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT User_Email, User_name, user_id FROM User")
+        rows = cursor.fetchall()
+        cursor.close()
+    _index.rebuild(rows)
+    return len(rows)
+
+
+def index_user(email, name=None, user_id=None):
+    """註冊、修改名稱或設定 user_id 成功後立即更新索引（name / user_id 為 None 時保留原值）"""
+    if USER_SEARCH_INDEX and _index.ready:
+        _index.upsert(email, name, user_id)
+
+
+def load_users(database_cursor, emails, columns):
+    """
+    依索引搜尋結果的順序載入用戶資料列（主鍵查詢）
+
+    Args:
+        database_cursor: 資料庫游標
+        emails (list): 已排序的 email
+        columns (str): 要查詢的欄位，第一欄須為 User_Email
+
+    Returns:
+        list: 與 emails 同順序的資料列（已不存在的用戶會略過）
+    """
+    if not emails:
+        return []
+    placeholders = ', '.join(['%s'] * len(emails))
+    database_cursor.execute(f"SELECT {columns} FROM User WHERE User_Email IN ({placeholders})", tuple(emails))
+    rows = {row[0]: row for row in database_cursor.fetchall()}
+    return [rows[email] for email in emails if email in rows]
+
+
+def run_user_search_index_refresher(interval_seconds=USER_SEARCH_INDEX_REFRESH_INTERVAL):
+    """啟動時載入索引，之後定期重建（由 app.py 以 socketio.start_background_task 啟動）"""
+    while True:
+        try:
+            count = warm_user_search_index()
+            print(f"[INFO] 用戶搜尋索引已載入 {count} 位用戶")
+        except Exception as e:
+            print(f"[ERROR] 用戶搜尋索引載入失敗: {str(e)}")
+        if interval_seconds <= 0:
+            return
+        time.sleep(interval_seconds)